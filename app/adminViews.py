@@ -2,10 +2,13 @@
 Custom views for Flask-Admin interface.
 
 This module contains custom view classes for Flask-Admin, which provide additional functionality and access control for managing various data models within the application.
+
+It is imported by initAdmin() the first time an application handles a request, so
+scripts that only use the models never load Flask-Admin.
 """
 
 from flask import render_template, url_for, session, redirect
-from flask_admin import AdminIndexView, expose
+from flask_admin import AdminIndexView, BaseView as AdminBaseView, expose
 from flask_admin.contrib.sqla import ModelView
 from markupsafe import Markup
 
@@ -19,7 +22,7 @@ class BaseView:
 
     def inaccessible_callback(self, name, **kwargs):
         """Redirect users without a valid session to the login page."""
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
 
 
 class CustomAdminIndexView(BaseView, AdminIndexView):
@@ -92,7 +95,7 @@ class ProductionFacilityView(BaseView, ModelView):
     }
     column_formatters = {
         "name": lambda v, c, m, p: Markup(
-            f'<a href="{url_for("facilityInventory", facilityId=m.id)}">{m.name}</a>'
+            f'<a href="{url_for("main.facilityInventory", facilityId=m.id)}">{m.name}</a>'
         )
     }
     column_editable_list = [
@@ -149,5 +152,182 @@ class DatabaseTransactionView(ModelView):
     }
 
 
+class PerformanceView(BaseView, AdminBaseView):
+    """View for the per-endpoint SQL profile and the flagged requests."""
+
+    def __init__(self, profiler, **kwargs):
+        super().__init__(**kwargs)
+        self.profiler = profiler
+
+    @expose("/")
+    def index(self):
+        return self.render("admin/performance.html", stats=self.profiler.stats())
+
+    @expose("/reset", methods=["POST"])
+    def reset(self):
+        self.profiler.reset()
+        return redirect(url_for(".index"))
+
+
+class BuildableView(BaseView, AdminBaseView):
+    """View for the buildable quantity of every product over every facility."""
+
+    @expose("/")
+    def index(self):
+        from services.mrpEngine import summarizeBuildable
+
+        return self.render("admin/buildable.html", summary=summarizeBuildable())
+
+
+class StockRollupView(BaseView, ModelView):
+    """View for company-wide stock totals per product or component."""
+
+    can_create = False
+    can_edit = False
+    can_delete = False
+    column_display_pk = True
+    column_default_sort = ("totalCount", True)
+    column_labels = {
+        "productId": "Product ID",
+        "componentId": "Component ID",
+        "totalCount": "Total Count",
+        "facilityCount": "Facilities Stocking",
+    }
+
+
+class StockAlertView(BaseView, ModelView):
+    """View for the low-stock alerts, active ones first."""
+
+    can_create = False
+    can_edit = False
+    can_delete = False
+    column_list = [
+        "status",
+        "productionFacilityId",
+        "itemType",
+        "itemId",
+        "count",
+        "reorderPoint",
+        "triggerCount",
+        "triggeredAt",
+        "lastTriggeredAt",
+        "resolvedAt",
+        "acknowledgedByUserId",
+    ]
+    column_filters = ["status", "productionFacilityId", "itemType", "itemId"]
+    column_sortable_list = ["status", "count", "triggeredAt", "lastTriggeredAt"]
+    column_default_sort = ("lastTriggeredAt", True)
+    column_labels = {
+        "productionFacilityId": "Facility",
+        "itemType": "Type",
+        "itemId": "Item ID",
+        "reorderPoint": "Reorder Point",
+        "triggerCount": "Times Triggered",
+        "triggeredAt": "Triggered",
+        "lastTriggeredAt": "Last Triggered",
+        "resolvedAt": "Resolved",
+        "acknowledgedByUserId": "Acknowledged By",
+    }
+    column_formatters = {
+        "productionFacilityId": lambda v, c, m, p: Markup(
+            f'<a href="{url_for("main.facilityInventory", facilityId=m.productionFacilityId)}">'
+            f"{m.productionFacilityId}</a>"
+        )
+    }
+
+    def get_query(self):
+        return self.session.query(self.model).order_by(
+            self.model.status == "resolved", self.model.lastTriggeredAt.desc()
+        )
+
+
+class StockThresholdView(BaseView, ModelView):
+    """View for managing the reorder point of each item at each facility."""
+
+    column_display_pk = True
+    form_columns = ["productionFacilityId", "itemType", "itemId", "reorderPoint"]
+    form_choices = {"itemType": [("product", "Product"), ("component", "Component")]}
+    column_list = [
+        "productionFacilityId",
+        "itemType",
+        "itemId",
+        "reorderPoint",
+        "updatedAt",
+        "updatedByUserId",
+    ]
+    column_filters = ["productionFacilityId", "itemType", "itemId"]
+    column_labels = {
+        "productionFacilityId": "Facility",
+        "itemType": "Type",
+        "itemId": "Item ID",
+        "reorderPoint": "Reorder Point",
+        "updatedAt": "Updated",
+        "updatedByUserId": "Updated By",
+    }
+    column_editable_list = ["reorderPoint"]
+
+    def on_model_change(self, form, model, is_created):
+        from services.authentication import currentPrincipal
+
+        principal = currentPrincipal()
+        model.updatedByUserId = principal and principal["id"]
+
+
 class ShipmentView(BaseView, ModelView):
     can_view_details = True
+
+
+def initAdmin(app):
+    """
+    Create the Flask-Admin instance of an application and register its views.
+
+    Args:
+        app (Flask): The application to register the admin blueprints on.
+
+    Returns:
+        Admin: The admin instance.
+    """
+    from flask_admin import Admin
+    from extensions import db
+    from models.component import Component
+    from models.product import Product
+    from models.productionFacility import ProductionFacility
+    from models.stockAlert import StockAlert, StockThreshold
+    from models.stockRollup import ComponentStockRollup, ProductStockRollup
+    from models.transaction import DatabaseTransaction
+    from models.user import User
+    from services.queryProfiler import queryProfiler
+
+    admin = Admin(
+        app,
+        name="Nexus Admin",
+        template_mode="bootstrap4",
+        index_view=CustomAdminIndexView(name="Home"),
+    )
+    admin.add_view(UserView(User, db.session, name="Personnel"))
+    admin.add_view(ProductView(Product, db.session, name="Products"))
+    admin.add_view(CustomView(Component, db.session, name="Components"))
+    admin.add_view(
+        ProductionFacilityView(ProductionFacility, db.session, name="Facilities")
+    )
+    admin.add_view(
+        StockRollupView(ProductStockRollup, db.session, name="Product Stock")
+    )
+    admin.add_view(
+        StockRollupView(ComponentStockRollup, db.session, name="Component Stock")
+    )
+    admin.add_view(StockAlertView(StockAlert, db.session, name="Stock Alerts"))
+    admin.add_view(
+        StockThresholdView(StockThreshold, db.session, name="Reorder Points")
+    )
+
+    admin.add_view(
+        DatabaseTransactionView(
+            DatabaseTransaction, db.session, name="Database Transactions"
+        )
+    )
+    admin.add_view(
+        PerformanceView(queryProfiler, name="Performance", endpoint="performance")
+    )
+    admin.add_view(BuildableView(name="Buildable", endpoint="buildable"))
+    return admin
@@ -4,101 +4,186 @@ Flask web application for managing inventory and user authentication.
 This application provides functionality for managing inventory, user authentication, 
 and dashboard display.
 
+create_app() builds an application instance: it initializes the extensions and
+Flask-Admin for it and registers the routes below, which are defined on the "main"
+blueprint. wsgi.py creates the production instance; "from app import app" still
+returns a default instance for scripts and tests.
+
 Routes:
 - '/' : Home page.
 - '/login' : User login page.
 - '/inventory' : Inventory overview page.
 - '/inventory/<int:facilityId>' : Detailed inventory view for a specific facility.
+- '/api/facilities/<int:facilityId>/inventory' : Facility inventory as JSON.
+- '/api/facilities/<int:facilityId>/inventory/<itemType>' : One filtered, sorted page of a facility's inventory.
+- '/inventory/<int:facilityId>/export/<itemType>.csv' : Streamed CSV export of a facility's inventory.
+- '/api/facilities/nearest' : Nearest operating facilities holding an item.
+- '/api/stock/products/<int:productId>' : Company-wide stock of a product.
+- '/api/stock/components/<int:componentId>' : Company-wide stock of a component.
+- '/api/facilities/<int:facilityId>/buildable' : Products a facility can build from its components.
+- '/api/products/<int:productId>/buildable' : Facilities that can build a product.
+- '/api/facilities/<int:facilityId>/builds' : Build products from a facility's components.
+- '/api/facilities/<int:facilityId>/reservations' : Hold some of a facility's stock for an order.
+- '/api/facilities/<int:facilityId>/available/<itemType>' : Available-to-promise quantities.
+- '/api/reservations/<int:reservationId>' : Release a reservation.
+- '/api/reservations/<int:reservationId>/confirm' : Keep a reservation until it is converted.
+- '/api/facilities/<int:facilityId>/stock-at' : A facility's counts as of a point in time.
+- '/api/facilities/<int:facilityId>/movements' : A facility's inventory movements, newest first.
+- '/api/shipments/plan' : Plan, and optionally apply, which facilities fulfil the pending shipments.
+- '/api/shipments/<int:shipmentId>' : A shipment and its allocations.
+- '/api/facilities/<int:facilityId>/thresholds' : Get or set a facility's reorder points.
+- '/api/alerts' : Low-stock alerts, newest first.
+- '/api/alerts/<int:alertId>/acknowledge' : Acknowledge a low-stock alert.
+- '/api/schedules' : Schedule a queue of build orders over the production lines.
+- '/api/schedules/<int:scheduleId>' : Schedule summary and unscheduled orders.
+- '/api/schedules/<int:scheduleId>/facilities/<int:facilityId>' : A facility's production timeline.
+- '/api/schedules/<int:scheduleId>/orders/<int:orderId>' : Add, change or remove one order.
+- '/api/audit/stats' : Audit writer queue depth and flush latency.
+- '/metrics' : Prometheus metrics of every worker process.
 - '/save-changes' : Endpoint for saving inventory changes.
 - '/infoModal' : Endpoint for displaying an information modal.
 - '/logout' : Endpoint for user logout.
 - '/signup' : User signup page.
 - '/information' : Information page.
 - '/dashboard' : Dashboard page.
+- '/map-data' : Facility map points, or grid clusters for a bbox and zoom level.
 
 """
 
 from flask import (
+    Blueprint,
     Flask,
+    current_app,
     redirect,
     render_template,
     request,
     session,
+    stream_template,
     abort,
+    flash,
     jsonify,
     url_for,
 )
 from config import Config
-from extensions import db
-from flask_admin import Admin
-from flask_oauthlib.client import OAuth
-from adminViews import (
-    CustomAdminIndexView,
-    CustomView,
-    ProductionFacilityView,
-    ProductView,
-    UserView,
-    DatabaseTransactionView,
-    ShipmentView,
-)
+from extensions import db, dbRouter, readCache
 from models.component import Component
 from models.inventory import ProductInventory, ComponentInventory
+from models.inventoryMovement import InventoryMovement, InventorySnapshot
 from models.product import Product
 from models.productionFacility import ProductionFacility
+from models.productionProcess import ProductionProcess, ComponentsRequired
+from models.productionSchedule import (
+    ProductionSchedule,
+    ScheduledOrder,
+    ScheduleStock,
+)
+from models.reservation import InventoryReservation
+from models.shipment import ShipmentAllocation, shipment
+from models.stockAlert import StockAlert, StockThreshold
 from models.user import User
-from models.transaction import DatabaseTransaction
-import os
+from models.transaction import DatabaseTransaction, auditSink
+from models.stockRollup import (
+    ComponentStockRollup,
+    ProductStockRollup,
+    getStockTotals,
+)
+from commands import ims
+from services.authentication import (
+    authenticator,
+    currentPrincipal,
+    isAdmin,
+    loginPrincipal,
+)
+from services.catalog import getFacility, getProduct, listFacilities
+from services.googleOAuth import getGoogle
+from services.facilityMap import clusterPoints, getMapPoints, parseBoundingBox
+from services.spatialIndex import nearestWithStock
+from services.inventoryGrid import exportRows, gridArguments, loadInventoryPage
+from services.inventoryLoader import loadFacilityInventory
+from services.metrics import metrics
+from services.queryProfiler import queryProfiler
+from services.inventoryWriter import (
+    saveInventoryChanges as bulkSaveInventoryChanges,
+)
+from itertools import chain
+from threading import Lock
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = Flask(__name__)
-app.config.from_object(Config)
-db.init_app(app)
-oauth = OAuth(app)
+main = Blueprint("main", __name__)
+setupLock = Lock()
 
-admin = Admin(
-    app,
-    name="Nexus Admin",
-    template_mode="bootstrap4",
-    index_view=CustomAdminIndexView(name="Home"),
-)
-admin.add_view(UserView(User, db.session, name="Personnel"))
-admin.add_view(ProductView(Product, db.session, name="Products"))
-admin.add_view(CustomView(Component, db.session, name="Components"))
-admin.add_view(
-    ProductionFacilityView(ProductionFacility, db.session, name="Facilities")
-)
 
+def create_app(config=Config):
+    """
+    Create and configure an application instance.
 
-admin.add_view(
-    DatabaseTransactionView(
-        DatabaseTransaction, db.session, name="Database Transactions"
-    )
-)
+    Args:
+        config: The configuration object, a Config class or subclass.
 
-google = oauth.remote_app(
-    "google",
-    consumer_key=os.getenv("GOOGLE_CONSUMER_KEY"),
-    consumer_secret=os.getenv("GOOGLE_CONSUMER_SECRET"),
-    request_token_params={
-        "scope": "email",
-    },
-    base_url="https://www.googleapis.com/oauth2/v1/",
-    request_token_url=None,
-    access_token_method="POST",
-    access_token_url="https://accounts.google.com/o/oauth2/token",
-    authorize_url="https://accounts.google.com/o/oauth2/auth",
-)
+    Returns:
+        Flask: The application with its extensions and routes; the admin views
+            are registered by finishSetup().
+    """
+    app = Flask(__name__)
+    app.config.from_object(config)
+    db.init_app(app)
+    dbRouter.init_app(app)
+    readCache.init_app(app, db.metadata)
+    auditSink.init_app(app)
+    authenticator.init_app(app)
+    queryProfiler.init_app(app)
+    with app.app_context():
+        metrics.init_app(app, db.engines)
+    app.register_blueprint(main)
+    app.cli.add_command(ims)
+    app.wsgi_app = SetupOnFirstRequest(app)
+    return app
 
 
-@app.route("/")
+def finishSetup(app):
+    """
+    Register the lazily loaded parts of an application, once: Flask-Admin.
+
+    create_app() leaves this to the first request, so CLI commands and scripts
+    that only use the models never import Flask-Admin. wsgi.py calls it up front,
+    so the preforked workers share it.
+
+    Returns:
+        Admin: The application's admin instance.
+    """
+    with setupLock:
+        if "admin" not in app.extensions:
+            from adminViews import initAdmin
+
+            initAdmin(app)
+    return app.extensions["admin"][0]
+
+
+class SetupOnFirstRequest:
+    """WSGI middleware running finishSetup() before the first request is handled."""
+
+    def __init__(self, app):
+        self.app = app
+        self.wsgiApp = app.wsgi_app
+        self.ready = False
+
+    def __call__(self, environ, start_response):
+        if not self.ready:
+            # Flask refuses new blueprints once a request has been handled
+            finishSetup(self.app)
+            self.ready = True
+        return self.wsgiApp(environ, start_response)
+
+
+@main.route("/")
 def home():
     """Render the home page."""
     return render_template("index.html")
 
 
-@app.route("/login", methods=["GET", "POST"])
+@main.route("/login", methods=["GET", "POST"])
 def login():
     """Render the login page and handle user authentication."""
 
@@ -107,41 +192,67 @@ def login():
         username = request.form.get("username")
         password = request.form.get("password")
 
-        user = User.query.filter_by(username=username).first()
-        # Checks if password attached to username is in system and redirects based on results
-        if user and user.checkPassword(password):
-            session["username"] = username
+        # Throttled and saturated attempts are refused before any hashing
+        status, detail = authenticator.authenticate(
+            username, password, request.remote_addr
+        )
+        if status == "ok":
+            loginPrincipal(detail)
             return redirect("/dashboard")
+        if status in ("throttled", "busy"):
+            message = (
+                "Too many failed login attempts, try again later."
+                if status == "throttled"
+                else "The server is busy, try again shortly."
+            )
+            return (
+                message,
+                429 if status == "throttled" else 503,
+                {"Retry-After": str(detail)},
+            )
         # returns to login if password and/or username is not in system
-        else:
-            return redirect("/login")
+        return redirect("/login")
     return render_template("/login.html")
 
 
 # Define the route for initiating Google OAuth login
-@app.route("/googleLogin")
+@main.route("/googleLogin")
 def googleLogin():
-    return google.authorize(callback=url_for("googleAuthorized", _external=True))
+    return getGoogle().authorize(callback=url_for(".googleAuthorized", _external=True))
 
 
 # Define the route for handling the Google OAuth callback
-@app.route("/googleLogin/callback")
+@main.route("/googleLogin/callback")
 def googleAuthorized():
-    resp = google.authorized_response()
+    resp = getGoogle().authorized_response()
 
     if resp is None or resp.get("access_token") is None:
         return "Access denied: reason={} error={}".format(
             request.args["error_reason"], request.args["error_description"]
         )
 
+    # requests is only needed once a Google login happens
+    import requests
+
     session["googleToken"] = (resp["access_token"], "")
-    userInfo = google.get("userinfo")
-    email = userInfo.data.get("email")
+    try:
+        userInfo = authenticator.fetchUserInfo(resp["access_token"])
+    except requests.RequestException:
+        flash("Google sign-in failed, please try again.")
+        return redirect("/login")
+    email = userInfo.get("email")
     # Here i will check if details provided are correct
-    user = User.query.filter_by(email=email).first()
+    user = User.query.filter_by(email=email).first() if email else None
     if user:
         # If the user exists, add the user's email to the session
-        session["username"] = user.username
+        loginPrincipal(
+            {
+                "id": user.id,
+                "username": user.username,
+                "role": user.role,
+                "email": user.email,
+            }
+        )
         session["email"] = str(email)
         return redirect("/dashboard")
     else:
@@ -149,110 +260,729 @@ def googleAuthorized():
         return redirect("/login")
 
 
-# Define the function to retrieve the Google OAuth token
-@google.tokengetter
-def getGoogleOAuthToken():
-    return session.get("googleToken")
-
-
-@app.route("/inventory")
+@main.route("/inventory")
 def inventoryHome():
     """Render the inventory overview page."""
-    facilities = [facility.toDict() for facility in ProductionFacility.query.all()]
-    return render_template("inventory.html", facilities=facilities)
+    return render_template("inventory.html", facilities=listFacilities())
 
 
-@app.route("/inventory/<int:facilityId>")
+@main.route("/inventory/<int:facilityId>")
 def facilityInventory(facilityId):
-    """Render the detailed inventory view for a specific facility."""
-    facility = db.session.get(ProductionFacility, facilityId)
+    """Render the facility inventory grid with the first page of each side."""
+    facility = getFacility(facilityId)
     if facility:
-        productEntries = [
-            entry.toDict()
-            for entry in db.session.query(ProductInventory).filter(
-                ProductInventory.productionFacilityId == facility.id
-            )
-        ]
+        return render_template(
+            "facilityInventory.html",
+            facility=facility,
+            productPage=loadInventoryPage(facility["id"], "product"),
+            componentPage=loadInventoryPage(facility["id"], "component"),
+        )
+    else:
+        abort(404)
 
-        for entry in productEntries:
-            entry["product"] = (
-                db.session.query(Product).get(entry["productId"]).toDict()
-            )
 
-        componentEntries = [
-            entry.toDict()
-            for entry in db.session.query(ComponentInventory).filter(
-                ComponentInventory.productionFacilityId == facility.id
-            )
-        ]
+@main.route("/api/facilities/<int:facilityId>/inventory")
+def facilityInventoryData(facilityId):
+    """Return the product and component inventory of a facility as JSON."""
+    facility = getFacility(facilityId)
+    if facility is None:
+        abort(404)
+    inventory = loadFacilityInventory(facility["id"])
+    return jsonify(
+        {
+            "facility": facility,
+            "productEntries": inventory["productEntries"],
+            "componentEntries": inventory["componentEntries"],
+        }
+    )
+
+
+@main.route("/api/facilities/<int:facilityId>/inventory/<itemType>")
+def facilityInventoryPage(facilityId, itemType):
+    """
+    Return one page of a facility's product or component inventory.
+
+    Query parameters: q (brand/model/name search), category, minCount, maxCount,
+    sort (item, count or price), direction (asc or desc), limit and after (the
+    nextCursor of the previous page).
+    """
+    if getFacility(facilityId) is None:
+        abort(404)
+    try:
+        page = loadInventoryPage(facilityId, itemType, **gridArguments(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+
+@main.route("/inventory/<int:facilityId>/export/<itemType>.csv")
+def facilityInventoryExport(facilityId, itemType):
+    """Stream a facility's filtered inventory as CSV, one keyset page at a time."""
+    if getFacility(facilityId) is None:
+        abort(404)
+    try:
+        args = gridArguments(request.args)
+        lines = exportRows(
+            facilityId, itemType, args["filters"], args["sort"], args["direction"]
+        )
+        # Validate the arguments before the response starts
+        firstLine = next(lines)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = current_app.response_class(
+        stream_template("inventoryExport.csv", lines=chain([firstLine], lines)),
+        mimetype="text/csv",
+    )
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename=facility-{facilityId}-{itemType}-inventory.csv"
+    )
+    return response
+
+
+@main.route("/api/facilities/nearest")
+def nearestFacilities():
+    """
+    Return the nearest operating facilities that can fulfil a request.
+
+    Query parameters: lat, lon, productId or componentId, quantity (default 1)
+    and k (default 5).
+    """
+    args = request.args
+    try:
+        lat, lon = float(args["lat"]), float(args["lon"])
+        if "productId" in args:
+            itemType, itemId = "product", int(args["productId"])
+        else:
+            itemType, itemId = "component", int(args["componentId"])
+        quantity = int(args.get("quantity", 1))
+        k = min(int(args.get("k", 5)), 100)
+    except (KeyError, ValueError):
+        return (
+            jsonify(
+                {"error": "lat, lon and productId or componentId are required numbers"}
+            ),
+            400,
+        )
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or k < 1:
+        return jsonify({"error": "lat, lon or k out of range"}), 400
+    return jsonify(
+        {
+            f"{itemType}Id": itemId,
+            "quantity": quantity,
+            "facilities": nearestWithStock(lat, lon, itemType, itemId, quantity, k),
+        }
+    )
+
+
+@main.route("/api/stock/products/<int:productId>")
+def productStock(productId):
+    """Return the company-wide stock of a product."""
+    return jsonify(
+        {"productId": productId, **getStockTotals(ProductStockRollup, productId)}
+    )
+
+
+@main.route("/api/stock/components/<int:componentId>")
+def componentStock(componentId):
+    """Return the company-wide stock of a component."""
+    return jsonify(
+        {
+            "componentId": componentId,
+            **getStockTotals(ComponentStockRollup, componentId),
+        }
+    )
+
+
+def buildableArguments(args):
+    """Parse the minQuantity (default 1) and limit (default 100) query parameters."""
+    minQuantity = int(args.get("minQuantity", 1))
+    limit = int(args.get("limit", 100))
+    if minQuantity < 0 or not 1 <= limit <= 1000:
+        raise ValueError("minQuantity must be >= 0 and limit between 1 and 1000")
+    return minQuantity, limit
+
+
+@main.route("/api/facilities/<int:facilityId>/buildable")
+def facilityBuildable(facilityId):
+    """
+    Return the products a facility can build from its component stock.
+
+    Each entry has the quantity, the process building it and the component that
+    runs out first. Query parameters: minQuantity (default 1) and limit.
+    """
+    # NumPy is only imported by the processes serving these reports
+    from services.mrpEngine import buildableAtFacility
+
+    if getFacility(facilityId) is None:
+        abort(404)
+    try:
+        minQuantity, limit = buildableArguments(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(
+        {
+            "facilityId": facilityId,
+            "products": buildableAtFacility(facilityId, minQuantity, limit),
+        }
+    )
+
+
+@main.route("/api/products/<int:productId>/buildable")
+def productBuildable(productId):
+    """
+    Return the facilities that can build a product, and the company-wide total.
+
+    Query parameters: minQuantity (default 1) and limit.
+    """
+    from services.mrpEngine import buildableOfProduct
+
+    if getProduct(productId) is None:
+        abort(404)
+    try:
+        minQuantity, limit = buildableArguments(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(
+        {"productId": productId, **buildableOfProduct(productId, minQuantity, limit)}
+    )
+
+
+@main.route("/api/facilities/<int:facilityId>/builds", methods=["POST"])
+def buildAtFacility(facilityId):
+    """
+    Turn a facility's components into products in one transaction.
+
+    The JSON body has productId, quantity and an optional processId. Returns 409
+    with the shortages when the facility lacks components.
+    """
+    from services.productionBuild import BuildError, buildProduct
+
+    principal = currentPrincipal()
+    if principal is None:
+        return jsonify({"error": "Sign in to build products."}), 401
+    data = request.get_json(silent=True) or {}
+    try:
+        productId = int(data["productId"])
+        quantity = int(data["quantity"])
+        processId = None if data.get("processId") is None else int(data["processId"])
+        if quantity < 1:
+            raise ValueError
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "productId and a positive quantity are required"}), 400
+    if getFacility(facilityId) is None:
+        abort(404)
+    try:
+        result = buildProduct(
+            facilityId, productId, quantity, principal["id"], processId
+        )
+    except BuildError as e:
+        status = 409 if e.reason == "noStock" else 404
+        return (
+            jsonify({"error": str(e), "reason": e.reason, "shortages": e.shortages}),
+            status,
+        )
+    return jsonify(result), 201
+
+
+@main.route("/api/facilities/<int:facilityId>/reservations", methods=["POST"])
+def reserveStock(facilityId):
+    """
+    Hold some of a facility's product or component stock for a limited time.
+
+    The JSON body has type ("product" or "component"), itemId, quantity and an
+    optional ttlSeconds. Returns 409 with the available quantity when the stock
+    is already promised.
+    """
+    from services.reservations import ReservationError, itemColumns, reserve
+
+    principal = currentPrincipal()
+    if principal is None:
+        return jsonify({"error": "Sign in to reserve stock."}), 401
+    data = request.get_json(silent=True) or {}
+    maxTtl = current_app.config["RESERVATION_MAX_TTL_SECONDS"]
+    try:
+        if data.get("type") not in itemColumns:
+            raise ValueError
+        itemId = int(data["itemId"])
+        quantity = int(data["quantity"])
+        ttlSeconds = data.get("ttlSeconds")
+        ttlSeconds = None if ttlSeconds is None else int(ttlSeconds)
+        if quantity < 1 or ttlSeconds is not None and not 1 <= ttlSeconds <= maxTtl:
+            raise ValueError
+    except (KeyError, TypeError, ValueError):
+        return (
+            jsonify(
+                {
+                    "error": "type, itemId and a positive quantity are required;"
+                    f" ttlSeconds must be between 1 and {maxTtl}"
+                }
+            ),
+            400,
+        )
+    if getFacility(facilityId) is None:
+        abort(404)
+    try:
+        reservation = reserve(
+            facilityId, data["type"], itemId, quantity, ttlSeconds, principal["id"]
+        )
+    except ReservationError as e:
+        status = 409 if e.reason == "insufficient" else 404
+        return (
+            jsonify({"error": str(e), "reason": e.reason, "available": e.available}),
+            status,
+        )
+    return jsonify(reservation), 201
+
+
+@main.route("/api/facilities/<int:facilityId>/available/<itemType>")
+def availableStock(facilityId, itemType):
+    """Return the count, held and available quantity of the items in ?ids=1,2,3."""
+    from services.reservations import availableToPromise, itemColumns
+
+    if itemType not in itemColumns:
+        abort(404)
+    try:
+        itemIds = [int(i) for i in request.args.get("ids", "").split(",") if i]
+        if not 1 <= len(itemIds) <= 1000:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "ids must list 1 to 1000 item IDs"}), 400
+    return jsonify(
+        {
+            "facilityId": facilityId,
+            "type": itemType,
+            "items": availableToPromise(facilityId, itemType, itemIds),
+        }
+    )
+
+
+@main.route("/api/facilities/<int:facilityId>/stock-at")
+def facilityStockAt(facilityId):
+    """Return a facility's counts as of ?at=<ISO time>, optionally ?type= and ?ids=."""
+    from datetime import datetime
+    from services.inventoryLedger import itemKeys, stockAt
+
+    itemType = request.args.get("type")
+    if itemType is not None and itemType not in itemKeys:
+        return jsonify({"error": "type must be product or component"}), 400
+    try:
+        at = datetime.fromisoformat(request.args["at"])
+        itemIds = None
+        if request.args.get("ids"):
+            itemIds = [int(i) for i in request.args["ids"].split(",") if i]
+            if len(itemIds) > 1000:
+                raise ValueError
+    except (KeyError, ValueError):
+        return (
+            jsonify({"error": "at must be an ISO time and ids at most 1000 item IDs"}),
+            400,
+        )
+    stock = stockAt(facilityId, at, itemType, itemIds)
+    return jsonify(
+        {
+            "facilityId": facilityId,
+            "at": at.isoformat(),
+            "snapshotAt": stock["snapshotAt"] and stock["snapshotAt"].isoformat(),
+            "replayed": stock["replayed"],
+            "items": stock["items"],
+        }
+    )
+
+
+@main.route("/api/facilities/<int:facilityId>/movements")
+def facilityMovements(facilityId):
+    """Return a facility's movements, newest first; ?before=<movementId> pages back."""
+    from services.inventoryLedger import itemKeys, listMovements
+
+    itemType = request.args.get("type")
+    if itemType is not None and itemType not in itemKeys:
+        return jsonify({"error": "type must be product or component"}), 400
+    try:
+        itemId = request.args.get("itemId", type=int)
+        beforeId = request.args.get("before", type=int)
+        limit = int(request.args.get("limit", 100))
+        if not 1 <= limit <= 1000 or (itemId is not None and itemType is None):
+            raise ValueError
+    except ValueError:
+        return (
+            jsonify({"error": "limit must be 1 to 1000; itemId requires type"}),
+            400,
+        )
+    movements = listMovements(facilityId, itemType, itemId, beforeId, limit)
+    return jsonify({"facilityId": facilityId, "movements": movements})
+
+
+def forbidReservationChange(reservationId):
+    """
+    Return the error response if the user may not change a reservation, else None.
+
+    Only the user who placed a reservation and administrators may change it.
+    """
+    principal = currentPrincipal()
+    if principal is None:
+        return jsonify({"error": "Sign in to change reservations."}), 401
+    reservation = db.session.get(InventoryReservation, reservationId)
+    if reservation is None:
+        abort(404)
+    if reservation.createdByUserId != principal["id"] and not isAdmin(principal):
+        return jsonify({"error": "The reservation belongs to another user."}), 403
+    return None
+
+
+@main.route("/api/reservations/<int:reservationId>/confirm", methods=["POST"])
+def confirmStockReservation(reservationId):
+    """
+    Keep a held reservation until it is converted; 410 if it has expired.
+
+    Only its creator or an administrator may confirm it (401 or 403 otherwise).
+    """
+    from services.reservations import ReservationError, confirmReservation
+
+    forbidden = forbidReservationChange(reservationId)
+    if forbidden is not None:
+        return forbidden
+    try:
+        return jsonify(confirmReservation(reservationId))
+    except ReservationError as e:
+        status = 410 if e.reason == "expired" else 404
+        return jsonify({"error": str(e), "reason": e.reason}), status
+
+
+@main.route("/api/reservations/<int:reservationId>", methods=["DELETE"])
+def releaseStockReservation(reservationId):
+    """Release a reservation that has not been converted yet; creator or admin only."""
+    from services.reservations import releaseReservation
+
+    forbidden = forbidReservationChange(reservationId)
+    if forbidden is not None:
+        return forbidden
+    if not releaseReservation(reservationId):
+        abort(404)
+    return jsonify({"released": reservationId})
+
+
+@main.route("/api/shipments/plan", methods=["POST"])
+def planPendingShipments():
+    """
+    Allocate the pending shipments to facilities with stock.
+
+    The JSON body may give the "mode" (greedy or optimal), a "chunkSize", the
+    "shipmentIds" to plan and "apply": true to hold the stock and record the plan,
+    which requires a signed-in user and answers 409 if the stock changed meanwhile.
+    """
+    from services.shipmentPlanner import (
+        ShipmentPlanError,
+        applyPlan,
+        planModes,
+        planShipments,
+    )
+
+    data = request.get_json(silent=True) or {}
+    try:
+        mode = data.get("mode", "greedy")
+        if mode not in planModes:
+            raise ValueError(f"mode must be one of {', '.join(planModes)}")
+        chunkSize = data.get("chunkSize")
+        if chunkSize is not None and (not isinstance(chunkSize, int) or chunkSize < 0):
+            raise ValueError("chunkSize must be a non-negative integer")
+        shipmentIds = data.get("shipmentIds")
+        if shipmentIds is not None:
+            shipmentIds = [int(shipmentId) for shipmentId in shipmentIds]
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    principal = currentPrincipal()
+    if data.get("apply") and principal is None:
+        return jsonify({"error": "sign in to apply a plan"}), 401
+    plan = planShipments(mode, chunkSize, shipmentIds)
+    if not data.get("apply"):
+        return jsonify(plan)
+    try:
+        plan["planned"] = applyPlan(plan["allocations"], principal["id"])
+    except ShipmentPlanError as e:
+        return jsonify({"error": str(e), "reason": e.reason}), 409
+    return jsonify(plan), 201
+
+
+@main.route("/api/shipments/<int:shipmentId>")
+def shipmentAllocations(shipmentId):
+    """Return a shipment's product, quantity, status and allocations."""
+    entry = db.session.get(shipment, shipmentId)
+    if entry is None:
+        abort(404)
+    allocations = db.session.scalars(
+        db.select(ShipmentAllocation)
+        .where(ShipmentAllocation.shipmentId == shipmentId)
+        .order_by(ShipmentAllocation.id)
+    )
+    return jsonify(
+        {
+            "shipmentId": entry.id,
+            "productId": entry.productId,
+            "quantity": entry.quantity,
+            "status": entry.status,
+            "allocations": [
+                {
+                    "facilityId": allocation.productionFacilityId,
+                    "quantity": allocation.quantity,
+                    "distanceKm": allocation.distanceKm,
+                }
+                for allocation in allocations
+            ],
+        }
+    )
+
+
+@main.route("/api/facilities/<int:facilityId>/thresholds")
+def facilityThresholds(facilityId):
+    """Return a facility's reorder points."""
+    from services.stockAlerts import listThresholds
+
+    if getFacility(facilityId) is None:
+        abort(404)
+    return jsonify({"facilityId": facilityId, "thresholds": listThresholds(facilityId)})
+
+
+@main.route("/api/facilities/<int:facilityId>/thresholds", methods=["PUT"])
+def setFacilityThresholds(facilityId):
+    """
+    Set or remove some of a facility's reorder points.
+
+    The JSON body has "thresholds", each with type ("product" or "component"),
+    itemId and reorderPoint, a non-negative integer or null to remove it. Items
+    already at or below their new reorder point raise their alert straight away.
+    """
+    from services.stockAlerts import setThresholds
+    from services.inventoryLedger import itemKeys
 
-        for entry in componentEntries:
-            entry["component"] = (
-                db.session.query(Component).get(entry["componentId"]).toDict()
+    principal = currentPrincipal()
+    if principal is None:
+        return jsonify({"error": "Sign in to set reorder points."}), 401
+    data = request.get_json(silent=True) or {}
+    try:
+        thresholds = []
+        for threshold in data["thresholds"]:
+            if threshold.get("type") not in itemKeys:
+                raise ValueError
+            reorderPoint = threshold["reorderPoint"]
+            if reorderPoint is not None:
+                reorderPoint = int(reorderPoint)
+                if reorderPoint < 0:
+                    raise ValueError
+            thresholds.append(
+                (threshold["type"], int(threshold["itemId"]), reorderPoint)
             )
+        if not 1 <= len(thresholds) <= 1000:
+            raise ValueError
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return (
+            jsonify(
+                {
+                    "error": "thresholds must list 1 to 1000 items with type, itemId"
+                    " and a non-negative reorderPoint or null"
+                }
+            ),
+            400,
+        )
+    if getFacility(facilityId) is None:
+        abort(404)
+    return jsonify(
+        {
+            "facilityId": facilityId,
+            "thresholds": setThresholds(facilityId, thresholds, principal["id"]),
+        }
+    )
 
-        return render_template(
-            "facilityInventory.html",
-            facility=facility,
-            productEntries=productEntries,
-            componentEntries=componentEntries,
+
+@main.route("/api/alerts")
+def stockAlerts():
+    """Return low-stock alerts, newest first; ?status=, ?facilityId= and ?before= filter."""
+    from services.stockAlerts import alertStatuses, listAlerts
+
+    status = request.args.get("status")
+    if status is not None and status not in alertStatuses:
+        return (
+            jsonify({"error": f"status must be one of {', '.join(alertStatuses)}"}),
+            400,
         )
+    try:
+        facilityId = request.args.get("facilityId", type=int)
+        beforeId = request.args.get("before", type=int)
+        limit = int(request.args.get("limit", 100))
+        if not 1 <= limit <= 1000:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "limit must be 1 to 1000"}), 400
+    return jsonify({"alerts": listAlerts(status, facilityId, beforeId, limit)})
+
+
+@main.route("/api/alerts/<int:alertId>/acknowledge", methods=["POST"])
+def acknowledgeStockAlert(alertId):
+    """Acknowledge an open alert; 409 if the stock has already recovered."""
+    from services.stockAlerts import StockAlertError, acknowledgeAlert
+
+    principal = currentPrincipal()
+    if principal is None:
+        return jsonify({"error": "Sign in to acknowledge alerts."}), 401
+    try:
+        return jsonify(acknowledgeAlert(alertId, principal["id"]))
+    except StockAlertError as e:
+        status = 409 if e.reason == "resolved" else 404
+        return jsonify({"error": str(e), "reason": e.reason}), status
+
+
+@main.route("/api/schedules", methods=["POST"])
+def createProductionSchedule():
+    """
+    Schedule a queue of build orders over the operating facilities' lines.
+
+    The JSON body has "orders", each with orderId, productId, quantity and
+    optional priority (lower first) and facilityId, and optional "lines": the
+    production lines per facility ID.
+    """
+    from services.productionScheduler import createSchedule, parseOrder
+
+    data = request.get_json(silent=True) or {}
+    try:
+        orders = [parseOrder(order) for order in data.get("orders") or []]
+        if not 1 <= len(orders) <= current_app.config["SCHEDULER_MAX_ORDERS"]:
+            raise ValueError("orders must be a non-empty list within the limit")
+        if len({order.orderId for order in orders}) != len(orders):
+            raise ValueError("orderId values must be unique")
+        lines = {
+            int(facilityId): int(count)
+            for facilityId, count in (data.get("lines") or {}).items()
+        }
+        if any(count < 0 for count in lines.values()):
+            raise ValueError("line counts must not be negative")
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    principal = currentPrincipal()
+    summary = createSchedule(orders, lines, principal["id"] if principal else None)
+    return jsonify(summary), 201
+
+
+@main.route("/api/schedules/<int:scheduleId>")
+def productionSchedule(scheduleId):
+    """Return a schedule's makespan, version and first unscheduled orders."""
+    from services.productionScheduler import getSchedule
+
+    schedule = getSchedule(scheduleId)
+    if schedule is None:
+        abort(404)
+    return jsonify(schedule)
+
+
+@main.route("/api/schedules/<int:scheduleId>/facilities/<int:facilityId>")
+def productionTimeline(scheduleId, facilityId):
+    """Return the orders scheduled at a facility, by line and start minute."""
+    from services.productionScheduler import facilityTimeline
+
+    return jsonify(
+        {
+            "scheduleId": scheduleId,
+            "facilityId": facilityId,
+            "orders": facilityTimeline(scheduleId, facilityId),
+        }
+    )
+
+
+@main.route(
+    "/api/schedules/<int:scheduleId>/orders/<int:orderId>", methods=["PUT", "DELETE"]
+)
+def scheduledOrder(scheduleId, orderId):
+    """
+    Add, change (PUT) or remove (DELETE) one order without rescheduling the rest.
+
+    Returns the new version and makespan, the orders whose assignment changed and
+    the removed order IDs.
+    """
+    from services.productionScheduler import (
+        parseOrder,
+        removeScheduledOrder,
+        setScheduledOrder,
+    )
+
+    principal = currentPrincipal()
+    userId = principal["id"] if principal else None
+    if request.method == "DELETE":
+        changes = removeScheduledOrder(scheduleId, orderId, userId)
     else:
+        try:
+            order = parseOrder(request.get_json(silent=True) or {}, orderId)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        changes = setScheduledOrder(scheduleId, order, userId)
+    if changes is None:
         abort(404)
+    return jsonify(changes)
+
+
+@main.route("/api/audit/stats")
+def auditStats():
+    """Return the audit writer's queue depth and flush latency."""
+    return jsonify(auditSink.stats())
+
 
+@main.route("/metrics")
+def prometheusMetrics():
+    """Return the metrics in the Prometheus text format."""
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
 
-@app.route("/save-changes", methods=["POST"])
+
+@main.route("/save-changes", methods=["POST"])
 def saveInventoryChanges():
     """Endpoint for saving inventory changes."""
     data = dict(request.json)
-    errors = list()
-    entryTypeMap = {"product": ProductInventory, "component": ComponentInventory}
-    for newEntry in data["changesList"]:
-        try:
-            if newEntry["type"] not in entryTypeMap:
-                raise Exception("Invalid inventory entry type.")
-            entry = (
-                entryTypeMap[newEntry["type"]]
-                .query.filter_by(id=newEntry["entryId"])
-                .first()
-            )
-            entry.count = newEntry["quantity"]
-            db.session.add(entry)
-            db.session.commit()
-        except Exception as e:
-            errors.append(str(e))
+    atomic = bool(data.get("atomic", False))
+    # The session principal identifies the user without a users query
+    principal = currentPrincipal()
+    conflicts = []
+    errors = bulkSaveInventoryChanges(
+        data["changesList"],
+        atomic=atomic,
+        userId=principal["id"] if principal else None,
+        conflicts=conflicts,
+    )
 
     if errors:
         resp = {
             "msg": f"Errors occured on {len(errors)}/{len(data['changesList'])} updates.",
             "errors": errors,
         }
+        if atomic:
+            resp["msg"] += " No changes were saved."
+        if conflicts:
+            # Entries changed since the grid was loaded were left as they are
+            resp["msg"] += " Reload the inventory to see the current counts."
+            resp["conflicts"] = conflicts
+            return jsonify(resp), 409
     else:
         resp = {"msg": "Inventory updated successfully."}
     return jsonify(resp)
 
 
-@app.route("/add-entry")
+@main.route("/add-entry")
 def addEntry():
     """Render the form for adding an inventory entry."""
     return render_template("addEntry.html")
 
 
-@app.route("/infoModal", methods=["GET", "POST"])
+@main.route("/infoModal", methods=["GET", "POST"])
 def infoModal():
     """Render the information modal."""
     return render_template("admin/InfoModal.html")
 
 
-@app.route("/logout")
+@main.route("/logout")
 def logout():
     """Handle user logout."""
     # removes user from session and redirects to intro page
     session.pop("username", None)
+    session.pop("principal", None)
     return redirect("/")
 
 
-@app.route("/signup", methods=["GET", "POST"])
+@main.route("/signup", methods=["GET", "POST"])
 def signup():
     if request.method == "POST":
         # Get form data
@@ -283,30 +1013,70 @@ def signup():
     return render_template("signup.html")
 
 
-@app.route("/information")
+@main.route("/information")
 def info():
     """Render the information page."""
     return render_template("information.html")
 
 
-@app.route("/dashboard")
+@main.route("/dashboard")
 def dashboard():
     """Render the dashboard page."""
     return render_template("dashboard.html")
 
 
-@app.route("/map-data")
+@main.route("/map-data")
 def facilityMapData():
-    facilities = ProductionFacility.query.all()
-    data = {
-        "lat": [f.latitude for f in facilities],
-        "lon": [f.longitude for f in facilities],
-        "text": [f.name for f in facilities],
-    }
-    return jsonify(data)
+    """
+    Return the facility map points as parallel lat/lon/text lists.
+
+    With "bbox" (minLon,minLat,maxLon,maxLat) and "zoom" query parameters, the
+    points inside the box are grouped into grid clusters with a "count" list. The
+    response carries an ETag, and a matching If-None-Match gets a 304.
+    """
+    points = getMapPoints()
+    bbox, zoom = request.args.get("bbox"), request.args.get("zoom")
+    etag = points["etag"]
+    if bbox is not None or zoom is not None:
+        try:
+            bbox = parseBoundingBox(bbox or "-180,-90,180,90")
+            zoom = float(zoom or 0)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        etag = f"{etag}-{zoom:g}-{','.join(f'{value:g}' for value in bbox)}"
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    elif bbox is None:
+        response = jsonify(
+            {"lat": points["lat"], "lon": points["lon"], "text": points["text"]}
+        )
+    else:
+        response = jsonify(clusterPoints(points, bbox, zoom))
+    response.set_etag(etag)
+    # Revalidate on every load; the 304 keeps that cheap
+    response.cache_control.no_cache = True
+    return response
+
+
+defaultApp = None
+
+
+def __getattr__(name):
+    # "from app import app" creates the default application on first use, so
+    # importing this module for create_app() does not build a second one
+    global defaultApp
+    if name == "google":
+        return getGoogle()
+    if name not in ("app", "admin"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if defaultApp is None:
+        defaultApp = create_app()
+    return defaultApp if name == "app" else finishSetup(defaultApp)
 
 
 if __name__ == "__main__":
+    # Development server; production runs wsgi:app under gunicorn
+    app = create_app()
     with app.app_context():
         db.create_all()
     app.run(port=5001, debug=True, host="0.0.0.0")
@@ -0,0 +1,143 @@
+"""
+Throughput of concurrent product builds.
+
+Generates a synthetic dataset with production processes in a database file (or
+uses SQLALCHEMY_DATABASE_URI, which should then be an empty server database), then
+runs buildProduct() from concurrent threads for a fixed time, each building one
+unit of a random product at one of a few facilities so that builds contend for the
+same inventory rows. Reports builds per second and p50/p99 latency, and checks that
+every component consumed and product built is accounted for: a lost update under
+contention would break the totals.
+
+Usage (from the app directory):
+    python3 -m benchmarks.benchBuild --threads 16 --duration 10
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+
+databaseFile = os.path.join(tempfile.mkdtemp(), "benchBuild.db")
+os.environ.setdefault("SQLALCHEMY_DATABASE_URI", f"sqlite:///{databaseFile}")
+
+from app import app, db
+from models.inventory import ComponentInventory, ProductInventory
+from services.productionBuild import BuildError, buildProduct, loadRecipes
+from services.syntheticData import generateDataset
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def inventoryTotals():
+    """Return the component counts by (facility, component) and the product total."""
+    components = Counter(
+        {
+            (facilityId, componentId): count
+            for facilityId, componentId, count in db.session.execute(
+                db.select(
+                    ComponentInventory.productionFacilityId,
+                    ComponentInventory.componentId,
+                    ComponentInventory.count,
+                )
+            )
+        }
+    )
+    products = db.session.scalar(db.select(db.func.sum(ProductInventory.count))) or 0
+    return components, products
+
+
+def worker(seed, facilities, products, deadline, results):
+    rng = random.Random(seed)
+    latencies, built, errors = [], [], Counter()
+    with app.app_context():
+        while time.monotonic() < deadline:
+            facilityId = rng.randint(1, facilities)
+            productId = rng.randint(1, products)
+            start = time.perf_counter()
+            try:
+                built.append(
+                    (facilityId, buildProduct(facilityId, productId, 1, userId=1))
+                )
+            except BuildError as e:
+                errors[e.reason] += 1
+            except Exception as e:
+                errors[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+        db.session.remove()
+    results.append((latencies, built, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--facilities", type=int, default=4)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--components", type=int, default=100)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generateDataset(
+            db.engine,
+            facilities=args.facilities,
+            products=args.products,
+            components=args.components,
+            productsPerFacility=args.products // 2,
+            componentsPerFacility=args.components,
+            processesPerProduct=2,
+            componentsPerProcess=3,
+        )
+        recipes = loadRecipes()
+        before = inventoryTotals()
+
+    results = []
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(i, args.facilities, args.products, deadline, results),
+        )
+        for i in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies = [value for result in results for value in result[0]]
+    builds = [build for result in results for build in result[1]]
+    errors = sum((result[2] for result in results), Counter())
+    print(
+        f"{args.threads} threads: {len(builds) / args.duration:.0f} builds/s,"
+        f" p50 {percentile(latencies, 0.5) * 1000:.1f} ms,"
+        f" p99 {percentile(latencies, 0.99) * 1000:.1f} ms;"
+        f" rejected {dict(errors)}"
+    )
+
+    consumed = Counter()
+    for facilityId, build in builds:
+        for processId, _, requirements in recipes[build["productId"]]:
+            if processId == build["processId"]:
+                for componentId, count in requirements.items():
+                    consumed[facilityId, componentId] += count
+    with app.app_context():
+        after = inventoryTotals()
+    for key, count in before[0].items():
+        if count - after[0][key] != consumed[key]:
+            raise SystemExit(f"component {key} lost an update")
+    if after[1] - before[1] != len(builds):
+        raise SystemExit("product counts lost an update")
+    print(f"{len(builds)} builds accounted for in component and product totals")
+
+
+if __name__ == "__main__":
+    main()
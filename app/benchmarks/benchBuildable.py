@@ -0,0 +1,130 @@
+"""
+Benchmark for the buildable-quantity (MRP) engine.
+
+Generates a synthetic dataset with production processes, then reports the time to
+load the bill of materials and the component stock, and to compute the buildable
+quantity of every product at every facility, in one pass and chunked as the admin
+report does. A sample of facilities is checked against a plain Python loop.
+
+Usage (from the app directory):
+    python3 -m benchmarks.benchBuildable --facilities 2000 --products 1000
+"""
+
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("SQLALCHEMY_DATABASE_URI", "sqlite:///:memory:")
+
+from app import app, db
+from models.inventory import ComponentInventory
+from models.productionProcess import ComponentsRequired, ProductionProcess
+from services.mrpEngine import (
+    BuildablePlan,
+    buildableAtFacility,
+    iterBuildable,
+    loadBillOfMaterials,
+    loadComponentStock,
+    summarizeBuildable,
+)
+from services.syntheticData import generateDataset
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def referenceQuantities(facilityId):
+    """Return {productId: quantity} for a facility, computed row by row."""
+    stock = dict(
+        db.session.execute(
+            db.select(ComponentInventory.componentId, ComponentInventory.count).where(
+                ComponentInventory.productionFacilityId == facilityId
+            )
+        ).all()
+    )
+    processes = {}
+    for productId, processId, componentId, count in db.session.execute(
+        db.select(
+            ProductionProcess.product,
+            ProductionProcess.id,
+            ComponentsRequired.componentId,
+            ComponentsRequired.count,
+        ).join(ComponentsRequired, ComponentsRequired.processId == ProductionProcess.id)
+    ):
+        limit = max(stock.get(componentId, 0), 0) // count
+        key = (productId, processId)
+        processes[key] = min(processes.get(key, limit), limit)
+    quantities = {}
+    for (productId, _), quantity in processes.items():
+        quantities[productId] = max(quantities.get(productId, 0), quantity)
+    return quantities
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--facilities", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--components", type=int, default=500)
+    parser.add_argument("--components-per-facility", type=int, default=150)
+    parser.add_argument("--processes-per-product", type=int, default=2)
+    parser.add_argument("--components-per-process", type=int, default=5)
+    parser.add_argument("--check", type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generateDataset(
+            db.engine,
+            facilities=args.facilities,
+            products=args.products,
+            components=args.components,
+            productsPerFacility=1,
+            componentsPerFacility=args.components_per_facility,
+            processesPerProduct=args.processes_per_product,
+            componentsPerProcess=args.components_per_process,
+        )
+        bom, bomMs = timed(loadBillOfMaterials)
+        stock, stockMs = timed(loadComponentStock, bom)
+        print(
+            f"loaded {len(bom)} requirements in {bomMs:.0f} ms,"
+            f" {len(stock)} stock rows in {stockMs:.0f} ms"
+        )
+        for label, cells in (("one pass", 1 << 40), ("chunked", None)):
+            plan, computeMs = timed(
+                lambda: BuildablePlan(bom, iterBuildable(bom, stock, cells=cells))
+            )
+            print(
+                f"{label}: {len(plan.facilityIds)} facilities x"
+                f" {len(plan.productIds)} products in {computeMs:.0f} ms"
+            )
+        summary, summaryMs = timed(summarizeBuildable)
+        print(f"admin summary: {summaryMs:.0f} ms end to end")
+
+        timings = []
+        for facilityId in random.Random(0).sample(
+            range(1, args.facilities + 1), args.check
+        ):
+            _, elapsed = timed(buildableAtFacility, facilityId, 0, None)
+            timings.append(elapsed)
+            expected = {
+                productId: quantity
+                for productId, quantity in referenceQuantities(facilityId).items()
+                if quantity
+            }
+            entries = plan.forFacility(facilityId)
+            actual = {entry["productId"]: entry["quantity"] for entry in entries}
+            if actual != expected:
+                raise SystemExit(f"facility {facilityId} differs from the reference")
+        print(
+            f"one facility: {sum(timings) / len(timings):.1f} ms average,"
+            f" {args.check} facilities match the reference"
+        )
+
+
+if __name__ == "__main__":
+    main()
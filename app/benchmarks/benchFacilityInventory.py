@@ -0,0 +1,128 @@
+"""
+Benchmark for the facility inventory loader.
+
+Seeds an in-memory database with facilities of increasing SKU counts and reports
+the number of SQL statements and the wall time needed to render each facility's
+inventory page and JSON endpoint.
+
+Usage (from the app directory):
+    python3 -m benchmarks.benchFacilityInventory --sizes 10 100 1000 5000
+"""
+
+import argparse
+import os
+import time
+
+os.environ.setdefault("SQLALCHEMY_DATABASE_URI", "sqlite:///:memory:")
+
+from sqlalchemy import event, insert
+
+from app import app, db
+from models.component import Component
+from models.inventory import ProductInventory, ComponentInventory
+from models.product import Product
+from models.productionFacility import ProductionFacility
+
+
+def seedFacility(skuCount):
+    """Insert a facility holding skuCount products and skuCount components."""
+    facility = ProductionFacility(
+        name=f"{skuCount} SKU Facility", latitude=0, longitude=0
+    )
+    db.session.add(facility)
+    db.session.commit()
+    firstProductId = (db.session.query(db.func.max(Product.id)).scalar() or 0) + 1
+    firstComponentId = (db.session.query(db.func.max(Component.id)).scalar() or 0) + 1
+    db.session.execute(
+        insert(Product),
+        [
+            {
+                "id": firstProductId + i,
+                "category": "Laptop",
+                "price": i,
+                "model": f"M{i}",
+            }
+            for i in range(skuCount)
+        ],
+    )
+    db.session.execute(
+        insert(Component),
+        [
+            {"id": firstComponentId + i, "price": i, "name": f"C{i}"}
+            for i in range(skuCount)
+        ],
+    )
+    db.session.execute(
+        insert(ProductInventory),
+        [
+            {
+                "productId": firstProductId + i,
+                "count": i,
+                "productionFacilityId": facility.id,
+                "lastUpdatedByUserId": 1,
+            }
+            for i in range(skuCount)
+        ],
+    )
+    db.session.execute(
+        insert(ComponentInventory),
+        [
+            {
+                "componentId": firstComponentId + i,
+                "count": i,
+                "productionFacilityId": facility.id,
+                "lastUpdatedByUserId": 1,
+            }
+            for i in range(skuCount)
+        ],
+    )
+    db.session.commit()
+    return facility.id
+
+
+def measure(client, engine, url):
+    """Return (statement count, elapsed seconds) for a GET request."""
+    statements = []
+
+    def beforeCursorExecute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", beforeCursorExecute)
+    try:
+        start = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(engine, "before_cursor_execute", beforeCursorExecute)
+    assert response.status_code == 200, response.status_code
+    return len(statements), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    args = parser.parse_args()
+
+    client = app.test_client()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        facilityIds = {size: seedFacility(size) for size in args.sizes}
+        engine = db.engine
+
+    print(
+        f"{'SKUs':>8} {'page queries':>13} {'page ms':>9} {'api queries':>12} {'api ms':>9}"
+    )
+    for size, facilityId in facilityIds.items():
+        pageQueries, pageTime = measure(client, engine, f"/inventory/{facilityId}")
+        apiQueries, apiTime = measure(
+            client, engine, f"/api/facilities/{facilityId}/inventory"
+        )
+        print(
+            f"{size:>8} {pageQueries:>13} {pageTime * 1000:>9.1f}"
+            f" {apiQueries:>12} {apiTime * 1000:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Cold import time budget for the app and the models.
+
+Imports each target in fresh interpreters with -X importtime and compares the
+median import time with the budget in importTimeBudget.json. Times are measured
+relative to importing Flask and SQLAlchemy themselves, the floor every target
+pays, so the budget carries over between machines; the baseline is re-measured
+next to the targets in every round, so changing load does not skew the ratios. The run fails (exit status 1)
+when a target exceeds its budgeted ratio by more than the tolerance, or when it
+imports a module that must stay lazy, such as Flask-Admin.
+
+Usage (from the app directory):
+    python3 -m benchmarks.benchImportTime
+    python3 -m benchmarks.benchImportTime --update   # accept the current times
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+budgetPath = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "importTimeBudget.json"
+)
+appDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def importTime(code):
+    """
+    Return the microseconds spent importing in `python -c code`, and the modules.
+
+    Interpreter startup imports are measured by an empty run and subtracted.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=appDirectory,
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+        check=True,
+    )
+    total, modules = 0, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        modules.add(name.strip())
+        # Top-level imports are indented by a single space
+        if not name.startswith("  "):
+            total += int(cumulative)
+    return total, modules
+
+
+def medianRatios(baselineCode, targets, runs):
+    """
+    Return the median baseline time and, per target, its median ratio and modules.
+
+    Every round measures the startup, the baseline and each target back to back,
+    and a target's ratio is taken within its round, so load that changes during
+    the run moves both sides of a ratio alike.
+    """
+    baselines, ratios, modules = [], {name: [] for name in targets}, {}
+    for _ in range(runs):
+        startup = importTime("pass")[0]
+        baseline = importTime(baselineCode)[0] - startup
+        baselines.append(baseline)
+        for name, target in targets.items():
+            total, imported = importTime(target["code"])
+            ratios[name].append((total - startup) / baseline)
+            modules.setdefault(name, set()).update(imported)
+    return (
+        statistics.median(baselines),
+        {name: statistics.median(values) for name, values in ratios.items()},
+        modules,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument(
+        "--update", action="store_true", help="write the measured ratios as budget"
+    )
+    args = parser.parse_args()
+
+    with open(budgetPath, encoding="utf-8") as budgetFile:
+        budget = json.load(budgetFile)
+    baseline, ratios, imported = medianRatios(
+        budget["baseline"], budget["targets"], args.runs
+    )
+    print(f"baseline ({budget['baseline']}): {baseline / 1000:.0f} ms")
+
+    failures = []
+    for name, target in budget["targets"].items():
+        ratio, modules = ratios[name], imported[name]
+        limit = target["ratio"] * (1 + budget["tolerance"])
+        status = "ok" if ratio <= limit else "OVER BUDGET"
+        print(
+            f"{name}: {ratio:.2f}x baseline"
+            f" (budget {target['ratio']:.2f}x, limit {limit:.2f}x) {status}"
+        )
+        if ratio > limit:
+            failures.append(f"{name} import time {ratio:.2f}x > {limit:.2f}x")
+        eager = sorted(set(target.get("forbidden", [])) & modules)
+        if eager:
+            failures.append(f"{name} imports {', '.join(eager)} eagerly")
+        if args.update:
+            target["ratio"] = round(ratio, 2)
+
+    if args.update:
+        with open(budgetPath, "w", encoding="utf-8") as budgetFile:
+            json.dump(budget, budgetFile, indent=4)
+            budgetFile.write("\n")
+        print(f"updated {budgetPath}")
+        return
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Benchmark for the inventory and lookup indexes.
+
+Builds a database without the indexes added by services/schemaIndexes.py, fills it
+with a multi-million-row dataset, then prints the query plan and latency of the hot
+lookups before and after running the index migration.
+
+Usage (from the app directory):
+    python3 -m benchmarks.benchIndexPlans --rows 2000000
+    python3 -m benchmarks.benchIndexPlans --url mysql+pymysql://user:pw@host/db
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, text
+
+from extensions import db
+from models.component import Component
+from models.inventory import ProductInventory, ComponentInventory
+from models.product import Product
+from models.productionFacility import ProductionFacility
+from models.transaction import DatabaseTransaction
+from models.user import User
+from services.schemaIndexes import indexedModels, migrateIndexes
+
+chunkSize = 50000
+
+
+def dropModelIndexes(engine):
+    """Drop the declared indexes so the database looks like an unmigrated one."""
+    for model in indexedModels:
+        for index in model.__table__.indexes:
+            index.drop(engine, checkfirst=True)
+
+
+def insertChunked(engine, table, rowCount, makeRow):
+    for start in range(0, rowCount, chunkSize):
+        rows = [makeRow(i) for i in range(start, min(start + chunkSize, rowCount))]
+        with engine.begin() as connection:
+            connection.execute(insert(table), rows)
+
+
+def loadDataset(engine, rowCount, itemsPerFacility):
+    now = datetime(2024, 1, 1)
+    insertChunked(
+        engine,
+        ProductionFacility.__table__,
+        rowCount // itemsPerFacility + 1,
+        lambda i: {"id": i + 1, "name": f"Facility {i}", "latitude": 0, "longitude": 0},
+    )
+    insertChunked(
+        engine,
+        Product.__table__,
+        itemsPerFacility,
+        lambda i: {"id": i + 1, "category": "Laptop", "price": i},
+    )
+    insertChunked(
+        engine,
+        Component.__table__,
+        itemsPerFacility,
+        lambda i: {"id": i + 1, "price": i},
+    )
+    for model, itemKey in (
+        (ProductInventory, "productId"),
+        (ComponentInventory, "componentId"),
+    ):
+        insertChunked(
+            engine,
+            model.__table__,
+            rowCount,
+            lambda i: {
+                "productionFacilityId": i // itemsPerFacility + 1,
+                itemKey: i % itemsPerFacility + 1,
+                "count": i % 200,
+                "lastUpdated": now,
+                "lastUpdatedByUserId": 1,
+            },
+        )
+    tableNames = ["product", "component", "productionFacility", "user"]
+    insertChunked(
+        engine,
+        DatabaseTransaction.__table__,
+        rowCount,
+        lambda i: {
+            "objectId": i // 20,
+            "tableName": tableNames[i % 4],
+            "operation": "update",
+            "changes": "count changed",
+            "timestamp": now + timedelta(seconds=i),
+        },
+    )
+    insertChunked(
+        engine,
+        User.__table__,
+        rowCount // 20,
+        lambda i: {
+            "username": f"user{i}",
+            "passwordHash": "x",
+            "email": f"user{i}@example.com",
+        },
+    )
+
+
+def benchmarkQueries(itemsPerFacility, rowCount):
+    facilityId = rowCount // itemsPerFacility // 2
+    return {
+        "product inventory by facility": db.select(ProductInventory).where(
+            ProductInventory.productionFacilityId == facilityId
+        ),
+        "component inventory by facility": db.select(ComponentInventory).where(
+            ComponentInventory.productionFacilityId == facilityId
+        ),
+        "transaction history of an object": db.select(DatabaseTransaction)
+        .where(
+            DatabaseTransaction.tableName == "product",
+            DatabaseTransaction.objectId == rowCount // 40,
+        )
+        .order_by(DatabaseTransaction.timestamp),
+        "user by email": db.select(User).where(
+            User.email == f"user{rowCount // 40}@example.com"
+        ),
+    }
+
+
+def explain(connection, query):
+    sql = str(query.compile(connection, compile_kwargs={"literal_binds": True}))
+    prefix = (
+        "EXPLAIN QUERY PLAN " if connection.dialect.name == "sqlite" else "EXPLAIN "
+    )
+    return [
+        " | ".join(str(col) for col in row)
+        for row in connection.execute(text(prefix + sql))
+    ]
+
+
+def report(engine, queries, repeats):
+    with engine.connect() as connection:
+        for name, query in queries.items():
+            start = time.perf_counter()
+            for _ in range(repeats):
+                connection.execute(query).all()
+            elapsed = (time.perf_counter() - start) / repeats
+            print(f"  {name}: {elapsed * 1000:.2f} ms")
+            for line in explain(connection, query):
+                print(f"      {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="database URL (default: a temporary SQLite file)")
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--items-per-facility", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    url = args.url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(url)
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    dropModelIndexes(engine)
+
+    start = time.perf_counter()
+    loadDataset(engine, args.rows, args.items_per_facility)
+    print(f"loaded {args.rows} rows per table in {time.perf_counter() - start:.1f} s")
+
+    queries = benchmarkQueries(args.items_per_facility, args.rows)
+    print("before migration:")
+    report(engine, queries, args.repeats)
+
+    start = time.perf_counter()
+    result = migrateIndexes(engine)
+    print(
+        f"migration created {result['created']} in {time.perf_counter() - start:.1f} s"
+    )
+
+    print("after migration:")
+    report(engine, queries, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
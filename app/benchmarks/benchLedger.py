@@ -0,0 +1,154 @@
+"""
+Point-in-time stock queries over a long movement history.
+
+Generates a synthetic ledger in a database file (or uses SQLALCHEMY_DATABASE_URI,
+which should then be an empty server database): random movements of a few hundred
+items per facility spread over several years, snapshotted once a week the way
+`flask ims snapshot-inventory` would. Then times stockAt() for random facilities
+and points in time, for a whole facility and for one item, against summing every
+movement up to the same time, and checks that both give the same counts.
+
+Usage (from the app directory):
+    python3 -m benchmarks.benchLedger --movements 1000000 --years 3
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+databaseFile = os.path.join(tempfile.mkdtemp(), "benchLedger.db")
+os.environ.setdefault("SQLALCHEMY_DATABASE_URI", f"sqlite:///{databaseFile}")
+
+from sqlalchemy import func, insert
+from app import app, db
+from models.inventoryMovement import InventoryMovement
+from models.productionFacility import ProductionFacility
+from services.inventoryLedger import stockAt, takeSnapshots
+
+start = datetime(2021, 1, 1)
+
+
+def generateLedger(args):
+    rng = random.Random(7)
+    db.session.execute(
+        insert(ProductionFacility),
+        [
+            {"name": f"Plant {i}", "latitude": 0, "longitude": 0}
+            for i in range(1, args.facilities + 1)
+        ],
+    )
+    span = args.years * 365 * 86400
+    times = sorted(rng.uniform(0, span) for _ in range(args.movements))
+    rows = []
+    for seconds in times:
+        rows.append(
+            {
+                "productionFacilityId": rng.randint(1, args.facilities),
+                "itemType": rng.choice(("product", "component")),
+                "itemId": rng.randint(1, args.items),
+                "delta": rng.randint(-5, 10),
+                "reason": "edit",
+                "createdAt": start + timedelta(seconds=seconds),
+            }
+        )
+        if len(rows) == 50000:
+            db.session.execute(insert(InventoryMovement), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(InventoryMovement), rows)
+    db.session.commit()
+
+
+def fullReplay(facilityId, at, itemType=None, itemIds=None):
+    query = db.select(
+        InventoryMovement.itemType,
+        InventoryMovement.itemId,
+        func.sum(InventoryMovement.delta),
+    ).where(
+        InventoryMovement.productionFacilityId == facilityId,
+        InventoryMovement.createdAt <= at,
+    )
+    if itemType is not None:
+        query = query.where(
+            InventoryMovement.itemType == itemType,
+            InventoryMovement.itemId.in_(itemIds),
+        )
+    counts = db.session.execute(
+        query.group_by(InventoryMovement.itemType, InventoryMovement.itemId)
+    ).all()
+    return [
+        {"type": entryType, "itemId": itemId, "count": count}
+        for entryType, itemId, count in sorted(counts)
+        if count
+    ]
+
+
+def timeQueries(label, queries, args):
+    rng = random.Random(11)
+    span = args.years * 365 * 86400
+    samples = [
+        (
+            rng.randint(1, args.facilities),
+            start + timedelta(seconds=rng.uniform(0, span)),
+        )
+        for _ in range(args.queries)
+    ]
+    item = ("product", [rng.randint(1, args.items)])
+    elapsed = defaultdict(float)
+    for facilityId, at in samples:
+        results = []
+        for name, query in queries:
+            begin = time.perf_counter()
+            results.append(
+                query(facilityId, at, *item)
+                if label == "item"
+                else query(facilityId, at)
+            )
+            elapsed[name] += time.perf_counter() - begin
+        if results[0]["items"] != results[1]:
+            raise SystemExit(f"stockAt differs from a full replay at {at}")
+    print(
+        f"{label}: "
+        + ", ".join(
+            f"{name} {elapsed[name] / args.queries * 1000:.2f} ms"
+            for name, _ in queries
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--movements", type=int, default=500000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--facilities", type=int, default=20)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        begin = time.perf_counter()
+        generateLedger(args)
+        print(
+            f"generated {args.movements} movements in {time.perf_counter() - begin:.1f} s"
+        )
+        begin = time.perf_counter()
+        taken = 0
+        cutoff = start
+        while cutoff < start + timedelta(days=args.years * 365):
+            cutoff += timedelta(days=7)
+            taken += takeSnapshots(cutoff, minMovements=1)
+        print(f"took {taken} weekly snapshots in {time.perf_counter() - begin:.1f} s")
+
+        queries = (("stockAt", stockAt), ("full replay", fullReplay))
+        timeQueries("facility", queries, args)
+        timeQueries("item", queries, args)
+
+
+if __name__ == "__main__":
+    main()
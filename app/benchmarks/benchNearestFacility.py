@@ -0,0 +1,71 @@
+"""
+Benchmark for the nearest-facility-with-stock query.
+
+Generates a synthetic dataset, builds the facility k-d tree and reports the
+build time and the p50/p99 latency of nearestWithStock() at random points, for a
+low quantity (most facilities qualify, the tree is walked) and a high one (few
+facilities qualify, they are ranked directly).
+
+Usage (from the app directory):
+    python3 -m benchmarks.benchNearestFacility --facilities 50000
+"""
+
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("SQLALCHEMY_DATABASE_URI", "sqlite:///:memory:")
+
+from app import app, db
+from services.spatialIndex import getFacilityIndex, nearestWithStock
+from services.syntheticData import generateDataset
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--facilities", type=int, default=50000)
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--products-per-facility", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generateDataset(
+            db.engine,
+            facilities=args.facilities,
+            products=args.products,
+            components=1,
+            productsPerFacility=args.products_per_facility,
+            componentsPerFacility=1,
+        )
+        start = time.perf_counter()
+        index = getFacilityIndex()
+        build = time.perf_counter() - start
+        print(f"indexed {len(index)} operating facilities in {build * 1000:.0f} ms")
+
+        rng = random.Random(0)
+        for quantity in (1, 400):
+            timings = []
+            for _ in range(args.queries):
+                lat, lon = rng.uniform(25, 49), rng.uniform(-124, -67)
+                productId = rng.randint(1, args.products)
+                start = time.perf_counter()
+                nearestWithStock(lat, lon, "product", productId, quantity, args.k)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(
+                f"quantity >= {quantity}: p50 {percentile(timings, 0.5):.2f} ms,"
+                f" p99 {percentile(timings, 0.99):.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Contention on hot inventory rows: direct decrements versus reservations.
+
+Generates a synthetic dataset in a database file (or uses SQLALCHEMY_DATABASE_URI,
+which should then be an empty server database), then has concurrent threads place
+one-unit orders against a few hot ProductInventory rows for a fixed time, in two
+ways:
+
+- decrement: lock the row, decrement its count and commit, which also updates the
+  stock rollups and the audit log;
+- reserve: place a reservation, which locks the row only to check and insert the
+  hold.
+
+Reports orders per second and p50/p99 latency of each, then the time to convert
+every confirmed reservation into decrements in batches, and checks that the
+converted counts match the reservations.
+
+Usage (from the app directory):
+    python3 -m benchmarks.benchReservations --threads 16 --duration 5
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+
+databaseFile = os.path.join(tempfile.mkdtemp(), "benchReservations.db")
+os.environ.setdefault("SQLALCHEMY_DATABASE_URI", f"sqlite:///{databaseFile}")
+
+from app import app, db
+from models.inventory import ProductInventory
+from models.reservation import InventoryReservation
+from services.inventoryLocks import writeSerialized
+from services.reservations import ReservationError, convertConfirmed, reserve
+from services.syntheticData import generateDataset
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def decrement(facilityId, productId):
+    """The order path without reservations: lock and decrement the row."""
+    with writeSerialized(db.session):
+        try:
+            entry = db.session.scalars(
+                db.select(ProductInventory)
+                .where(
+                    ProductInventory.productionFacilityId == facilityId,
+                    ProductInventory.productId == productId,
+                )
+                .with_for_update()
+            ).first()
+            if entry is None or entry.count < 1:
+                raise ReservationError("out of stock", "insufficient")
+            entry.count -= 1
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def worker(seed, hotRows, order, deadline, results):
+    rng = random.Random(seed)
+    latencies, errors = [], Counter()
+    with app.app_context():
+        while time.monotonic() < deadline:
+            facilityId, productId = rng.choice(hotRows)
+            start = time.perf_counter()
+            try:
+                order(facilityId, productId)
+            except ReservationError as e:
+                errors[e.reason] += 1
+            latencies.append(time.perf_counter() - start)
+        db.session.remove()
+    results.append((latencies, errors))
+
+
+def run(label, order, hotRows, args):
+    results = []
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(i, hotRows, order, deadline, results))
+        for i in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies = [value for result in results for value in result[0]]
+    errors = sum((result[1] for result in results), Counter())
+    print(
+        f"{label}: {(len(latencies) - sum(errors.values())) / args.duration:.0f}"
+        f" orders/s, p50 {percentile(latencies, 0.5) * 1000:.1f} ms,"
+        f" p99 {percentile(latencies, 0.99) * 1000:.1f} ms; rejected {dict(errors)}"
+    )
+
+
+def productCounts(hotRows):
+    return {
+        (facilityId, productId): db.session.scalar(
+            db.select(ProductInventory.count).where(
+                ProductInventory.productionFacilityId == facilityId,
+                ProductInventory.productId == productId,
+            )
+        )
+        for facilityId, productId in hotRows
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--hot-rows", type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generateDataset(db.engine, facilities=10, products=100, productsPerFacility=50)
+        db.session.execute(db.update(ProductInventory).values(count=10**6))
+        db.session.commit()
+        hotRows = db.session.execute(
+            db.select(
+                ProductInventory.productionFacilityId, ProductInventory.productId
+            ).limit(args.hot_rows)
+        ).all()
+
+    run("decrement", decrement, hotRows, args)
+    run(
+        "reserve",
+        lambda facilityId, productId: reserve(facilityId, "product", productId, 1),
+        hotRows,
+        args,
+    )
+
+    with app.app_context():
+        db.session.execute(db.update(InventoryReservation).values(status="confirmed"))
+        db.session.commit()
+        reserved = {
+            (facilityId, productId): quantity
+            for facilityId, productId, quantity in db.session.execute(
+                db.select(
+                    InventoryReservation.productionFacilityId,
+                    InventoryReservation.itemId,
+                    db.func.sum(InventoryReservation.quantity),
+                ).group_by(
+                    InventoryReservation.productionFacilityId,
+                    InventoryReservation.itemId,
+                )
+            )
+        }
+        before = productCounts(hotRows)
+        start = time.perf_counter()
+        result = convertConfirmed()
+        elapsed = time.perf_counter() - start
+        after = productCounts(hotRows)
+    print(
+        f"converted {result['reservations']} reservations in {elapsed * 1000:.0f} ms"
+        f" ({result['reservations'] / elapsed:.0f}/s)"
+    )
+    for key in before:
+        if before[key] - after[key] != reserved.get(key, 0):
+            raise SystemExit(f"row {key} does not match its reservations")
+    print("converted counts match the reservations")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark for the production scheduler.
+
+Generates a synthetic dataset with production processes, then reports the time to
+schedule a queue of random build orders over every facility's lines and to store
+the schedule, and the average time of changing and of removing one order, each
+written back as one schedule version. A sample of lines is checked for overlapping
+orders.
+
+Usage (from the app directory):
+    python3 -m benchmarks.benchScheduler --orders 100000 --facilities 500
+"""
+
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("SQLALCHEMY_DATABASE_URI", "sqlite:///:memory:")
+
+from app import app, db
+from services import productionScheduler
+from services.productionScheduler import (
+    PlannedOrder,
+    createSchedule,
+    removeScheduledOrder,
+    setScheduledOrder,
+)
+from services.syntheticData import generateDataset
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--facilities", type=int, default=500)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--components", type=int, default=500)
+    parser.add_argument("--components-per-facility", type=int, default=300)
+    parser.add_argument("--processes-per-product", type=int, default=2)
+    parser.add_argument("--changes", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generateDataset(
+            db.engine,
+            facilities=args.facilities,
+            products=args.products,
+            components=args.components,
+            productsPerFacility=1,
+            componentsPerFacility=args.components_per_facility,
+            processesPerProduct=args.processes_per_product,
+            componentsPerProcess=3,
+        )
+        orders = [
+            PlannedOrder(i, rng.randint(1, args.products), rng.randint(1, 5))
+            for i in range(1, args.orders + 1)
+        ]
+        summary, createMs = timed(createSchedule, orders)
+        print(
+            f"scheduled {summary['orders']} orders ({summary['unscheduled']}"
+            f" unscheduled) in {summary['seconds'] * 1000:.0f} ms,"
+            f" {createMs:.0f} ms stored; makespan {summary['makespanMinutes']} min"
+        )
+
+        scheduleId = summary["scheduleId"]
+        timings = {"change": [], "remove": []}
+        for orderId in rng.sample(range(1, args.orders + 1), args.changes):
+            order = PlannedOrder(orderId, rng.randint(1, args.products), 1)
+            timings["change"].append(timed(setScheduledOrder, scheduleId, order)[1])
+            timings["remove"].append(
+                timed(removeScheduledOrder, scheduleId, orderId)[1]
+            )
+        for label, values in timings.items():
+            print(f"{label} one order: {sum(values) / len(values):.1f} ms average")
+
+        productionScheduler.cachedSchedulers.clear()
+        _, reloadMs = timed(setScheduledOrder, scheduleId, PlannedOrder(0, 1, 1))
+        print(f"reload from rows and change: {reloadMs:.0f} ms")
+
+        scheduler = productionScheduler.cachedSchedulers[scheduleId][1]
+        for position in rng.sample(range(len(scheduler.facilityIds)), 20):
+            for line in scheduler.lineOrders[position]:
+                for before, after in zip(line, line[1:]):
+                    if before.end > after.start:
+                        raise SystemExit(
+                            f"orders {before.orderId} and {after.orderId} overlap"
+                        )
+        print("sampled lines have no overlapping orders")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark for the shipment planner.
+
+Generates a synthetic dataset and random pending shipments around the facilities,
+then reports the time, total unit-kilometres and peak memory (of a second, traced
+run) of a plan in each mode, unchunked and chunked. --stock scales the inventory
+counts down, so that the shipments need most of the stock and the optimal mode has
+to move units between shipments; with fewer --products, each product's distance
+matrix and the saving of chunking grow.
+
+Usage (from the app directory):
+    python3 -m benchmarks.benchShipmentPlanner --shipments 10000 --facilities 1000
+"""
+
+import argparse
+import os
+import random
+import tracemalloc
+
+os.environ.setdefault("SQLALCHEMY_DATABASE_URI", "sqlite:///:memory:")
+
+from sqlalchemy import insert
+from app import app, db
+from models.inventory import ProductInventory
+from models.productionFacility import ProductionFacility
+from models.shipment import shipment
+from services.shipmentPlanner import planShipments
+from services.syntheticData import generateDataset
+
+
+def addShipments(args):
+    rng = random.Random(1)
+    facilities = db.session.execute(
+        db.select(ProductionFacility.latitude, ProductionFacility.longitude)
+    ).all()
+    rows = []
+    for _ in range(args.shipments):
+        latitude, longitude = rng.choice(facilities)
+        rows.append(
+            {
+                "productId": rng.randint(1, args.products),
+                "quantity": rng.randint(1, 5),
+                "latitude": max(-90, min(90, latitude + rng.gauss(0, 2))),
+                "longitude": longitude + rng.gauss(0, 2),
+                "status": "pending",
+            }
+        )
+    db.session.execute(insert(shipment), rows)
+    db.session.commit()
+
+
+def report(label, mode, chunkSize):
+    plan = planShipments(mode, chunkSize)
+    # Traced separately, tracing slows the plan down
+    tracemalloc.start()
+    planShipments(mode, chunkSize)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(
+        f"{label:<18} {plan['seconds']:7.2f} s  {plan['unitKm']:14.0f} unit-km"
+        f"  {plan['allocatedUnits']}/{plan['units']} units"
+        f"  peak {peak / 2**20:6.1f} MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--shipments", type=int, default=10000)
+    parser.add_argument("--facilities", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--products-per-facility", type=int, default=20)
+    parser.add_argument("--stock", type=float, default=0.05)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generateDataset(
+            db.engine,
+            facilities=args.facilities,
+            products=args.products,
+            components=10,
+            productsPerFacility=args.products_per_facility,
+            componentsPerFacility=1,
+        )
+        db.session.execute(
+            db.update(ProductInventory).values(
+                count=db.cast(ProductInventory.count * args.stock, db.Integer)
+            )
+        )
+        addShipments(args)
+        stock = db.session.scalar(db.select(db.func.sum(ProductInventory.count)))
+        demand = db.session.scalar(db.select(db.func.sum(shipment.quantity)))
+        print(
+            f"{args.shipments} shipments ({demand} units) x {args.facilities}"
+            f" facilities holding {stock} units of {args.products} products"
+        )
+        for mode in ("greedy", "optimal"):
+            report(mode, mode, 0)
+            report(f"{mode} chunked", mode, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
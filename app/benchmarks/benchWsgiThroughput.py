@@ -0,0 +1,187 @@
+"""
+Throughput of the development server versus the production gunicorn setup.
+
+Builds a synthetic SQLite database, then serves it with each server in turn and
+drives a fixed mix of read endpoints from concurrent client processes with
+keep-alive sessions, reporting requests per second and p50/p99 latency:
+
+- dev: the Flask development server in debug mode, as production.Dockerfile used
+  to run it with "python3 app.py" (without the reloader, which only restarts it);
+- gunicorn: wsgi:app with gunicorn.conf.py, preloaded and preforked.
+
+Usage (from the app directory):
+    python3 -m benchmarks.benchWsgiThroughput --duration 10 --clients 8
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("SQLALCHEMY_DATABASE_URI", "sqlite:///:memory:")
+
+import requests
+from sqlalchemy import create_engine
+from app import db
+from services.syntheticData import generateDataset
+
+devServer = (
+    "from app import create_app; "
+    "create_app().run(host='127.0.0.1', port={port}, debug=True, use_reloader=False)"
+)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def freePort():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def requestPaths(products):
+    return [
+        "/map-data",
+        "/api/facilities/1/inventory/product?limit=50",
+        "/api/facilities/nearest?lat=40&lon=-100&productId=1",
+        *(f"/api/stock/products/{i}" for i in range(1, min(products, 20) + 1)),
+    ]
+
+
+def drive(baseUrl, paths, duration, offset):
+    """Request paths round-robin for duration seconds; return latencies and errors."""
+    session = requests.Session()
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+    i = offset
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            response = session.get(baseUrl + paths[i % len(paths)], timeout=30)
+            if response.status_code != 200:
+                errors += 1
+        except requests.RequestException:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+        i += 1
+    return latencies, errors
+
+
+def waitUntilUp(baseUrl, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            requests.get(baseUrl + "/", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def runServer(name, command, env, args, paths):
+    port = freePort()
+    baseUrl = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [part.format(port=port) for part in command],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        waitUntilUp(baseUrl, process)
+        # Warm the caches of every worker before measuring
+        drive(baseUrl, paths, 1, 0)
+        with ProcessPoolExecutor(args.clients) as pool:
+            results = list(
+                pool.map(
+                    drive,
+                    [baseUrl] * args.clients,
+                    [paths] * args.clients,
+                    [args.duration] * args.clients,
+                    range(args.clients),
+                )
+            )
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    latencies = [latency for result in results for latency in result[0]]
+    errors = sum(result[1] for result in results)
+    print(
+        f"{name:>9}: {len(latencies) / args.duration:8.1f} req/s,"
+        f" p50 {percentile(latencies, 0.5) * 1000:7.1f} ms,"
+        f" p99 {percentile(latencies, 0.99) * 1000:7.1f} ms,"
+        f" {errors} errors"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() * 2 + 1)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--facilities", type=int, default=500)
+    parser.add_argument("--products", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        databaseUrl = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        engine = create_engine(databaseUrl)
+        db.metadata.create_all(engine)
+        generateDataset(
+            engine,
+            facilities=args.facilities,
+            products=args.products,
+            components=args.products,
+            productsPerFacility=50,
+            componentsPerFacility=50,
+        )
+        engine.dispose()
+        env = dict(
+            os.environ,
+            SQLALCHEMY_DATABASE_URI=databaseUrl,
+            METRICS_MULTIPROC_DIR=os.path.join(directory, "metrics"),
+            AUDIT_SPOOL_DIR=os.path.join(directory, "audit"),
+            PROFILER_ENABLED="false",
+            GUNICORN_ACCESS_LOG="",
+        )
+        env.setdefault("SECRET_KEY", "benchmark")
+        paths = requestPaths(args.products)
+        print(
+            f"{args.clients} clients for {args.duration:.0f} s each,"
+            f" {os.cpu_count()} CPUs"
+        )
+        runServer("dev", [sys.executable, "-c", devServer], env, args, paths)
+        runServer(
+            "gunicorn",
+            [
+                sys.executable,
+                "-m",
+                "gunicorn",
+                "--config",
+                "gunicorn.conf.py",
+                "--bind",
+                "127.0.0.1:{port}",
+                "--workers",
+                str(args.workers),
+                "--threads",
+                str(args.threads),
+                "wsgi:app",
+            ],
+            env,
+            args,
+            paths,
+        )
+
+
+if __name__ == "__main__":
+    main()
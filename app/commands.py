@@ -0,0 +1,263 @@
+"""
+Flask CLI commands for inventory maintenance.
+
+The commands are grouped under `flask ims`, e.g.:
+- 'flask --app app ims init-db' : Create missing tables and indexes; gunicorn runs it on start.
+- 'flask --app app ims rebuild-rollups' : Recompute the company-wide stock rollups.
+- 'flask --app app ims migrate-indexes' : Add missing columns and inventory and lookup indexes.
+- 'flask --app app ims import products laptops.csv' : Stream a catalog CSV into the database.
+- 'flask --app app ims generate --facilities 1000' : Write a synthetic load-test dataset.
+- 'flask --app app ims sweep-reservations --interval 30' : Expire and convert reservations.
+- 'flask --app app ims reconcile-ledger' : Record inventory changes missing from the ledger.
+- 'flask --app app ims snapshot-inventory' : Snapshot the facilities with new movements.
+- 'flask --app app ims plan-shipments --mode optimal --apply' : Allocate pending shipments to facilities.
+- 'flask --app app ims reconcile-alerts --interval 300' : Re-evaluate every reorder point.
+"""
+
+import time
+import click
+from flask.cli import AppGroup
+from sqlalchemy import create_engine
+from extensions import db, readCache
+from models.stockRollup import rebuildStockRollups
+from services.bulkImport import auditModes, importCsv, importers
+from services.inventoryLedger import reconcileLedger, takeSnapshots
+from services.reservations import convertConfirmed, sweepExpired
+from services.schemaIndexes import initDatabase, migrateIndexes
+from services.stockAlerts import reconcileAlerts
+from services.syntheticData import estimateRows, generateDataset
+
+ims = AppGroup("ims", help="Nexus IMS maintenance commands.")
+
+
+@ims.command("rebuild-rollups")
+def rebuildRollupsCommand():
+    """Recompute the product and component stock rollups from inventory."""
+    written = rebuildStockRollups(db.session)
+    db.session.commit()
+    for tableName, rowCount in written.items():
+        click.echo(f"{tableName}: {rowCount} rows")
+
+
+@ims.command("init-db")
+def initDbCommand():
+    """Create the missing tables, columns and indexes and fill new derived tables."""
+    result = initDatabase()
+    for tableName in result["tables"]:
+        click.echo(f"created table {tableName}")
+    for columnName in result["columns"]:
+        click.echo(f"added column {columnName}")
+    for tableName, merged in result["merged"].items():
+        if merged:
+            click.echo(f"{tableName}: merged {merged} duplicate rows")
+    for indexName in result["created"]:
+        click.echo(f"created {indexName}")
+    if result["rebuilt"]:
+        click.echo("rebuilt stock rollups")
+    if result["reconciled"]:
+        click.echo(
+            f"opened the ledger with {result['reconciled']['product']} product and"
+            f" {result['reconciled']['component']} component movements"
+        )
+
+
+@ims.command("migrate-indexes")
+def migrateIndexesCommand():
+    """Add missing columns, merge duplicate inventory rows and create missing indexes."""
+    result = migrateIndexes(db.engine)
+    for columnName in result["columns"]:
+        click.echo(f"added column {columnName}")
+    for tableName, merged in result["merged"].items():
+        click.echo(f"{tableName}: merged {merged} duplicate rows")
+    for indexName in result["created"]:
+        click.echo(f"created {indexName}")
+    if any(result["merged"].values()):
+        # Merging changes how many facilities stock an item
+        rebuildStockRollups(db.session)
+        db.session.commit()
+        click.echo("rebuilt stock rollups")
+
+
+@ims.command("import")
+@click.argument("kind", type=click.Choice(sorted(importers)))
+@click.argument("csvfile", type=click.File("r", encoding="utf-8"))
+@click.option("--chunk-size", default=5000, show_default=True)
+@click.option("--workers", default=1, show_default=True, help="Parser processes.")
+@click.option(
+    "--audit",
+    type=click.Choice(auditModes),
+    default="chunk",
+    show_default=True,
+    help="One audit record per chunk, per row (slow ORM path) or none.",
+)
+def importCommand(kind, csvfile, chunk_size, workers, audit):
+    """Stream a product or component CSV into the catalog."""
+
+    def reportProgress(totals):
+        click.echo(
+            f"chunk {totals['chunks']}: {totals['inserted']} rows inserted,"
+            f" {totals['rejected']} rejected, {totals['rowsPerSecond']:.0f} rows/s"
+        )
+
+    totals = importCsv(
+        kind,
+        csvfile,
+        chunkSize=chunk_size,
+        workers=workers,
+        audit=audit,
+        onProgress=reportProgress,
+    )
+    click.echo(
+        f"imported {totals['inserted']} {kind} in {totals['seconds']:.1f} s"
+        f" ({totals['rowsPerSecond']:.0f} rows/s), rejected {totals['rejected']}"
+    )
+
+
+@ims.command("generate")
+@click.option("--database-url", help="Target database; defaults to the app's.")
+@click.option("--facilities", default=100, show_default=True)
+@click.option("--products", default=1000, show_default=True)
+@click.option("--components", default=1000, show_default=True)
+@click.option("--products-per-facility", default=50, show_default=True)
+@click.option("--components-per-facility", default=50, show_default=True)
+@click.option("--processes-per-product", default=0, show_default=True)
+@click.option("--components-per-process", default=4, show_default=True)
+@click.option("--users", default=20, show_default=True)
+@click.option("--seed", default=0, show_default=True)
+@click.option("--chunk-size", default=20000, show_default=True)
+@click.option("--reset", is_flag=True, help="Drop and recreate all tables first.")
+def generateCommand(database_url, reset, chunk_size, **sizes):
+    """Write a deterministic synthetic dataset for load testing."""
+    engine = create_engine(database_url) if database_url else db.engine
+    if reset:
+        db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    inventoryRows = estimateRows(
+        sizes["facilities"],
+        sizes["products"],
+        sizes["components"],
+        sizes["products_per_facility"],
+        sizes["components_per_facility"],
+    )
+    click.echo(f"generating {inventoryRows} inventory rows")
+
+    def reportProgress(tableName, rowsWritten):
+        click.echo(f"{tableName}: {rowsWritten} rows")
+
+    written = generateDataset(
+        engine,
+        facilities=sizes["facilities"],
+        products=sizes["products"],
+        components=sizes["components"],
+        productsPerFacility=sizes["products_per_facility"],
+        componentsPerFacility=sizes["components_per_facility"],
+        processesPerProduct=sizes["processes_per_product"],
+        componentsPerProcess=sizes["components_per_process"],
+        users=sizes["users"],
+        seed=sizes["seed"],
+        chunkSize=chunk_size,
+        onProgress=reportProgress,
+    )
+    if database_url:
+        engine.dispose()
+    else:
+        # Core inserts do not fire the invalidation events
+        readCache.clear()
+    click.echo(f"done in {written['seconds']:.1f} s")
+
+
+@ims.command("sweep-reservations")
+@click.option(
+    "--interval",
+    default=0.0,
+    show_default=True,
+    help="Seconds between sweeps; 0 sweeps once and exits.",
+)
+@click.option("--batch-size", default=None, type=int, help="Rows per transaction.")
+def sweepReservationsCommand(interval, batch_size):
+    """Delete expired holds and convert confirmed reservations into decrements."""
+    while True:
+        expired = sweepExpired(batch_size)
+        converted = convertConfirmed(batch_size)
+        click.echo(
+            f"expired {expired}, converted {converted['reservations']}"
+            f" reservations ({converted['units']['product']} product and"
+            f" {converted['units']['component']} component units,"
+            f" {converted['shortfall']} short)"
+        )
+        if interval <= 0:
+            return
+        time.sleep(interval)
+
+
+@ims.command("reconcile-ledger")
+def reconcileLedgerCommand():
+    """Append movements wherever the ledger and the inventory counts disagree."""
+    appended = reconcileLedger()
+    click.echo(
+        f"appended {appended['product']} product and"
+        f" {appended['component']} component movements"
+    )
+
+
+@ims.command("snapshot-inventory")
+@click.option(
+    "--min-movements",
+    default=None,
+    type=int,
+    help="Movements a facility needs since its latest snapshot.",
+)
+def snapshotInventoryCommand(min_movements):
+    """Snapshot the counts of every facility with enough new movements."""
+    click.echo(f"took {takeSnapshots(minMovements=min_movements)} snapshots")
+
+
+@ims.command("plan-shipments")
+@click.option(
+    "--mode",
+    type=click.Choice(("greedy", "optimal")),
+    default="greedy",
+    show_default=True,
+)
+@click.option(
+    "--chunk-size",
+    default=None,
+    type=int,
+    help="Shipments of a product planned at a time; 0 plans them all at once.",
+)
+@click.option("--apply", is_flag=True, help="Hold the stock and record the plan.")
+def planShipmentsCommand(mode, chunk_size, apply):
+    """Allocate the pending shipments to the nearest facilities with stock."""
+    # NumPy is only imported when a plan is made
+    from services.shipmentPlanner import applyPlan, planShipments
+
+    plan = planShipments(mode, chunk_size)
+    click.echo(
+        f"{plan['mode']}: {plan['allocatedUnits']} of {plan['units']} units of"
+        f" {plan['shipments']} shipments allocated, {plan['unitKm']:.0f} unit-km,"
+        f" {len(plan['unserved'])} unserved, in {plan['seconds']:.2f} s"
+    )
+    if apply:
+        click.echo(f"planned {applyPlan(plan['allocations'])} shipments")
+
+
+@ims.command("reconcile-alerts")
+@click.option(
+    "--interval",
+    default=0.0,
+    show_default=True,
+    help="Seconds between reconciliations; 0 reconciles once and exits.",
+)
+@click.option("--batch-size", default=None, type=int, help="Items per transaction.")
+def reconcileAlertsCommand(interval, batch_size):
+    """Re-evaluate every reorder point to catch missed low-stock alerts."""
+    while True:
+        totals = reconcileAlerts(batch_size)
+        click.echo(
+            f"evaluated {totals['evaluated']} reorder points: fired {totals['fired']},"
+            f" reopened {totals['suppressed']}, updated {totals['updated']},"
+            f" resolved {totals['resolved']} alerts"
+        )
+        if interval <= 0:
+            return
+        time.sleep(interval)
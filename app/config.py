@@ -6,11 +6,85 @@ This module contains configuration settings for the Flask application, including
 
 from dotenv import load_dotenv
 import os
+from services.metrics import TimedQueuePool
 
 load_dotenv()
 
+
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY")
     SQLALCHEMY_DATABASE_URI = os.getenv("SQLALCHEMY_DATABASE_URI")
+    # Comma-separated read replica URIs, bound as replica0, replica1, ...
+    SQLALCHEMY_BINDS = {
+        f"replica{i}": uri.strip()
+        for i, uri in enumerate(
+            filter(None, os.getenv("SQLALCHEMY_REPLICA_URIS", "").split(","))
+        )
+    }
+    DB_REPLICA_BINDS = list(SQLALCHEMY_BINDS)
+    # Times checkout waits for /metrics; in-memory SQLite keeps its StaticPool
+    SQLALCHEMY_ENGINE_OPTIONS = {"poolclass": TimedQueuePool}
+    # Seconds a user keeps reading from the primary after a write
+    DB_STICKY_SECONDS = float(os.getenv("DB_STICKY_SECONDS", 10))
     FLASK_ADMIN_FLUID_LAYOUT = True
     FLASK_ADMIN_SWATCH = "cerulean"
+    # simple (per-process), memcached, redis or null
+    READ_CACHE_TYPE = os.getenv("READ_CACHE_TYPE", "simple")
+    READ_CACHE_TTL = int(os.getenv("READ_CACHE_TTL", 300))
+    READ_CACHE_SIZE = int(os.getenv("READ_CACHE_SIZE", 10000))
+    READ_CACHE_SERVERS = os.getenv("READ_CACHE_SERVERS", "127.0.0.1:11211").split(",")
+    # Write DatabaseTransaction records from a background thread via a spool file
+    AUDIT_ASYNC = os.getenv("AUDIT_ASYNC", "false").lower() == "true"
+    AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", 500))
+    AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", 0.5))
+    # Attempts after a failed batch before it goes to the dead-letter spool
+    AUDIT_MAX_RETRIES = int(os.getenv("AUDIT_MAX_RETRIES", 5))
+    AUDIT_SPOOL_DIR = os.getenv("AUDIT_SPOOL_DIR")
+    AUDIT_SPOOL_FSYNC = os.getenv("AUDIT_SPOOL_FSYNC", "false").lower() == "true"
+    # Login throttling and the bounded password hashing pool
+    AUTH_MAX_USER_FAILURES = int(os.getenv("AUTH_MAX_USER_FAILURES", 5))
+    AUTH_MAX_IP_FAILURES = int(os.getenv("AUTH_MAX_IP_FAILURES", 50))
+    AUTH_FAILURE_WINDOW = float(os.getenv("AUTH_FAILURE_WINDOW", 300))
+    AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", 2))
+    AUTH_HASH_QUEUE = int(os.getenv("AUTH_HASH_QUEUE", 8))
+    AUTH_HTTP_POOL_SIZE = int(os.getenv("AUTH_HTTP_POOL_SIZE", 10))
+    # The User.role of administrators, who may act on other users' records
+    ADMIN_ROLE = int(os.getenv("ADMIN_ROLE", 0))
+    GOOGLE_USERINFO_URL = os.getenv(
+        "GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v1/userinfo"
+    )
+    # Per-request SQL profiling; requests over a budget are flagged
+    PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "true").lower() == "true"
+    PROFILER_QUERY_BUDGET = int(os.getenv("PROFILER_QUERY_BUDGET", 30))
+    PROFILER_DB_TIME_BUDGET_MS = float(os.getenv("PROFILER_DB_TIME_BUDGET_MS", 200))
+    PROFILER_REPEAT_THRESHOLD = int(os.getenv("PROFILER_REPEAT_THRESHOLD", 5))
+    # Shared directory for the metrics snapshots of multiple worker processes
+    METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+    METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 1))
+    # Production scheduling: default lines per facility, orders per request and
+    # the schedules each worker keeps in memory
+    SCHEDULER_LINES_PER_FACILITY = int(os.getenv("SCHEDULER_LINES_PER_FACILITY", 1))
+    SCHEDULER_MAX_ORDERS = int(os.getenv("SCHEDULER_MAX_ORDERS", 200000))
+    SCHEDULER_CACHE_SIZE = int(os.getenv("SCHEDULER_CACHE_SIZE", 4))
+    # Inventory reservations: default and longest hold, and the rows each sweep
+    # or conversion transaction handles
+    RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", 900))
+    RESERVATION_MAX_TTL_SECONDS = int(os.getenv("RESERVATION_MAX_TTL_SECONDS", 86400))
+    RESERVATION_BATCH_SIZE = int(os.getenv("RESERVATION_BATCH_SIZE", 1000))
+
+    # Inventory ledger: movements since a facility's latest snapshot before a new
+    # one is taken, and how far in the past snapshots are taken
+    LEDGER_SNAPSHOT_MIN_MOVEMENTS = int(
+        os.getenv("LEDGER_SNAPSHOT_MIN_MOVEMENTS", 1000)
+    )
+    LEDGER_SNAPSHOT_GRACE_SECONDS = int(os.getenv("LEDGER_SNAPSHOT_GRACE_SECONDS", 60))
+
+    # Shipment planning: shipments of a product planned at a time, bounding the
+    # distance matrix to this many rows; 0 plans them all at once
+    SHIPMENT_PLAN_CHUNK_SIZE = int(os.getenv("SHIPMENT_PLAN_CHUNK_SIZE", 0))
+
+    # Low-stock alerts: how long after an item's alert is resolved it reopens that
+    # alert instead of raising a new one, and the reorder points each
+    # reconciliation transaction re-evaluates
+    STOCK_ALERT_COOLDOWN_SECONDS = int(os.getenv("STOCK_ALERT_COOLDOWN_SECONDS", 3600))
+    STOCK_ALERT_BATCH_SIZE = int(os.getenv("STOCK_ALERT_BATCH_SIZE", 500))
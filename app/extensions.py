@@ -1,9 +1,15 @@
 """
 Flask extensions setup.
 
-This module initializes the SQLAlchemy extension for database management.
+This module initializes the SQLAlchemy extension for database management, whose
+session routes read-only requests to the replicas, the database router and the read
+cache used for catalog and facility lookups.
 """
 
 from flask_sqlalchemy import SQLAlchemy
+from services.dbRouting import DatabaseRouter, RoutingSession
+from services.readCache import ReadCache
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+dbRouter = DatabaseRouter()
+readCache = ReadCache()
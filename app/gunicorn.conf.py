@@ -0,0 +1,88 @@
+"""
+Gunicorn settings for the production server.
+
+The application is imported once in the master (preload_app) and the workers are
+forked from it, so the imported modules, the models and the admin views are shared
+copy-on-write. Anything holding sockets is reset in
+each worker after the fork: the database engines are disposed of without closing
+the parent's connections, and the audit writer and metrics snapshot thread start
+per process on first use. When a worker exits, child_exit folds its metrics
+snapshot into the totals of the exited workers.
+
+The read cache must be shared by the workers (READ_CACHE_TYPE=memcached or redis):
+with the per-process default and more than one worker, on_starting turns read
+caching off rather than let workers serve entries another worker invalidated.
+
+Before the workers start, on_starting brings the database schema up to the models
+(see services/schemaIndexes.initDatabase); set IMS_INIT_DB=false when several
+instances share a database and `flask ims init-db` runs as a separate release step.
+
+Every setting can be overridden on the command line or through GUNICORN_* and
+WEB_CONCURRENCY environment variables.
+"""
+
+import glob
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5001")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 1))
+worker_class = "gthread" if threads > 1 else "sync"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound memory growth, staggered by the jitter
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+
+# /metrics merges the snapshots the workers write here
+os.environ.setdefault("METRICS_MULTIPROC_DIR", "/tmp/ims-metrics")
+
+
+def on_starting(server):
+    # Snapshots of a previous run would be counted as exited workers
+    for path in glob.glob(
+        os.path.join(os.environ["METRICS_MULTIPROC_DIR"], "*metrics*.json")
+    ):
+        os.remove(path)
+    from extensions import readCache
+
+    # The app is preloaded, so the workers inherit the backend chosen here
+    if readCache.ensureShared(server.cfg.workers):
+        server.log.warning(
+            "READ_CACHE_TYPE=simple is per process and %d workers would serve stale"
+            " entries; read caching is off. Set READ_CACHE_TYPE to memcached or redis",
+            server.cfg.workers,
+        )
+    if os.getenv("IMS_INIT_DB", "true").lower() == "true":
+        from extensions import db
+        from services.schemaIndexes import initDatabase
+        from wsgi import app
+
+        # The app is preloaded, so this runs in the master before any fork
+        with app.app_context():
+            initDatabase()
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+
+def post_fork(server, worker):
+    from extensions import db
+    from wsgi import app
+
+    # Pooled connections opened before the fork belong to the master; dropping
+    # them without closing keeps two processes off the same socket
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    from services.metrics import metrics
+
+    metrics.compactSnapshot(worker.pid)
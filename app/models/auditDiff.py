@@ -0,0 +1,165 @@
+"""
+Shared audit listeners for model changes.
+
+registerAudit() attaches one set of insert/update/delete listeners to a model and
+records each change through the audit sink. The model's column keys are computed
+once, when SQLAlchemy configures its mapper. An update only inspects the attributes
+the unit of work marks as modified (the keys of the instance state's committed
+state), and every value is read from already loaded state, so a listener never
+triggers a lazy load of a deferred or expired column.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from extensions import db
+from models.transaction import auditSink
+
+auditedModels = {}
+
+
+class AuditedModel:
+    """
+    Audit configuration of one model.
+
+    Attributes:
+        tableName (str): The tableName recorded on DatabaseTransaction rows.
+        columns (list): Column attribute keys in mapper order.
+        columnIndex (dict): Column key -> position, for ordering diffs.
+        primaryKey (str): The key of the primary key attribute.
+    """
+
+    def __init__(self, tableName, insertMessage, updatePrefix, deleteMessage):
+        self.tableName = tableName
+        self.insertMessage = insertMessage
+        self.updatePrefix = updatePrefix
+        self.deleteMessage = deleteMessage
+        self.columns = []
+        self.columnIndex = {}
+        self.primaryKey = "id"
+
+    def configure(self, mapper):
+        self.columns = [prop.key for prop in mapper.column_attrs]
+        self.columnIndex = {key: i for i, key in enumerate(self.columns)}
+        self.primaryKey = mapper.get_property_by_column(mapper.primary_key[0]).key
+
+
+def objectId(entry, state):
+    value = state.dict.get(entry.primaryKey)
+    if value is None and state.identity:
+        value = state.identity[0]
+    return value
+
+
+def loadedValues(target):
+    """
+    Return the loaded column values of an instance in column order.
+
+    Deferred or expired columns are skipped instead of being loaded.
+    """
+    entry = auditedModels[type(target)]
+    loaded = db.inspect(target).dict
+    return [(key, loaded[key]) for key in entry.columns if key in loaded]
+
+
+def changedValues(target):
+    """
+    Return the (key, old, new) triples of the columns modified in this flush.
+
+    Only keys present in the state's committed_state are inspected, and history is
+    read without initializing unloaded attributes.
+    """
+    entry = auditedModels[type(target)]
+    state = db.inspect(target)
+    modified = sorted(
+        (key for key in state.committed_state if key in entry.columnIndex),
+        key=entry.columnIndex.__getitem__,
+    )
+    changes = []
+    for key in modified:
+        history = state.attrs[key].history
+        if history.has_changes():
+            changes.append(
+                (
+                    key,
+                    history.deleted[0] if history.deleted else None,
+                    history.added[0] if history.added else None,
+                )
+            )
+    return changes
+
+
+def afterInsert(mapper, connection, target):
+    entry = auditedModels[type(target)]
+    auditSink.record(
+        object_session(target),
+        objectId=objectId(entry, db.inspect(target)),
+        tableName=entry.tableName,
+        operation="insert",
+        changes=entry.insertMessage(target),
+    )
+
+
+def afterUpdate(mapper, connection, target):
+    entry = auditedModels[type(target)]
+    changes = changedValues(target)
+    if not changes:
+        return
+    description = "; ".join(
+        f"{key} changed from {old} to {new}" for key, old, new in changes
+    )
+    auditSink.record(
+        object_session(target),
+        objectId=objectId(entry, db.inspect(target)),
+        tableName=entry.tableName,
+        operation="update",
+        changes=entry.updatePrefix + description,
+    )
+
+
+def beforeDelete(mapper, connection, target):
+    entry = auditedModels[type(target)]
+    state = db.inspect(target)
+    auditSink.record(
+        object_session(target),
+        objectId=objectId(entry, state),
+        tableName=entry.tableName,
+        operation="delete",
+        changes=entry.deleteMessage(target, objectId(entry, state)),
+    )
+
+
+def registerAudit(
+    model, tableName, insertMessage=None, updatePrefix="", deleteMessage=None
+):
+    """
+    Record inserts, updates and deletes of a model as DatabaseTransaction rows.
+
+    Args:
+        model: The mapped class to audit.
+        tableName (str): The tableName recorded on the audit rows.
+        insertMessage (callable): Builds the insert description from the new
+            instance; inserts are not audited when omitted.
+        updatePrefix (str): Text put in front of the list of changed columns.
+        deleteMessage (callable): Builds the delete description from the instance
+            and its ID; defaults to "<tableName> ID <id> was deleted".
+    """
+    if model in auditedModels:
+        raise ValueError(f"{model.__name__} is already audited")
+    entry = AuditedModel(
+        tableName,
+        insertMessage,
+        updatePrefix,
+        deleteMessage or (lambda target, objId: f"{tableName} ID {objId} was deleted"),
+    )
+    auditedModels[model] = entry
+    mapper = db.inspect(model)
+    if mapper.configured:
+        entry.configure(mapper)
+    else:
+        event.listen(
+            model, "mapper_configured", lambda mapper, cls: entry.configure(mapper)
+        )
+    if insertMessage is not None:
+        event.listen(model, "after_insert", afterInsert)
+    event.listen(model, "after_update", afterUpdate)
+    event.listen(model, "before_delete", beforeDelete)
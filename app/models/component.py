@@ -6,11 +6,11 @@ It includes fields for various attributes of components and event listeners for
 recording database transactions after insert and update operations.
 """
 
-from extensions import db
+from extensions import db, readCache
 from models.dbUtils import BaseModel
 from sqlalchemy import event
-from models.transaction import DatabaseTransaction
-from datetime import datetime
+from sqlalchemy.orm import object_session
+from models.auditDiff import registerAudit
 
 
 class Component(db.Model, BaseModel):
@@ -45,53 +45,17 @@ class Component(db.Model, BaseModel):
 
 
 @event.listens_for(Component, "after_insert")
-def after_component_insert(mapper, connection, target):
-
-    transaction = DatabaseTransaction(
-        objectId=target.id,
-        tableName="component",
-        operation="insert",
-        changes=f"Component created with Name: {target.name},"
-        + " Brand: {target.brand}, Price: {target.price}",
-        timestamp=datetime.now(),
-    )
-    db.session.add(transaction)
-
-
 @event.listens_for(Component, "after_update")
-def after_component_update(mapper, connection, target):
-    state = db.inspect(target)
-    changes = {}
-    for attr in state.attrs:
-        hist = state.get_history(attr.key, True)
-        if hist.has_changes():
-            if hist.has_changes():
-                changes[attr.key] = {
-                    "old": hist.deleted[0] if hist.deleted else None,
-                    "new": hist.added[0] if hist.added else None,
-                }
-    if changes:
-        change_description = "; ".join(
-            f'{key} changed from {vals["old"]} to {vals["new"]}'
-            for key, vals in changes.items()
-        )
-        transaction = DatabaseTransaction(
-            objectId=target.id,
-            tableName="component",
-            operation="update",
-            changes=f"Component {change_description}",
-            timestamp=datetime.now(),
-        )
-    db.session.add(transaction)
-
-
 @event.listens_for(Component, "before_delete")
-def before_component_delete(mapper, connection, target):
-    transaction = DatabaseTransaction(
-        objectId=target.id,
-        tableName="component",
-        operation="delete",
-        changes=f"Component ID {target.id} was deleted",
-        timestamp=datetime.utcnow(),
-    )
-    db.session.add(transaction)
+def invalidateComponentCache(mapper, connection, target):
+    readCache.invalidate("component", target.id, object_session(target))
+
+
+registerAudit(
+    Component,
+    tableName="component",
+    insertMessage=lambda target: f"Component created with Name: {target.name},"
+    + f" Brand: {target.brand}, Price: {target.price}",
+    updatePrefix="Component ",
+    deleteMessage=lambda target, componentId: f"Component ID {componentId} was deleted",
+)
@@ -28,13 +28,39 @@ class ProductInventory(db.Model, BaseModel):
     """
 
     __tablename__ = "productInventory"
+    __table_args__ = (
+        db.Index(
+            "ix_productInventory_facility_product",
+            "productionFacilityId",
+            "productId",
+            unique=True,
+        ),
+        # Covers "which facilities hold at least N of a product"
+        db.Index(
+            "ix_productInventory_product_count",
+            "productId",
+            "count",
+            "productionFacilityId",
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    productId = db.Column(db.Integer, db.ForeignKey("products.id", ondelete="CASCADE"))
-    count = db.Column(db.Integer, nullable=False)
-    productionFacilityId = db.Column(
-        db.Integer,
-        db.ForeignKey("productionFacilities.id", ondelete="CASCADE"),
+    # active_history keeps the previous value of stock columns available to the
+    # flush listeners in models/stockRollup.py and models/inventoryMovement.py even
+    # when it was never loaded
+    productId = db.column_property(
+        db.Column(db.Integer, db.ForeignKey("products.id", ondelete="CASCADE")),
+        active_history=True,
+    )
+    count = db.column_property(
+        db.Column(db.Integer, nullable=False), active_history=True
+    )
+    productionFacilityId = db.column_property(
+        db.Column(
+            db.Integer,
+            db.ForeignKey("productionFacilities.id", ondelete="CASCADE"),
+        ),
+        active_history=True,
     )
     lastUpdated = db.Column(db.DateTime, nullable=True, default=datetime.now())
     lastUpdatedByUserId = db.Column(db.Integer, nullable=False)
@@ -60,15 +86,35 @@ class ComponentInventory(db.Model, BaseModel):
     """
 
     __tablename__ = "componentInventory"
+    __table_args__ = (
+        db.Index(
+            "ix_componentInventory_facility_component",
+            "productionFacilityId",
+            "componentId",
+            unique=True,
+        ),
+        db.Index(
+            "ix_componentInventory_component_count",
+            "componentId",
+            "count",
+            "productionFacilityId",
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    componentId = db.Column(
-        db.Integer, db.ForeignKey("components.id", ondelete="CASCADE")
+    componentId = db.column_property(
+        db.Column(db.Integer, db.ForeignKey("components.id", ondelete="CASCADE")),
+        active_history=True,
+    )
+    count = db.column_property(
+        db.Column(db.Integer, nullable=False), active_history=True
     )
-    count = db.Column(db.Integer, nullable=False)
-    productionFacilityId = db.Column(
-        db.Integer,
-        db.ForeignKey("productionFacilities.id", ondelete="CASCADE"),
+    productionFacilityId = db.column_property(
+        db.Column(
+            db.Integer,
+            db.ForeignKey("productionFacilities.id", ondelete="CASCADE"),
+        ),
+        active_history=True,
     )
     lastUpdated = db.Column(db.DateTime, nullable=False, default=datetime.now())
     lastUpdatedByUserId = db.Column(db.Integer, nullable=True)
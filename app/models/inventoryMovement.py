@@ -0,0 +1,215 @@
+"""
+Database models for the inventory movement ledger.
+
+Every change to a facility's product or component count is appended to the
+inventoryMovements table as a delta with its reason and user, so the stock at any
+past time can be reconstructed. The count column of the inventory tables is the
+projection of the ledger: inventory mapper events collect a movement per changed
+row while the session flushes, and an after_flush listener appends them with one
+batched INSERT on the flush's own connection, so the movements commit or roll back
+together with the count they explain.
+
+Inventory snapshots hold every count of one facility as of their takenAt time, so
+the stock as of T is the latest snapshot before T plus the movements since, see
+services/inventoryLedger.py.
+
+Writes that bypass the unit of work (Core bulk inserts, raw SQL) record no
+movements; run `flask ims reconcile-ledger` afterwards.
+"""
+
+from datetime import datetime
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session, object_session
+from extensions import db
+from models.dbUtils import BaseModel
+from models.inventory import ProductInventory, ComponentInventory
+from models.stockRollup import oldValue
+
+pendingMovementsInfoKey = "inventoryMovements"
+movementReasonInfoKey = "inventoryMovementReason"
+
+# inventory model -> (item type, item key)
+movementTargets = {
+    ProductInventory: ("product", "productId"),
+    ComponentInventory: ("component", "componentId"),
+}
+
+
+class InventoryMovement(db.Model, BaseModel):
+    """
+    Represents one change of a facility's count of a product or component.
+
+    Attributes:
+        id (int): The unique identifier for the movement.
+        productionFacilityId (int): The facility whose stock changed.
+        itemType (str): "product" or "component".
+        itemId (int): The product or component ID.
+        delta (int): The change of the count.
+        reason (str): Why it changed: edit, build, reservation or reconcile.
+        userId (int): The user who made the change, if known.
+        createdAt (datetime): When the change was flushed.
+    """
+
+    __tablename__ = "inventoryMovements"
+    __table_args__ = (
+        # Replays of one facility since a snapshot
+        db.Index(
+            "ix_inventoryMovements_facility_time", "productionFacilityId", "createdAt"
+        ),
+        # History of one item
+        db.Index(
+            "ix_inventoryMovements_item",
+            "productionFacilityId",
+            "itemType",
+            "itemId",
+            "createdAt",
+        ),
+    )
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    productionFacilityId = db.Column(db.Integer, nullable=False)
+    itemType = db.Column(db.String(16), nullable=False)
+    itemId = db.Column(db.Integer, nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(32), nullable=False)
+    userId = db.Column(db.Integer, nullable=True)
+    createdAt = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    def __repr__(self):
+        return (
+            f"<InventoryMovement {self.id}: {self.delta:+d} {self.itemType}"
+            f" {self.itemId} at facility {self.productionFacilityId}>"
+        )
+
+
+class InventorySnapshot(db.Model, BaseModel):
+    """
+    Represents the counts of one facility as of a point in time.
+
+    Attributes:
+        id (int): The unique identifier for the snapshot.
+        productionFacilityId (int): The facility.
+        takenAt (datetime): The snapshot holds the movements up to this time.
+        movementCount (int): The movements replayed since the previous snapshot.
+    """
+
+    __tablename__ = "inventorySnapshots"
+    __table_args__ = (
+        db.Index(
+            "ix_inventorySnapshots_facility_time", "productionFacilityId", "takenAt"
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    productionFacilityId = db.Column(db.Integer, nullable=False)
+    takenAt = db.Column(db.DateTime, nullable=False)
+    movementCount = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<InventorySnapshot {self.id}: facility {self.productionFacilityId}>"
+
+
+class InventorySnapshotEntry(db.Model, BaseModel):
+    """
+    Represents one non-zero count within an inventory snapshot.
+
+    Attributes:
+        snapshotId (int): The snapshot.
+        itemType (str): "product" or "component".
+        itemId (int): The product or component ID.
+        count (int): The count as of the snapshot's takenAt.
+    """
+
+    __tablename__ = "inventorySnapshotEntries"
+
+    snapshotId = db.Column(
+        db.Integer,
+        db.ForeignKey("inventorySnapshots.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    itemType = db.Column(db.String(16), primary_key=True)
+    itemId = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<InventorySnapshotEntry {self.itemType} {self.itemId}: {self.count}>"
+
+
+def setMovementReason(session, reason):
+    """
+    Record the movements of the session's current transaction with a reason.
+
+    The reason applies until the transaction commits or rolls back; without one,
+    movements are recorded as edits.
+    """
+    session.info[movementReasonInfoKey] = reason
+
+
+def addMovement(target, facilityId, itemId, delta):
+    if itemId is None or facilityId is None or not delta:
+        return
+    itemType, _ = movementTargets[type(target)]
+    session = object_session(target)
+    session.info.setdefault(pendingMovementsInfoKey, []).append(
+        {
+            "productionFacilityId": facilityId,
+            "itemType": itemType,
+            "itemId": itemId,
+            "delta": delta,
+            "userId": target.lastUpdatedByUserId,
+        }
+    )
+
+
+def afterInventoryInsert(mapper, connection, target):
+    _, itemKey = movementTargets[type(target)]
+    addMovement(
+        target, target.productionFacilityId, getattr(target, itemKey), target.count
+    )
+
+
+def afterInventoryUpdate(mapper, connection, target):
+    _, itemKey = movementTargets[type(target)]
+    state = db.inspect(target)
+    oldItem = oldValue(state, itemKey)
+    oldFacility = oldValue(state, "productionFacilityId")
+    newItem, newFacility = getattr(target, itemKey), target.productionFacilityId
+    oldCount = oldValue(state, "count") or 0
+    if (oldItem, oldFacility) == (newItem, newFacility):
+        addMovement(target, newFacility, newItem, (target.count or 0) - oldCount)
+        return
+    addMovement(target, oldFacility, oldItem, -oldCount)
+    addMovement(target, newFacility, newItem, target.count or 0)
+
+
+def beforeInventoryDelete(mapper, connection, target):
+    _, itemKey = movementTargets[type(target)]
+    addMovement(
+        target, target.productionFacilityId, getattr(target, itemKey), -target.count
+    )
+
+
+for inventoryModel in movementTargets:
+    event.listen(inventoryModel, "after_insert", afterInventoryInsert)
+    event.listen(inventoryModel, "after_update", afterInventoryUpdate)
+    event.listen(inventoryModel, "before_delete", beforeInventoryDelete)
+
+
+@event.listens_for(Session, "after_flush")
+def afterFlushAppendMovements(session, flushContext):
+    pending = session.info.pop(pendingMovementsInfoKey, None)
+    if not pending:
+        return
+    reason = session.info.get(movementReasonInfoKey, "edit")
+    now = datetime.now()
+    for movement in pending:
+        movement["reason"] = reason
+        movement["createdAt"] = now
+    session.connection().execute(insert(InventoryMovement), pending)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def afterTransactionForgetMovements(session):
+    session.info.pop(pendingMovementsInfoKey, None)
+    session.info.pop(movementReasonInfoKey, None)
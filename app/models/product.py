@@ -7,10 +7,10 @@ insert and update operations.
 """
 
 from sqlalchemy import event
-from extensions import db
+from sqlalchemy.orm import object_session
+from extensions import db, readCache
 from models.dbUtils import BaseModel
-from models.transaction import DatabaseTransaction
-from datetime import datetime
+from models.auditDiff import loadedValues, registerAudit
 
 
 class Product(db.Model, BaseModel):
@@ -54,93 +54,33 @@ class Product(db.Model, BaseModel):
 
 
 @event.listens_for(Product, "after_insert")
-def after_product_insert(mapper, connection, target):
-    """
-    Event listener function triggered after a product is inserted into the database.
-
-    Args:
-        mapper: The mapper object.
-        connection: The connection object.
-        target: The newly inserted product object.
-    """
-    changes_description = (
-        f"Product inserted with "
-        f"Model: {target.model}, Category: {target.category}, Price: {target.price}"
-    )
-    transaction = DatabaseTransaction(
-        objectId=target.id,
-        tableName="product",
-        operation="insert",
-        changes=changes_description,
-        timestamp=datetime.now(),
-    )
-    db.session.add(transaction)
-
-
 @event.listens_for(Product, "after_update")
-def after_product_update(mapper, connection, target):
+@event.listens_for(Product, "before_delete")
+def invalidateProductCache(mapper, connection, target):
     """
-    Event listener function triggered after a product is updated in the database.
+    Event listener function dropping a changed product from the read cache.
 
     Args:
         mapper: The mapper object.
         connection: The connection object.
-        target: The updated product object.
+        target: The inserted, updated or deleted product object.
     """
-    state = db.inspect(target)
-    changes = {}
+    readCache.invalidate("product", target.id, object_session(target))
 
-    for attr in state.attrs:
-        # The key property on this object gives us the name of the attribute as a string (for example, 'name').
-        # True: this is a boolean flag that tells get_history() whether or not to return the 'unchanged' portion of the history.
-        # hist: The History object contains three lists representing the changes to the attribute: added, unchanged, and deleted.
-        hist = state.get_history(attr.key, True)
-        if hist.has_changes():
-            if hist.has_changes():
-                changes[attr.key] = {
-                    # hist.deleted: This list contains the value(s) that were present before the update operation and have been replaced or deleted
-                    # hist.added: This list contains the new value(s) that have been set during the update operation
-                    "old": hist.deleted[0] if hist.deleted else None,
-                    "new": hist.added[0] if hist.added else None,
-                }
 
-    if changes:
-        change_description = "; ".join(
-            f'{key} changed from {vals["old"]} to {vals["new"]}'
-            for key, vals in changes.items()
-        )
-        transaction = DatabaseTransaction(
-            objectId=target.id,
-            tableName="product",
-            operation="update",
-            changes=change_description,
-            timestamp=datetime.now(),
-        )
-    db.session.add(transaction)
-
-
-@event.listens_for(Product, "before_delete")
-def beforeProductDelete(mapper, connection, target):
-    """
-    Event listener function triggered before a product is deleted from the database.
-
-    Args:
-        mapper: The mapper object.
-        connection: The connection object.
-        target: The product object to be deleted.
-    """
-    state = db.inspect(target)
-    change_description = []
-    for attr in state.attrs:
-        value = getattr(target, attr.key)
-        if value is not None:
-            change_description.append(f"{attr.key} was '{value}'")
-        change_description_str = "; ".join(change_description)
-    transaction = DatabaseTransaction(
-        objectId=target.id,
-        tableName="product",
-        operation="delete",
-        changes=f"Deleted product {change_description_str}",
-        timestamp=datetime.now(),
-    )
-    db.session.add(transaction)
+registerAudit(
+    Product,
+    tableName="product",
+    insertMessage=lambda target: (
+        f"Product inserted with "
+        f"Model: {target.model}, Category: {target.category}, Price: {target.price}"
+    ),
+    # Only columns already loaded are described, so deleting a product never
+    # loads its specs or notes
+    deleteMessage=lambda target, productId: "Deleted product "
+    + "; ".join(
+        f"{key} was '{value}'"
+        for key, value in loadedValues(target)
+        if value is not None
+    ),
+)
@@ -7,10 +7,10 @@ database transactions after insert and update operations.
 """
 
 from sqlalchemy import event
-from extensions import db
+from sqlalchemy.orm import object_session
+from extensions import db, readCache
 from models.dbUtils import BaseModel
-from models.transaction import DatabaseTransaction
-from datetime import datetime
+from models.auditDiff import registerAudit
 
 
 class ProductionFacility(db.Model, BaseModel):
@@ -62,61 +62,25 @@ class ProductionFacility(db.Model, BaseModel):
 
 
 @event.listens_for(ProductionFacility, "after_insert")
-def after_productionFacility_insert(mapper, connection, target):
-    transaction = DatabaseTransaction(
-        objectId=target.id,
-        tableName="productionFacility",
-        operation="insert",
-        changes=f"New facility created with Name: {target.name},"
-        + f" Country: {target.country}, ContactInfo: {target.contactInfo}",
-        timestamp=datetime.now(),
-    )
-    db.session.add(transaction)
-
-
 @event.listens_for(ProductionFacility, "after_update")
-def after_productionFacility_update(mapper, connection, target):
-    state = db.inspect(target)
-    changes = {}
-    for attr in state.attrs:
-        hist = state.get_history(attr.key, True)
-        if hist.has_changes():
-            if hist.has_changes():
-                changes[attr.key] = {
-                    "old": hist.deleted[0] if hist.deleted else None,
-                    "new": hist.added[0] if hist.added else None,
-                }
-    if changes:
-        change_description = "; ".join(
-            f'{key} changed from {vals["old"]} to {vals["new"]}'
-            for key, vals in changes.items()
-        )
-        transaction = DatabaseTransaction(
-            objectId=target.id,
-            tableName="productionFacility",
-            operation="update",
-            changes=f"Facility {change_description}",
-            timestamp=datetime.now(),
-        )
-    db.session.add(transaction)
-
-
 @event.listens_for(ProductionFacility, "before_delete")
-def before_productionFacility_delete(mapper, connection, target):
+def invalidateProductionFacilityCache(mapper, connection, target):
     """
-    Event listener function triggered after a production facility is updated.
+    Event listener function dropping a changed production facility from the read cache.
 
     Args:
         mapper: The mapper object managing state.
-        connection: The database connection for the update operation.
-        target: The updated production facility object.
+        connection: The database connection for the operation.
+        target: The inserted, updated or deleted production facility object.
     """
+    readCache.invalidate("productionFacility", target.id, object_session(target))
+
 
-    transaction = DatabaseTransaction(
-        objectId=target.id,
-        tableName="productionFacility",
-        operation="delete",
-        changes=f"Facility ID {target.id} was deleted",
-        timestamp=datetime.utcnow(),
-    )
-    db.session.add(transaction)
+registerAudit(
+    ProductionFacility,
+    tableName="productionFacility",
+    insertMessage=lambda target: f"New facility created with Name: {target.name},"
+    + f" Country: {target.country}, ContactInfo: {target.contactInfo}",
+    updatePrefix="Facility ",
+    deleteMessage=lambda target, facilityId: f"Facility ID {facilityId} was deleted",
+)
@@ -3,13 +3,15 @@ Database model for production processes.
 
 This module defines the database model for production processes. Each 
 process take a certain amount of time and transforms an amount of components 
-into a product.
+into a product. The components a process consumes are its ComponentsRequired
+rows; a product made by several processes can be built by any one of them.
+services/mrpEngine.py computes the buildable quantities from these tables.
 """
 
-from sqlalchemy import event
-from extensions import db
+from extensions import db, readCache
 from models.dbUtils import BaseModel
-from models.transaction import DatabaseTransaction
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
 from datetime import datetime
 
 
@@ -17,16 +19,12 @@ class ProductionProcess(db.Model, BaseModel):
     __tablename__ = "productionProcesses"
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    requires = db.Column(
-        db.Integer,
-        db.ForeignKey("ComponentRequirement.id", ondelete="CASCADE"),
-    )
     product = db.Column(
         db.Integer,
         db.ForeignKey("products.id", ondelete="CASCADE"),
     )
     minutes = db.Column(db.Integer, nullable=False)
-    lastUpdated = db.Column(db.DateTime, nullable=False, default=datetime.now())
+    lastUpdated = db.Column(db.DateTime, nullable=False, default=datetime.now)
     lastUpdatedByUserId = db.Column(db.Integer, nullable=True)
 
     def __repr__(self):
@@ -35,6 +33,7 @@ class ProductionProcess(db.Model, BaseModel):
 
 class ComponentsRequired(db.Model, BaseModel):
     __tablename__ = "ComponentsRequired"
+    __table_args__ = (db.Index("ix_ComponentsRequired_process", "processId"),)
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     componentId = db.Column(
@@ -50,3 +49,14 @@ class ComponentsRequired(db.Model, BaseModel):
         return (
             f"{self.count} {self.componentId} components for process {self.processId}"
         )
+
+
+@event.listens_for(ProductionProcess, "after_insert")
+@event.listens_for(ProductionProcess, "after_update")
+@event.listens_for(ProductionProcess, "before_delete")
+@event.listens_for(ComponentsRequired, "after_insert")
+@event.listens_for(ComponentsRequired, "after_update")
+@event.listens_for(ComponentsRequired, "before_delete")
+def invalidateBillOfMaterials(mapper, connection, target):
+    readCache.invalidate("billOfMaterials", "all", object_session(target))
+    readCache.invalidate("buildRecipes", "all", object_session(target))
@@ -0,0 +1,131 @@
+"""
+Database models for production schedules.
+
+A production schedule assigns a queue of build orders to the production lines of
+the operating facilities. Each order is one ScheduledOrder row holding the
+facility, line, process and start and end minutes it was given, or the reason it
+could not be scheduled. services/productionScheduler.py computes the schedules
+and updates them one order at a time; the version column changes with every
+update, so the workers know when their in-memory copy is out of date. The
+ScheduleStock rows keep the component stock the schedule was planned with, so
+every worker reloads it against the same stock.
+"""
+
+from datetime import datetime
+from extensions import db
+from models.dbUtils import BaseModel
+
+
+class ProductionSchedule(db.Model, BaseModel):
+    """
+    Represents a production schedule.
+
+    Attributes:
+        id (int): The unique identifier for the schedule.
+        startAt (datetime): The time minute 0 of the schedule stands for.
+        lineCounts (dict): Production lines per facility ID, overriding the
+            SCHEDULER_LINES_PER_FACILITY default.
+        makespanMinutes (int): The end of the last scheduled order.
+        orderCount (int): The number of orders, scheduled or not.
+        version (int): Incremented by every update of the schedule.
+    """
+
+    __tablename__ = "productionSchedules"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    startAt = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    lineCounts = db.Column(db.JSON, nullable=False, default=dict)
+    makespanMinutes = db.Column(db.Integer, nullable=False, default=0)
+    orderCount = db.Column(db.Integer, nullable=False, default=0)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    lastUpdated = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    lastUpdatedByUserId = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return f"<ProductionSchedule {self.id}: {self.orderCount} orders>"
+
+
+class ScheduledOrder(db.Model, BaseModel):
+    """
+    Represents a build order within a production schedule.
+
+    Attributes:
+        orderId (int): The caller's order identifier, unique within the schedule.
+        productId (int): The product to build.
+        quantity (int): Units to build.
+        priority (int): Lower values are scheduled first.
+        pinnedFacilityId (int): The facility the order must be built at, if any.
+        facilityId (int): The facility it is scheduled at; None if unscheduled.
+        line (int): The production line within the facility, from 0.
+        processId (int): The production process used.
+        startMinute (int): Start, in minutes after the schedule's startAt.
+        endMinute (int): End, in minutes after the schedule's startAt.
+        reason (str): Why the order is unscheduled: noProcess, noStock or
+            facilityUnavailable.
+    """
+
+    __tablename__ = "scheduledOrders"
+    __table_args__ = (
+        db.Index(
+            "ix_scheduledOrders_schedule_order", "scheduleId", "orderId", unique=True
+        ),
+        db.Index(
+            "ix_scheduledOrders_schedule_facility",
+            "scheduleId",
+            "facilityId",
+            "line",
+            "startMinute",
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    scheduleId = db.Column(
+        db.Integer,
+        db.ForeignKey("productionSchedules.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    orderId = db.Column(db.Integer, nullable=False)
+    productId = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    pinnedFacilityId = db.Column(db.Integer, nullable=True)
+    facilityId = db.Column(db.Integer, nullable=True)
+    line = db.Column(db.Integer, nullable=True)
+    processId = db.Column(db.Integer, nullable=True)
+    startMinute = db.Column(db.Integer, nullable=True)
+    endMinute = db.Column(db.Integer, nullable=True)
+    reason = db.Column(db.String(32), nullable=True)
+
+    def __repr__(self):
+        return (
+            f"order {self.orderId} of schedule {self.scheduleId} at {self.facilityId}"
+        )
+
+
+class ScheduleStock(db.Model, BaseModel):
+    """
+    Represents the stock of a component at a facility when a schedule was created.
+
+    Attributes:
+        scheduleId (int): The schedule.
+        productionFacilityId (int): The facility.
+        componentId (int): The component.
+        count (int): The units in stock, before any order of the schedule.
+    """
+
+    __tablename__ = "scheduleStock"
+
+    scheduleId = db.Column(
+        db.Integer,
+        db.ForeignKey("productionSchedules.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    productionFacilityId = db.Column(db.Integer, primary_key=True)
+    componentId = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"stock of component {self.componentId} at {self.productionFacilityId}"
+            f" for schedule {self.scheduleId}"
+        )
@@ -0,0 +1,65 @@
+"""
+Database model for inventory reservations.
+
+A reservation is a soft allocation: a hold on some of a facility's product or
+component stock that makes it unavailable to other orders without changing the
+inventory row. Held reservations lapse at expiresAt; confirmed ones are kept until
+services/reservations.py converts them into a real decrement of the inventory
+count, many at a time. Converted, released and expired reservations are deleted.
+"""
+
+from datetime import datetime
+from extensions import db
+from models.dbUtils import BaseModel
+
+
+class InventoryReservation(db.Model, BaseModel):
+    """
+    Represents a hold on a facility's stock of a product or component.
+
+    Attributes:
+        id (int): The unique identifier for the reservation.
+        itemType (str): "product" or "component".
+        itemId (int): The product or component ID.
+        productionFacilityId (int): The facility whose stock is held.
+        quantity (int): The number of units held.
+        status (str): "held" until confirmed, then "confirmed" until converted.
+        expiresAt (datetime): When a held reservation lapses.
+        createdAt (datetime): When the reservation was placed.
+        createdByUserId (int): The user who placed it.
+    """
+
+    __tablename__ = "inventoryReservations"
+    __table_args__ = (
+        # Covers the held quantity of a facility's item
+        db.Index(
+            "ix_inventoryReservations_item",
+            "productionFacilityId",
+            "itemType",
+            "itemId",
+            "status",
+            "expiresAt",
+            "quantity",
+        ),
+        db.Index("ix_inventoryReservations_status_expires", "status", "expiresAt"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    itemType = db.Column(db.String(16), nullable=False)
+    itemId = db.Column(db.Integer, nullable=False)
+    productionFacilityId = db.Column(
+        db.Integer,
+        db.ForeignKey("productionFacilities.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default="held")
+    expiresAt = db.Column(db.DateTime, nullable=False)
+    createdAt = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    createdByUserId = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return (
+            f"<InventoryReservation {self.id}: {self.quantity} {self.itemType}"
+            f" {self.itemId} at facility {self.productionFacilityId}>"
+        )
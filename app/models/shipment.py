@@ -1,5 +1,11 @@
 """
 This section store the orders' shipment information. Users can create the shipment orders
+
+A shipment asks for a quantity of a product to be delivered to its location. It
+stays "pending" until services/shipmentPlanner.py decides which facilities fulfil
+it: each ShipmentAllocation holds the units one facility sends, and the stock is
+kept for the shipment by a confirmed reservation. A shipment whose whole quantity
+is allocated becomes "planned".
 """
 
 from sqlalchemy import event
@@ -21,6 +27,52 @@ class shipment(db.Model, BaseModel):
     contactInfo = db.Column(db.String(256), nullable=True)
     longitude = db.Column(db.Float, nullable=True)
     latitude = db.Column(db.Float, nullable=True)
+    productId = db.Column(
+        db.Integer, db.ForeignKey("products.id", ondelete="CASCADE"), nullable=True
+    )
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    status = db.Column(db.String(16), nullable=False, default="pending", index=True)
+    createdAt = db.Column(db.DateTime, nullable=False, default=datetime.now)
 
     def __repr__(self):
         return f"<shipment {self.id}: {self.name}>"
+
+
+class ShipmentAllocation(db.Model, BaseModel):
+    """
+    Represents the units of a shipment one facility sends.
+
+    Attributes:
+        id (int): The unique identifier for the allocation.
+        shipmentId (int): The shipment.
+        productionFacilityId (int): The facility the units are sent from.
+        quantity (int): The number of units.
+        distanceKm (float): The great-circle distance to the shipment.
+        createdAt (datetime): When the plan was applied.
+        createdByUserId (int): The user who applied it.
+    """
+
+    __tablename__ = "shipmentAllocations"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    shipmentId = db.Column(
+        db.Integer,
+        db.ForeignKey("shipment.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    productionFacilityId = db.Column(
+        db.Integer,
+        db.ForeignKey("productionFacilities.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    quantity = db.Column(db.Integer, nullable=False)
+    distanceKm = db.Column(db.Float, nullable=False)
+    createdAt = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    createdByUserId = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return (
+            f"<ShipmentAllocation {self.quantity} of shipment {self.shipmentId}"
+            f" from facility {self.productionFacilityId}>"
+        )
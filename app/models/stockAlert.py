@@ -0,0 +1,401 @@
+"""
+Database models for low-stock alerting.
+
+A StockThreshold is the reorder point of one product or component at one facility;
+a StockAlert is raised when the facility's count of the item falls to or below it.
+Alerts are evaluated incrementally: inventory and threshold mapper events collect
+the (facility, type, item) keys changed while the session flushes, and a
+before_commit listener evaluates only those keys, once per transaction however
+many flushes it took, on the transaction's own connection, so alerts commit
+together with the change that raised them. A transaction touching no item with a
+threshold costs one indexed lookup.
+
+Alerts are de-duplicated and rate-limited per key. While an alert is open or
+acknowledged, further drops only refresh its count; once the stock is back above
+the reorder point it is resolved. A key that runs low again within
+STOCK_ALERT_COOLDOWN_SECONDS of its last alert being resolved reopens that alert
+instead of raising a new one, so stock hovering around its reorder point does not
+flood the alert list.
+
+Writes that bypass the unit of work (Core bulk inserts, raw SQL) raise no alerts;
+`flask ims reconcile-alerts` re-evaluates every threshold periodically to catch
+them, see services/stockAlerts.py.
+"""
+
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import bindparam, event, func, insert, or_, tuple_, update
+from sqlalchemy.orm import Session, object_session
+from extensions import db
+from models.dbUtils import BaseModel
+from models.inventory import ProductInventory, ComponentInventory
+from models.stockRollup import oldValue
+from services.metrics import metrics
+
+pendingKeysInfoKey = "stockAlertKeys"
+activeStatuses = ("open", "acknowledged")
+
+# inventory model -> (item type, item key)
+alertTargets = {
+    ProductInventory: ("product", "productId"),
+    ComponentInventory: ("component", "componentId"),
+}
+
+evaluatedKeys = metrics.counter(
+    "ims_stock_alert_keys_evaluated_total",
+    "Facility items evaluated for low stock, by source.",
+    ("source",),
+)
+alertOutcomes = metrics.counter(
+    "ims_stock_alerts_total",
+    "Low-stock alerts fired, suppressed by the cooldown, updated or resolved.",
+    ("outcome", "source"),
+)
+
+
+class StockThreshold(db.Model, BaseModel):
+    """
+    Represents the reorder point of an item at a facility.
+
+    Attributes:
+        productionFacilityId (int): The facility.
+        itemType (str): "product" or "component".
+        itemId (int): The product or component ID.
+        reorderPoint (int): An alert is raised when the count is at or below it.
+        updatedAt (datetime): When the reorder point was last set.
+        updatedByUserId (int): The user who last set it.
+    """
+
+    __tablename__ = "stockThresholds"
+
+    productionFacilityId = db.Column(
+        db.Integer,
+        db.ForeignKey("productionFacilities.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    itemType = db.Column(db.String(16), primary_key=True)
+    itemId = db.Column(db.Integer, primary_key=True)
+    reorderPoint = db.Column(db.Integer, nullable=False)
+    updatedAt = db.Column(
+        db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now
+    )
+    updatedByUserId = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return (
+            f"<StockThreshold {self.itemType} {self.itemId} at facility"
+            f" {self.productionFacilityId}: {self.reorderPoint}>"
+        )
+
+
+class StockAlert(db.Model, BaseModel):
+    """
+    Represents a low-stock alert of an item at a facility.
+
+    Attributes:
+        id (int): The unique identifier for the alert.
+        productionFacilityId (int): The facility.
+        itemType (str): "product" or "component".
+        itemId (int): The product or component ID.
+        count (int): The latest count seen while the alert was open.
+        reorderPoint (int): The reorder point the count fell to.
+        status (str): "open", "acknowledged" or "resolved".
+        triggerCount (int): How often the item ran low, counting reopenings.
+        triggeredAt (datetime): When the alert was raised.
+        lastTriggeredAt (datetime): When it was last raised or reopened.
+        resolvedAt (datetime): When the stock was last back above the reorder point.
+        acknowledgedAt (datetime): When a user acknowledged the alert.
+        acknowledgedByUserId (int): The user who acknowledged it.
+    """
+
+    __tablename__ = "stockAlerts"
+    __table_args__ = (
+        # The alerts of the keys being evaluated
+        db.Index(
+            "ix_stockAlerts_item",
+            "productionFacilityId",
+            "itemType",
+            "itemId",
+            "status",
+        ),
+        db.Index("ix_stockAlerts_status", "status", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    productionFacilityId = db.Column(
+        db.Integer,
+        db.ForeignKey("productionFacilities.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    itemType = db.Column(db.String(16), nullable=False)
+    itemId = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    reorderPoint = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default="open")
+    triggerCount = db.Column(db.Integer, nullable=False, default=1)
+    triggeredAt = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    lastTriggeredAt = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    resolvedAt = db.Column(db.DateTime, nullable=True)
+    acknowledgedAt = db.Column(db.DateTime, nullable=True)
+    acknowledgedByUserId = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return (
+            f"<StockAlert {self.id}: {self.itemType} {self.itemId} at facility"
+            f" {self.productionFacilityId} {self.status}>"
+        )
+
+
+def addKey(target, facilityId, itemType, itemId):
+    if facilityId is None or itemId is None:
+        return
+    session = object_session(target)
+    session.info.setdefault(pendingKeysInfoKey, set()).add(
+        (facilityId, itemType, itemId)
+    )
+
+
+def afterInventoryInsert(mapper, connection, target):
+    itemType, itemKey = alertTargets[type(target)]
+    addKey(target, target.productionFacilityId, itemType, getattr(target, itemKey))
+
+
+def afterInventoryUpdate(mapper, connection, target):
+    itemType, itemKey = alertTargets[type(target)]
+    state = db.inspect(target)
+    if not any(
+        state.attrs[key].history.has_changes()
+        for key in ("count", itemKey, "productionFacilityId")
+    ):
+        return
+    addKey(
+        target,
+        oldValue(state, "productionFacilityId"),
+        itemType,
+        oldValue(state, itemKey),
+    )
+    addKey(target, target.productionFacilityId, itemType, getattr(target, itemKey))
+
+
+def afterInventoryDelete(mapper, connection, target):
+    itemType, itemKey = alertTargets[type(target)]
+    addKey(target, target.productionFacilityId, itemType, getattr(target, itemKey))
+
+
+def afterThresholdChange(mapper, connection, target):
+    addKey(target, target.productionFacilityId, target.itemType, target.itemId)
+
+
+def afterThresholdDelete(mapper, connection, target):
+    resolveAlerts(
+        connection,
+        db.and_(
+            StockAlert.productionFacilityId == target.productionFacilityId,
+            StockAlert.itemType == target.itemType,
+            StockAlert.itemId == target.itemId,
+        ),
+    )
+
+
+for inventoryModel in alertTargets:
+    event.listen(inventoryModel, "after_insert", afterInventoryInsert)
+    event.listen(inventoryModel, "after_update", afterInventoryUpdate)
+    event.listen(inventoryModel, "after_delete", afterInventoryDelete)
+event.listen(StockThreshold, "after_insert", afterThresholdChange)
+event.listen(StockThreshold, "after_update", afterThresholdChange)
+event.listen(StockThreshold, "after_delete", afterThresholdDelete)
+
+
+def resolveAlerts(connection, condition, source="event"):
+    """Resolve the open and acknowledged alerts matching a condition."""
+    resolved = connection.execute(
+        update(StockAlert)
+        .where(StockAlert.status.in_(activeStatuses), condition)
+        .values(status="resolved", resolvedAt=datetime.now())
+    ).rowcount
+    if resolved:
+        alertOutcomes.inc(resolved, labels=("resolved", source))
+    return resolved
+
+
+def loadCounts(connection, keys):
+    """Return the count of each (facility, type, item) key; unstocked keys are 0."""
+    counts = dict.fromkeys(keys, 0)
+    for model, (itemType, itemKey) in alertTargets.items():
+        pairs = sorted(
+            (facilityId, itemId)
+            for facilityId, keyType, itemId in keys
+            if keyType == itemType
+        )
+        if not pairs:
+            continue
+        itemColumn = getattr(model, itemKey)
+        for facilityId, itemId, count in connection.execute(
+            db.select(model.productionFacilityId, itemColumn, func.sum(model.count))
+            .where(tuple_(model.productionFacilityId, itemColumn).in_(pairs))
+            .group_by(model.productionFacilityId, itemColumn)
+        ):
+            counts[facilityId, itemType, itemId] = count or 0
+    return counts
+
+
+def evaluateKeys(connection, keys, source="event"):
+    """
+    Raise, refresh, reopen or resolve the alerts of some facility items.
+
+    Args:
+        connection: The connection of the transaction to write the alerts in.
+        keys: The (facility ID, item type, item ID) keys to evaluate; keys
+            without a threshold are skipped.
+        source (str): "event" or "reconcile", for the metrics.
+
+    Returns:
+        dict: The number of alerts "fired", "suppressed" (reopened within the
+            cooldown), "updated" and "resolved".
+    """
+    outcomes = dict.fromkeys(("fired", "suppressed", "updated", "resolved"), 0)
+    keys = sorted(keys)
+    if not keys:
+        return outcomes
+    evaluatedKeys.inc(len(keys), labels=(source,))
+    threshold = StockThreshold.__table__
+    reorderPoints = {
+        (facilityId, itemType, itemId): reorderPoint
+        for facilityId, itemType, itemId, reorderPoint in connection.execute(
+            db.select(
+                threshold.c.productionFacilityId,
+                threshold.c.itemType,
+                threshold.c.itemId,
+                threshold.c.reorderPoint,
+            ).where(
+                tuple_(
+                    threshold.c.productionFacilityId,
+                    threshold.c.itemType,
+                    threshold.c.itemId,
+                ).in_(keys)
+            )
+        )
+    }
+    if not reorderPoints:
+        return outcomes
+    keys = sorted(reorderPoints)
+    now = datetime.now()
+    cooldown = timedelta(seconds=current_app.config["STOCK_ALERT_COOLDOWN_SECONDS"])
+    alert = StockAlert.__table__
+    active, recent = {}, {}
+    for row in connection.execute(
+        db.select(alert)
+        .where(
+            tuple_(alert.c.productionFacilityId, alert.c.itemType, alert.c.itemId).in_(
+                keys
+            ),
+            or_(
+                alert.c.status.in_(activeStatuses),
+                alert.c.resolvedAt >= now - cooldown,
+            ),
+        )
+        .order_by(alert.c.id)
+    ):
+        key = (row.productionFacilityId, row.itemType, row.itemId)
+        if row.status in activeStatuses:
+            active.setdefault(key, []).append(row)
+        else:
+            recent[key] = row
+
+    counts = loadCounts(connection, keys)
+    inserts, updates = [], []
+
+    def change(row, **values):
+        updates.append(
+            {
+                "alertId": row.id,
+                "newCount": values.get("count", row.count),
+                "newReorderPoint": values.get("reorderPoint", row.reorderPoint),
+                "newStatus": values.get("status", row.status),
+                "newTriggerCount": values.get("triggerCount", row.triggerCount),
+                "newLastTriggeredAt": values.get(
+                    "lastTriggeredAt", row.lastTriggeredAt
+                ),
+                "newResolvedAt": values.get("resolvedAt", row.resolvedAt),
+            }
+        )
+
+    for key in keys:
+        reorderPoint, count = reorderPoints[key], counts[key]
+        rows = active.get(key, [])
+        if count > reorderPoint:
+            for row in rows:
+                change(row, count=count, status="resolved", resolvedAt=now)
+                outcomes["resolved"] += 1
+            continue
+        if rows:
+            # Concurrent transactions may both have raised one; keep the oldest
+            for duplicate in rows[1:]:
+                change(duplicate, status="resolved", resolvedAt=now)
+                outcomes["resolved"] += 1
+            if (rows[0].count, rows[0].reorderPoint) != (count, reorderPoint):
+                change(rows[0], count=count, reorderPoint=reorderPoint)
+                outcomes["updated"] += 1
+        elif key in recent:
+            change(
+                recent[key],
+                count=count,
+                reorderPoint=reorderPoint,
+                status="open",
+                triggerCount=recent[key].triggerCount + 1,
+                lastTriggeredAt=now,
+                resolvedAt=None,
+            )
+            outcomes["suppressed"] += 1
+        else:
+            facilityId, itemType, itemId = key
+            inserts.append(
+                {
+                    "productionFacilityId": facilityId,
+                    "itemType": itemType,
+                    "itemId": itemId,
+                    "count": count,
+                    "reorderPoint": reorderPoint,
+                    "status": "open",
+                    "triggerCount": 1,
+                    "triggeredAt": now,
+                    "lastTriggeredAt": now,
+                }
+            )
+            outcomes["fired"] += 1
+
+    if inserts:
+        connection.execute(insert(StockAlert), inserts)
+    if updates:
+        connection.execute(
+            update(alert)
+            .where(alert.c.id == bindparam("alertId"))
+            .values(
+                count=bindparam("newCount"),
+                reorderPoint=bindparam("newReorderPoint"),
+                status=bindparam("newStatus"),
+                triggerCount=bindparam("newTriggerCount"),
+                lastTriggeredAt=bindparam("newLastTriggeredAt"),
+                resolvedAt=bindparam("newResolvedAt"),
+            ),
+            updates,
+        )
+    for outcome, count in outcomes.items():
+        if count:
+            alertOutcomes.inc(count, labels=(outcome, source))
+    return outcomes
+
+
+@event.listens_for(Session, "before_commit")
+def beforeCommitEvaluateAlerts(session):
+    # before_commit runs ahead of the commit's own flush
+    session.flush()
+    keys = session.info.pop(pendingKeysInfoKey, None)
+    if not keys:
+        return
+    evaluateKeys(session.connection(), keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def afterRollbackDiscardAlertKeys(session):
+    session.info.pop(pendingKeysInfoKey, None)
@@ -0,0 +1,270 @@
+"""
+Database models for company-wide stock rollups.
+
+This module defines one rollup row per product and per component holding the total
+count across every production facility and the number of facilities that stock it.
+The rows are maintained incrementally: inventory mapper events collect count deltas
+while the session flushes, and an after_flush listener applies them as one batched
+upsert on the flush's own connection, so rollups commit or roll back together with
+the inventory change.
+
+Writes that bypass the unit of work (Core bulk inserts, raw SQL) do not update the
+rollups; run `flask ims rebuild-rollups` afterwards.
+"""
+
+from sqlalchemy import event, insert
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session, object_session
+from extensions import db
+from models.dbUtils import BaseModel
+from models.inventory import ProductInventory, ComponentInventory
+
+pendingDeltasInfoKey = "stockRollupDeltas"
+
+
+class ProductStockRollup(db.Model, BaseModel):
+    """
+    Represents the company-wide stock of a product.
+
+    Attributes:
+        productId (int): The product this rollup belongs to.
+        totalCount (int): The sum of the product's count over every facility.
+        facilityCount (int): The number of facilities holding a positive count.
+    """
+
+    __tablename__ = "productStockRollup"
+
+    productId = db.Column(
+        db.Integer, db.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True
+    )
+    totalCount = db.Column(db.Integer, nullable=False, default=0)
+    facilityCount = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ProductStockRollup {self.productId}: {self.totalCount}>"
+
+
+class ComponentStockRollup(db.Model, BaseModel):
+    """
+    Represents the company-wide stock of a component.
+
+    Attributes:
+        componentId (int): The component this rollup belongs to.
+        totalCount (int): The sum of the component's count over every facility.
+        facilityCount (int): The number of facilities holding a positive count.
+    """
+
+    __tablename__ = "componentStockRollup"
+
+    componentId = db.Column(
+        db.Integer, db.ForeignKey("components.id", ondelete="CASCADE"), primary_key=True
+    )
+    totalCount = db.Column(db.Integer, nullable=False, default=0)
+    facilityCount = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ComponentStockRollup {self.componentId}: {self.totalCount}>"
+
+
+# inventory model -> (rollup model, item key attribute)
+rollupTargets = {
+    ProductInventory: (ProductStockRollup, "productId"),
+    ComponentInventory: (ComponentStockRollup, "componentId"),
+}
+
+
+def addDelta(target, itemId, count, sign):
+    """
+    Record the rollup delta of one inventory row entering or leaving an item's total.
+
+    Args:
+        target: The inventory row being flushed.
+        itemId (int): The product or component ID the row counts towards.
+        count (int): The row's count.
+        sign (int): 1 when the row is added to the total, -1 when it is removed.
+    """
+    if itemId is None or count is None:
+        return
+    session = object_session(target)
+    rollupModel, _ = rollupTargets[type(target)]
+    deltas = session.info.setdefault(pendingDeltasInfoKey, {}).setdefault(
+        rollupModel, {}
+    )
+    total, facilities = deltas.get(itemId, (0, 0))
+    deltas[itemId] = (total + sign * count, facilities + sign * (1 if count > 0 else 0))
+
+
+def oldValue(state, key):
+    """Return the value an attribute had before the flush."""
+    # count and the item keys use active_history, so a replaced value is always
+    # recorded in history.deleted
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.obj(), key)
+
+
+def afterInventoryInsert(mapper, connection, target):
+    _, itemKey = rollupTargets[type(target)]
+    addDelta(target, getattr(target, itemKey), target.count, 1)
+
+
+def afterInventoryUpdate(mapper, connection, target):
+    _, itemKey = rollupTargets[type(target)]
+    state = db.inspect(target)
+    if not (
+        state.attrs.count.history.has_changes()
+        or state.attrs[itemKey].history.has_changes()
+    ):
+        return
+    addDelta(target, oldValue(state, itemKey), oldValue(state, "count"), -1)
+    addDelta(target, getattr(target, itemKey), target.count, 1)
+
+
+def beforeInventoryDelete(mapper, connection, target):
+    _, itemKey = rollupTargets[type(target)]
+    addDelta(target, getattr(target, itemKey), target.count, -1)
+
+
+for inventoryModel in rollupTargets:
+    event.listen(inventoryModel, "after_insert", afterInventoryInsert)
+    event.listen(inventoryModel, "after_update", afterInventoryUpdate)
+    event.listen(inventoryModel, "before_delete", beforeInventoryDelete)
+
+
+# (dialect name, rollup model) -> upsert statement; the dialects' upsert
+# constructs have no cache key, so reusing one at least saves rebuilding it
+upsertStatements = {}
+
+
+def upsertStatement(connection, rollupModel):
+    """
+    Return an INSERT that adds to an existing rollup row instead of failing.
+
+    Returns None for dialects without an upsert clause.
+    """
+    key = (connection.dialect.name, rollupModel)
+    if key not in upsertStatements:
+        upsertStatements[key] = buildUpsertStatement(connection, rollupModel)
+    return upsertStatements[key]
+
+
+def buildUpsertStatement(connection, rollupModel):
+    table = rollupModel.__table__
+    dialect = connection.dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update(
+            totalCount=table.c.totalCount + stmt.inserted.totalCount,
+            facilityCount=table.c.facilityCount + stmt.inserted.facilityCount,
+        )
+    if dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite if dialect == "sqlite" else postgresql).insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.primary_key.columns.values()[0]],
+            set_={
+                "totalCount": table.c.totalCount + stmt.excluded.totalCount,
+                "facilityCount": table.c.facilityCount + stmt.excluded.facilityCount,
+            },
+        )
+    return None
+
+
+def applyDeltas(connection, rollupModel, deltas):
+    """
+    Add per-item deltas to a rollup table.
+
+    Args:
+        connection: The connection of the flushing transaction.
+        rollupModel: ProductStockRollup or ComponentStockRollup.
+        deltas (dict): Item ID -> (total count delta, facility count delta).
+    """
+    table = rollupModel.__table__
+    keyColumn = table.primary_key.columns.values()[0]
+    rows = [
+        {keyColumn.name: itemId, "totalCount": total, "facilityCount": facilities}
+        for itemId, (total, facilities) in sorted(deltas.items())
+        if total or facilities
+    ]
+    if not rows:
+        return
+    stmt = upsertStatement(connection, rollupModel)
+    if stmt is not None:
+        connection.execute(stmt, rows)
+        return
+    for row in rows:
+        updated = connection.execute(
+            table.update()
+            .where(keyColumn == row[keyColumn.name])
+            .values(
+                totalCount=table.c.totalCount + row["totalCount"],
+                facilityCount=table.c.facilityCount + row["facilityCount"],
+            )
+        )
+        if updated.rowcount == 0:
+            connection.execute(table.insert(), row)
+
+
+@event.listens_for(Session, "after_flush")
+def afterFlushApplyRollups(session, flushContext):
+    pending = session.info.pop(pendingDeltasInfoKey, None)
+    if not pending:
+        return
+    connection = session.connection()
+    for rollupModel, deltas in pending.items():
+        applyDeltas(connection, rollupModel, deltas)
+
+
+@event.listens_for(Session, "after_rollback")
+def afterRollbackDiscardRollups(session):
+    session.info.pop(pendingDeltasInfoKey, None)
+
+
+def rebuildStockRollups(session):
+    """
+    Recompute every rollup row from the inventory tables.
+
+    Args:
+        session: The session to run the rebuild in; the caller commits.
+
+    Returns:
+        dict: The number of rollup rows written per rollup table.
+    """
+    written = {}
+    for inventoryModel, (rollupModel, itemKey) in rollupTargets.items():
+        itemColumn = getattr(inventoryModel, itemKey)
+        session.execute(db.delete(rollupModel))
+        session.execute(
+            insert(rollupModel).from_select(
+                [itemKey, "totalCount", "facilityCount"],
+                db.select(
+                    itemColumn,
+                    db.func.sum(inventoryModel.count),
+                    db.func.sum(db.case((inventoryModel.count > 0, 1), else_=0)),
+                )
+                .where(itemColumn.isnot(None))
+                .group_by(itemColumn),
+            )
+        )
+        written[rollupModel.__tablename__] = session.scalar(
+            db.select(db.func.count()).select_from(rollupModel)
+        )
+    return written
+
+
+def getStockTotals(rollupModel, itemId):
+    """
+    Return the company-wide stock of one product or component.
+
+    Args:
+        rollupModel: ProductStockRollup or ComponentStockRollup.
+        itemId (int): The product or component ID.
+
+    Returns:
+        dict: The item's totalCount and facilityCount (zero if it has no stock row).
+    """
+    rollup = db.session.get(rollupModel, itemId)
+    return {
+        "totalCount": rollup.totalCount if rollup else 0,
+        "facilityCount": rollup.facilityCount if rollup else 0,
+    }
@@ -8,11 +8,20 @@ changes made, and the timestamp of the transaction.
 
 from extensions import db
 from models.dbUtils import BaseModel
+from services.auditLog import AuditSink
 from datetime import datetime
 
 
 class DatabaseTransaction(db.Model, BaseModel):
     __tablename__ = "databaseTransactions"
+    __table_args__ = (
+        db.Index(
+            "ix_databaseTransactions_table_object_time",
+            "tableName",
+            "objectId",
+            "timestamp",
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)  # The ID for the transactions
     objectId = db.Column(
@@ -28,3 +37,6 @@ class DatabaseTransaction(db.Model, BaseModel):
             f"<Transaction {self.operation} for {self.tableName.capitalize()}"
             + " ID {self.objectId} at {self.timestamp}>"
         )
+
+
+auditSink = AuditSink(DatabaseTransaction)
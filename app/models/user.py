@@ -4,12 +4,12 @@ Database model for users.
 This module defines the database model for users. It includes fields for user information such as username, password hash, role, first name, last name, phone number, email, and title. It also provides methods for setting and checking passwords, as well as converting user objects to dictionaries.
 """
 
-from werkzeug.security import check_password_hash, generate_password_hash
 from sqlalchemy import event
-from extensions import db
+from sqlalchemy.orm import object_session
+from werkzeug.security import check_password_hash, generate_password_hash
+from extensions import db, readCache
 from models.dbUtils import BaseModel
-from models.transaction import DatabaseTransaction
-from datetime import datetime
+from models.auditDiff import registerAudit
 
 
 class User(db.Model, BaseModel):
@@ -45,7 +45,7 @@ class User(db.Model, BaseModel):
     firstName = db.Column(db.String(64), nullable=True)
     lastName = db.Column(db.String(64), nullable=True)
     phoneNumber = db.Column(db.String(64), nullable=True)
-    email = db.Column(db.String(80), unique=False, nullable=True)
+    email = db.Column(db.String(80), unique=False, nullable=True, index=True)
     title = db.Column(db.String(128), nullable=True)
 
     def __repr__(self):
@@ -85,64 +85,22 @@ class User(db.Model, BaseModel):
 
 
 @event.listens_for(User, "after_update")
-def after_user_update(mapper, connection, target):
+@event.listens_for(User, "before_delete")
+def invalidateUserCache(mapper, connection, target):
     """
-    Event listener triggered after a user is updated in the database.
+    Event listener function dropping a changed user's cached session principal.
 
     Args:
-        mapper: The mapper object managing state.
-        connection: The database connection used for the update operation.
-        target: The updated user object.
+        mapper: The mapper object.
+        connection: The connection object.
+        target: The updated or deleted user object.
     """
-    state = db.inspect(target)
-    changes = {}
-
-    for attr in state.attrs:
-        # The key property on this object gives us the name of the attribute as a string (for example, 'name').
-        # True: this is a boolean flag that tells get_history() whether or not to return the 'unchanged' portion of the history.
-        # hist: The History object contains three lists representing the changes to the attribute: added, unchanged, and deleted.
-        hist = state.get_history(attr.key, True)
-        if hist.has_changes():
-            if hist.has_changes():
-                changes[attr.key] = {
-                    # hist.deleted: This list contains the value(s) that were present before the update operation and have been replaced or deleted
-                    # hist.added: This list contains the new value(s) that have been set during the update operation
-                    "old": hist.deleted[0] if hist.deleted else None,
-                    "new": hist.added[0] if hist.added else None,
-                }
-    if changes:
-        change_description = "; ".join(
-            f'{key} changed from {vals["old"]} to {vals["new"]}'
-            for key, vals in changes.items()
-        )
-        transaction = DatabaseTransaction(
-            objectId=target.id,
-            tableName="user",
-            operation="update",
-            changes=change_description,
-            timestamp=datetime.now(),
-        )
-    db.session.add(transaction)
-    print(f"User ID: {target.id} updated.")
-
+    readCache.invalidate("user", target.id, object_session(target))
 
-@event.listens_for(User, "before_delete")
-def before_user_delete(mapper, connection, target):
-    """
-    Event listener triggered before a user is deleted from the database.
 
-    Args:
-        mapper: The mapper object managing state.
-        connection: The database connection used for the delete operation.
-        target: The user object to be deleted.
-    """
-    # Create a DatabaseTransaction record for logging the deletion
-    transaction = DatabaseTransaction(
-        objectId=target.id,
-        tableName="user",
-        operation="delete",
-        changes=f"User ID {target.id} was deleted",
-        timestamp=datetime.now(),
-    )
-    # Add the transaction to the session
-    db.session.add(transaction)
+# Users are audited on update and delete only
+registerAudit(
+    User,
+    tableName="user",
+    deleteMessage=lambda target, userId: f"User ID {userId} was deleted",
+)
@@ -8,32 +8,11 @@ from models.inventory import ProductInventory, ComponentInventory
 from models.product import Product
 from models.productionFacility import ProductionFacility
 from models.user import User
+from services.bulkImport import importCsv, normalizeString, parseFloat
 
 faker = Faker()
 
 
-def parseFloat(inputValue):
-    if isinstance(inputValue, float):
-        return inputValue
-    try:
-        # If input is not already a float, try to convert it
-        number_str = str(inputValue).replace(",", "")
-        return float(number_str)
-    except ValueError:
-        # Return -1 if conversion fails
-        return -1
-
-
-def normalizeString(inputString):
-    try:
-        # Try to decode the string using UTF-8 encoding
-        normalizedString = inputString.encode("latin-1").decode("utf-8")
-        return normalizedString
-    except Exception as e:
-        # If decoding fails, return the original string
-        return ""
-
-
 if __name__ == "__main__":
     with app.app_context():
         db.drop_all()
@@ -54,41 +33,11 @@ if __name__ == "__main__":
             db.session.add(user)
         db.session.commit()
 
-        # Create products
+        # Create products and components
         with open("../sampleData/laptops.csv", "r", encoding="utf-8") as csvfile:
-            reader = csv.reader(csvfile)
-            next(reader)
-            # Manufacturer,Model Name,Category,Screen Size,Screen,CPU,RAM, Storage,GPU,Operating System,Operating System Version,Weight,Price (Euros)
-            for row in reader:
-                price = parseFloat(row[12]) * 1.07
-                if price != -1:
-                    product = Product(
-                        brand=row[0],
-                        model=normalizeString(row[1]),
-                        category=row[2],
-                        price=price,
-                        available=True,
-                    )
-                    db.session.add(product)
-            db.session.commit()
-
-        # Create components
+            importCsv("products", csvfile)
         with open("../sampleData/sampleComponentData.csv", "r") as csvfile:
-            reader = csv.reader(csvfile)
-            next(reader)
-            db.create_all()
-            for row in reader:
-                # ,brand_name,decription,ratings,prices,category
-                price = parseFloat(row[4])
-                if price != -1:
-                    component = Component(
-                        name=row[2],
-                        brand=row[1],
-                        price=price,
-                        category=row[5],
-                    )
-                    db.session.add(component)
-            db.session.commit()
+            importCsv("components", csvfile)
 
         # Generate fake ProductionFacility objects and save them to the database
         with open("../sampleData/locations.csv") as csvfile:
@@ -0,0 +1,338 @@
+"""
+Audit log writer for DatabaseTransaction records.
+
+The model listeners hand their audit records to an AuditSink instead of adding
+DatabaseTransaction rows to the flushing session. In the default synchronous mode
+the sink still adds them to the session. With AUDIT_ASYNC enabled, the records of
+a session are queued when it commits (and dropped when it rolls back), appended to
+a per-process spool file and written by a background thread in batched multi-row
+INSERTs, so requests no longer wait on audit writes.
+
+The spool file is the durable fallback: it is truncated only once every spooled
+record has been inserted, and spools left behind by a crashed process are replayed
+when the next writer starts. Delivery is at-least-once, so a crash between an
+INSERT and the truncation can duplicate a batch.
+
+A writer first claims each spool it replays by renaming it to
+replay-<its pid>-<attempt>-*, so a replay that fails is never mistaken for the live
+spool of a process that reuses the dead one's pid, and is retried by a later
+writer. A failed replay rewrites the spool with only the records not inserted yet,
+so the batches it did insert are not inserted again. A batch that still fails after
+AUDIT_MAX_RETRIES attempts, or a spool whose replay has failed that many times,
+such as one violating a constraint, is appended to the dead-letter spool
+dead-<pid>.jsonl for inspection instead of stalling the writer.
+"""
+
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+from extensions import db
+
+pendingRecordsInfoKey = "auditPendingRecords"
+stopSentinel = object()
+
+
+def serializeRecord(record):
+    return json.dumps(dict(record, timestamp=record["timestamp"].isoformat()))
+
+
+def deserializeRecord(line):
+    record = json.loads(line)
+    record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+    return record
+
+
+def processIsAlive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AuditSink:
+    """
+    Collects audit records and writes them to the audit table.
+
+    Attributes:
+        model: The audit model (DatabaseTransaction).
+        asyncMode (bool): Whether records are written by the background writer.
+        batchSize (int): The maximum number of rows per INSERT.
+        flushInterval (float): Seconds the writer waits to fill a batch.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.app = None
+        self.engine = None
+        self.asyncMode = False
+        self.batchSize = 500
+        self.flushInterval = 0.5
+        self.fsync = False
+        self.maxRetries = 5
+        self.spoolDir = None
+        self.spoolFile = None
+        self.pid = None
+        self.thread = None
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.metrics = {
+            "flushes": 0,
+            "recordsWritten": 0,
+            "failures": 0,
+            "replayed": 0,
+            "deadLettered": 0,
+            "lastFlushSeconds": 0.0,
+            "totalFlushSeconds": 0.0,
+        }
+
+    def init_app(self, app):
+        """
+        Configure the sink from the application config.
+
+        Config keys: AUDIT_ASYNC, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL,
+        AUDIT_MAX_RETRIES, AUDIT_SPOOL_DIR and AUDIT_SPOOL_FSYNC.
+        """
+        self.app = app
+        self.asyncMode = app.config.get("AUDIT_ASYNC", False)
+        self.batchSize = app.config.get("AUDIT_BATCH_SIZE", 500)
+        self.flushInterval = app.config.get("AUDIT_FLUSH_INTERVAL", 0.5)
+        self.fsync = app.config.get("AUDIT_SPOOL_FSYNC", False)
+        self.maxRetries = app.config.get("AUDIT_MAX_RETRIES", 5)
+        self.spoolDir = app.config.get("AUDIT_SPOOL_DIR") or os.path.join(
+            app.instance_path, "auditSpool"
+        )
+        app.extensions["auditSink"] = self
+        if not event.contains(Session, "after_commit", self.onCommit):
+            event.listen(Session, "after_commit", self.onCommit)
+            event.listen(Session, "after_rollback", self.onRollback)
+            atexit.register(self.close)
+
+    def record(self, session, **fields):
+        """
+        Record one audit entry for the transaction of a session.
+
+        Args:
+            session: The session flushing the audited change.
+            **fields: DatabaseTransaction column values.
+        """
+        fields.setdefault("timestamp", datetime.now())
+        if not self.asyncMode:
+            session.add(self.model(**fields))
+            return
+        session.info.setdefault(pendingRecordsInfoKey, []).append(fields)
+
+    def onCommit(self, session):
+        records = session.info.pop(pendingRecordsInfoKey, None)
+        if records:
+            self.enqueue(records)
+
+    def onRollback(self, session):
+        session.info.pop(pendingRecordsInfoKey, None)
+
+    def enqueue(self, records):
+        """Spool records to disk and hand them to the background writer."""
+        self.ensureStarted()
+        with self.lock:
+            self.spoolFile.write("".join(serializeRecord(r) + "\n" for r in records))
+            self.spoolFile.flush()
+            if self.fsync:
+                os.fsync(self.spoolFile.fileno())
+            for record in records:
+                self.queue.put(record)
+
+    def ensureStarted(self):
+        """Start the writer thread, once per process (workers may be forked)."""
+        if (
+            self.pid == os.getpid()
+            and self.thread is not None
+            and self.thread.is_alive()
+        ):
+            return
+        if self.pid != os.getpid():
+            # A lock or queue inherited through fork may be in any state
+            self.lock = threading.Lock()
+            self.queue = queue.Queue()
+        with self.lock:
+            if self.pid == os.getpid() and self.thread is not None:
+                return
+            self.pid = os.getpid()
+            if self.engine is None:
+                with self.app.app_context():
+                    self.engine = db.engine
+            os.makedirs(self.spoolDir, exist_ok=True)
+            self.replaySpools()
+            spoolPath = os.path.join(self.spoolDir, f"audit-{self.pid}.jsonl")
+            self.spoolFile = open(spoolPath, "a", encoding="utf-8")
+            self.thread = threading.Thread(
+                target=self.run, name="audit-writer", daemon=True
+            )
+            self.thread.start()
+
+    def replaySpools(self):
+        """Insert the records of spool files left behind by dead processes."""
+        paths = glob.glob(os.path.join(self.spoolDir, "audit-*.jsonl"))
+        paths += glob.glob(os.path.join(self.spoolDir, "replay-*.jsonl"))
+        for path in sorted(paths):
+            # audit-<pid>.jsonl, or replay-<pid>-<attempts>-<n>.jsonl of an
+            # earlier replay
+            parts = os.path.basename(path)[: -len(".jsonl")].split("-")
+            pid = int(parts[1])
+            if pid != self.pid and processIsAlive(pid):
+                continue
+            attempts = int(parts[2]) + 1 if len(parts) == 4 else 1
+            claimed = os.path.join(
+                self.spoolDir, f"replay-{self.pid}-{attempts}-{time.time_ns()}.jsonl"
+            )
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # Claimed by another starting writer
+                continue
+            records = []
+            with open(claimed, encoding="utf-8") as spool:
+                for line in spool:
+                    try:
+                        records.append(deserializeRecord(line))
+                    except ValueError:
+                        # A line cut short by the crash
+                        continue
+            written = 0
+            while written < len(records):
+                batch = records[written : written + self.batchSize]
+                if not self.writeBatch(batch):
+                    break
+                written += len(batch)
+            self.metrics["replayed"] += written
+            remaining = records[written:]
+            if not remaining:
+                os.remove(claimed)
+            elif attempts >= self.maxRetries:
+                self.deadLetter(remaining)
+                os.remove(claimed)
+            else:
+                # Keep only the records a later writer still has to insert
+                rewritten = claimed + ".tmp"
+                with open(rewritten, "w", encoding="utf-8") as spool:
+                    spool.write("".join(serializeRecord(r) + "\n" for r in remaining))
+                    spool.flush()
+                    if self.fsync:
+                        os.fsync(spool.fileno())
+                os.replace(rewritten, claimed)
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            stopping = batch[0] is stopSentinel
+            if stopping:
+                batch = []
+            deadline = time.monotonic() + self.flushInterval
+            while not stopping and len(batch) < self.batchSize:
+                try:
+                    item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is stopSentinel:
+                    stopping = True
+                else:
+                    batch.append(item)
+            written = True
+            if batch:
+                written = self.writeBatch(batch, 0 if stopping else self.maxRetries)
+                if not written and not stopping:
+                    self.deadLetter(batch)
+                    written = True
+            for _ in range(len(batch) + (1 if stopping else 0)):
+                self.queue.task_done()
+            if written:
+                self.truncateSpoolIfIdle()
+            if stopping:
+                return
+
+    def writeBatch(self, batch, retries=0):
+        """
+        Insert a batch as one multi-row INSERT, retrying with backoff on failure.
+
+        Returns:
+            bool: False if every attempt failed; the records stay in the spool.
+        """
+        backoff = 0.5
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            start = time.perf_counter()
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(insert(self.model.__table__).values(batch))
+            except Exception:
+                self.metrics["failures"] += 1
+                continue
+            elapsed = time.perf_counter() - start
+            self.metrics["flushes"] += 1
+            self.metrics["recordsWritten"] += len(batch)
+            self.metrics["lastFlushSeconds"] = elapsed
+            self.metrics["totalFlushSeconds"] += elapsed
+            return True
+        return False
+
+    def deadLetter(self, batch):
+        """Append a batch that cannot be inserted to this process's dead-letter spool."""
+        path = os.path.join(self.spoolDir, f"dead-{self.pid}.jsonl")
+        with open(path, "a", encoding="utf-8") as spool:
+            spool.write("".join(serializeRecord(r) + "\n" for r in batch))
+            spool.flush()
+            if self.fsync:
+                os.fsync(spool.fileno())
+        self.metrics["deadLettered"] += len(batch)
+
+    def truncateSpoolIfIdle(self):
+        with self.lock:
+            if self.queue.unfinished_tasks == 0 and self.spoolFile is not None:
+                self.spoolFile.truncate(0)
+
+    def drain(self):
+        """Block until every queued record has been written."""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+    def close(self):
+        """Write the remaining records and stop the writer thread."""
+        if self.pid != os.getpid() or self.thread is None:
+            return
+        self.queue.put(stopSentinel)
+        self.thread.join()
+        self.thread = None
+        self.spoolFile.close()
+        self.spoolFile = None
+
+    def stats(self):
+        """
+        Return the writer's queue depth and flush metrics.
+
+        Returns:
+            dict: queueDepth, flushes, recordsWritten, failures, replayed,
+            deadLettered, lastFlushMs and avgFlushMs.
+        """
+        flushes = self.metrics["flushes"]
+        return {
+            "queueDepth": self.queue.qsize(),
+            "flushes": flushes,
+            "recordsWritten": self.metrics["recordsWritten"],
+            "failures": self.metrics["failures"],
+            "replayed": self.metrics["replayed"],
+            "deadLettered": self.metrics["deadLettered"],
+            "lastFlushMs": self.metrics["lastFlushSeconds"] * 1000,
+            "avgFlushMs": (
+                self.metrics["totalFlushSeconds"] / flushes * 1000 if flushes else 0.0
+            ),
+        }
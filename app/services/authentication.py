@@ -0,0 +1,292 @@
+"""
+Login fast path.
+
+The Authenticator extension guards the password login with a per-username and
+per-IP failure counter, which rejects repeat offenders before any password hash is
+computed, and runs the hashing itself on a small bounded thread pool, so a burst of
+login attempts cannot occupy every worker. When the pool and its queue are full the
+attempt is refused instead of waiting. Unknown usernames are checked against a
+dummy hash, so the response time does not tell which usernames exist.
+
+After a login the session carries a principal (ID, username, role, email). Later
+requests read it from the session and revalidate it against the read cache, which
+the User mapper events invalidate, instead of querying the users table.
+
+Google userinfo calls go through one pooled requests.Session with connect/read
+timeouts and retries on gateway errors, created by the first call.
+"""
+
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from flask import current_app, session
+from werkzeug.security import check_password_hash, generate_password_hash
+from extensions import db, readCache
+from models.user import User
+
+principalNamespace = "user"
+
+
+class LoginThrottle:
+    """
+    Counts recent login failures per key and blocks keys over their limit.
+
+    Attributes:
+        maxFailures (int): Failures allowed within the window before blocking.
+        window (float): Seconds after the last failure until a key is forgotten.
+        maxKeys (int): Keys kept in memory; the least recently failed are dropped.
+    """
+
+    def __init__(self, maxFailures, window, maxKeys=100000):
+        self.maxFailures = maxFailures
+        self.window = window
+        self.maxKeys = maxKeys
+        self.failures = OrderedDict()
+        self.lock = Lock()
+
+    def retryAfter(self, key, now=None):
+        """Return the seconds until key is unblocked, or 0 if it is not blocked."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            entry = self.failures.get(key)
+            if entry is None:
+                return 0
+            count, lastFailure = entry
+            if now - lastFailure >= self.window:
+                del self.failures[key]
+                return 0
+            if count < self.maxFailures:
+                return 0
+            return self.window - (now - lastFailure)
+
+    def recordFailure(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            count, lastFailure = self.failures.pop(key, (0, now))
+            if now - lastFailure >= self.window:
+                count = 0
+            self.failures[key] = (count + 1, now)
+            while len(self.failures) > self.maxKeys:
+                self.failures.popitem(last=False)
+
+    def reset(self, key):
+        with self.lock:
+            self.failures.pop(key, None)
+
+
+class Authenticator:
+    """
+    Password verification with throttling and a bounded hashing pool.
+
+    Attributes:
+        userThrottle (LoginThrottle): Failures per username.
+        ipThrottle (LoginThrottle): Failures per client IP.
+        hashWorkers (int): Threads computing password hashes.
+        hashQueue (int): Verifications that may wait for a hashing thread.
+        httpSession (requests.Session): The pooled client for OAuth userinfo calls.
+    """
+
+    def __init__(self, app=None):
+        self.userThrottle = LoginThrottle(5, 300)
+        self.ipThrottle = LoginThrottle(50, 300)
+        self.hashWorkers = 2
+        self.hashQueue = 8
+        self.executor = None
+        self.slots = None
+        self.dummyHash = None
+        self.httpSession = None
+        self.httpPoolSize = 10
+        self.userInfoUrl = None
+        self.httpTimeout = (3.05, 10)
+        self.stats = {"verified": 0, "rejected": 0, "throttled": 0, "busy": 0}
+        self.statsLock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Configure the throttles, the hashing pool and the HTTP client.
+
+        Args:
+            app (Flask): The application whose AUTH_* config is used.
+        """
+        window = app.config.get("AUTH_FAILURE_WINDOW", 300)
+        self.userThrottle = LoginThrottle(
+            app.config.get("AUTH_MAX_USER_FAILURES", 5), window
+        )
+        self.ipThrottle = LoginThrottle(
+            app.config.get("AUTH_MAX_IP_FAILURES", 50), window
+        )
+        self.hashWorkers = app.config.get("AUTH_HASH_WORKERS", 2)
+        self.hashQueue = app.config.get("AUTH_HASH_QUEUE", 8)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.hashWorkers, thread_name_prefix="passwordHash"
+        )
+        self.slots = BoundedSemaphore(self.hashWorkers + self.hashQueue)
+        self.userInfoUrl = app.config.get(
+            "GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v1/userinfo"
+        )
+        self.httpPoolSize = app.config.get("AUTH_HTTP_POOL_SIZE", 10)
+        self.httpSession = None
+        self.stats = dict.fromkeys(self.stats, 0)
+        app.extensions["authenticator"] = self
+
+    def count(self, name):
+        with self.statsLock:
+            self.stats[name] += 1
+
+    def retryAfter(self, username, ip):
+        """Return the seconds until this username and IP may try again, or 0."""
+        return max(
+            self.userThrottle.retryAfter(("user", username)),
+            self.ipThrottle.retryAfter(("ip", ip)),
+        )
+
+    def verify(self, passwordHash, password):
+        """
+        Check a password on the hashing pool.
+
+        Returns:
+            bool: Whether the password matches, or None if the pool is saturated.
+        """
+        if not self.slots.acquire(blocking=False):
+            self.count("busy")
+            return None
+        try:
+            return self.executor.submit(
+                check_password_hash, passwordHash, password
+            ).result()
+        finally:
+            self.slots.release()
+
+    def authenticate(self, username, password, ip):
+        """
+        Verify a username and password.
+
+        Args:
+            username (str): The submitted username.
+            password (str): The submitted password.
+            ip (str): The client address.
+
+        Returns:
+            tuple: (status, detail). status is "ok" with the principal dictionary,
+                "invalid" with None, "throttled" with the seconds to wait, or
+                "busy" with the seconds to wait.
+        """
+        retryAfter = self.retryAfter(username, ip)
+        if retryAfter:
+            self.count("throttled")
+            return "throttled", int(retryAfter) + 1
+        row = db.session.execute(
+            db.select(
+                User.id, User.username, User.role, User.email, User.passwordHash
+            ).where(User.username == username)
+        ).first()
+        if row is None and self.dummyHash is None:
+            self.dummyHash = generate_password_hash("unused")
+        matches = self.verify(
+            self.dummyHash if row is None else row.passwordHash, password or ""
+        )
+        if matches is None:
+            return "busy", 1
+        if matches and row is not None:
+            self.count("verified")
+            self.userThrottle.reset(("user", username))
+            return "ok", principalFromRow(row)
+        self.count("rejected")
+        self.userThrottle.recordFailure(("user", username))
+        self.ipThrottle.recordFailure(("ip", ip))
+        return "invalid", None
+
+    def fetchUserInfo(self, accessToken):
+        """Return the Google userinfo of an access token, using the pooled client."""
+        if self.httpSession is None:
+            self.httpSession = createHttpSession(self.httpPoolSize)
+        response = self.httpSession.get(
+            self.userInfoUrl,
+            headers={"Authorization": f"Bearer {accessToken}"},
+            timeout=self.httpTimeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        if self.httpSession is not None:
+            self.httpSession.close()
+
+
+def createHttpSession(poolSize):
+    # requests is only needed once a Google login happens
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    httpSession = requests.Session()
+    retries = Retry(
+        total=2,
+        backoff_factor=0.2,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=("GET",),
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4, pool_maxsize=poolSize, max_retries=retries
+    )
+    httpSession.mount("https://", adapter)
+    httpSession.mount("http://", adapter)
+    return httpSession
+
+
+def principalFromRow(row):
+    return {
+        "id": row.id,
+        "username": row.username,
+        "role": row.role,
+        "email": row.email,
+    }
+
+
+def loadPrincipal(userId):
+    row = db.session.execute(
+        db.select(User.id, User.username, User.role, User.email).where(
+            User.id == userId
+        )
+    ).first()
+    return principalFromRow(row) if row is not None else None
+
+
+def loginPrincipal(principal):
+    """Store a principal in the session after a successful login."""
+    session["principal"] = principal
+    session["username"] = principal["username"]
+
+
+def currentPrincipal():
+    """
+    Return the logged-in user's principal, or None.
+
+    The session copy is compared with the cached principal, so role changes and
+    deleted users take effect without a users query on every request.
+    """
+    principal = session.get("principal")
+    if principal is None:
+        return None
+    cached = readCache.get(
+        principalNamespace, principal["id"], lambda: loadPrincipal(principal["id"])
+    )
+    if cached is None:
+        session.clear()
+        return None
+    if cached != principal:
+        loginPrincipal(cached)
+    return cached
+
+
+def isAdmin(principal):
+    """Whether a principal has the ADMIN_ROLE."""
+    return principal["role"] == current_app.config.get("ADMIN_ROLE", 0)
+
+
+authenticator = Authenticator()
@@ -0,0 +1,200 @@
+"""
+Streaming CSV importer for the product and component catalogs.
+
+The importer is a pipeline of generator stages: CSV rows are read in chunks,
+normalised and validated (optionally in a process pool, with a bounded number of
+chunks in flight) and each chunk is written with one Core bulk INSERT in its own
+transaction. Memory use is bounded by the chunk size, not the file size.
+
+Audit modes:
+- "chunk": one summary DatabaseTransaction per chunk (default).
+- "row": ORM inserts, so the per-row audit listeners fire as before.
+- "none": no audit records.
+
+Core inserts bypass mapper events, so imported rows are not audited per row and
+are not added to any read cache list.
+"""
+
+import csv
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from sqlalchemy import insert
+from extensions import db
+from models.component import Component
+from models.product import Product
+from models.transaction import auditSink
+
+auditModes = ("chunk", "row", "none")
+
+
+def parseFloat(inputValue):
+    if isinstance(inputValue, float):
+        return inputValue
+    try:
+        # If input is not already a float, try to convert it
+        number_str = str(inputValue).replace(",", "")
+        return float(number_str)
+    except ValueError:
+        # Return -1 if conversion fails
+        return -1
+
+
+def normalizeString(inputString):
+    try:
+        # Try to decode the string using UTF-8 encoding
+        normalizedString = inputString.encode("latin-1").decode("utf-8")
+        return normalizedString
+    except Exception as e:
+        # If decoding fails, return the original string
+        return ""
+
+
+def parseProductRows(rows):
+    """
+    Normalise and validate laptop catalog rows.
+
+    Columns: Manufacturer,Model Name,Category,Screen Size,Screen,CPU,RAM, Storage,
+    GPU,Operating System,Operating System Version,Weight,Price (Euros)
+
+    Args:
+        rows (list): Raw CSV rows.
+
+    Returns:
+        tuple: The Product column dictionaries and the number of rejected rows.
+    """
+    records = []
+    for row in rows:
+        if len(row) < 13 or not row[2]:
+            continue
+        price = parseFloat(row[12])
+        if price == -1:
+            continue
+        records.append(
+            {
+                "brand": row[0],
+                "model": normalizeString(row[1]),
+                "category": row[2],
+                "price": price * 1.07,
+                "available": True,
+            }
+        )
+    return records, len(rows) - len(records)
+
+
+def parseComponentRows(rows):
+    """
+    Normalise and validate component catalog rows.
+
+    Columns: ,brand_name,decription,ratings,prices,category
+
+    Args:
+        rows (list): Raw CSV rows.
+
+    Returns:
+        tuple: The Component column dictionaries and the number of rejected rows.
+    """
+    records = []
+    for row in rows:
+        if len(row) < 6:
+            continue
+        price = parseFloat(row[4])
+        if price == -1:
+            continue
+        records.append(
+            {"name": row[2], "brand": row[1], "price": price, "category": row[5]}
+        )
+    return records, len(rows) - len(records)
+
+
+importers = {
+    "products": (Product, "product", parseProductRows),
+    "components": (Component, "component", parseComponentRows),
+}
+
+
+def readChunks(csvFile, chunkSize):
+    """Yield lists of at most chunkSize rows, skipping the header."""
+    reader = csv.reader(csvFile)
+    next(reader, None)
+    while True:
+        chunk = list(islice(reader, chunkSize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parseChunks(chunks, parser, workers):
+    """
+    Yield the parsed form of each chunk, in input order.
+
+    With more than one worker, chunks are parsed in a process pool with at most
+    two chunks per worker in flight, so a large file is never read ahead fully.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield parser(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        inFlight = deque()
+        for chunk in chunks:
+            inFlight.append(executor.submit(parser, chunk))
+            if len(inFlight) >= workers * 2:
+                yield inFlight.popleft().result()
+        while inFlight:
+            yield inFlight.popleft().result()
+
+
+def writeChunk(model, tableName, records, audit, chunkNumber):
+    """Insert one chunk of records and commit it."""
+    if audit == "row":
+        db.session.add_all([model(**record) for record in records])
+    else:
+        db.session.execute(insert(model), records)
+        if audit == "chunk":
+            auditSink.record(
+                db.session,
+                objectId=0,
+                tableName=tableName,
+                operation="import",
+                changes=f"Bulk import chunk {chunkNumber}: {len(records)} rows",
+            )
+    db.session.commit()
+
+
+def importCsv(kind, csvFile, chunkSize=5000, workers=1, audit="chunk", onProgress=None):
+    """
+    Stream a catalog CSV into the database.
+
+    Args:
+        kind (str): "products" or "components".
+        csvFile: An open text file with the CSV data.
+        chunkSize (int): Rows per parse task and per INSERT transaction.
+        workers (int): Parser processes; 1 parses in this process.
+        audit (str): "chunk", "row" or "none".
+        onProgress (callable): Called with the running totals after each chunk.
+
+    Returns:
+        dict: "inserted" and "rejected" row counts, "seconds" and "rowsPerSecond".
+    """
+    if kind not in importers:
+        raise ValueError(f"Unknown import kind: {kind}")
+    if audit not in auditModes:
+        raise ValueError(f"Unknown audit mode: {audit}")
+    model, tableName, parser = importers[kind]
+    totals = {"inserted": 0, "rejected": 0}
+    start = time.perf_counter()
+    parsed = parseChunks(readChunks(csvFile, chunkSize), parser, workers)
+    for chunkNumber, (records, rejected) in enumerate(parsed, start=1):
+        if records:
+            writeChunk(model, tableName, records, audit, chunkNumber)
+        totals["inserted"] += len(records)
+        totals["rejected"] += rejected
+        totals["seconds"] = time.perf_counter() - start
+        totals["rowsPerSecond"] = totals["inserted"] / max(totals["seconds"], 1e-9)
+        if onProgress is not None:
+            onProgress(dict(totals, chunks=chunkNumber))
+    totals.setdefault("seconds", time.perf_counter() - start)
+    totals.setdefault("rowsPerSecond", 0.0)
+    return totals
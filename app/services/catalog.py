@@ -0,0 +1,53 @@
+"""
+Cached catalog and facility lookups.
+
+This module wraps the read paths for products, components and production facilities
+in the read cache. Cached values are the toDict() form of each row, so they can be
+shared between workers through an external cache server.
+"""
+
+from extensions import db, readCache
+from models.component import Component
+from models.product import Product
+from models.productionFacility import ProductionFacility
+
+
+def loadDict(model, objectId):
+    # Not a copy already in the session, which may have been read from a replica
+    row = db.session.get(model, objectId, populate_existing=True)
+    return row.toDict() if row is not None else None
+
+
+def getProduct(productId):
+    """Return a product as a dictionary, or None if it does not exist."""
+    return readCache.get("product", productId, lambda: loadDict(Product, productId))
+
+
+def getComponent(componentId):
+    """Return a component as a dictionary, or None if it does not exist."""
+    return readCache.get(
+        "component", componentId, lambda: loadDict(Component, componentId)
+    )
+
+
+def getFacility(facilityId):
+    """Return a production facility as a dictionary, or None if it does not exist."""
+    return readCache.get(
+        "productionFacility",
+        facilityId,
+        lambda: loadDict(ProductionFacility, facilityId),
+    )
+
+
+def listFacilities():
+    """Return every production facility as a dictionary, ordered by ID."""
+    return readCache.get(
+        "productionFacility",
+        "all",
+        lambda: [
+            facility.toDict()
+            for facility in ProductionFacility.query.populate_existing().order_by(
+                ProductionFacility.id
+            )
+        ],
+    )
@@ -0,0 +1,116 @@
+"""
+Read/write routing between the primary database and its replicas.
+
+Replicas are configured as Flask-SQLAlchemy binds named in DB_REPLICA_BINDS. The
+RoutingSession sends the SELECTs of a read-only request (GET, HEAD, OPTIONS) to one
+replica chosen for the request, and everything else to the primary: writes, flushes,
+SELECT ... FOR UPDATE, every statement of other requests and all work outside a
+request, such as CLI commands.
+
+Read-your-writes: once a request flushes, its remaining reads use the primary, and
+the user's session is pinned to the primary for DB_STICKY_SECONDS, so the next
+pages do not read from a replica that has not caught up yet.
+
+The read cache loads its misses inside readingPrimary(), so a lagging replica can
+never put a stale row back into the cache after a write invalidated it.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+readOnlyMethods = ("GET", "HEAD", "OPTIONS")
+stickySessionKey = "dbPrimaryUntil"
+
+
+class RoutingSession(Session):
+    """A Flask-SQLAlchemy session that reads from a replica when the request allows."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and readsFromReplica(self, clause):
+            return self._db.engines[g.dbReplica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def readsFromReplica(dbSession, clause):
+    if not has_request_context() or g.get("dbReplica") is None:
+        return False
+    if dbSession._flushing or not isinstance(clause, Select):
+        return False
+    return clause._for_update_arg is None
+
+
+class DatabaseRouter:
+    """
+    Chooses the database of each request and keeps writers on the primary.
+
+    Attributes:
+        replicas (list): The bind names of the replicas.
+        stickySeconds (float): How long a user reads from the primary after a write.
+    """
+
+    def __init__(self, app=None):
+        self.replicas = []
+        self.stickySeconds = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Register the request hooks.
+
+        Args:
+            app (Flask): The application whose DB_REPLICA_BINDS and DB_STICKY_SECONDS
+                are used.
+        """
+        self.replicas = list(app.config.get("DB_REPLICA_BINDS", []))
+        self.stickySeconds = app.config.get("DB_STICKY_SECONDS", 10)
+        app.extensions["dbRouter"] = self
+        app.before_request(self.chooseDatabase)
+        app.after_request(self.pinWriters)
+        if not event.contains(RoutingSession, "after_flush", onFlush):
+            event.listen(RoutingSession, "after_flush", onFlush)
+
+    def chooseDatabase(self):
+        g.dbReplica = None
+        if not self.replicas or request.method not in readOnlyMethods:
+            return
+        if session.get(stickySessionKey, 0) > time.time():
+            return
+        g.dbReplica = random.choice(self.replicas)
+
+    def pinWriters(self, response):
+        if self.replicas and self.stickySeconds and g.get("dbWrote"):
+            session[stickySessionKey] = time.time() + self.stickySeconds
+        return response
+
+
+def onFlush(dbSession, flushContext):
+    if has_request_context():
+        # Later reads of this request must see the flushed rows
+        g.dbReplica = None
+        g.dbWrote = True
+
+
+def usePrimary():
+    """Send the rest of the current request's queries to the primary."""
+    g.dbReplica = None
+
+
+@contextmanager
+def readingPrimary():
+    """Send the queries of the block to the primary, then restore the request's replica."""
+    if not has_request_context():
+        yield
+        return
+    replica = g.get("dbReplica")
+    g.dbReplica = None
+    try:
+        yield
+    finally:
+        if not g.get("dbWrote"):
+            g.dbReplica = replica
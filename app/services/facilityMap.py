@@ -0,0 +1,132 @@
+"""
+Facility map points and server-side clustering.
+
+The map only needs the ID, name and coordinates of each facility, so the points are
+loaded with a column projection in columnar form and kept in the read cache next to
+an ETag computed from their contents. The facility mapper events drop the cached
+points, so the ETag changes exactly when a facility is added, edited or removed.
+
+clusterPoints() groups the points inside a bounding box into a square grid whose
+cell size halves with every zoom level.
+"""
+
+import hashlib
+import json
+import math
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from extensions import db, readCache
+from models.productionFacility import ProductionFacility
+
+mapNamespace = "facilityMap"
+clusterCellsPerTile = 4
+
+
+def loadMapPoints():
+    rows = db.session.execute(
+        db.select(
+            ProductionFacility.id,
+            ProductionFacility.name,
+            ProductionFacility.latitude,
+            ProductionFacility.longitude,
+            ProductionFacility.isOperating,
+        ).order_by(ProductionFacility.id)
+    ).all()
+    points = {
+        "id": [row.id for row in rows],
+        "lat": [row.latitude for row in rows],
+        "lon": [row.longitude for row in rows],
+        "text": [row.name for row in rows],
+        "operating": [row.isOperating for row in rows],
+    }
+    digest = hashlib.sha1(json.dumps(points, sort_keys=True).encode()).hexdigest()
+    points["etag"] = digest[:20]
+    return points
+
+
+def getMapPoints():
+    """
+    Return the facility map points.
+
+    Returns:
+        dict: Parallel "id", "lat", "lon", "text" and "operating" lists ordered by
+            facility ID, and the "etag" of their contents.
+    """
+    return readCache.get(mapNamespace, "points", loadMapPoints)
+
+
+def getMapEtag():
+    """Return the ETag of the map points without loading them on a cache hit."""
+    return readCache.get(mapNamespace, "etag", lambda: getMapPoints()["etag"])
+
+
+@event.listens_for(ProductionFacility, "after_insert")
+@event.listens_for(ProductionFacility, "after_update")
+@event.listens_for(ProductionFacility, "before_delete")
+def invalidateMapPoints(mapper, connection, target):
+    """Drop the cached map points when a facility is inserted, updated or deleted."""
+    session = object_session(target)
+    readCache.invalidate(mapNamespace, "points", session)
+    readCache.invalidate(mapNamespace, "etag", session)
+
+
+def parseBoundingBox(value):
+    """
+    Parse a "minLon,minLat,maxLon,maxLat" bounding box.
+
+    A box with minLon > maxLon crosses the antimeridian.
+
+    Raises:
+        ValueError: If the value is not four numbers within the valid ranges.
+    """
+    parts = [float(part) for part in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be minLon,minLat,maxLon,maxLat")
+    minLon, minLat, maxLon, maxLat = parts
+    if not (-180 <= minLon <= 180 and -180 <= maxLon <= 180):
+        raise ValueError("bbox longitudes must be within [-180, 180]")
+    if not -90 <= minLat <= maxLat <= 90:
+        raise ValueError("bbox latitudes must be ordered and within [-90, 90]")
+    return minLon, minLat, maxLon, maxLat
+
+
+def clusterPoints(points, bbox, zoom):
+    """
+    Group the points inside a bounding box into grid clusters.
+
+    Args:
+        points (dict): Map points as returned by getMapPoints().
+        bbox (tuple): (minLon, minLat, maxLon, maxLat).
+        zoom (float): The map zoom level; each level halves the cell size.
+
+    Returns:
+        dict: Parallel "lat", "lon", "text" and "count" lists, one entry per
+            non-empty cell, positioned at the mean of the cell's points.
+    """
+    minLon, minLat, maxLon, maxLat = bbox
+    wraps = minLon > maxLon
+    cellSize = 360 / (2 ** max(zoom, 0)) / clusterCellsPerTile
+    cells = {}
+    for lat, lon, text in zip(points["lat"], points["lon"], points["text"]):
+        if not minLat <= lat <= maxLat:
+            continue
+        if wraps:
+            if maxLon < lon < minLon:
+                continue
+        elif not minLon <= lon <= maxLon:
+            continue
+        key = (math.floor((lon + 180) / cellSize), math.floor((lat + 90) / cellSize))
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = [lat, lon, 1, text]
+        else:
+            cell[0] += lat
+            cell[1] += lon
+            cell[2] += 1
+    clusters = {"lat": [], "lon": [], "text": [], "count": []}
+    for sumLat, sumLon, count, text in cells.values():
+        clusters["lat"].append(sumLat / count)
+        clusters["lon"].append(sumLon / count)
+        clusters["text"].append(text if count == 1 else f"{count} facilities")
+        clusters["count"].append(count)
+    return clusters
@@ -0,0 +1,44 @@
+"""
+Google OAuth client.
+
+The Flask-OAuthlib remote app is created the first time a Google login route uses
+it, so importing the application does not load flask_oauthlib and oauthlib.
+"""
+
+import os
+from threading import Lock
+from flask import session
+
+clientLock = Lock()
+googleClient = None
+
+
+def getGoogle():
+    """Return the Google OAuth remote app, creating it on first use."""
+    global googleClient
+    if googleClient is not None:
+        return googleClient
+    with clientLock:
+        if googleClient is None:
+            from flask_oauthlib.client import OAuth
+
+            client = OAuth().remote_app(
+                "google",
+                consumer_key=os.getenv("GOOGLE_CONSUMER_KEY"),
+                consumer_secret=os.getenv("GOOGLE_CONSUMER_SECRET"),
+                request_token_params={
+                    "scope": "email",
+                },
+                base_url="https://www.googleapis.com/oauth2/v1/",
+                request_token_url=None,
+                access_token_method="POST",
+                access_token_url="https://accounts.google.com/o/oauth2/token",
+                authorize_url="https://accounts.google.com/o/oauth2/auth",
+            )
+            client.tokengetter(getGoogleOAuthToken)
+            googleClient = client
+    return googleClient
+
+
+def getGoogleOAuthToken():
+    return session.get("googleToken")
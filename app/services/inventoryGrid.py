@@ -0,0 +1,267 @@
+"""
+Server-side sorting, filtering and keyset pagination for the inventory grid.
+
+A page is selected with a seek condition on the sort key instead of an OFFSET: the
+rows are ordered by (item ID, entry ID), or by (sort column, item ID, entry ID), and
+the next page starts after the key of the last row returned. The facility's
+(facility, item) index serves the default order, so a deep page costs the same as
+the first one.
+
+The key of the last row travels to the client as an opaque cursor string.
+"""
+
+import base64
+import csv
+import io
+import json
+from extensions import db
+from models.component import Component
+from models.inventory import ComponentInventory, ProductInventory
+from models.product import Product
+
+defaultPageSize = 50
+maxPageSize = 500
+exportPageSize = 1000
+
+
+class GridSource:
+    """
+    The inventory and catalog models behind one side of the grid.
+
+    Attributes:
+        inventory: The inventory model.
+        catalog: The catalog model joined to it.
+        itemKey (str): The inventory column referencing the catalog row.
+        searchColumns (list): Catalog column names matched by the search text.
+        exportColumns (list): Catalog column names written by the CSV export.
+    """
+
+    def __init__(self, inventory, catalog, itemKey, searchColumns, exportColumns):
+        self.inventory = inventory
+        self.catalog = catalog
+        self.itemKey = itemKey
+        self.searchColumns = searchColumns
+        self.exportColumns = exportColumns
+
+    def itemColumn(self):
+        return getattr(self.inventory, self.itemKey)
+
+    def sortExpression(self, sort):
+        if sort == "item":
+            return None
+        if sort == "count":
+            return self.inventory.count
+        if sort == "price":
+            # Keyset comparisons need a non-null key
+            return db.func.coalesce(self.catalog.price, 0)
+        raise ValueError(f"Unknown sort: {sort}")
+
+
+gridSources = {
+    "product": GridSource(
+        ProductInventory,
+        Product,
+        "productId",
+        ["brand", "model"],
+        ["brand", "model", "category", "price"],
+    ),
+    "component": GridSource(
+        ComponentInventory,
+        Component,
+        "componentId",
+        ["brand", "name"],
+        ["brand", "name", "category", "price"],
+    ),
+}
+
+
+def encodeCursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decodeCursor(cursor):
+    """
+    Decode a cursor string into the sort key values it holds.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def getSource(itemType, sort, direction):
+    """
+    Return the grid source of an item type after validating the sort options.
+
+    Raises:
+        ValueError: If the type, sort or direction is unknown.
+    """
+    if itemType not in gridSources:
+        raise ValueError(f"Unknown inventory type: {itemType}")
+    if direction not in ("asc", "desc"):
+        raise ValueError(f"Unknown direction: {direction}")
+    source = gridSources[itemType]
+    source.sortExpression(sort)
+    return source
+
+
+def buildQuery(source, facilityId, filters, sort, direction):
+    """Return the filtered, ordered grid query and its key expressions."""
+    inventory, catalog = source.inventory, source.catalog
+    sortExpression = source.sortExpression(sort)
+    keys = [source.itemColumn(), inventory.id]
+    if sortExpression is not None:
+        keys.insert(0, sortExpression)
+    query = (
+        db.select(inventory, catalog, *keys)
+        .join(catalog, catalog.id == source.itemColumn())
+        .where(inventory.productionFacilityId == facilityId)
+    )
+    if filters.get("q"):
+        query = query.where(
+            db.or_(
+                *(
+                    getattr(catalog, column).icontains(filters["q"], autoescape=True)
+                    for column in source.searchColumns
+                )
+            )
+        )
+    if filters.get("category"):
+        query = query.where(catalog.category == filters["category"])
+    if filters.get("minCount") is not None:
+        query = query.where(inventory.count >= filters["minCount"])
+    if filters.get("maxCount") is not None:
+        query = query.where(inventory.count <= filters["maxCount"])
+    if direction == "desc":
+        return query.order_by(*(key.desc() for key in keys)), keys
+    return query.order_by(*keys), keys
+
+
+def seek(query, keys, direction, after):
+    if after is None:
+        return query
+    if len(after) != len(keys):
+        raise ValueError("Invalid cursor")
+    if direction == "desc":
+        return query.where(db.tuple_(*keys) < db.tuple_(*after))
+    return query.where(db.tuple_(*keys) > db.tuple_(*after))
+
+
+def loadInventoryPage(
+    facilityId,
+    itemType,
+    filters=None,
+    sort="item",
+    direction="asc",
+    after=None,
+    limit=defaultPageSize,
+):
+    """
+    Load one page of a facility's inventory grid.
+
+    Args:
+        facilityId (int): The ID of the production facility.
+        itemType (str): "product" or "component".
+        filters (dict): Optional "q" search text, "category", "minCount" and
+            "maxCount".
+        sort (str): "item", "count" or "price"; ties are broken by item and entry ID.
+        direction (str): "asc" or "desc".
+        after (str): The cursor returned with the previous page.
+        limit (int): The page size, capped at maxPageSize.
+
+    Returns:
+        dict: "entries" in the format of services.inventoryLoader, with the catalog
+            row nested under the item type, and "nextCursor", None on the last page.
+
+    Raises:
+        ValueError: If the type, sort, direction or cursor is invalid.
+    """
+    source = getSource(itemType, sort, direction)
+    limit = max(1, min(limit, maxPageSize))
+    query, keys = buildQuery(source, facilityId, filters or {}, sort, direction)
+    query = seek(query, keys, direction, decodeCursor(after) if after else None)
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    entries = []
+    for row in rows[:limit]:
+        entryDict = row[0].toDict()
+        entryDict[itemType] = row[1].toDict()
+        entries.append(entryDict)
+    nextCursor = None
+    if len(rows) > limit:
+        nextCursor = encodeCursor(list(rows[limit - 1][2:]))
+    return {"entries": entries, "nextCursor": nextCursor}
+
+
+def iterateInventory(facilityId, itemType, filters=None, sort="item", direction="asc"):
+    """Yield every matching grid entry, one keyset page at a time."""
+    after = None
+    while True:
+        page = loadInventoryPage(
+            facilityId, itemType, filters, sort, direction, after, exportPageSize
+        )
+        yield from page["entries"]
+        after = page["nextCursor"]
+        if after is None:
+            return
+
+
+def exportRows(facilityId, itemType, filters=None, sort="item", direction="asc"):
+    """
+    Yield the CSV lines of a facility's inventory export, header first.
+
+    Raises:
+        ValueError: From the first next() call, if the type or sort is invalid.
+    """
+    columns = getSource(itemType, sort, direction).exportColumns
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield line(["entryId", f"{itemType}Id", *columns, "count"])
+    for entry in iterateInventory(facilityId, itemType, filters, sort, direction):
+        item = entry[itemType]
+        yield line(
+            [
+                entry["id"],
+                item["id"],
+                *(item[column] for column in columns),
+                entry["count"],
+            ]
+        )
+
+
+def gridArguments(args):
+    """
+    Read the grid filters, sort and page options from request arguments.
+
+    Raises:
+        ValueError: If a count or the page size is not an integer.
+    """
+
+    def optionalInt(name):
+        value = args.get(name)
+        return int(value) if value not in (None, "") else None
+
+    return {
+        "filters": {
+            "q": args.get("q", "").strip(),
+            "category": args.get("category", "").strip(),
+            "minCount": optionalInt("minCount"),
+            "maxCount": optionalInt("maxCount"),
+        },
+        "sort": args.get("sort", "item"),
+        "direction": args.get("direction", "asc"),
+        "after": args.get("after") or None,
+        "limit": optionalInt("limit") or defaultPageSize,
+    }
@@ -0,0 +1,299 @@
+"""
+Point-in-time stock from the inventory movement ledger.
+
+Every inventory change is appended to InventoryMovement (see
+models/inventoryMovement.py), so a facility's stock as of T is the sum of its
+movements up to T. Summing years of movements per query would get slower every
+day, so takeSnapshots() periodically stores the counts of each busy facility as an
+InventorySnapshot, and stockAt() starts from the latest snapshot before T and
+replays only the movements between the two. The replay is one indexed range scan
+of at most about LEDGER_SNAPSHOT_MIN_MOVEMENTS rows per facility, however long the
+history.
+
+A snapshot covers the movements up to a cutoff LEDGER_SNAPSHOT_GRACE_SECONDS in the
+past, so that transactions still open when it is taken commit their movements
+before the cutoff is reached. Snapshots are built from the previous snapshot and
+the ledger alone, never from the inventory counts.
+
+reconcileLedger() appends "reconcile" movements wherever the inventory counts and
+the ledger disagree: when the ledger is first opened on an existing database, and
+after writes that bypass the unit of work. Both run from `flask ims` commands.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, insert
+from extensions import db
+from models.inventoryMovement import (
+    InventoryMovement,
+    InventorySnapshot,
+    InventorySnapshotEntry,
+)
+from models.productionFacility import ProductionFacility
+from services.inventoryLocks import writeSerialized
+from services.inventoryWriter import entryTypeMap
+from services.metrics import metrics
+
+itemKeys = {"product": "productId", "component": "componentId"}
+
+snapshotsTaken = metrics.counter(
+    "ims_inventory_snapshots_total", "Inventory snapshots stored by takeSnapshots."
+)
+reconciledMovements = metrics.counter(
+    "ims_ledger_reconcile_movements_total",
+    "Movements appended by reconcileLedger, by item type.",
+    ("type",),
+)
+
+
+def latestSnapshot(facilityId, at):
+    """Return the (id, takenAt) of the latest snapshot at or before at, or None."""
+    return db.session.execute(
+        db.select(InventorySnapshot.id, InventorySnapshot.takenAt)
+        .where(
+            InventorySnapshot.productionFacilityId == facilityId,
+            InventorySnapshot.takenAt <= at,
+        )
+        .order_by(InventorySnapshot.takenAt.desc(), InventorySnapshot.id.desc())
+        .limit(1)
+    ).first()
+
+
+def stockAt(facilityId, at, itemType=None, itemIds=None):
+    """
+    Return a facility's counts as of a point in time.
+
+    Args:
+        facilityId (int): The facility.
+        at (datetime): The point in time.
+        itemType (str): "product" or "component"; both by default.
+        itemIds: The product or component IDs; every item by default.
+
+    Returns:
+        dict: The "snapshotAt" time the replay started from (None without a
+            snapshot), the number of "replayed" movements and the non-zero
+            "items", ordered by type and item ID.
+    """
+    snapshot = latestSnapshot(facilityId, at)
+    counts = defaultdict(int)
+    if snapshot is not None:
+        query = db.select(
+            InventorySnapshotEntry.itemType,
+            InventorySnapshotEntry.itemId,
+            InventorySnapshotEntry.count,
+        ).where(InventorySnapshotEntry.snapshotId == snapshot.id)
+        if itemType is not None:
+            query = query.where(InventorySnapshotEntry.itemType == itemType)
+        if itemIds is not None:
+            query = query.where(InventorySnapshotEntry.itemId.in_(list(itemIds)))
+        for entryType, itemId, count in db.session.execute(query):
+            counts[entryType, itemId] = count
+
+    query = db.select(
+        InventoryMovement.itemType,
+        InventoryMovement.itemId,
+        func.sum(InventoryMovement.delta),
+        func.count(),
+    ).where(
+        InventoryMovement.productionFacilityId == facilityId,
+        InventoryMovement.createdAt <= at,
+    )
+    if snapshot is not None:
+        query = query.where(InventoryMovement.createdAt > snapshot.takenAt)
+    if itemType is not None:
+        query = query.where(InventoryMovement.itemType == itemType)
+    if itemIds is not None:
+        query = query.where(InventoryMovement.itemId.in_(list(itemIds)))
+    replayed = 0
+    for entryType, itemId, delta, movements in db.session.execute(
+        query.group_by(InventoryMovement.itemType, InventoryMovement.itemId)
+    ):
+        counts[entryType, itemId] += delta
+        replayed += movements
+    return {
+        "snapshotAt": snapshot.takenAt if snapshot is not None else None,
+        "replayed": replayed,
+        "items": [
+            {"type": entryType, "itemId": itemId, "count": count}
+            for (entryType, itemId), count in sorted(counts.items())
+            if count
+        ],
+    }
+
+
+def listMovements(facilityId, itemType=None, itemId=None, beforeId=None, limit=100):
+    """
+    Return a facility's movements, newest first.
+
+    Args:
+        facilityId (int): The facility.
+        itemType (str): Only movements of "product" or "component" items.
+        itemId (int): Only movements of this item; requires itemType.
+        beforeId (int): Only movements older than this one, to page backwards.
+        limit (int): The maximum number of movements.
+
+    Returns:
+        list: One dictionary per movement.
+    """
+    query = db.select(InventoryMovement).where(
+        InventoryMovement.productionFacilityId == facilityId
+    )
+    if itemType is not None:
+        query = query.where(InventoryMovement.itemType == itemType)
+    if itemId is not None:
+        query = query.where(InventoryMovement.itemId == itemId)
+    if beforeId is not None:
+        query = query.where(InventoryMovement.id < beforeId)
+    return [
+        {
+            "movementId": movement.id,
+            "type": movement.itemType,
+            "itemId": movement.itemId,
+            "delta": movement.delta,
+            "reason": movement.reason,
+            "userId": movement.userId,
+            "createdAt": movement.createdAt.isoformat(),
+        }
+        for movement in db.session.scalars(
+            query.order_by(InventoryMovement.id.desc()).limit(limit)
+        )
+    ]
+
+
+def takeSnapshots(cutoff=None, minMovements=None):
+    """
+    Snapshot every facility with enough movements since its latest snapshot.
+
+    Args:
+        cutoff (datetime): The time the snapshots are taken at; defaults to
+            LEDGER_SNAPSHOT_GRACE_SECONDS ago.
+        minMovements (int): The movements a facility needs since its latest
+            snapshot; defaults to LEDGER_SNAPSHOT_MIN_MOVEMENTS.
+
+    Returns:
+        int: The number of snapshots stored.
+    """
+    config = current_app.config
+    if cutoff is None:
+        cutoff = datetime.now() - timedelta(
+            seconds=config["LEDGER_SNAPSHOT_GRACE_SECONDS"]
+        )
+    if minMovements is None:
+        minMovements = config["LEDGER_SNAPSHOT_MIN_MOVEMENTS"]
+    latest = dict(
+        db.session.execute(
+            db.select(
+                InventorySnapshot.productionFacilityId,
+                func.max(InventorySnapshot.takenAt),
+            ).group_by(InventorySnapshot.productionFacilityId)
+        ).all()
+    )
+    facilityIds = db.session.scalars(
+        db.select(ProductionFacility.id).order_by(ProductionFacility.id)
+    ).all()
+    taken = 0
+    for facilityId in facilityIds:
+        since = latest.get(facilityId)
+        if since is not None and since >= cutoff:
+            continue
+        query = db.select(func.count()).where(
+            InventoryMovement.productionFacilityId == facilityId,
+            InventoryMovement.createdAt <= cutoff,
+        )
+        if since is not None:
+            query = query.where(InventoryMovement.createdAt > since)
+        if db.session.scalar(query) < max(minMovements, 1):
+            continue
+        stock = stockAt(facilityId, cutoff)
+        snapshot = InventorySnapshot(
+            productionFacilityId=facilityId,
+            takenAt=cutoff,
+            movementCount=stock["replayed"],
+        )
+        db.session.add(snapshot)
+        db.session.flush()
+        if stock["items"]:
+            db.session.execute(
+                insert(InventorySnapshotEntry),
+                [
+                    {
+                        "snapshotId": snapshot.id,
+                        "itemType": item["type"],
+                        "itemId": item["itemId"],
+                        "count": item["count"],
+                    }
+                    for item in stock["items"]
+                ],
+            )
+        db.session.commit()
+        taken += 1
+    snapshotsTaken.inc(taken)
+    return taken
+
+
+def reconcileFacility(facilityId):
+    """Append the movements that make a facility's ledger match its counts."""
+    counts = {}
+    for itemType, model in entryTypeMap.items():
+        itemColumn = getattr(model, itemKeys[itemType])
+        # Locking the rows first keeps concurrent edits out of the comparison
+        for itemId, count in db.session.execute(
+            db.select(itemColumn, model.count)
+            .where(model.productionFacilityId == facilityId, itemColumn.isnot(None))
+            .order_by(model.id)
+            .with_for_update()
+        ):
+            counts[itemType, itemId] = counts.get((itemType, itemId), 0) + count
+    now = datetime.now()
+    ledger = {
+        (item["type"], item["itemId"]): item["count"]
+        for item in stockAt(facilityId, now)["items"]
+    }
+    movements = [
+        {
+            "productionFacilityId": facilityId,
+            "itemType": itemType,
+            "itemId": itemId,
+            "delta": counts.get((itemType, itemId), 0)
+            - ledger.get((itemType, itemId), 0),
+            "reason": "reconcile",
+            "userId": None,
+            "createdAt": now,
+        }
+        for itemType, itemId in sorted(counts.keys() | ledger.keys())
+        if counts.get((itemType, itemId), 0) != ledger.get((itemType, itemId), 0)
+    ]
+    if movements:
+        db.session.execute(insert(InventoryMovement), movements)
+    return movements
+
+
+def reconcileLedger():
+    """
+    Append "reconcile" movements wherever the ledger and the inventory disagree.
+
+    Run once to open the ledger on existing inventory, and after writes that
+    bypass the unit of work. Each facility is reconciled in its own transaction.
+
+    Returns:
+        dict: The number of movements appended per item type.
+    """
+    appended = {itemType: 0 for itemType in entryTypeMap}
+    facilityIds = db.session.scalars(
+        db.select(ProductionFacility.id).order_by(ProductionFacility.id)
+    ).all()
+    for facilityId in facilityIds:
+        with writeSerialized(db.session):
+            try:
+                movements = reconcileFacility(facilityId)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        for movement in movements:
+            appended[movement["itemType"]] += 1
+    for itemType, count in appended.items():
+        if count:
+            reconciledMovements.inc(count, labels=(itemType,))
+    return appended
@@ -0,0 +1,77 @@
+"""
+Facility inventory loading.
+
+This module loads the product and component inventory of a production facility
+together with the catalog rows they reference. Each side is fetched with a single
+joined query, so the number of round trips stays constant no matter how many
+SKUs a facility holds.
+"""
+
+from extensions import db
+from models.component import Component
+from models.inventory import ProductInventory, ComponentInventory
+from models.product import Product
+
+
+def loadProductEntries(facilityId):
+    """
+    Load the product inventory of a facility in one joined query.
+
+    Args:
+        facilityId (int): The ID of the production facility.
+
+    Returns:
+        list: Inventory entry dictionaries, each with the product nested under "product".
+    """
+    rows = db.session.execute(
+        db.select(ProductInventory, Product)
+        .join(Product, Product.id == ProductInventory.productId)
+        .where(ProductInventory.productionFacilityId == facilityId)
+        .order_by(ProductInventory.id)
+    )
+    entries = []
+    for entry, product in rows:
+        entryDict = entry.toDict()
+        entryDict["product"] = product.toDict()
+        entries.append(entryDict)
+    return entries
+
+
+def loadComponentEntries(facilityId):
+    """
+    Load the component inventory of a facility in one joined query.
+
+    Args:
+        facilityId (int): The ID of the production facility.
+
+    Returns:
+        list: Inventory entry dictionaries, each with the component nested under "component".
+    """
+    rows = db.session.execute(
+        db.select(ComponentInventory, Component)
+        .join(Component, Component.id == ComponentInventory.componentId)
+        .where(ComponentInventory.productionFacilityId == facilityId)
+        .order_by(ComponentInventory.id)
+    )
+    entries = []
+    for entry, component in rows:
+        entryDict = entry.toDict()
+        entryDict["component"] = component.toDict()
+        entries.append(entryDict)
+    return entries
+
+
+def loadFacilityInventory(facilityId):
+    """
+    Load both sides of a facility's inventory.
+
+    Args:
+        facilityId (int): The ID of the production facility.
+
+    Returns:
+        dict: A dictionary with "productEntries" and "componentEntries" lists.
+    """
+    return {
+        "productEntries": loadProductEntries(facilityId),
+        "componentEntries": loadComponentEntries(facilityId),
+    }
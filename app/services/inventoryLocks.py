@@ -0,0 +1,38 @@
+"""
+Serialized inventory writes on SQLite.
+
+Writers that read inventory counts and then change them lock the rows with
+SELECT ... FOR UPDATE. SQLite has no row locks and ignores FOR UPDATE, so on SQLite
+writeSerialized() takes the database write lock up front with an empty UPDATE,
+before the transaction reads anything. The writers of one process queue on a lock
+first, rather than in SQLite's busy handler, which sleeps between its retries. On
+other databases it does nothing.
+"""
+
+from contextlib import contextmanager
+from threading import Lock
+from sqlalchemy import false, update
+from models.inventory import ComponentInventory
+
+sqliteWriters = Lock()
+
+
+def isSqlite(dbSession):
+    return dbSession.get_bind(mapper=ComponentInventory).dialect.name == "sqlite"
+
+
+@contextmanager
+def writeSerialized(dbSession):
+    """
+    Run one read-then-write inventory transaction; commit or roll back inside.
+
+    Args:
+        dbSession (Session): The session of the transaction.
+    """
+    if not isSqlite(dbSession):
+        yield
+        return
+    table = ComponentInventory.__table__
+    with sqliteWriters:
+        dbSession.execute(update(table).where(false()).values(count=table.c.count))
+        yield
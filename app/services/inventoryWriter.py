@@ -0,0 +1,148 @@
+"""
+Bulk inventory writes.
+
+This module applies the grid edits posted to /save-changes. All affected rows of a
+type are loaded with one IN query, the new counts are assigned in memory and a
+single flush sends them to the database. The unit of work groups the UPDATEs of a
+table into one executemany, and the whole batch is committed once.
+
+A change may carry the "expectedCount" the grid showed. The rows are then read with
+SELECT ... FOR UPDATE, component rows before product rows like buildProduct() takes
+them, and a change whose entry no longer has that count is rejected as a conflict
+instead of overwriting a build or another user's edit made since the grid loaded.
+"""
+
+from extensions import db
+from models.inventory import ProductInventory, ComponentInventory
+from services.inventoryLocks import writeSerialized
+from services.metrics import metrics
+
+entryTypeMap = {"product": ProductInventory, "component": ComponentInventory}
+
+savedRows = metrics.counter(
+    "ims_inventory_save_rows_total",
+    "Inventory entries updated through saveInventoryChanges.",
+    ("type",),
+)
+saveErrors = metrics.counter(
+    "ims_inventory_save_errors_total",
+    "Inventory changes rejected by saveInventoryChanges, by reason.",
+    ("reason",),
+)
+
+
+def parseChange(change):
+    """
+    Validate one entry of a changes list.
+
+    Args:
+        change (dict): A change with "type", "entryId" and "quantity" keys, and
+            optionally the "expectedCount" the entry had when it was edited.
+
+    Returns:
+        tuple: The entry type, the entry ID, the new quantity and the expected
+            count, or None.
+
+    Raises:
+        Exception: If the change is malformed.
+    """
+    if change.get("type") not in entryTypeMap:
+        raise Exception("Invalid inventory entry type.")
+    try:
+        entryId = int(change["entryId"])
+        quantity = int(change["quantity"])
+        expectedCount = change.get("expectedCount")
+        if expectedCount is not None:
+            expectedCount = int(expectedCount)
+    except (KeyError, TypeError, ValueError):
+        raise Exception("Invalid inventory entry ID or quantity.")
+    if quantity < 0:
+        raise Exception(f"Quantity for entry {entryId} cannot be negative.")
+    return change["type"], entryId, quantity, expectedCount
+
+
+def saveInventoryChanges(changesList, atomic=False, userId=None, conflicts=None):
+    """
+    Apply a list of inventory count changes in one transaction.
+
+    Args:
+        changesList (list): Changes as posted by the facility inventory grid.
+        atomic (bool): If True, nothing is saved when any change fails.
+        userId (int): Recorded as lastUpdatedByUserId of the changed entries.
+        conflicts (list): If given, receives the type, entryId, expectedCount and
+            current count of every change whose entry no longer had the expected
+            count.
+
+    Returns:
+        list: One error message per change that could not be applied.
+    """
+    errors = []
+    applied = {entryType: 0 for entryType in entryTypeMap}
+    # Rows are locked in the order buildProduct() locks them
+    pending = {entryType: {} for entryType in ("component", "product")}
+    for change in changesList:
+        try:
+            entryType, entryId, quantity, expectedCount = parseChange(change)
+            pending[entryType][entryId] = (quantity, expectedCount)
+        except Exception as e:
+            errors.append(str(e))
+            saveErrors.inc(labels=("invalid",))
+
+    with writeSerialized(db.session):
+        for entryType, quantities in pending.items():
+            if not quantities:
+                continue
+            model = entryTypeMap[entryType]
+            entries = db.session.scalars(
+                db.select(model)
+                .where(model.id.in_(quantities.keys()))
+                .order_by(model.id)
+                .with_for_update()
+            ).all()
+            found = {entry.id: entry for entry in entries}
+            for entryId, (quantity, expectedCount) in quantities.items():
+                entry = found.get(entryId)
+                if entry is None:
+                    errors.append(
+                        f"Inventory {entryType} entry {entryId} does not exist."
+                    )
+                    saveErrors.inc(labels=("missing",))
+                    continue
+                if expectedCount is not None and entry.count != expectedCount:
+                    errors.append(
+                        f"Inventory {entryType} entry {entryId} changed from"
+                        f" {expectedCount} to {entry.count}."
+                    )
+                    saveErrors.inc(labels=("conflict",))
+                    if conflicts is not None:
+                        conflicts.append(
+                            {
+                                "type": entryType,
+                                "entryId": entryId,
+                                "expectedCount": expectedCount,
+                                "count": entry.count,
+                            }
+                        )
+                    continue
+                entry.count = quantity
+                if userId is not None:
+                    entry.lastUpdatedByUserId = userId
+                applied[entryType] += 1
+
+        if atomic and errors:
+            db.session.rollback()
+            saveErrors.inc(sum(applied.values()), labels=("aborted",))
+            return errors
+
+        try:
+            db.session.commit()
+        except Exception as e:
+            # Every change in the batch shares the failed transaction.
+            db.session.rollback()
+            errors.extend([str(e)] * sum(applied.values()))
+            saveErrors.inc(sum(applied.values()), labels=("commit",))
+            return errors
+    for entryType, count in applied.items():
+        if count:
+            savedRows.inc(count, labels=(entryType,))
+    return errors
@@ -0,0 +1,514 @@
+"""
+Prometheus metrics.
+
+A small in-process registry of counters, gauges and histograms, rendered in the
+Prometheus text exposition format by /metrics. Recording a value is a dictionary
+update under a lock, so the request hooks cost a few microseconds.
+
+The MetricsRegistry extension records per-route latency histograms, request totals
+and in-flight gauges, and the connection pool size, checked-out connections,
+checkouts, checkout wait and connect time of every engine created by db.init_app.
+Checkouts and connect time come from the pool events. The wait needs the pool
+itself: Config sets SQLALCHEMY_ENGINE_OPTIONS["poolclass"] to TimedQueuePool, which
+times each checkout, and every pool dispose() creates is recreated from it, so the
+timing survives the dispose() in the gunicorn post_fork hook.
+
+With METRICS_MULTIPROC_DIR set, each worker process writes a snapshot of its
+values to metrics-<pid>.json in that directory every METRICS_FLUSH_INTERVAL
+seconds, and /metrics merges the snapshots of all processes: counters and
+histograms are summed over every process that ever wrote one, so totals do not
+drop when a worker is replaced, while gauges are summed over live processes only.
+When a worker exits, the gunicorn child_exit hook calls compactSnapshot(), which
+adds its counters and histograms to exited-metrics.json and deletes its snapshot,
+so the directory holds one file per live worker.
+"""
+
+import atexit
+import bisect
+import glob
+import json
+import math
+import os
+import threading
+import time
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from services.auditLog import processIsAlive
+
+defaultBuckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+poolConnectBuckets = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+
+class TimedQueuePool(QueuePool):
+    """
+    A QueuePool that reports how long each checkout waited for a connection.
+
+    The time includes opening a connection when the pool may still grow. It is
+    passed to observeWait, which instrumentEngine() sets, and which the pool
+    created by recreate() on dispose() keeps.
+    """
+
+    observeWait = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.observeWait is not None:
+                self.observeWait(time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.observeWait = self.observeWait
+        return pool
+
+
+class Metric:
+    """
+    One metric family.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): The HELP text.
+        labelNames (tuple): The label names; values are passed as a tuple in the
+            same order.
+        values (dict): Label values tuple -> value.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, help, labelNames=()):
+        self.name = name
+        self.help = help
+        self.labelNames = tuple(labelNames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(labels), value] for labels, value in self.values.items()]
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, labels=()):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, labels=()):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+    def set(self, value, labels=()):
+        with self.lock:
+            self.values[labels] = value
+
+
+class Histogram(Metric):
+    """A histogram whose values are [bucket counts..., +Inf count, sum]."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelNames=(), buckets=defaultBuckets):
+        super().__init__(name, help, labelNames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        # Bucket counts are stored per bucket and accumulated when rendered
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+
+class MetricsRegistry:
+    """
+    The metric families of the process, and the Flask integration.
+
+    Attributes:
+        metrics (dict): Metric name -> Metric.
+        multiprocDir (str): The snapshot directory, or None for a single process.
+        flushInterval (float): Seconds between snapshots of this process.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.engines = {}
+        self.multiprocDir = None
+        self.flushInterval = 1.0
+        self.pid = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.requestLatency = self.histogram(
+            "ims_http_request_duration_seconds",
+            "Request latency by route.",
+            ("method", "endpoint"),
+        )
+        self.requestsTotal = self.counter(
+            "ims_http_requests_total",
+            "Requests by route and status code.",
+            ("method", "endpoint", "status"),
+        )
+        self.inFlight = self.gauge(
+            "ims_http_requests_in_flight",
+            "Requests being handled, by route.",
+            ("endpoint",),
+        )
+        self.poolCheckouts = self.counter(
+            "ims_db_pool_checkouts_total",
+            "Connections checked out of the pool.",
+            ("engine",),
+        )
+        self.poolConnect = self.histogram(
+            "ims_db_pool_connect_seconds",
+            "Time spent opening a new database connection.",
+            ("engine",),
+            buckets=poolConnectBuckets,
+        )
+        self.poolWait = self.histogram(
+            "ims_db_pool_checkout_wait_seconds",
+            "Time a checkout waited for a pooled connection, including timeouts.",
+            ("engine",),
+            buckets=poolConnectBuckets,
+        )
+        self.poolSize = self.gauge(
+            "ims_db_pool_size", "Connections the pool keeps open.", ("engine",)
+        )
+        self.poolCheckedOut = self.gauge(
+            "ims_db_pool_checked_out", "Connections in use.", ("engine",)
+        )
+        self.poolOverflow = self.gauge(
+            "ims_db_pool_overflow",
+            "Connections open beyond the pool size.",
+            ("engine",),
+        )
+        self.collectors.append(self.collectPoolStats)
+
+    def counter(self, name, help, labelNames=()):
+        return self.register(Counter(name, help, labelNames))
+
+    def gauge(self, name, help, labelNames=()):
+        return self.register(Gauge(name, help, labelNames))
+
+    def histogram(self, name, help, labelNames=(), buckets=defaultBuckets):
+        return self.register(Histogram(name, help, labelNames, buckets))
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def init_app(self, app, engines=None):
+        """
+        Register the request hooks and instrument the database engines.
+
+        Args:
+            app (Flask): The application whose METRICS_* config is used.
+            engines (dict): Bind key -> Engine, as in db.engines; the default bind
+                is reported as "primary".
+        """
+        self.multiprocDir = app.config.get("METRICS_MULTIPROC_DIR")
+        self.flushInterval = app.config.get("METRICS_FLUSH_INTERVAL", 1.0)
+        app.extensions["metrics"] = self
+        app.before_request(self.startRequest)
+        app.after_request(self.recordStatus)
+        app.teardown_request(self.finishRequest)
+        for key, engine in (engines or {}).items():
+            self.instrumentEngine("primary" if key is None else key, engine)
+        if self.multiprocDir:
+            os.makedirs(self.multiprocDir, exist_ok=True)
+            atexit.unregister(self.writeSnapshot)
+            atexit.register(self.writeSnapshot)
+
+    def startRequest(self):
+        self.ensureStarted()
+        g.metricsStart = time.perf_counter()
+        g.metricsEndpoint = request.endpoint or "<unmatched>"
+        self.inFlight.inc(labels=(g.metricsEndpoint,))
+
+    def recordStatus(self, response):
+        g.metricsStatus = response.status_code
+        return response
+
+    def finishRequest(self, exc=None):
+        start = g.pop("metricsStart", None)
+        if start is None:
+            return
+        endpoint = g.pop("metricsEndpoint")
+        status = g.pop("metricsStatus", 500)
+        self.inFlight.dec(labels=(endpoint,))
+        self.requestLatency.observe(
+            time.perf_counter() - start, (request.method, endpoint)
+        )
+        self.requestsTotal.inc(labels=(request.method, endpoint, str(status)))
+
+    def instrumentEngine(self, name, engine):
+        """Count the pool checkouts of an engine and time their wait and connects."""
+        if self.engines.get(name) is engine:
+            return
+        # The pool gauges follow the engines of the most recently created app
+        self.engines[name] = engine
+        labels = (name,)
+
+        # Pool listeners on the engine carry over to the pool dispose() creates
+        @event.listens_for(engine, "do_connect")
+        def beforeConnect(dialect, connectionRecord, cargs, cparams):
+            connectionRecord.info["metricsConnectStart"] = time.perf_counter()
+
+        @event.listens_for(engine, "connect")
+        def onConnect(dbapiConnection, connectionRecord):
+            start = connectionRecord.info.pop("metricsConnectStart", None)
+            if start is not None:
+                self.poolConnect.observe(time.perf_counter() - start, labels)
+
+        @event.listens_for(engine, "checkout")
+        def onCheckout(dbapiConnection, connectionRecord, connectionProxy):
+            self.poolCheckouts.inc(labels=labels)
+
+        if isinstance(engine.pool, TimedQueuePool):
+            engine.pool.observeWait = lambda seconds: self.poolWait.observe(
+                seconds, labels
+            )
+
+    def collectPoolStats(self):
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            labels = (name,)
+            # Only queue pools report their size and overflow
+            for gauge, method in (
+                (self.poolSize, "size"),
+                (self.poolCheckedOut, "checkedout"),
+                (self.poolOverflow, "overflow"),
+            ):
+                if callable(getattr(pool, method, None)):
+                    gauge.set(max(0, getattr(pool, method)()), labels)
+
+    def collect(self):
+        """Return {name: family dict} with the current values of this process."""
+        for collector in self.collectors:
+            collector()
+        return {
+            name: {
+                "kind": metric.kind,
+                "help": metric.help,
+                "labelNames": list(metric.labelNames),
+                "buckets": list(getattr(metric, "buckets", ())),
+                "values": metric.snapshot(),
+            }
+            for name, metric in self.metrics.items()
+        }
+
+    def ensureStarted(self):
+        """Start the snapshot writer, once per process (workers may be forked)."""
+        if not self.multiprocDir or self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            if self.pid is not None:
+                # Values inherited through fork belong to the parent
+                for metric in self.metrics.values():
+                    metric.lock = threading.Lock()
+                    metric.clear()
+            self.pid = os.getpid()
+            self.thread = threading.Thread(
+                target=self.run, name="metrics-writer", daemon=True
+            )
+            self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.flushInterval)
+            self.writeSnapshot()
+
+    def snapshotPath(self, pid):
+        return os.path.join(self.multiprocDir, f"metrics-{pid}.json")
+
+    def exitedPath(self):
+        return os.path.join(self.multiprocDir, "exited-metrics.json")
+
+    def readExited(self):
+        try:
+            with open(self.exitedPath(), encoding="utf-8") as snapshot:
+                return json.load(snapshot)
+        except (OSError, ValueError):
+            return {"pids": [], "families": {}}
+
+    def compactSnapshot(self, pid):
+        """
+        Fold the snapshot of an exited worker into exited-metrics.json.
+
+        Its counters and histograms are added to the totals of the exited workers
+        and its gauges are dropped. The merged file lists the pid while its
+        snapshot is being deleted, so a concurrent /metrics never counts it twice.
+
+        Args:
+            pid (int): The exited worker's process ID.
+        """
+        if not self.multiprocDir:
+            return
+        path = self.snapshotPath(pid)
+        try:
+            with open(path, encoding="utf-8") as snapshot:
+                families = json.load(snapshot)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            families = {}
+        exited = self.readExited()
+        merged = {}
+        mergeFamilies(merged, exited["families"], includeGauges=False)
+        mergeFamilies(merged, families, includeGauges=False)
+        families = {
+            name: dict(
+                family,
+                values=[
+                    [list(labels), value] for labels, value in family["values"].items()
+                ],
+            )
+            for name, family in merged.items()
+        }
+        self.writeExited([pid], families)
+        os.remove(path)
+        # The pid may be reused by the worker that replaces this one
+        self.writeExited([], families)
+
+    def writeExited(self, pids, families):
+        temporary = f"{self.exitedPath()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as snapshot:
+            json.dump({"pids": pids, "families": families}, snapshot)
+        os.replace(temporary, self.exitedPath())
+
+    def writeSnapshot(self):
+        if not self.multiprocDir or self.pid != os.getpid():
+            return
+        path = self.snapshotPath(self.pid)
+        temporary = f"{path}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as snapshot:
+                json.dump(self.collect(), snapshot)
+            os.replace(temporary, path)
+        except OSError:
+            # Retried at the next interval
+            pass
+
+    def readSnapshots(self):
+        """Merge the snapshots of every process into one family dict."""
+        self.ensureStarted()
+        self.writeSnapshot()
+        merged = {}
+        paths = sorted(glob.glob(os.path.join(self.multiprocDir, "metrics-*.json")))
+        # Read after listing the snapshots: a pid compacted in between is listed
+        exited = self.readExited()
+        mergeFamilies(merged, exited["families"], includeGauges=False)
+        compacted = set(exited["pids"])
+        for path in paths:
+            pid = int(os.path.basename(path)[len("metrics-") : -len(".json")])
+            if pid in compacted:
+                continue
+            try:
+                with open(path, encoding="utf-8") as snapshot:
+                    families = json.load(snapshot)
+            except (OSError, ValueError):
+                continue
+            alive = pid == self.pid or processIsAlive(pid)
+            mergeFamilies(merged, families, includeGauges=alive)
+        return merged
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        if self.multiprocDir:
+            families = self.readSnapshots()
+        else:
+            families = {
+                name: dict(
+                    family,
+                    values={tuple(labels): value for labels, value in family["values"]},
+                )
+                for name, family in self.collect().items()
+            }
+        lines = []
+        for name, family in sorted(families.items()):
+            lines.append(f"# HELP {name} {escapeHelp(family['help'])}")
+            lines.append(f"# TYPE {name} {family['kind']}")
+            labelNames = family["labelNames"]
+            for labels, value in sorted(family["values"].items()):
+                pairs = list(zip(labelNames, labels))
+                if family["kind"] != "histogram":
+                    lines.append(f"{name}{formatLabels(pairs)} {formatValue(value)}")
+                    continue
+                cumulative = 0
+                bounds = [*family["buckets"], math.inf]
+                for bound, count in zip(bounds, value):
+                    cumulative += count
+                    bucketLabels = formatLabels(pairs + [("le", formatValue(bound))])
+                    lines.append(f"{name}_bucket{bucketLabels} {cumulative}")
+                lines.append(
+                    f"{name}_sum{formatLabels(pairs)} {formatValue(value[-1])}"
+                )
+                lines.append(f"{name}_count{formatLabels(pairs)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def mergeFamilies(merged, families, includeGauges=True):
+    """Add the values of snapshot families to merged, keyed by label tuple."""
+    for name, family in families.items():
+        if family["kind"] == "gauge" and not includeGauges:
+            continue
+        target = merged.setdefault(name, dict(family, values={}))
+        for labels, value in family["values"]:
+            key = tuple(labels)
+            current = target["values"].get(key)
+            if current is None:
+                target["values"][key] = value
+            elif isinstance(value, list):
+                target["values"][key] = [a + b for a, b in zip(current, value)]
+            else:
+                target["values"][key] = current + value
+
+
+def escapeHelp(text):
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def formatLabels(pairs):
+    if not pairs:
+        return ""
+    escaped = (
+        (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def formatValue(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+    return str(value)
+
+
+metrics = MetricsRegistry()
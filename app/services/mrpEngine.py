@@ -0,0 +1,496 @@
+"""
+Buildable quantities from the bill of materials and the component inventory.
+
+A product is made by one or more production processes, and each process consumes
+ComponentsRequired.count units of a set of components. With the component stock
+of a facility, the quantity one process can build is the minimum over its
+requirements of stock // count, and the quantity of the product is the maximum
+over its processes. The requirement reaching the minimum is the limiting
+component: the one that runs out first.
+
+Everything is computed with NumPy over whole facilities x processes matrices:
+
+- the stock is a dense components x facilities matrix, built a chunk of
+  facilities at a time to bound the memory;
+- the requirements are laid out in slots: row k of the slot matrices holds the
+  k-th requirement of every process, so the minimum over a process is a running
+  np.minimum over the slots. The slot number is added to stock // count * slots,
+  so the same minimum also identifies the first limiting requirement. The
+  processes of each product are reduced with np.maximum the same way.
+
+Processes without any component requirement are ignored, since they would have no
+limit.
+"""
+
+import time
+import numpy as np
+from extensions import db, readCache
+from models.component import Component
+from models.inventory import ComponentInventory
+from models.product import Product
+from models.productionProcess import ComponentsRequired, ProductionProcess
+
+# Facilities x processes cells computed per chunk, about 48 bytes each
+chunkCells = 1 << 20
+# Components filtered in SQL rather than after loading the stock
+maxFilteredComponents = 500
+
+
+class BillOfMaterials:
+    """
+    The component requirements of every process, grouped by product and process.
+
+    Attributes:
+        productIds (ndarray): Products with at least one process, ascending.
+        processIds (ndarray): Processes, grouped by product.
+        componentIds (ndarray): Components required by any process, ascending.
+        requiredComponents (ndarray): Component index of each requirement.
+        requiredProcesses (ndarray): Process index of each requirement.
+        requiredCounts (ndarray): Units consumed by each requirement.
+        processStarts (ndarray): First requirement of each process.
+        processProducts (ndarray): Product index of each process.
+        slotComponents (ndarray): slots x processes component indices, padded
+            with len(componentIds).
+        slotCounts (ndarray): slots x processes units consumed, padded with 1.
+        slotProcesses (ndarray): slots x products process indices, padded with
+            len(processIds).
+    """
+
+    def __init__(self, rows):
+        """
+        Args:
+            rows (ndarray): (productId, processId, componentId, count) rows, ordered
+                by product, process and component, with positive counts.
+        """
+        products, processes, components, counts = rows.reshape(-1, 4).T
+        self.componentIds, self.requiredComponents = np.unique(
+            components, return_inverse=True
+        )
+        self.requiredCounts = counts
+        self.processStarts = startsOf(processes)
+        self.processIds = processes[self.processStarts]
+        processProducts = products[self.processStarts]
+        productStarts = startsOf(processProducts)
+        self.productIds = processProducts[productStarts]
+
+        (self.requiredProcesses, slot), slots = slotsOf(
+            self.processStarts, len(processes)
+        )
+        self.slotComponents = np.full(
+            (slots, len(self.processIds)), len(self.componentIds)
+        )
+        self.slotComponents[slot, self.requiredProcesses] = self.requiredComponents
+        self.slotCounts = np.ones(self.slotComponents.shape)
+        self.slotCounts[slot, self.requiredProcesses] = counts
+
+        (self.processProducts, slot), slots = slotsOf(
+            productStarts, len(self.processIds)
+        )
+        self.slotProcesses = np.full(
+            (slots, len(self.productIds)), len(self.processIds)
+        )
+        self.slotProcesses[slot, self.processProducts] = np.arange(len(self.processIds))
+
+    def __len__(self):
+        return len(self.requiredComponents)
+
+
+def startsOf(values):
+    """Return the positions where a run of equal values starts."""
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+
+
+def slotsOf(starts, length):
+    """
+    Return the group and the position in the group of each of length elements.
+
+    Returns:
+        tuple: (groups, positions) arrays and the size of the largest group.
+    """
+    sizes = np.diff(np.append(starts, length))
+    groups = np.repeat(np.arange(len(starts)), sizes)
+    positions = np.arange(length) - np.repeat(starts, sizes)
+    return (groups, positions), int(sizes.max(initial=0))
+
+
+def fetchArray(query, columns):
+    """Return the integer rows of a query as a (rows, columns) array."""
+    # Much faster than np.array() over the Row objects
+    rows = db.session.execute(query)
+    return np.fromiter(
+        (value for row in rows for value in row), dtype=np.int64
+    ).reshape(-1, columns)
+
+
+def loadBillOfMaterials(productIds=None):
+    """
+    Load the requirements of every process, or of the processes of some products.
+
+    Requirements listing the same component twice are added up. The complete
+    bill of materials is kept in the read cache.
+    """
+    query = (
+        db.select(
+            ProductionProcess.product,
+            ProductionProcess.id,
+            ComponentsRequired.componentId,
+            db.func.sum(ComponentsRequired.count),
+        )
+        .join(ComponentsRequired, ComponentsRequired.processId == ProductionProcess.id)
+        .where(
+            ProductionProcess.product.is_not(None),
+            ComponentsRequired.componentId.is_not(None),
+        )
+        .group_by(
+            ProductionProcess.product,
+            ProductionProcess.id,
+            ComponentsRequired.componentId,
+        )
+        .having(db.func.sum(ComponentsRequired.count) > 0)
+        .order_by(
+            ProductionProcess.product,
+            ProductionProcess.id,
+            ComponentsRequired.componentId,
+        )
+    )
+    if productIds is not None:
+        query = query.where(ProductionProcess.product.in_(productIds))
+        return BillOfMaterials(fetchArray(query, 4))
+    # The processes change rarely; the model events invalidate the cached rows
+    return BillOfMaterials(
+        readCache.get("billOfMaterials", "all", lambda: fetchArray(query, 4))
+    )
+
+
+def loadComponentStock(bom, facilityIds=None):
+    """
+    Load the positive stock of the components a bill of materials requires.
+
+    Returns:
+        ndarray: (facilityId, componentId, count) rows ordered by facility.
+    """
+    query = db.select(
+        ComponentInventory.productionFacilityId,
+        ComponentInventory.componentId,
+        ComponentInventory.count,
+    ).where(
+        ComponentInventory.count > 0,
+        ComponentInventory.productionFacilityId.is_not(None),
+        ComponentInventory.componentId.is_not(None),
+    )
+    if facilityIds is not None:
+        query = query.where(ComponentInventory.productionFacilityId.in_(facilityIds))
+    # Other components are dropped by iterBuildable()
+    if len(bom.componentIds) <= maxFilteredComponents:
+        query = query.where(
+            ComponentInventory.componentId.in_(bom.componentIds.tolist())
+        )
+    stock = fetchArray(query, 3)
+    # Sorting here is cheaper than ORDER BY through the facility index
+    return stock[np.argsort(stock[:, 0], kind="stable")]
+
+
+class BuildableChunk:
+    """Buildable quantities of every product at a run of facilities."""
+
+    def __init__(self, facilityIds, quantities, processes, limitingRequirements):
+        self.facilityIds = facilityIds
+        # facilities x products: units, and the indices of the process used
+        # and of its limiting requirement in the bill of materials
+        self.quantities = quantities
+        self.processes = processes
+        self.limitingRequirements = limitingRequirements
+
+
+def iterBuildable(bom, stock, facilityIds=None, cells=None):
+    """
+    Compute the buildable quantities, a chunk of facilities at a time.
+
+    Args:
+        bom (BillOfMaterials): The requirements.
+        stock (ndarray): (facilityId, componentId, count) rows ordered by facility.
+        facilityIds: The facilities to compute, ascending; by default every
+            facility in stock.
+        cells (int): Facilities x processes computed per chunk.
+
+    Yields:
+        BuildableChunk: Results for consecutive facilities, in facilityIds order.
+    """
+    if facilityIds is None:
+        facilityIds = np.unique(stock[:, 0])
+    facilityIds = np.asarray(facilityIds, dtype=np.int64)
+    components, processes = len(bom.componentIds), len(bom.processIds)
+    if processes == 0 or len(facilityIds) == 0:
+        return
+    # Rows of facilities or components outside the computation are dropped
+    facilityIndex = np.searchsorted(facilityIds, stock[:, 0])
+    componentIndex = np.searchsorted(bom.componentIds, stock[:, 1])
+    known = (
+        (facilityIndex < len(facilityIds))
+        & (componentIndex < components)
+        & (facilityIds[np.minimum(facilityIndex, len(facilityIds) - 1)] == stock[:, 0])
+        & (bom.componentIds[np.minimum(componentIndex, components - 1)] == stock[:, 1])
+    )
+    facilityIndex, componentIndex = facilityIndex[known], componentIndex[known]
+    counts = stock[known, 2]
+
+    requirementSlots, processSlots = len(bom.slotCounts), len(bom.slotProcesses)
+    products = np.arange(len(bom.productIds))[:, None]
+    chunkSize = max(1, (cells or chunkCells) // processes)
+    for start in range(0, len(facilityIds), chunkSize):
+        stop = min(start + chunkSize, len(facilityIds))
+        first, last = np.searchsorted(facilityIndex, (start, stop))
+        # The padding slots point to the last row, unlimited stock
+        matrix = np.zeros((components + 1, stop - start))
+        matrix[components] = np.inf
+        matrix[componentIndex[first:last], facilityIndex[first:last] - start] = counts[
+            first:last
+        ]
+
+        # processes x facilities: stock // count * slots + slot, so the minimum
+        # is the quantity and the first slot reaching it
+        keys = None
+        for slot in range(requirementSlots):
+            ratios = matrix[bom.slotComponents[slot]]
+            ratios /= bom.slotCounts[slot][:, None]
+            np.floor(ratios, out=ratios)
+            ratios *= requirementSlots
+            ratios += slot
+            keys = ratios if keys is None else np.minimum(keys, ratios, out=keys)
+        processQuantities = np.empty((processes + 1, stop - start))
+        processQuantities[processes] = -1
+        np.floor(keys / requirementSlots, out=processQuantities[:processes])
+        keys -= processQuantities[:processes] * requirementSlots
+
+        # products x facilities: the maximum quantity and the first process
+        # reaching it, as quantity * slots + (slots - 1 - slot)
+        best = None
+        for slot in range(processSlots):
+            ranks = processQuantities[bom.slotProcesses[slot]]
+            ranks *= processSlots
+            ranks += processSlots - 1 - slot
+            best = ranks if best is None else np.maximum(best, ranks, out=best)
+        quantities = np.floor(best / processSlots)
+        slots = (processSlots - 1) - (best - quantities * processSlots).astype(np.int64)
+        chosen = bom.slotProcesses[slots, products]
+        limiting = bom.processStarts[chosen] + np.take_along_axis(
+            keys, chosen, axis=0
+        ).astype(np.int64)
+        yield BuildableChunk(
+            facilityIds[start:stop],
+            quantities.T.astype(np.int64),
+            chosen.T,
+            limiting.T,
+        )
+
+
+class BuildablePlan:
+    """
+    Buildable quantities of products (columns) at facilities (rows).
+
+    Attributes:
+        facilityIds (ndarray): Row facilities, ascending.
+        productIds (ndarray): Column products, ascending.
+        quantities (ndarray): Units buildable from the current stock.
+        processIds (ndarray): Process building them.
+        limitingComponentIds (ndarray): Component that runs out first.
+    """
+
+    def __init__(self, bom, chunks):
+        chunks = list(chunks)
+        self.productIds = bom.productIds
+        self.facilityIds = np.concatenate(
+            [chunk.facilityIds for chunk in chunks] or [np.zeros(0, np.int64)]
+        )
+        shape = (len(self.facilityIds), len(self.productIds))
+
+        def stack(name, ids):
+            if not chunks:
+                return np.zeros(shape, dtype=np.int64)
+            values = np.concatenate([getattr(chunk, name) for chunk in chunks])
+            return values if ids is None else ids[values]
+
+        self.quantities = stack("quantities", None)
+        self.processIds = stack("processes", bom.processIds)
+        self.limitingComponentIds = stack(
+            "limitingRequirements", bom.componentIds[bom.requiredComponents]
+        )
+
+    def entries(self, row, column, minQuantity, limit, key, keyIds):
+        quantities = self.quantities[row, column]
+        selected = np.flatnonzero(quantities >= minQuantity)
+        # Most units first, then by ID
+        order = np.lexsort((keyIds[selected], -quantities[selected]))[:limit]
+        return [
+            {
+                key: int(keyIds[i]),
+                "quantity": int(quantities[i]),
+                "processId": int(self.processIds[row, column][i]),
+                "limitingComponentId": int(self.limitingComponentIds[row, column][i]),
+            }
+            for i in selected[order]
+        ]
+
+    def forFacility(self, facilityId, minQuantity=1, limit=None):
+        """Return the products a facility can build, most units first."""
+        row = np.searchsorted(self.facilityIds, facilityId)
+        if row == len(self.facilityIds) or self.facilityIds[row] != facilityId:
+            return []
+        return self.entries(
+            row, slice(None), minQuantity, limit, "productId", self.productIds
+        )
+
+    def forProduct(self, productId, minQuantity=1, limit=None):
+        """Return the facilities that can build a product, most units first."""
+        column = np.searchsorted(self.productIds, productId)
+        if column == len(self.productIds) or self.productIds[column] != productId:
+            return []
+        return self.entries(
+            slice(None), column, minQuantity, limit, "facilityId", self.facilityIds
+        )
+
+
+def computeBuildable(facilityIds=None, productIds=None, cells=None):
+    """
+    Compute the buildable quantity of products at facilities.
+
+    Args:
+        facilityIds: Facilities to compute; by default every facility stocking a
+            required component.
+        productIds: Products to compute; by default every product with a process.
+        cells (int): Facilities x processes computed per chunk.
+
+    Returns:
+        BuildablePlan: The quantities, processes and limiting components.
+    """
+    bom = loadBillOfMaterials(productIds)
+    stock = loadComponentStock(bom, facilityIds)
+    if facilityIds is not None:
+        facilityIds = np.unique(np.asarray(list(facilityIds), dtype=np.int64))
+    return BuildablePlan(bom, iterBuildable(bom, stock, facilityIds, cells))
+
+
+def buildableAtFacility(facilityId, minQuantity=1, limit=100):
+    """
+    Return the products a facility can build from its component stock.
+
+    Returns:
+        list: productId, quantity, processId and limitingComponentId dictionaries,
+            most units first.
+    """
+    plan = computeBuildable(facilityIds=[facilityId])
+    return plan.forFacility(facilityId, minQuantity, limit)
+
+
+def buildableOfProduct(productId, minQuantity=1, limit=100):
+    """
+    Return the facilities that can build a product, and the company-wide total.
+
+    Returns:
+        dict: "totalQuantity" over every facility, and "facilities": facilityId,
+            quantity, processId and limitingComponentId dictionaries, most units
+            first.
+    """
+    plan = computeBuildable(productIds=[productId])
+    return {
+        "totalQuantity": int(plan.quantities.sum()),
+        "facilities": plan.forProduct(productId, minQuantity, limit),
+    }
+
+
+def summarizeBuildable(cells=None):
+    """
+    Summarize the buildable quantities of every product over every facility.
+
+    The quantities are aggregated chunk by chunk, so the full facilities x
+    products matrix is never held in memory.
+
+    Returns:
+        dict: The "facilities", "requirements", "loadMs" and "computeMs" of the
+            run, and one "products" entry per product: totalQuantity, the number
+            of facilities that can build it, the bestFacilityId and bestQuantity,
+            and the bottleneck component, limiting at the most facilities.
+    """
+    start = time.perf_counter()
+    bom = loadBillOfMaterials()
+    stock = loadComponentStock(bom)
+    loaded = time.perf_counter()
+
+    products, components = len(bom.productIds), len(bom.componentIds)
+    totals = np.zeros(products, dtype=np.int64)
+    facilities = np.zeros(products, dtype=np.int64)
+    bestQuantities = np.full(products, -1, dtype=np.int64)
+    bestFacilities = np.zeros(products, dtype=np.int64)
+    limitingHits = np.zeros(len(bom), dtype=np.int64)
+    facilityCount = 0
+    for chunk in iterBuildable(bom, stock, cells=cells):
+        facilityCount += len(chunk.facilityIds)
+        totals += chunk.quantities.sum(axis=0)
+        facilities += np.count_nonzero(chunk.quantities, axis=0)
+        rows = chunk.quantities.argmax(axis=0)
+        chunkBest = chunk.quantities[rows, np.arange(products)]
+        better = chunkBest > bestQuantities
+        bestQuantities[better] = chunkBest[better]
+        bestFacilities[better] = chunk.facilityIds[rows[better]]
+        limitingHits += np.bincount(
+            chunk.limitingRequirements.ravel(), minlength=len(bom)
+        )
+    # Add up the hits of a component over the processes of each product, and
+    # keep the component with the most
+    requirementProducts = bom.processProducts[bom.requiredProcesses]
+    pairs, pairIndex = np.unique(
+        requirementProducts * components + bom.requiredComponents,
+        return_inverse=True,
+    )
+    pairHits = np.bincount(pairIndex, weights=limitingHits)
+    pairProducts = pairs // components
+    order = np.lexsort((pairs, -pairHits, pairProducts))
+    bottlenecks = pairs[order[startsOf(pairProducts[order])]] % components
+    computed = time.perf_counter()
+
+    productNames = nameLookup(Product, bom.productIds)
+    componentNames = nameLookup(Component, bom.componentIds[bottlenecks])
+    entries = []
+    for i, productId in enumerate(bom.productIds.tolist()):
+        componentId = int(bom.componentIds[bottlenecks[i]])
+        entries.append(
+            {
+                "productId": productId,
+                "product": productNames.get(productId, ""),
+                "totalQuantity": int(totals[i]),
+                "facilities": int(facilities[i]),
+                "bestFacilityId": (
+                    int(bestFacilities[i]) if bestQuantities[i] > 0 else None
+                ),
+                "bestQuantity": max(int(bestQuantities[i]), 0),
+                "bottleneckComponentId": componentId,
+                "bottleneckComponent": componentNames.get(componentId, ""),
+            }
+        )
+    return {
+        "facilities": facilityCount,
+        "requirements": len(bom),
+        "loadMs": (loaded - start) * 1000,
+        "computeMs": (computed - loaded) * 1000,
+        "products": entries,
+    }
+
+
+def nameLookup(model, ids):
+    """Return "brand model" (or name) labels of products or components by ID."""
+    ids = sorted(set(np.asarray(ids).tolist()))
+    names = {}
+    # Chunked to stay below the bound parameter limits
+    for start in range(0, len(ids), 500):
+        rows = db.session.execute(
+            db.select(model).where(model.id.in_(ids[start : start + 500]))
+        ).scalars()
+        for row in rows:
+            names[row.id] = " ".join(
+                str(part)
+                for part in (row.brand, getattr(row, "name", None) or row.model)
+                if part
+            )
+    return names
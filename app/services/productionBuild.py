@@ -0,0 +1,231 @@
+"""
+Building products from components.
+
+buildProduct() turns components into products at a facility in one transaction. It
+picks the fastest ProductionProcess of the product whose ComponentsRequired the
+facility has in stock, leaving out the components reserved for orders (see
+services/reservations.py), decrements every required ComponentInventory row and
+increments the facility's ProductInventory row.
+
+Concurrent builds and grid edits through /save-changes write the same rows, so the
+rows are read with SELECT ... FOR UPDATE before their counts are checked; a grid
+edit whose row no longer has the count the grid showed is rejected (see
+services/inventoryWriter.py). Locks are always taken in the same order, the
+component rows by ID and then the product rows, so builds and grid edits touching
+the same rows wait for each other instead of deadlocking.
+The new counts are assigned to the locked ORM objects and sent in one flush: the
+unit of work groups the component UPDATEs into one executemany, and the stock
+rollups and the audit log see the change like any other inventory edit.
+
+SQLite has no row locks and ignores FOR UPDATE; there builds are serialized by
+services/inventoryLocks.py instead.
+"""
+
+from sqlalchemy.exc import IntegrityError
+from extensions import db, readCache
+from models.inventory import ComponentInventory, ProductInventory
+from models.inventoryMovement import setMovementReason
+from models.productionProcess import ComponentsRequired, ProductionProcess
+from services.inventoryLocks import writeSerialized
+from services.metrics import metrics
+from services.reservations import heldQuantities
+
+builtUnits = metrics.counter(
+    "ims_build_units_total", "Product units built from components by buildProduct."
+)
+buildErrors = metrics.counter(
+    "ims_build_errors_total", "Builds rejected by buildProduct, by reason.", ("reason",)
+)
+
+
+class BuildError(Exception):
+    """
+    A build that cannot be carried out.
+
+    Attributes:
+        reason (str): noProcess, unknownProcess or noStock.
+        shortages (list): For noStock, the missing components of the fastest
+            process, as componentId, required and available counts.
+    """
+
+    def __init__(self, message, reason, shortages=None):
+        super().__init__(message)
+        self.reason = reason
+        self.shortages = shortages or []
+
+
+def loadRecipes():
+    """
+    Return {productId: [(processId, minutes, {componentId: count}), ...]}.
+
+    The processes of each product are listed fastest first. Requirements listed
+    more than once for a process are added up.
+    """
+    recipes = {}
+    for productId, processId, minutes in db.session.execute(
+        db.select(
+            ProductionProcess.product, ProductionProcess.id, ProductionProcess.minutes
+        )
+        .where(ProductionProcess.product.is_not(None))
+        .order_by(ProductionProcess.minutes, ProductionProcess.id)
+    ):
+        recipes.setdefault(productId, []).append((processId, minutes, {}))
+    requirements = {
+        processId: counts
+        for processes in recipes.values()
+        for processId, _, counts in processes
+    }
+    for processId, componentId, count in db.session.execute(
+        db.select(
+            ComponentsRequired.processId,
+            ComponentsRequired.componentId,
+            ComponentsRequired.count,
+        )
+    ):
+        counts = requirements.get(processId)
+        if counts is not None:
+            counts[componentId] = counts.get(componentId, 0) + count
+    return recipes
+
+
+def lockInventory(facilityId, productId, componentIds):
+    """
+    Lock a facility's inventory rows of the components and of the product.
+
+    Returns:
+        tuple: {componentId: ComponentInventory} and the ProductInventory row, or
+            None if the facility holds none of the product yet.
+    """
+    components = {}
+    if componentIds:
+        rows = db.session.scalars(
+            db.select(ComponentInventory)
+            .where(
+                ComponentInventory.productionFacilityId == facilityId,
+                ComponentInventory.componentId.in_(sorted(componentIds)),
+            )
+            .order_by(ComponentInventory.id)
+            .with_for_update()
+        )
+        for row in rows:
+            components[row.componentId] = row
+    product = db.session.scalars(
+        db.select(ProductInventory)
+        .where(
+            ProductInventory.productionFacilityId == facilityId,
+            ProductInventory.productId == productId,
+        )
+        .with_for_update()
+    ).first()
+    return components, product
+
+
+def shortagesOf(requirements, components, held, quantity):
+    shortages = []
+    for componentId, count in sorted(requirements.items()):
+        row = components.get(componentId)
+        available = (row.count if row is not None else 0) - held.get(componentId, 0)
+        if available < count * quantity:
+            shortages.append(
+                {
+                    "componentId": componentId,
+                    "required": count * quantity,
+                    "available": available,
+                }
+            )
+    return shortages
+
+
+def buildProduct(facilityId, productId, quantity, userId, processId=None):
+    """
+    Build units of a product at a facility from the components it holds.
+
+    Args:
+        facilityId (int): The facility building the product.
+        productId (int): The product to build.
+        quantity (int): The number of units, at least 1.
+        userId (int): Recorded as lastUpdatedByUserId of the changed rows.
+        processId (int): The process to use; by default the fastest one the
+            facility has the components for.
+
+    Returns:
+        dict: The process used, the new product count and the consumed components
+            with their new counts.
+
+    Raises:
+        BuildError: If the product has no such process or the facility lacks
+            components; nothing is changed.
+    """
+    processes = readCache.get("buildRecipes", "all", loadRecipes).get(productId, [])
+    if processId is not None:
+        processes = [process for process in processes if process[0] == processId]
+    if not processes:
+        reason = "noProcess" if processId is None else "unknownProcess"
+        buildErrors.inc(labels=(reason,))
+        raise BuildError(f"Product {productId} has no such production process.", reason)
+
+    for attempt in range(2):
+        try:
+            with writeSerialized(db.session):
+                result = applyBuild(facilityId, productId, quantity, userId, processes)
+            break
+        except BuildError as e:
+            db.session.rollback()
+            buildErrors.inc(labels=(e.reason,))
+            raise
+        except IntegrityError:
+            # A concurrent first build created the product row; it is there now
+            db.session.rollback()
+            if attempt:
+                raise
+        except Exception:
+            db.session.rollback()
+            raise
+    builtUnits.inc(quantity)
+    return result
+
+
+def applyBuild(facilityId, productId, quantity, userId, processes):
+    componentIds = set()
+    for _, _, requirements in processes:
+        componentIds.update(requirements)
+    setMovementReason(db.session, "build")
+    components, product = lockInventory(facilityId, productId, componentIds)
+    held = heldQuantities(facilityId, "component", componentIds)
+    for process in processes:
+        if not shortagesOf(process[2], components, held, quantity):
+            break
+    else:
+        raise BuildError(
+            f"Facility {facilityId} lacks the components to build {quantity}"
+            f" of product {productId}.",
+            "noStock",
+            shortagesOf(processes[0][2], components, held, quantity),
+        )
+    processId, _, requirements = process
+    consumed = []
+    for componentId, count in sorted(requirements.items()):
+        row = components[componentId]
+        row.count -= count * quantity
+        row.lastUpdatedByUserId = userId
+        consumed.append({"componentId": componentId, "count": row.count})
+    if product is None:
+        product = ProductInventory(
+            productionFacilityId=facilityId,
+            productId=productId,
+            count=0,
+            lastUpdatedByUserId=userId,
+        )
+        db.session.add(product)
+    product.count += quantity
+    product.lastUpdatedByUserId = userId
+    result = {
+        "facilityId": facilityId,
+        "productId": productId,
+        "quantity": quantity,
+        "processId": processId,
+        "productCount": product.count,
+        "components": consumed,
+    }
+    db.session.commit()
+    return result
@@ -0,0 +1,806 @@
+"""
+Production scheduling of build orders over the facilities' production lines.
+
+Each operating facility has SCHEDULER_LINES_PER_FACILITY parallel production lines
+(overridable per facility and schedule). An order of a product takes the
+ProductionProcess.minutes of its process for every unit, and consumes the
+process's components from the facility's ComponentInventory, so an order only goes
+to a facility that still has the components after the orders scheduled before it.
+
+Scheduler builds a schedule greedily to keep the makespan short: orders are taken
+by priority and, within a priority, longest first (LPT), and each is put on the
+line that frees up first among the facilities able to build it. Every facility
+keeps its line end times in a heap, and the earliest free time of every facility
+is kept in an array, so choosing a line costs one argmin over the candidate
+facilities of the product: those with the components for at least one unit,
+found with services/mrpEngine.py.
+
+Changing or removing one order does not reschedule the others: the order leaves
+its line, the later orders on that line move up, its components return to the
+facility, and orders that were short of those components are retried. Only the
+orders whose assignment changed are returned and written back.
+
+The schedules are stored as ProductionSchedule and ScheduledOrder rows, with the
+component stock they were planned with as ScheduleStock rows. Each worker keeps
+the Scheduler of recently used schedules in memory, and reloads it from the rows
+when the schedule's version shows another process changed it. A reload plans with
+the stored stock rather than the current one, so every worker, cached or not,
+places an order the same way.
+"""
+
+import heapq
+import math
+import time
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+from flask import current_app
+from sqlalchemy import bindparam, delete, insert, update
+from extensions import db
+from models.productionFacility import ProductionFacility
+from models.productionProcess import ProductionProcess
+from models.productionSchedule import ProductionSchedule, ScheduledOrder, ScheduleStock
+from services.mrpEngine import (
+    fetchArray,
+    iterBuildable,
+    loadBillOfMaterials,
+    loadComponentStock,
+)
+
+# Schedulers kept in memory per process, most recently used last
+cachedSchedulers = OrderedDict()
+schedulerLock = Lock()
+# Serializes the changes of this process; the row lock does across processes
+changeLock = Lock()
+insertChunkSize = 5000
+
+
+class PlannedOrder:
+    """A build order and its assignment to a facility's line, if any."""
+
+    __slots__ = (
+        "orderId",
+        "productId",
+        "quantity",
+        "priority",
+        "pinnedFacilityId",
+        "facilityId",
+        "line",
+        "processId",
+        "start",
+        "end",
+        "reason",
+    )
+
+    def __init__(self, orderId, productId, quantity, priority=0, pinnedFacilityId=None):
+        self.orderId = orderId
+        self.productId = productId
+        self.quantity = quantity
+        self.priority = priority
+        self.pinnedFacilityId = pinnedFacilityId
+        self.facilityId = None
+        self.line = None
+        self.processId = None
+        self.start = None
+        self.end = None
+        self.reason = None
+
+    def toDict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def parseOrder(data, orderId=None):
+    """
+    Build a PlannedOrder from a JSON object.
+
+    Args:
+        data (dict): orderId (unless given), productId, quantity, and optional
+            priority (default 0, lower first) and facilityId to pin it to.
+        orderId (int): The order ID, when it comes from the URL.
+
+    Raises:
+        ValueError: If a field is missing or invalid.
+    """
+    try:
+        order = PlannedOrder(
+            int(data["orderId"] if orderId is None else orderId),
+            int(data["productId"]),
+            int(data["quantity"]),
+            int(data.get("priority", 0)),
+            None if data.get("facilityId") is None else int(data["facilityId"]),
+        )
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("orderId, productId and quantity must be integers")
+    if order.quantity < 1:
+        raise ValueError("quantity must be at least 1")
+    return order
+
+
+class Scheduler:
+    """
+    Assigns build orders to production lines and updates the assignment.
+
+    Args:
+        facilityIds (list): Facilities the orders can be scheduled at.
+        lineCounts (list): Production lines of each facility.
+        processes (dict): productId -> (minutes, processId, requirements) tuples,
+            fastest first; requirements are (componentId, count) pairs.
+        stock (dict): facilityId -> {componentId: count} available.
+        candidates (dict): productId -> positions in facilityIds of the
+            facilities that can build at least one unit.
+        closedFacilityIds: Facilities that keep their assignments but take no
+            new orders.
+    """
+
+    def __init__(
+        self,
+        facilityIds,
+        lineCounts,
+        processes,
+        stock,
+        candidates,
+        closedFacilityIds=(),
+    ):
+        self.facilityIds = list(facilityIds)
+        self.positions = {
+            facilityId: i for i, facilityId in enumerate(self.facilityIds)
+        }
+        self.closed = {self.positions[facilityId] for facilityId in closedFacilityIds}
+        self.lineEnds = [[0] * count for count in lineCounts]
+        # Lazy heaps: an entry is current if it matches lineEnds
+        self.lineHeaps = [[(0, line) for line in range(count)] for count in lineCounts]
+        self.lineOrders = [[[] for _ in range(count)] for count in lineCounts]
+        self.facilityFree = np.zeros(len(self.facilityIds))
+        for position in range(len(self.facilityIds)):
+            self.refreshFree(position)
+        self.processes = processes
+        self.requirements = {
+            processId: requirements
+            for options in processes.values()
+            for _, processId, requirements in options
+        }
+        self.productsUsing = {}
+        for productId, options in processes.items():
+            for _, _, requirements in options:
+                for componentId, _ in requirements:
+                    self.productsUsing.setdefault(componentId, set()).add(productId)
+        self.stock = [stock.get(facilityId, {}) for facilityId in self.facilityIds]
+        self.allCandidates = candidates
+        # Narrowed as facilities run out of components, restored when an order
+        # returns them
+        self.candidates = dict(candidates)
+        self.orders = {}
+        self.unscheduled = {}
+        # Smallest quantity of a product no facility could build; stock only
+        # decreases until an order is removed, so larger orders fail as well
+        self.failedQuantity = {}
+
+    def sortKey(self, order):
+        options = self.processes.get(order.productId)
+        minutes = options[0][0] * order.quantity if options else 0
+        return (order.priority, -minutes, order.orderId)
+
+    def schedule(self, orders):
+        """Schedule new orders, highest priority and longest first."""
+        for order in orders:
+            if order.orderId in self.orders:
+                raise ValueError(f"duplicate orderId {order.orderId}")
+            self.orders[order.orderId] = order
+        for order in sorted(orders, key=self.sortKey):
+            self.place(order)
+
+    def restore(self, order):
+        """Add an order with the assignment it already has, as loaded from a row."""
+        self.orders[order.orderId] = order
+        if order.facilityId is None:
+            self.unscheduled[order.orderId] = order
+            return
+        position = self.positions[order.facilityId]
+        self.lineOrders[position][order.line].append(order)
+        ends = self.lineEnds[position]
+        ends[order.line] = max(ends[order.line], order.end)
+        self.consume(position, order.processId, order.quantity, -1)
+
+    def finishRestore(self):
+        for position, ends in enumerate(self.lineEnds):
+            self.lineHeaps[position] = [(end, line) for line, end in enumerate(ends)]
+            heapq.heapify(self.lineHeaps[position])
+            self.refreshFree(position)
+
+    def consume(self, position, processId, quantity, sign):
+        stock = self.stock[position]
+        for componentId, count in self.requirements.get(processId, ()):
+            stock[componentId] = stock.get(componentId, 0) + sign * count * quantity
+
+    def refreshFree(self, position):
+        heap, ends = self.lineHeaps[position], self.lineEnds[position]
+        while heap and heap[0][0] != ends[heap[0][1]]:
+            heapq.heappop(heap)
+        if heap and position not in self.closed:
+            self.facilityFree[position] = heap[0][0]
+        else:
+            self.facilityFree[position] = math.inf
+
+    def feasibleProcess(self, options, position, quantity):
+        """Return the fastest process the facility has the components for."""
+        stock = self.stock[position]
+        for option in options:
+            if all(
+                stock.get(componentId, 0) >= count * quantity
+                for componentId, count in option[2]
+            ):
+                return option
+        return None
+
+    def place(self, order):
+        """Put an order on the earliest free line able to build it."""
+        self.unscheduled.pop(order.orderId, None)
+        options = self.processes.get(order.productId)
+        if not options:
+            return self.reject(order, "noProcess")
+        if order.pinnedFacilityId is not None:
+            position = self.positions.get(order.pinnedFacilityId)
+            if position is None or self.facilityFree[position] == math.inf:
+                return self.reject(order, "facilityUnavailable")
+            candidates = np.array([position])
+        elif order.quantity >= self.failedQuantity.get(order.productId, math.inf):
+            return self.reject(order, "noStock")
+        else:
+            candidates = self.candidates.get(order.productId, np.zeros(0, np.int64))
+
+        free = self.facilityFree[candidates]
+        exhausted = []
+        placed = False
+        for _ in range(len(candidates)):
+            i = int(free.argmin())
+            if free[i] == math.inf:
+                break
+            position = int(candidates[i])
+            option = self.feasibleProcess(options, position, order.quantity)
+            if option is not None:
+                self.assign(order, position, option)
+                placed = True
+                break
+            free[i] = math.inf
+            if order.quantity == 1 or not self.feasibleProcess(options, position, 1):
+                exhausted.append(i)
+        if exhausted and order.pinnedFacilityId is None:
+            self.candidates[order.productId] = np.delete(candidates, exhausted)
+        if placed:
+            return True
+        if order.pinnedFacilityId is None:
+            self.failedQuantity[order.productId] = min(
+                order.quantity, self.failedQuantity.get(order.productId, math.inf)
+            )
+        return self.reject(order, "noStock")
+
+    def assign(self, order, position, option):
+        minutes, processId, _ = option
+        heap = self.lineHeaps[position]
+        start, line = heapq.heappop(heap)
+        order.facilityId = self.facilityIds[position]
+        order.line = line
+        order.processId = processId
+        order.start = start
+        order.end = start + minutes * order.quantity
+        order.reason = None
+        self.lineOrders[position][line].append(order)
+        self.lineEnds[position][line] = order.end
+        heapq.heappush(heap, (order.end, line))
+        self.refreshFree(position)
+        self.consume(position, processId, order.quantity, -1)
+
+    def reject(self, order, reason):
+        order.facilityId = order.line = order.processId = None
+        order.start = order.end = None
+        order.reason = reason
+        self.unscheduled[order.orderId] = order
+        return False
+
+    def unassign(self, order):
+        """
+        Take an order off its line and move the later orders on the line up.
+
+        Returns:
+            list: The orders that moved.
+        """
+        if order.facilityId is None:
+            self.unscheduled.pop(order.orderId, None)
+            return []
+        position = self.positions[order.facilityId]
+        orders = self.lineOrders[position][order.line]
+        index = orders.index(order)
+        del orders[index]
+        duration = order.end - order.start
+        moved = orders[index:]
+        for later in moved:
+            later.start -= duration
+            later.end -= duration
+        self.lineEnds[position][order.line] -= duration
+        heapq.heappush(
+            self.lineHeaps[position],
+            (self.lineEnds[position][order.line], order.line),
+        )
+        self.refreshFree(position)
+        self.consume(position, order.processId, order.quantity, 1)
+        for productId in self.productsSharing(order.processId):
+            self.failedQuantity.pop(productId, None)
+            if productId in self.allCandidates:
+                self.candidates[productId] = self.allCandidates[productId]
+        return moved
+
+    def productsSharing(self, processId):
+        """Return the products needing a component of the process."""
+        products = set()
+        for componentId, _ in self.requirements.get(processId, ()):
+            products |= self.productsUsing.get(componentId, set())
+        return products
+
+    def retryShortOrders(self, processId):
+        """Retry the orders short of the components a removed order returned."""
+        products = self.productsSharing(processId)
+        waiting = [
+            order
+            for order in self.unscheduled.values()
+            if order.reason == "noStock" and order.productId in products
+        ]
+        return [
+            order for order in sorted(waiting, key=self.sortKey) if self.place(order)
+        ]
+
+    def setOrder(self, order):
+        """
+        Add an order, or replace the order with the same ID, and schedule it.
+
+        Returns:
+            dict: The "inserted" or "updated" orders and the "deleted" order IDs.
+        """
+        previous = self.orders.get(order.orderId)
+        changes = {"inserted": [], "updated": [], "deleted": []}
+        moved, freed = [], None
+        if previous is not None:
+            freed = previous.processId
+            moved = self.unassign(previous)
+        self.orders[order.orderId] = order
+        self.place(order)
+        retried = self.retryShortOrders(freed) if freed is not None else []
+        changes["inserted" if previous is None else "updated"].append(order)
+        changes["updated"].extend(uniqueOrders(moved + retried, exclude=order))
+        return changes
+
+    def removeOrder(self, orderId):
+        """
+        Remove an order from the schedule.
+
+        Returns:
+            dict: The "updated" orders and the "deleted" order IDs, or None if the
+                order does not exist.
+        """
+        order = self.orders.pop(orderId, None)
+        if order is None:
+            return None
+        moved = self.unassign(order)
+        retried = (
+            self.retryShortOrders(order.processId)
+            if order.facilityId is not None
+            else []
+        )
+        return {
+            "inserted": [],
+            "updated": uniqueOrders(moved + retried, exclude=order),
+            "deleted": [orderId],
+        }
+
+    def makespan(self):
+        return max((max(ends, default=0) for ends in self.lineEnds), default=0)
+
+    def timeline(self, facilityId):
+        """Return the orders of a facility by line and start."""
+        position = self.positions.get(facilityId)
+        if position is None:
+            return []
+        return [order for orders in self.lineOrders[position] for order in orders]
+
+
+def uniqueOrders(orders, exclude):
+    seen = {exclude.orderId}
+    unique = []
+    for order in orders:
+        if order.orderId not in seen:
+            seen.add(order.orderId)
+            unique.append(order)
+    return unique
+
+
+def loadPlanningData(lineCounts, stockRows, scheduledFacilities=()):
+    """
+    Load the facilities and processes a Scheduler plans with.
+
+    Args:
+        lineCounts (dict): Production lines per facility ID, overriding the
+            SCHEDULER_LINES_PER_FACILITY default.
+        stockRows (ndarray): (facilityId, componentId, count) rows ordered by
+            facility, as returned by loadComponentStock().
+        scheduledFacilities: Facilities existing assignments use, kept even if
+            they no longer operate.
+
+    Returns:
+        dict: The keyword arguments of Scheduler.
+    """
+    defaultLines = current_app.config["SCHEDULER_LINES_PER_FACILITY"]
+    operating = db.session.scalars(
+        db.select(ProductionFacility.id)
+        .where(ProductionFacility.isOperating.is_(True))
+        .order_by(ProductionFacility.id)
+    ).all()
+    operatingIds = np.array(operating, dtype=np.int64)
+    closed = set(scheduledFacilities) - set(operating)
+    facilityIds = sorted(set(operating) | closed)
+    lines = [
+        0 if facilityId in closed else lineCounts.get(facilityId, defaultLines)
+        for facilityId in facilityIds
+    ]
+
+    bom = loadBillOfMaterials()
+    stock = {}
+    for facilityId, componentId, count in stockRows.tolist():
+        stock.setdefault(facilityId, {})[componentId] = count
+
+    requirements = {}
+    for i, processId in enumerate(bom.processIds.tolist()):
+        start = bom.processStarts[i]
+        stop = bom.processStarts[i + 1] if i + 1 < len(bom.processIds) else len(bom)
+        requirements[processId] = tuple(
+            zip(
+                bom.componentIds[bom.requiredComponents[start:stop]].tolist(),
+                bom.requiredCounts[start:stop].tolist(),
+            )
+        )
+    processes = {}
+    for productId, processId, minutes in db.session.execute(
+        db.select(
+            ProductionProcess.product, ProductionProcess.id, ProductionProcess.minutes
+        )
+        .where(ProductionProcess.product.is_not(None))
+        .order_by(ProductionProcess.minutes, ProductionProcess.id)
+    ):
+        processes.setdefault(productId, []).append(
+            (minutes, processId, requirements.get(processId, ()))
+        )
+
+    # Facilities able to build one unit, by product; a process without
+    # requirements can run anywhere
+    positions = np.searchsorted(facilityIds, operatingIds)
+    buildable = np.zeros((len(facilityIds), len(bom.productIds)), dtype=bool)
+    for chunk in iterBuildable(bom, stockRows, operatingIds):
+        rows = np.searchsorted(facilityIds, chunk.facilityIds)
+        buildable[rows] = chunk.quantities > 0
+    columns = {productId: i for i, productId in enumerate(bom.productIds.tolist())}
+    candidates = {}
+    for productId, options in processes.items():
+        if any(not option[2] for option in options):
+            candidates[productId] = positions
+        elif productId in columns:
+            candidates[productId] = np.flatnonzero(buildable[:, columns[productId]])
+    return {
+        "facilityIds": facilityIds,
+        "lineCounts": lines,
+        "processes": processes,
+        "stock": stock,
+        "candidates": candidates,
+        "closedFacilityIds": closed,
+    }
+
+
+def orderRow(scheduleId, order):
+    return {
+        "scheduleId": scheduleId,
+        "orderId": order.orderId,
+        "productId": order.productId,
+        "quantity": order.quantity,
+        "priority": order.priority,
+        "pinnedFacilityId": order.pinnedFacilityId,
+        "facilityId": order.facilityId,
+        "line": order.line,
+        "processId": order.processId,
+        "startMinute": order.start,
+        "endMinute": order.end,
+        "reason": order.reason,
+    }
+
+
+def scheduleSummary(schedule, scheduler):
+    return {
+        "scheduleId": schedule.id,
+        "version": schedule.version,
+        "startAt": schedule.startAt.isoformat(),
+        "makespanMinutes": schedule.makespanMinutes,
+        "orders": schedule.orderCount,
+        "unscheduled": len(scheduler.unscheduled),
+    }
+
+
+def createSchedule(orders, lineCounts=None, userId=None):
+    """
+    Schedule a queue of build orders and store the schedule.
+
+    Args:
+        orders (list): PlannedOrder objects with unique order IDs.
+        lineCounts (dict): Production lines per facility ID.
+        userId (int): The user creating the schedule.
+
+    Returns:
+        dict: The schedule summary and the "seconds" spent scheduling.
+
+    Raises:
+        ValueError: If two orders have the same ID.
+    """
+    lineCounts = lineCounts or {}
+    start = time.perf_counter()
+    stockRows = loadComponentStock(loadBillOfMaterials())
+    scheduler = Scheduler(**loadPlanningData(lineCounts, stockRows))
+    scheduler.schedule(orders)
+    elapsed = time.perf_counter() - start
+
+    schedule = ProductionSchedule(
+        lineCounts={str(key): value for key, value in lineCounts.items()},
+        makespanMinutes=scheduler.makespan(),
+        orderCount=len(orders),
+        version=1,
+        lastUpdatedByUserId=userId,
+    )
+    db.session.add(schedule)
+    db.session.flush()
+    rows = [orderRow(schedule.id, order) for order in orders]
+    for offset in range(0, len(rows), insertChunkSize):
+        db.session.execute(
+            insert(ScheduledOrder), rows[offset : offset + insertChunkSize]
+        )
+    stockRows = [
+        {
+            "scheduleId": schedule.id,
+            "productionFacilityId": facilityId,
+            "componentId": componentId,
+            "count": count,
+        }
+        for facilityId, componentId, count in stockRows.tolist()
+    ]
+    for offset in range(0, len(stockRows), insertChunkSize):
+        db.session.execute(
+            insert(ScheduleStock), stockRows[offset : offset + insertChunkSize]
+        )
+    db.session.commit()
+    rememberScheduler(schedule, scheduler)
+    return dict(scheduleSummary(schedule, scheduler), seconds=elapsed)
+
+
+def rememberScheduler(schedule, scheduler):
+    with schedulerLock:
+        cachedSchedulers[schedule.id] = (schedule.version, scheduler)
+        cachedSchedulers.move_to_end(schedule.id)
+        while len(cachedSchedulers) > current_app.config["SCHEDULER_CACHE_SIZE"]:
+            cachedSchedulers.popitem(last=False)
+
+
+def getScheduler(schedule):
+    """Return the Scheduler of a schedule, reloading it if another process changed it."""
+    with schedulerLock:
+        cached = cachedSchedulers.get(schedule.id)
+    if cached is not None and cached[0] == schedule.version:
+        return cached[1]
+    rows = db.session.execute(
+        db.select(ScheduledOrder)
+        .where(ScheduledOrder.scheduleId == schedule.id)
+        .order_by(
+            ScheduledOrder.facilityId, ScheduledOrder.line, ScheduledOrder.startMinute
+        )
+    ).scalars()
+    orders = []
+    for row in rows:
+        order = PlannedOrder(
+            row.orderId, row.productId, row.quantity, row.priority, row.pinnedFacilityId
+        )
+        order.facilityId, order.line, order.processId = (
+            row.facilityId,
+            row.line,
+            row.processId,
+        )
+        order.start, order.end, order.reason = (
+            row.startMinute,
+            row.endMinute,
+            row.reason,
+        )
+        orders.append(order)
+    lineCounts = {int(key): value for key, value in schedule.lineCounts.items()}
+    # The stock the schedule was created with; the orders' use is taken off below
+    stockRows = fetchArray(
+        db.select(
+            ScheduleStock.productionFacilityId,
+            ScheduleStock.componentId,
+            ScheduleStock.count,
+        )
+        .where(ScheduleStock.scheduleId == schedule.id)
+        .order_by(ScheduleStock.productionFacilityId),
+        3,
+    )
+    planning = loadPlanningData(
+        lineCounts,
+        stockRows,
+        {order.facilityId for order in orders if order.facilityId is not None},
+    )
+    # Keep the lines existing assignments use, even if there are fewer now
+    for order in orders:
+        if order.facilityId is not None:
+            position = planning["facilityIds"].index(order.facilityId)
+            planning["lineCounts"][position] = max(
+                planning["lineCounts"][position], order.line + 1
+            )
+    scheduler = Scheduler(**planning)
+    for order in orders:
+        scheduler.restore(order)
+    scheduler.finishRestore()
+    rememberScheduler(schedule, scheduler)
+    return scheduler
+
+
+updatedColumns = (
+    "facilityId",
+    "line",
+    "processId",
+    "startMinute",
+    "endMinute",
+    "reason",
+    "productId",
+    "quantity",
+    "priority",
+    "pinnedFacilityId",
+)
+
+
+def lockSchedule(scheduleId):
+    return db.session.get(ProductionSchedule, scheduleId, with_for_update=True)
+
+
+def writeChanges(schedule, scheduler, changes, userId):
+    """Write the changed orders and the new version of a schedule."""
+    table = ScheduledOrder.__table__
+    if changes["deleted"]:
+        db.session.execute(
+            delete(table).where(
+                table.c.scheduleId == schedule.id,
+                table.c.orderId.in_(changes["deleted"]),
+            )
+        )
+    if changes["inserted"]:
+        db.session.execute(
+            insert(table), [orderRow(schedule.id, o) for o in changes["inserted"]]
+        )
+    if changes["updated"]:
+        db.session.execute(
+            update(table)
+            .where(
+                table.c.scheduleId == schedule.id,
+                table.c.orderId == bindparam("b_orderId"),
+            )
+            .values({name: bindparam(f"b_{name}") for name in updatedColumns}),
+            [
+                {
+                    f"b_{name}": value
+                    for name, value in orderRow(schedule.id, o).items()
+                    if name in updatedColumns or name == "orderId"
+                }
+                for o in changes["updated"]
+            ],
+        )
+    schedule.version += 1
+    schedule.makespanMinutes = scheduler.makespan()
+    schedule.orderCount = len(scheduler.orders)
+    schedule.lastUpdatedByUserId = userId
+    db.session.commit()
+    rememberScheduler(schedule, scheduler)
+    return dict(
+        scheduleSummary(schedule, scheduler),
+        changed=[o.toDict() for o in changes["inserted"] + changes["updated"]],
+        removed=changes["deleted"],
+    )
+
+
+def applyChange(scheduleId, change, userId):
+    with changeLock:
+        schedule = lockSchedule(scheduleId)
+        if schedule is None:
+            return None
+        scheduler = getScheduler(schedule)
+        try:
+            changes = change(scheduler)
+            if changes is None:
+                db.session.rollback()
+                return None
+            return writeChanges(schedule, scheduler, changes, userId)
+        except Exception:
+            # The scheduler changed in memory; reload it from the rows next time
+            with schedulerLock:
+                cachedSchedulers.pop(scheduleId, None)
+            db.session.rollback()
+            raise
+
+
+def setScheduledOrder(scheduleId, order, userId=None):
+    """
+    Add or change one order of a schedule without rescheduling the others.
+
+    Returns:
+        dict: The schedule summary, the "changed" orders and "removed" order IDs,
+            or None if the schedule does not exist.
+    """
+    return applyChange(scheduleId, lambda scheduler: scheduler.setOrder(order), userId)
+
+
+def removeScheduledOrder(scheduleId, orderId, userId=None):
+    """
+    Remove one order from a schedule; the later orders on its line move up.
+
+    Returns:
+        dict: As setScheduledOrder(), or None if the schedule or order does not
+            exist.
+    """
+    return applyChange(
+        scheduleId, lambda scheduler: scheduler.removeOrder(orderId), userId
+    )
+
+
+def getSchedule(scheduleId, unscheduledLimit=100):
+    """
+    Return a schedule's summary and its first unscheduled orders.
+
+    Returns:
+        dict: The summary and "unscheduledOrders", or None if it does not exist.
+    """
+    schedule = db.session.get(ProductionSchedule, scheduleId)
+    if schedule is None:
+        return None
+    unscheduled = db.session.execute(
+        db.select(ScheduledOrder)
+        .where(
+            ScheduledOrder.scheduleId == scheduleId,
+            ScheduledOrder.facilityId.is_(None),
+        )
+        .order_by(ScheduledOrder.priority, ScheduledOrder.orderId)
+        .limit(unscheduledLimit)
+    ).scalars()
+    return {
+        "scheduleId": schedule.id,
+        "version": schedule.version,
+        "startAt": schedule.startAt.isoformat(),
+        "makespanMinutes": schedule.makespanMinutes,
+        "orders": schedule.orderCount,
+        "unscheduledOrders": [
+            {"orderId": row.orderId, "productId": row.productId, "reason": row.reason}
+            for row in unscheduled
+        ],
+    }
+
+
+def facilityTimeline(scheduleId, facilityId):
+    """Return the orders scheduled at a facility, by line and start minute."""
+    rows = db.session.execute(
+        db.select(ScheduledOrder)
+        .where(
+            ScheduledOrder.scheduleId == scheduleId,
+            ScheduledOrder.facilityId == facilityId,
+        )
+        .order_by(ScheduledOrder.line, ScheduledOrder.startMinute)
+    ).scalars()
+    return [
+        {
+            "orderId": row.orderId,
+            "productId": row.productId,
+            "quantity": row.quantity,
+            "priority": row.priority,
+            "line": row.line,
+            "processId": row.processId,
+            "start": row.startMinute,
+            "end": row.endMinute,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,245 @@
+"""
+Per-request SQL profiling and N+1 detection.
+
+The QueryProfiler extension listens to the before/after_cursor_execute events of
+every engine and, while a request is being handled, records each statement's
+duration and fingerprint: the SQL with its literals and IN lists collapsed, so the
+same query issued with different parameters counts as one. When a request ends its
+query count and database time are added to the aggregates of its endpoint.
+
+A request is flagged when it exceeds PROFILER_QUERY_BUDGET queries or
+PROFILER_DB_TIME_BUDGET_MS of database time, or repeats one fingerprint
+PROFILER_REPEAT_THRESHOLD times or more, the usual signature of a lazy load in a
+loop. Flagged requests are logged and kept in a short list for the admin
+Performance view. The aggregates are per process.
+"""
+
+import re
+import time
+from collections import Counter, deque
+from functools import lru_cache
+from threading import Lock
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+stringLiteral = re.compile(r"'(?:[^']|'')*'")
+numberLiteral = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+placeholderList = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+whitespace = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement):
+    """Return the statement with literals replaced by ? and IN lists collapsed."""
+    statement = whitespace.sub(" ", statement).strip()
+    statement = stringLiteral.sub("?", statement)
+    statement = numberLiteral.sub("?", statement)
+    statement = re.sub(r"%\(\w+\)s|:\w+|%s|\$\d+", "?", statement)
+    return placeholderList.sub("(?...)", statement)
+
+
+class RequestProfile:
+    """The statements executed while handling one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.dbSeconds = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement, seconds):
+        self.queries += 1
+        self.dbSeconds += seconds
+        self.fingerprints[fingerprint(statement)] += 1
+
+
+class EndpointStats:
+    """
+    Totals of the profiled requests of one endpoint.
+
+    Attributes:
+        requests (int): Profiled requests.
+        queries (int): Statements executed by them.
+        maxQueries (int): The most statements of a single request.
+        dbSeconds (float): Database time spent by them.
+        maxDbSeconds (float): The most database time of a single request.
+        flagged (int): Requests over budget or with repeated statements.
+        repeated (dict): Repeated fingerprint -> [requests, most repeats].
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.maxQueries = 0
+        self.dbSeconds = 0.0
+        self.maxDbSeconds = 0.0
+        self.flagged = 0
+        self.repeated = {}
+
+    def add(self, profile, repeated, flagged):
+        self.requests += 1
+        self.queries += profile.queries
+        self.maxQueries = max(self.maxQueries, profile.queries)
+        self.dbSeconds += profile.dbSeconds
+        self.maxDbSeconds = max(self.maxDbSeconds, profile.dbSeconds)
+        self.flagged += flagged
+        for statement, count in repeated.items():
+            entry = self.repeated.setdefault(statement, [0, 0])
+            entry[0] += 1
+            entry[1] = max(entry[1], count)
+
+    def toDict(self, endpoint):
+        return {
+            "endpoint": endpoint,
+            "requests": self.requests,
+            "queries": self.queries,
+            "avgQueries": self.queries / self.requests,
+            "maxQueries": self.maxQueries,
+            "dbMs": self.dbSeconds * 1000,
+            "avgDbMs": self.dbSeconds / self.requests * 1000,
+            "maxDbMs": self.maxDbSeconds * 1000,
+            "flagged": self.flagged,
+            "repeated": [
+                {"statement": statement, "requests": requests, "maxRepeats": repeats}
+                for statement, (requests, repeats) in sorted(
+                    self.repeated.items(), key=lambda item: -item[1][1]
+                )
+            ],
+        }
+
+
+class QueryProfiler:
+    """
+    Request-scoped SQL instrumentation.
+
+    Attributes:
+        enabled (bool): Whether requests are profiled.
+        queryBudget (int): Statements a request may execute before it is flagged.
+        timeBudget (float): Database seconds a request may spend before it is flagged.
+        repeatThreshold (int): Executions of one fingerprint that flag a request.
+        endpoints (dict): Endpoint name -> EndpointStats.
+        recentFlagged (deque): The latest flagged requests, newest last.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.queryBudget = 30
+        self.timeBudget = 0.2
+        self.repeatThreshold = 5
+        self.endpoints = {}
+        self.recentFlagged = deque(maxlen=50)
+        self.lock = Lock()
+        self.logger = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Register the request hooks and the engine event listeners.
+
+        Args:
+            app (Flask): The application whose PROFILER_* config is used.
+        """
+        self.enabled = app.config.get("PROFILER_ENABLED", True)
+        self.queryBudget = app.config.get("PROFILER_QUERY_BUDGET", 30)
+        self.timeBudget = app.config.get("PROFILER_DB_TIME_BUDGET_MS", 200) / 1000
+        self.repeatThreshold = app.config.get("PROFILER_REPEAT_THRESHOLD", 5)
+        self.recentFlagged = deque(maxlen=app.config.get("PROFILER_RECENT_FLAGGED", 50))
+        self.logger = app.logger
+        app.extensions["queryProfiler"] = self
+        app.before_request(self.startRequest)
+        app.after_request(self.finishRequest)
+        if not event.contains(Engine, "before_cursor_execute", beforeCursorExecute):
+            event.listen(Engine, "before_cursor_execute", beforeCursorExecute)
+            event.listen(Engine, "after_cursor_execute", afterCursorExecute)
+
+    def startRequest(self):
+        if self.enabled and request.endpoint != "static":
+            g.queryProfile = RequestProfile()
+
+    def finishRequest(self, response):
+        profile = g.pop("queryProfile", None)
+        if profile is None:
+            return response
+        endpoint = request.endpoint or "<unmatched>"
+        repeated = {
+            statement: count
+            for statement, count in profile.fingerprints.items()
+            if count >= self.repeatThreshold
+        }
+        flagged = bool(
+            repeated
+            or profile.queries > self.queryBudget
+            or profile.dbSeconds > self.timeBudget
+        )
+        with self.lock:
+            self.endpoints.setdefault(endpoint, EndpointStats()).add(
+                profile, repeated, flagged
+            )
+            if flagged:
+                self.recentFlagged.append(
+                    {
+                        "endpoint": endpoint,
+                        "method": request.method,
+                        "path": request.full_path.rstrip("?"),
+                        "queries": profile.queries,
+                        "dbMs": profile.dbSeconds * 1000,
+                        "repeated": repeated,
+                        "time": time.time(),
+                    }
+                )
+        if flagged:
+            self.logger.warning(
+                "%s %s ran %d queries in %.1f ms%s",
+                request.method,
+                request.path,
+                profile.queries,
+                profile.dbSeconds * 1000,
+                f", repeated: {max(repeated, key=repeated.get)}" if repeated else "",
+            )
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={profile.dbSeconds * 1000:.1f};desc="{profile.queries} queries"',
+        )
+        return response
+
+    def stats(self):
+        """
+        Return the endpoint aggregates, by total database time, and the recent
+        flagged requests, newest first.
+        """
+        with self.lock:
+            endpoints = [
+                stats.toDict(endpoint) for endpoint, stats in self.endpoints.items()
+            ]
+            flagged = list(reversed(self.recentFlagged))
+        endpoints.sort(key=lambda stats: -stats["dbMs"])
+        return {
+            "enabled": self.enabled,
+            "queryBudget": self.queryBudget,
+            "dbTimeBudgetMs": self.timeBudget * 1000,
+            "repeatThreshold": self.repeatThreshold,
+            "endpoints": endpoints,
+            "recentFlagged": flagged,
+        }
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+            self.recentFlagged.clear()
+
+
+def beforeCursorExecute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context() and "queryProfile" in g:
+        # The execution context lives for one statement, so a failed statement
+        # leaves nothing behind
+        context.profilerStart = time.perf_counter()
+
+
+def afterCursorExecute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "profilerStart", None)
+    if start is not None and has_request_context() and "queryProfile" in g:
+        g.queryProfile.record(statement, time.perf_counter() - start)
+
+
+queryProfiler = QueryProfiler()
@@ -0,0 +1,197 @@
+"""
+Read-through cache for rarely changing rows.
+
+This module provides the ReadCache extension used for catalog and facility lookups.
+Values are stored in a cachelib backend: an in-process SimpleCache bounded by size
+and TTL by default, or a memcached/redis server shared by every worker. Entries are
+invalidated by the model mapper events, once when the row is flushed and again when
+the transaction commits, so a concurrent reader cannot re-cache the old row.
+"""
+
+from threading import Lock
+from cachelib import MemcachedCache, NullCache, RedisCache, SimpleCache
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from services.dbRouting import readingPrimary
+
+pendingKeysInfoKey = "readCachePendingKeys"
+
+
+def createBackend(config):
+    """
+    Build the cachelib backend selected by the application config.
+
+    Args:
+        config (dict): The Flask application config.
+
+    Returns:
+        BaseCache: The cache backend.
+
+    Raises:
+        ValueError: If READ_CACHE_TYPE is unknown.
+        RuntimeError: If the client library of the backend is not installed.
+    """
+    cacheType = config.get("READ_CACHE_TYPE", "simple")
+    ttl = config.get("READ_CACHE_TTL", 300)
+    prefix = config.get("READ_CACHE_KEY_PREFIX", "nexus:")
+    if cacheType == "simple":
+        return SimpleCache(
+            threshold=config.get("READ_CACHE_SIZE", 10000), default_timeout=ttl
+        )
+    try:
+        if cacheType == "memcached":
+            return MemcachedCache(
+                servers=config.get("READ_CACHE_SERVERS", ["127.0.0.1:11211"]),
+                default_timeout=ttl,
+                key_prefix=prefix,
+            )
+        if cacheType == "redis":
+            return RedisCache(
+                host=config.get("READ_CACHE_HOST", "127.0.0.1"),
+                port=config.get("READ_CACHE_PORT", 6379),
+                default_timeout=ttl,
+                key_prefix=prefix,
+            )
+    except RuntimeError as error:
+        # cachelib imports the client library only when the backend is created
+        raise RuntimeError(
+            f"READ_CACHE_TYPE={cacheType} needs its client library"
+            " (redis or python-memcached, pinned in requirements.txt)"
+        ) from error
+    if cacheType == "null":
+        return NullCache()
+    raise ValueError(f"Unknown READ_CACHE_TYPE: {cacheType}")
+
+
+class ReadCache:
+    """
+    Namespaced read-through cache with hit/miss counters.
+
+    Keys have the form "<namespace>:<id>", and "<namespace>:all" holds list lookups
+    for a namespace. Invalidating an object also drops its namespace list.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.hits = {}
+        self.misses = {}
+        self.lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, metadata=None):
+        """
+        Attach the cache to a Flask application.
+
+        Args:
+            app (Flask): The application whose config selects the backend.
+            metadata (MetaData): Optional metadata; dropping its tables clears the cache.
+        """
+        self.backend = createBackend(app.config)
+        app.extensions["readCache"] = self
+        if not event.contains(Session, "after_commit", self.onCommit):
+            event.listen(Session, "after_commit", self.onCommit)
+        if metadata is not None and not event.contains(
+            metadata, "after_drop", self.onDrop
+        ):
+            event.listen(metadata, "after_drop", self.onDrop)
+
+    def ensureShared(self, workers):
+        """
+        Stop caching in a per-process backend when several workers serve requests.
+
+        Invalidation only reaches the cache of the process that made the write, so
+        with a SimpleCache the other workers would keep serving stale principals,
+        catalog rows and facilities until the entries expire.
+
+        Args:
+            workers (int): The number of worker processes.
+
+        Returns:
+            bool: True if the backend was replaced by a NullCache.
+        """
+        if workers <= 1 or not isinstance(self.backend, SimpleCache):
+            return False
+        self.backend = NullCache()
+        return True
+
+    def key(self, namespace, objectId="all"):
+        return f"{namespace}:{objectId}"
+
+    def count(self, counters, namespace):
+        with self.lock:
+            counters[namespace] = counters.get(namespace, 0) + 1
+
+    def get(self, namespace, objectId, loader):
+        """
+        Return a cached value, loading and storing it on a miss.
+
+        Args:
+            namespace (str): The entity namespace, e.g. "product".
+            objectId: The object ID, or "all" for the namespace list.
+            loader (callable): Called with no arguments to load the value on a miss;
+                its queries go to the primary database.
+
+        Returns:
+            The cached or freshly loaded value. None values are not cached.
+        """
+        if self.backend is None:
+            return loader()
+        key = self.key(namespace, objectId)
+        value = self.backend.get(key)
+        if value is not None:
+            self.count(self.hits, namespace)
+            return value
+        self.count(self.misses, namespace)
+        # A replica may not have caught up with the write that invalidated the key
+        with readingPrimary():
+            value = loader()
+        if value is not None:
+            self.backend.set(key, value)
+        return value
+
+    def invalidate(self, namespace, objectId, session=None):
+        """
+        Drop an object and its namespace list from the cache.
+
+        Args:
+            namespace (str): The entity namespace.
+            objectId: The ID of the changed object.
+            session (Session): The session flushing the change; the keys are dropped
+                again when it commits.
+        """
+        if self.backend is None:
+            return
+        keys = [self.key(namespace, objectId), self.key(namespace)]
+        self.backend.delete_many(*keys)
+        if session is not None:
+            session.info.setdefault(pendingKeysInfoKey, set()).update(keys)
+
+    def onCommit(self, session):
+        keys = session.info.pop(pendingKeysInfoKey, None)
+        if keys and self.backend is not None:
+            self.backend.delete_many(*keys)
+
+    def onDrop(self, *args, **kwargs):
+        self.clear()
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        """
+        Return the hit and miss counters of this process.
+
+        Returns:
+            dict: Per-namespace {"hits": int, "misses": int} counters.
+        """
+        with self.lock:
+            namespaces = set(self.hits) | set(self.misses)
+            return {
+                namespace: {
+                    "hits": self.hits.get(namespace, 0),
+                    "misses": self.misses.get(namespace, 0),
+                }
+                for namespace in sorted(namespaces)
+            }
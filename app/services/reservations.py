@@ -0,0 +1,400 @@
+"""
+Inventory reservations (soft allocation).
+
+Under order bursts, every order used to lock and decrement the same hot inventory
+rows for the length of its transaction. An order now places a reservation instead:
+a hold on some of a facility's product or component stock, recorded as an
+InventoryReservation row. The inventory row is locked only while the hold is
+checked and inserted, which is one indexed SUM and one INSERT.
+
+Available-to-promise is the inventory count minus the active holds: the confirmed
+ones, and the held ones that have not expired yet. Expired holds stop counting at
+once, so sweepExpired() only has to delete them in bulk now and then. Confirmed
+holds are turned into real decrements by convertConfirmed(), which adds up a batch
+of them per inventory row and writes every row once. Both run from
+`flask ims sweep-reservations`.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, or_, tuple_, update
+from extensions import db
+from models.inventory import ComponentInventory, ProductInventory
+from models.inventoryMovement import setMovementReason
+from models.reservation import InventoryReservation
+from services.inventoryLocks import writeSerialized
+from services.inventoryWriter import entryTypeMap
+from services.metrics import metrics
+
+itemColumns = {
+    "product": ProductInventory.productId,
+    "component": ComponentInventory.componentId,
+}
+# Components before products and rows by ID, the order builds lock them in
+lockOrder = ("component", "product")
+
+reservationResults = metrics.counter(
+    "ims_reservations_total", "Reservation requests, by result.", ("result",)
+)
+convertedUnits = metrics.counter(
+    "ims_reservation_units_converted_total",
+    "Reserved units decremented from inventory, by item type.",
+    ("type",),
+)
+conversionShortfall = metrics.counter(
+    "ims_reservation_units_short_total",
+    "Confirmed units the inventory no longer held when they were converted.",
+)
+expiredReservations = metrics.counter(
+    "ims_reservations_expired_total", "Expired holds deleted by sweepExpired."
+)
+
+
+class ReservationError(Exception):
+    """
+    A reservation request that cannot be carried out.
+
+    Attributes:
+        reason (str): unknownItem, insufficient, notFound or expired.
+        available (int): For insufficient, the quantity that could be reserved.
+    """
+
+    def __init__(self, message, reason, available=None):
+        super().__init__(message)
+        self.reason = reason
+        self.available = available
+
+
+def activeHolds(now):
+    """Return the condition matching the reservations that hold stock at now."""
+    return or_(
+        InventoryReservation.status == "confirmed",
+        InventoryReservation.expiresAt > now,
+    )
+
+
+def heldQuantities(facilityId, itemType, itemIds, now=None):
+    """
+    Return {itemId: quantity} held by the active reservations of a facility.
+
+    Args:
+        facilityId (int): The facility.
+        itemType (str): "product" or "component".
+        itemIds: The product or component IDs.
+        now (datetime): The time holds are checked against; defaults to now.
+    """
+    now = now or datetime.now()
+    return dict(
+        db.session.execute(
+            db.select(
+                InventoryReservation.itemId, func.sum(InventoryReservation.quantity)
+            )
+            .where(
+                InventoryReservation.productionFacilityId == facilityId,
+                InventoryReservation.itemType == itemType,
+                InventoryReservation.itemId.in_(list(itemIds)),
+                activeHolds(now),
+            )
+            .group_by(InventoryReservation.itemId)
+        ).all()
+    )
+
+
+def availableToPromise(facilityId, itemType, itemIds):
+    """
+    Return the count, held and available quantity of a facility's items.
+
+    Returns:
+        list: One dictionary per item the facility stocks, ordered by item ID.
+    """
+    model, itemColumn = entryTypeMap[itemType], itemColumns[itemType]
+    counts = db.session.execute(
+        db.select(itemColumn, model.count)
+        .where(model.productionFacilityId == facilityId, itemColumn.in_(itemIds))
+        .order_by(itemColumn)
+    ).all()
+    held = heldQuantities(facilityId, itemType, [itemId for itemId, _ in counts])
+    return [
+        {
+            "itemId": itemId,
+            "count": count,
+            "held": held.get(itemId, 0),
+            "available": count - held.get(itemId, 0),
+        }
+        for itemId, count in counts
+    ]
+
+
+def reservationDict(reservation):
+    return {
+        "reservationId": reservation.id,
+        "type": reservation.itemType,
+        "itemId": reservation.itemId,
+        "facilityId": reservation.productionFacilityId,
+        "quantity": reservation.quantity,
+        "status": reservation.status,
+        "expiresAt": reservation.expiresAt.isoformat(),
+    }
+
+
+def reserve(facilityId, itemType, itemId, quantity, ttlSeconds=None, userId=None):
+    """
+    Hold some of a facility's stock of an item for a limited time.
+
+    Args:
+        facilityId (int): The facility holding the stock.
+        itemType (str): "product" or "component".
+        itemId (int): The product or component ID.
+        quantity (int): The number of units, at least 1.
+        ttlSeconds (int): How long the hold lasts unless confirmed; defaults to
+            RESERVATION_TTL_SECONDS.
+        userId (int): The user placing the reservation.
+
+    Returns:
+        dict: The reservation and the quantity still "available" after it.
+
+    Raises:
+        ReservationError: If the facility does not stock the item or not enough
+            of it is available.
+    """
+    ttlSeconds = ttlSeconds or current_app.config["RESERVATION_TTL_SECONDS"]
+    model, itemColumn = entryTypeMap[itemType], itemColumns[itemType]
+    with writeSerialized(db.session):
+        try:
+            entry = db.session.scalars(
+                db.select(model)
+                .where(model.productionFacilityId == facilityId, itemColumn == itemId)
+                .with_for_update()
+            ).first()
+            if entry is None:
+                raise ReservationError(
+                    f"Facility {facilityId} does not stock {itemType} {itemId}.",
+                    "unknownItem",
+                )
+            now = datetime.now()
+            available = entry.count - heldQuantities(
+                facilityId, itemType, [itemId], now
+            ).get(itemId, 0)
+            if available < quantity:
+                raise ReservationError(
+                    f"Only {max(available, 0)} of {itemType} {itemId} are available.",
+                    "insufficient",
+                    max(available, 0),
+                )
+            reservation = InventoryReservation(
+                itemType=itemType,
+                itemId=itemId,
+                productionFacilityId=facilityId,
+                quantity=quantity,
+                status="held",
+                expiresAt=now + timedelta(seconds=ttlSeconds),
+                createdAt=now,
+                createdByUserId=userId,
+            )
+            db.session.add(reservation)
+            db.session.flush()
+            result = dict(reservationDict(reservation), available=available - quantity)
+            db.session.commit()
+        except ReservationError as e:
+            db.session.rollback()
+            reservationResults.inc(labels=(e.reason,))
+            raise
+        except Exception:
+            db.session.rollback()
+            raise
+    reservationResults.inc(labels=("held",))
+    return result
+
+
+def confirmReservation(reservationId):
+    """
+    Keep a held reservation until it is converted into an inventory decrement.
+
+    Returns:
+        dict: The confirmed reservation.
+
+    Raises:
+        ReservationError: If the reservation does not exist or has expired.
+    """
+    now = datetime.now()
+    confirmed = db.session.execute(
+        update(InventoryReservation)
+        .where(InventoryReservation.id == reservationId, activeHolds(now))
+        .values(status="confirmed")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    reservation = db.session.get(InventoryReservation, reservationId)
+    if reservation is None:
+        raise ReservationError(f"Reservation {reservationId} not found.", "notFound")
+    if not confirmed:
+        reservationResults.inc(labels=("expired",))
+        raise ReservationError(f"Reservation {reservationId} has expired.", "expired")
+    reservationResults.inc(labels=("confirmed",))
+    return reservationDict(reservation)
+
+
+def releaseReservation(reservationId):
+    """
+    Cancel a reservation, held or confirmed, before it is converted.
+
+    Returns:
+        bool: False if the reservation does not exist.
+    """
+    deleted = db.session.execute(
+        delete(InventoryReservation).where(InventoryReservation.id == reservationId)
+    ).rowcount
+    db.session.commit()
+    if deleted:
+        reservationResults.inc(labels=("released",))
+    return bool(deleted)
+
+
+def sweepExpired(batchSize=None, now=None):
+    """
+    Delete the held reservations that have expired, batchSize at a time.
+
+    Returns:
+        int: The number of reservations deleted.
+    """
+    batchSize = batchSize or current_app.config["RESERVATION_BATCH_SIZE"]
+    now = now or datetime.now()
+    total = 0
+    while True:
+        ids = db.session.scalars(
+            db.select(InventoryReservation.id)
+            .where(
+                InventoryReservation.status == "held",
+                InventoryReservation.expiresAt <= now,
+            )
+            .limit(batchSize)
+        ).all()
+        if ids:
+            db.session.execute(
+                delete(InventoryReservation).where(
+                    InventoryReservation.id.in_(ids),
+                    InventoryReservation.status == "held",
+                )
+            )
+        db.session.commit()
+        total += len(ids)
+        if len(ids) < batchSize:
+            break
+    expiredReservations.inc(total)
+    return total
+
+
+def lockEntries(itemType, keys):
+    """Lock the inventory rows of (facilityId, itemId) keys, by ID."""
+    model, itemColumn = entryTypeMap[itemType], itemColumns[itemType]
+    entries = db.session.scalars(
+        db.select(model)
+        .where(tuple_(model.productionFacilityId, itemColumn).in_(sorted(keys)))
+        .order_by(model.id)
+        .with_for_update()
+    )
+    return {
+        (entry.productionFacilityId, getattr(entry, itemColumn.key)): entry
+        for entry in entries
+    }
+
+
+def supportsSkipLocked(dialect):
+    """Whether a dialect's server accepts FOR UPDATE SKIP LOCKED."""
+    version = dialect.server_version_info or ()
+    if dialect.name == "postgresql":
+        return True
+    if dialect.name in ("mysql", "mariadb"):
+        # MySQL 5.7, the production image, rejects it as a syntax error
+        if getattr(dialect, "is_mariadb", False):
+            return version >= (10, 6)
+        return version >= (8, 0, 1)
+    return False
+
+
+def confirmedBatchQuery(batchSize, dialect):
+    """
+    Select the oldest confirmed reservations for conversion, locking them.
+
+    Concurrent sweepers skip each other's rows where the server supports SKIP
+    LOCKED; elsewhere they wait, and take the rows in the same ID order.
+    """
+    return (
+        db.select(
+            InventoryReservation.id,
+            InventoryReservation.itemType,
+            InventoryReservation.productionFacilityId,
+            InventoryReservation.itemId,
+            InventoryReservation.quantity,
+        )
+        .where(InventoryReservation.status == "confirmed")
+        .order_by(InventoryReservation.id)
+        .limit(batchSize)
+        .with_for_update(skip_locked=supportsSkipLocked(dialect))
+    )
+
+
+def convertBatch(batchSize):
+    """Convert up to batchSize confirmed reservations in one transaction."""
+    setMovementReason(db.session, "reservation")
+    dialect = db.session.connection().dialect
+    reservations = db.session.execute(confirmedBatchQuery(batchSize, dialect)).all()
+    totals = {itemType: defaultdict(int) for itemType in lockOrder}
+    for _, itemType, facilityId, itemId, quantity in reservations:
+        totals[itemType][facilityId, itemId] += quantity
+    units = {itemType: 0 for itemType in lockOrder}
+    shortfall = 0
+    for itemType in lockOrder:
+        if not totals[itemType]:
+            continue
+        entries = lockEntries(itemType, totals[itemType])
+        for key, quantity in totals[itemType].items():
+            entry = entries.get(key)
+            available = max(entry.count, 0) if entry is not None else 0
+            if entry is not None:
+                entry.count -= min(quantity, available)
+            units[itemType] += min(quantity, available)
+            shortfall += quantity - min(quantity, available)
+    if reservations:
+        db.session.execute(
+            delete(InventoryReservation).where(
+                InventoryReservation.id.in_([row[0] for row in reservations])
+            )
+        )
+    db.session.commit()
+    return len(reservations), units, shortfall
+
+
+def convertConfirmed(batchSize=None):
+    """
+    Decrement the inventory by the confirmed reservations and delete them.
+
+    Each batch adds the reservations up per inventory row and locks the rows in
+    the order builds use, so every row is written once per batch. Units the
+    inventory no longer holds, because its count was edited down since the
+    reservation, are counted as a shortfall rather than driving it negative.
+
+    Returns:
+        dict: The converted "reservations", the "units" by item type and the
+            "shortfall".
+    """
+    batchSize = batchSize or current_app.config["RESERVATION_BATCH_SIZE"]
+    result = {"reservations": 0, "units": {itemType: 0 for itemType in lockOrder}}
+    result["shortfall"] = 0
+    while True:
+        with writeSerialized(db.session):
+            try:
+                converted, units, shortfall = convertBatch(batchSize)
+            except Exception:
+                db.session.rollback()
+                raise
+        result["reservations"] += converted
+        result["shortfall"] += shortfall
+        for itemType, count in units.items():
+            result["units"][itemType] += count
+            if count:
+                convertedUnits.inc(count, labels=(itemType,))
+        conversionShortfall.inc(shortfall)
+        if converted < batchSize:
+            return result
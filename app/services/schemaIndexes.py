@@ -0,0 +1,205 @@
+"""
+Schema setup and index migration for existing databases.
+
+initDatabase() brings the application's database up to the models, and runs from
+`flask ims init-db` and when gunicorn starts: it creates the missing tables, then
+the missing indexes of the existing ones, and fills the tables derived from the
+inventory (stock rollups, the movement ledger) when they were just created next to
+existing stock.
+
+db.create_all() only creates columns and indexes together with new tables, so
+databases created before the inventory and lookup indexes were declared on the
+models need the migration. It adds the columns later releases declared on existing
+tables, merges duplicate (facility, item) inventory rows, which would block the
+unique indexes, and then creates every missing index.
+"""
+
+from datetime import datetime
+from sqlalchemy import inspect, literal, text
+from extensions import db
+from models.inventory import ProductInventory, ComponentInventory
+from models.inventoryMovement import InventoryMovement
+from models.productionProcess import ComponentsRequired
+from models.shipment import shipment
+from services.inventoryLedger import reconcileLedger
+from models.stockRollup import (
+    ComponentStockRollup,
+    ProductStockRollup,
+    rebuildStockRollups,
+)
+from models.transaction import DatabaseTransaction
+from models.user import User
+
+# model -> item key of the (facility, item) unique index
+uniqueInventoryKeys = {ProductInventory: "productId", ComponentInventory: "componentId"}
+
+indexedModels = [
+    ProductInventory,
+    ComponentInventory,
+    ComponentsRequired,
+    DatabaseTransaction,
+    User,
+    shipment,
+]
+
+# model -> columns added to a table that existing databases already have
+addedColumns = {shipment: ["productId", "quantity", "status", "createdAt"]}
+
+
+def addColumnStatement(dialect, column):
+    """
+    Return the ALTER TABLE adding a model column to an existing table.
+
+    Existing rows receive the column's Python default, evaluated once; a NOT NULL
+    column without one cannot be added. Foreign keys are not added, since SQLite
+    cannot add constraints to an existing table.
+    """
+    preparer = dialect.identifier_preparer
+    ddl = (
+        f"ALTER TABLE {preparer.format_table(column.table)}"
+        f" ADD COLUMN {preparer.format_column(column)}"
+        f" {column.type.compile(dialect=dialect)}"
+    )
+    if column.default is not None:
+        value = column.default.arg
+        if column.default.is_callable:
+            # e.g. datetime.now; DATETIME columns may not keep microseconds
+            value = value(None)
+            if isinstance(value, datetime):
+                value = value.replace(microsecond=0)
+        default = literal(value, column.type).compile(
+            dialect=dialect, compile_kwargs={"literal_binds": True}
+        )
+        ddl += f" DEFAULT {default}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    return text(ddl)
+
+
+def migrateColumns(connection):
+    """
+    Add the missing columns of addedColumns to existing tables.
+
+    Returns:
+        list: The "table.column" names added.
+    """
+    added = []
+    inspector = inspect(connection)
+    for model, columnNames in addedColumns.items():
+        table = model.__table__
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for columnName in columnNames:
+            if columnName not in existing:
+                connection.execute(
+                    addColumnStatement(connection.dialect, table.c[columnName])
+                )
+                added.append(f"{table.name}.{columnName}")
+    return added
+
+
+def mergeDuplicateInventory(connection, model, itemKey):
+    """
+    Collapse duplicate (facility, item) rows into the row with the lowest ID.
+
+    The kept row receives the sum of the duplicates' counts.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+    itemColumn = getattr(model, itemKey)
+    duplicates = connection.execute(
+        db.select(
+            model.productionFacilityId,
+            itemColumn,
+            db.func.min(model.id),
+            db.func.sum(model.count),
+        )
+        .group_by(model.productionFacilityId, itemColumn)
+        .having(db.func.count() > 1)
+    ).all()
+    deleted = 0
+    for facilityId, itemId, keepId, totalCount in duplicates:
+        connection.execute(
+            db.update(model).where(model.id == keepId).values(count=totalCount)
+        )
+        deleted += connection.execute(
+            db.delete(model).where(
+                model.productionFacilityId == facilityId,
+                itemColumn == itemId,
+                model.id != keepId,
+            )
+        ).rowcount
+    return deleted
+
+
+def migrateIndexes(engine):
+    """
+    Create the model columns and indexes that are missing from an existing database.
+
+    Args:
+        engine: The engine of the database to migrate.
+
+    Returns:
+        dict: The "table.column" names of the "columns" added, "merged" rows per
+            inventory table and the names of "created" indexes.
+    """
+    result = {"columns": [], "merged": {}, "created": []}
+    with engine.begin() as connection:
+        result["columns"] = migrateColumns(connection)
+        for model, itemKey in uniqueInventoryKeys.items():
+            result["merged"][model.__tablename__] = mergeDuplicateInventory(
+                connection, model, itemKey
+            )
+        inspector = inspect(connection)
+        for model in indexedModels:
+            table = model.__table__
+            if not inspector.has_table(table.name):
+                # db.create_all() creates it together with its indexes
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name not in existing:
+                    index.create(connection)
+                    result["created"].append(index.name)
+    return result
+
+
+def initDatabase():
+    """
+    Create the missing tables, columns and indexes of the application's database.
+
+    Runs in an application context. Idempotent: on an up-to-date database it only
+    inspects the schema.
+
+    Returns:
+        dict: The created "tables", the added "columns", the "merged" rows per
+            inventory table, the "created" indexes, whether the stock rollups were
+            "rebuilt" and the movements "reconciled" into a new ledger per item
+            type.
+    """
+    inspector = inspect(db.engine)
+    missing = [
+        table.name
+        for table in db.metadata.sorted_tables
+        if not inspector.has_table(table.name)
+    ]
+    db.metadata.create_all(db.engine)
+    result = migrateIndexes(db.engine)
+    result["tables"] = missing
+    rollupTables = {
+        ProductStockRollup.__tablename__,
+        ComponentStockRollup.__tablename__,
+    }
+    result["rebuilt"] = bool(rollupTables & set(missing)) or any(
+        result["merged"].values()
+    )
+    if result["rebuilt"]:
+        rebuildStockRollups(db.session)
+        db.session.commit()
+    result["reconciled"] = None
+    if InventoryMovement.__tablename__ in missing:
+        # Opens the ledger on the stock already held
+        result["reconciled"] = reconcileLedger()
+    return result
@@ -0,0 +1,501 @@
+"""
+Shipment fulfilment planning.
+
+planShipments() decides which operating facilities send the units of the pending
+shipments. Every shipment asks for a quantity of one product, so the plan splits
+into one independent problem per product: the product's shipments against the
+facilities holding it, each with the stock it can still promise (count minus the
+active reservations) as capacity. The great-circle distances between the two are
+computed at once as a NumPy haversine matrix. A shipment is split over several
+facilities when no single one has enough.
+
+Two modes:
+- "greedy": shipments are taken oldest first, and each takes its units from the
+  nearest facilities that still have stock.
+- "optimal": the allocation with the fewest unit-kilometres, found by successive
+  shortest paths (min-cost flow). Each shipment in turn is routed along a shortest
+  path that may move units of earlier shipments to other facilities. Node
+  potentials keep the reduced distances non-negative, so every path is a Dijkstra
+  search over the facility columns, which usually ends at the first one scanned.
+
+When stock runs short, the oldest shipments are served first in both modes.
+
+A product with many shipments gives a large matrix. With chunkSize, its shipments
+are planned chunkSize at a time against the stock the previous chunks left, so
+memory stays bounded by chunkSize times the facility count; the optimal mode is
+then optimal per chunk only.
+
+applyPlan() stores a plan: it locks the shipments and then the inventory rows,
+re-checks the units the shipments still need and the stock, holds it with
+confirmed reservations, which `flask ims sweep-reservations` later converts into
+decrements, and records the ShipmentAllocation rows.
+"""
+
+import time
+from collections import defaultdict
+from datetime import datetime
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, insert, tuple_, update
+from extensions import db
+from models.inventory import ProductInventory
+from models.productionFacility import ProductionFacility
+from models.reservation import InventoryReservation
+from models.shipment import ShipmentAllocation, shipment
+from services.inventoryLocks import writeSerialized
+from services.metrics import metrics
+from services.reservations import activeHolds, lockEntries
+from services.spatialIndex import earthRadiusKm
+
+planModes = ("greedy", "optimal")
+
+planSeconds = metrics.histogram(
+    "ims_shipment_plan_seconds", "Time to compute a shipment plan, by mode.", ("mode",)
+)
+allocatedUnits = metrics.counter(
+    "ims_shipment_units_allocated_total",
+    "Shipment units allocated to facilities by applyPlan.",
+)
+
+
+class ShipmentPlanError(Exception):
+    """
+    A plan that can no longer be applied.
+
+    Attributes:
+        reason (str): stockChanged or shipmentChanged.
+    """
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+def haversineMatrix(lat1, lon1, lat2, lon2):
+    """
+    Return the great-circle distances in kilometres between two sets of points.
+
+    Args:
+        lat1, lon1: Coordinates in degrees of the m row points.
+        lat2, lon2: Coordinates in degrees of the n column points.
+
+    Returns:
+        numpy.ndarray: An m x n matrix.
+    """
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(values, dtype=np.float64))
+        for values in (lat1, lon1, lat2, lon2)
+    )
+    a = np.sin(np.subtract.outer(lat1, lat2) / 2) ** 2
+    a += np.outer(np.cos(lat1), np.cos(lat2)) * (
+        np.sin(np.subtract.outer(lon1, lon2) / 2) ** 2
+    )
+    np.minimum(a, 1.0, out=a)
+    return 2 * earthRadiusKm * np.arcsin(np.sqrt(a, out=a), out=a)
+
+
+def greedyAllocate(distances, demand, capacity):
+    """
+    Serve each row in turn from its nearest columns with capacity left.
+
+    Args:
+        distances (numpy.ndarray): Rows are shipments, columns facilities.
+        demand (numpy.ndarray): Units each shipment needs.
+        capacity (numpy.ndarray): Units each facility has; decremented in place.
+
+    Returns:
+        list: (row, column, units) allocations.
+    """
+    allocations = []
+    # Distances from the current row, +inf at the columns without capacity
+    reachable = np.empty(distances.shape[1])
+    for row, need in enumerate(demand.tolist()):
+        np.copyto(reachable, distances[row])
+        reachable[capacity <= 0] = np.inf
+        while need:
+            column = int(reachable.argmin())
+            if reachable[column] == np.inf:
+                return allocations
+            units = min(need, int(capacity[column]))
+            allocations.append((row, column, units))
+            capacity[column] -= units
+            need -= units
+            reachable[column] = np.inf
+    return allocations
+
+
+def minCostAllocate(distances, demand, capacity):
+    """
+    Serve the rows in turn with the least total units times distance.
+
+    Takes the same arguments and returns the same allocations as greedyAllocate;
+    an earlier row never loses units to a later one.
+    """
+    columns = distances.shape[1]
+    remaining = demand.copy()
+    # Reduced distance of row i to column j: distances[i, j] + rowPotential[i]
+    # - columnPotential[j], never negative, and zero where units flow
+    rowPotential = -distances.min(axis=1)
+    columnPotential = np.zeros(columns)
+    # column -> {row: units}
+    flows = [{} for _ in range(columns)]
+    stocked = int(capacity.sum())
+    via = np.empty(columns, dtype=np.int64)
+    candidate = np.empty(columns)
+    for source in range(len(remaining)):
+        while remaining[source] > 0 and stocked > 0:
+            # Tentative distances of the unscanned columns, +inf once scanned for
+            # the argmin and -inf for the comparisons
+            unscanned = distances[source] + rowPotential[source]
+            unscanned -= columnPotential
+            bound = unscanned.copy()
+            via.fill(source)
+            scannedColumns, scannedDistances = [], []
+            rowDistance = {source: 0.0}
+            reachedFrom = {}
+            while True:
+                column = int(unscanned.argmin())
+                shortest = float(unscanned[column])
+                unscanned[column] = np.inf
+                bound[column] = -np.inf
+                scannedColumns.append(column)
+                scannedDistances.append(shortest)
+                if capacity[column] > 0:
+                    break
+                # A full column leads on to the rows it serves, at no extra
+                # distance, since moving their units elsewhere frees capacity
+                for row in flows[column]:
+                    if row in rowDistance:
+                        continue
+                    rowDistance[row] = shortest
+                    reachedFrom[row] = column
+                    np.add(distances[row], shortest + rowPotential[row], out=candidate)
+                    candidate -= columnPotential
+                    better = candidate < bound
+                    unscanned[better] = bound[better] = candidate[better]
+                    via[better] = row
+
+            columnPotential[scannedColumns] -= shortest - np.array(scannedDistances)
+            for row, distance in rowDistance.items():
+                rowPotential[row] -= shortest - distance
+
+            units = min(int(remaining[source]), int(capacity[column]))
+            node = column
+            while via[node] != source:
+                row = via[node]
+                units = min(units, flows[reachedFrom[row]][row])
+                node = reachedFrom[row]
+            node = column
+            while True:
+                row = int(via[node])
+                flows[node][row] = flows[node].get(row, 0) + units
+                if row == source:
+                    break
+                node = reachedFrom[row]
+                flows[node][row] -= units
+                if not flows[node][row]:
+                    del flows[node][row]
+            capacity[column] -= units
+            remaining[source] -= units
+            stocked -= units
+    return [
+        (row, column, units)
+        for column, served in enumerate(flows)
+        for row, units in served.items()
+    ]
+
+
+allocators = {"greedy": greedyAllocate, "optimal": minCostAllocate}
+
+
+def loadPendingShipments(shipmentIds=None):
+    """
+    Return the pending shipments that can be planned, oldest first.
+
+    Returns:
+        list: Rows of id, productId, latitude, longitude and the "remaining"
+            units not allocated yet.
+    """
+    allocated = (
+        db.select(
+            ShipmentAllocation.shipmentId,
+            func.sum(ShipmentAllocation.quantity).label("units"),
+        )
+        .group_by(ShipmentAllocation.shipmentId)
+        .subquery()
+    )
+    query = (
+        db.select(
+            shipment.id,
+            shipment.productId,
+            shipment.latitude,
+            shipment.longitude,
+            (shipment.quantity - func.coalesce(allocated.c.units, 0)).label(
+                "remaining"
+            ),
+        )
+        .outerjoin(allocated, allocated.c.shipmentId == shipment.id)
+        .where(
+            shipment.status == "pending",
+            shipment.productId.isnot(None),
+            shipment.latitude.isnot(None),
+            shipment.longitude.isnot(None),
+        )
+        .order_by(shipment.id)
+    )
+    if shipmentIds is not None:
+        query = query.where(shipment.id.in_(list(shipmentIds)))
+    return [row for row in db.session.execute(query) if row.remaining > 0]
+
+
+def shipmentLockQuery(shipmentIds):
+    """Select the shipment rows of shipmentIds for update, in ID order."""
+    return (
+        db.select(shipment.id)
+        .where(shipment.id.in_(sorted(shipmentIds)))
+        .order_by(shipment.id)
+        .with_for_update()
+    )
+
+
+def heldByKey(productIds=None, keys=None):
+    """Return {(facilityId, productId): units} held by active reservations."""
+    query = db.select(
+        InventoryReservation.productionFacilityId,
+        InventoryReservation.itemId,
+        func.sum(InventoryReservation.quantity),
+    ).where(InventoryReservation.itemType == "product", activeHolds(datetime.now()))
+    if productIds is not None:
+        query = query.where(InventoryReservation.itemId.in_(productIds))
+    if keys is not None:
+        query = query.where(
+            tuple_(
+                InventoryReservation.productionFacilityId, InventoryReservation.itemId
+            ).in_(sorted(keys))
+        )
+    return {
+        (facilityId, productId): units
+        for facilityId, productId, units in db.session.execute(
+            query.group_by(
+                InventoryReservation.productionFacilityId, InventoryReservation.itemId
+            )
+        )
+    }
+
+
+def loadStock(productIds):
+    """
+    Return the operating facilities able to promise each product.
+
+    Returns:
+        dict: productId -> (facility IDs, latitudes, longitudes, capacities)
+            arrays.
+    """
+    held = heldByKey(productIds=productIds)
+    rows = defaultdict(list)
+    for facilityId, productId, count, latitude, longitude in db.session.execute(
+        db.select(
+            ProductInventory.productionFacilityId,
+            ProductInventory.productId,
+            ProductInventory.count,
+            ProductionFacility.latitude,
+            ProductionFacility.longitude,
+        )
+        .join(
+            ProductionFacility,
+            ProductionFacility.id == ProductInventory.productionFacilityId,
+        )
+        .where(
+            ProductionFacility.isOperating.is_(True),
+            ProductInventory.productId.in_(productIds),
+            ProductInventory.count > 0,
+        )
+        .order_by(ProductInventory.productId, ProductInventory.productionFacilityId)
+    ):
+        available = count - held.get((facilityId, productId), 0)
+        if available > 0:
+            rows[productId].append((facilityId, latitude, longitude, available))
+    return {
+        productId: (
+            np.array([row[0] for row in facilities]),
+            np.array([row[1] for row in facilities], dtype=np.float64),
+            np.array([row[2] for row in facilities], dtype=np.float64),
+            np.array([row[3] for row in facilities], dtype=np.int64),
+        )
+        for productId, facilities in rows.items()
+    }
+
+
+def planShipments(mode="greedy", chunkSize=None, shipmentIds=None):
+    """
+    Allocate the units of the pending shipments to facilities with stock.
+
+    Args:
+        mode (str): "greedy" or "optimal".
+        chunkSize (int): Shipments of a product planned at a time; defaults to
+            SHIPMENT_PLAN_CHUNK_SIZE, 0 plans them all at once.
+        shipmentIds: Only plan these shipments; every pending one by default.
+
+    Returns:
+        dict: The "allocations" (shipmentId, facilityId, quantity, distanceKm),
+            the shipment and unit totals, the total "unitKm" and the IDs of the
+            "unserved" shipments, whose units are not all allocated.
+    """
+    if mode not in allocators:
+        raise ValueError(f"mode must be one of {', '.join(planModes)}")
+    if chunkSize is None:
+        chunkSize = current_app.config["SHIPMENT_PLAN_CHUNK_SIZE"]
+    started = time.perf_counter()
+    shipments = defaultdict(list)
+    for row in loadPendingShipments(shipmentIds):
+        shipments[row.productId].append(row)
+    stock = loadStock(list(shipments))
+    allocations, unserved = [], []
+    units = unitKm = 0
+    for productId, rows in sorted(shipments.items()):
+        facilityIds, latitudes, longitudes, capacity = stock.get(
+            productId, ([], [], [], np.zeros(0, dtype=np.int64))
+        )
+        size = chunkSize or len(rows)
+        for first in range(0, len(rows), size):
+            chunk = rows[first : first + size]
+            demand = np.array([row.remaining for row in chunk], dtype=np.int64)
+            served = np.zeros(len(chunk), dtype=np.int64)
+            units += int(demand.sum())
+            if capacity.any():
+                distances = haversineMatrix(
+                    [row.latitude for row in chunk],
+                    [row.longitude for row in chunk],
+                    latitudes,
+                    longitudes,
+                )
+                for row, column, quantity in allocators[mode](
+                    distances, demand, capacity
+                ):
+                    distanceKm = float(distances[row, column])
+                    allocations.append(
+                        {
+                            "shipmentId": chunk[row].id,
+                            "facilityId": int(facilityIds[column]),
+                            "quantity": quantity,
+                            "distanceKm": round(distanceKm, 3),
+                        }
+                    )
+                    served[row] += quantity
+                    unitKm += quantity * distanceKm
+            unserved.extend(chunk[i].id for i in np.flatnonzero(served < demand))
+    seconds = time.perf_counter() - started
+    planSeconds.observe(seconds, labels=(mode,))
+    allocations.sort(key=lambda allocation: allocation["shipmentId"])
+    return {
+        "mode": mode,
+        "shipments": sum(len(rows) for rows in shipments.values()),
+        "units": units,
+        "allocatedUnits": sum(allocation["quantity"] for allocation in allocations),
+        "unitKm": round(unitKm, 3),
+        "unserved": sorted(unserved),
+        "allocations": allocations,
+        "seconds": round(seconds, 3),
+    }
+
+
+def applyPlan(allocations, userId=None):
+    """
+    Hold the stock of a plan's allocations and record them.
+
+    Args:
+        allocations (list): The "allocations" of a plan.
+        userId (int): The user applying the plan.
+
+    Returns:
+        int: The number of shipments that became fully planned.
+
+    Raises:
+        ShipmentPlanError: If a shipment is no longer pending with that many
+            units left, or a facility can no longer promise its units; nothing
+            is changed and the shipments should be planned again.
+    """
+    if not allocations:
+        return 0
+    perShipment = defaultdict(int)
+    for allocation in allocations:
+        perShipment[allocation["shipmentId"]] += allocation["quantity"]
+    with writeSerialized(db.session):
+        try:
+            # Two applies of overlapping plans would both see the units still
+            # remaining; the shipments are locked before the inventory rows so
+            # every apply takes the locks in the same order
+            db.session.execute(shipmentLockQuery(perShipment))
+            pending = {row.id: row for row in loadPendingShipments(perShipment)}
+            for shipmentId, quantity in perShipment.items():
+                if (
+                    shipmentId not in pending
+                    or pending[shipmentId].remaining < quantity
+                ):
+                    raise ShipmentPlanError(
+                        f"Shipment {shipmentId} no longer needs {quantity} units.",
+                        "shipmentChanged",
+                    )
+            required = defaultdict(int)
+            for allocation in allocations:
+                productId = pending[allocation["shipmentId"]].productId
+                required[allocation["facilityId"], productId] += allocation["quantity"]
+            entries = lockEntries("product", required)
+            held = heldByKey(keys=required)
+            for key, quantity in required.items():
+                entry = entries.get(key)
+                if entry is None or entry.count - held.get(key, 0) < quantity:
+                    raise ShipmentPlanError(
+                        f"Facility {key[0]} can no longer promise {quantity} units"
+                        f" of product {key[1]}.",
+                        "stockChanged",
+                    )
+            now = datetime.now()
+            db.session.execute(
+                insert(InventoryReservation),
+                [
+                    {
+                        "itemType": "product",
+                        "itemId": productId,
+                        "productionFacilityId": facilityId,
+                        "quantity": quantity,
+                        "status": "confirmed",
+                        "expiresAt": now,
+                        "createdAt": now,
+                        "createdByUserId": userId,
+                    }
+                    for (facilityId, productId), quantity in sorted(required.items())
+                ],
+            )
+            db.session.execute(
+                insert(ShipmentAllocation),
+                [
+                    {
+                        "shipmentId": allocation["shipmentId"],
+                        "productionFacilityId": allocation["facilityId"],
+                        "quantity": allocation["quantity"],
+                        "distanceKm": allocation["distanceKm"],
+                        "createdAt": now,
+                        "createdByUserId": userId,
+                    }
+                    for allocation in allocations
+                ],
+            )
+            planned = [
+                shipmentId
+                for shipmentId, quantity in perShipment.items()
+                if pending[shipmentId].remaining == quantity
+            ]
+            if planned:
+                db.session.execute(
+                    update(shipment)
+                    .where(shipment.id.in_(planned))
+                    .values(status="planned")
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    allocatedUnits.inc(sum(perShipment.values()))
+    return len(planned)
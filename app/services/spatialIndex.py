@@ -0,0 +1,264 @@
+"""
+Nearest-facility queries over an in-memory k-d tree.
+
+Operating facilities are indexed as points on the unit sphere in 3D, where the
+straight-line (chord) distance grows with the great-circle distance, so a plain
+Euclidean k-d tree returns facilities in haversine order. The tree is built from
+the cached facility map points and rebuilt in each process when their ETag
+changes, which the facility mapper events take care of.
+
+nearestWithStock() combines the tree with the inventory tables: an item held by few
+facilities is ranked directly, otherwise the tree is walked nearest-first and the
+candidates' stock is checked in batches.
+"""
+
+import heapq
+import math
+from itertools import count as counter
+from threading import Lock
+from extensions import db
+from models.inventory import ComponentInventory, ProductInventory
+from services.facilityMap import getMapEtag, getMapPoints
+
+earthRadiusKm = 6371.0088
+# Items held by at most this many facilities are always ranked without the tree
+rareItemLimit = 512
+# Relative cost of checking one tree candidate versus ranking one stocked row
+treeWalkCost = 8
+firstBatchSize = 64
+maxBatchSize = 512
+
+stockModels = {
+    "product": (ProductInventory, "productId"),
+    "component": (ComponentInventory, "componentId"),
+}
+
+
+def haversineKm(lat1, lon1, lat2, lon2):
+    """Return the great-circle distance between two points in kilometres."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * earthRadiusKm * math.asin(min(1.0, math.sqrt(a)))
+
+
+def toUnitVector(lat, lon):
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (
+        math.cos(lat) * math.cos(lon),
+        math.cos(lat) * math.sin(lon),
+        math.sin(lat),
+    )
+
+
+class KdNode:
+    __slots__ = ("point", "left", "right", "low", "high")
+
+    def __init__(self, point, left, right, low, high):
+        self.point = point
+        self.left = left
+        self.right = right
+        # Bounding box of the subtree, for the nearest-first lower bounds
+        self.low = low
+        self.high = high
+
+
+def buildTree(vectors, indices, depth=0):
+    if not indices:
+        return None
+    axis = depth % 3
+    indices.sort(key=lambda i: vectors[i][axis])
+    middle = len(indices) // 2
+    point = indices[middle]
+    left = buildTree(vectors, indices[:middle], depth + 1)
+    right = buildTree(vectors, indices[middle + 1 :], depth + 1)
+    # The subtree box is the union of the children's boxes and the point
+    low, high = vectors[point], vectors[point]
+    for child in (left, right):
+        if child is not None:
+            low = tuple(map(min, low, child.low))
+            high = tuple(map(max, high, child.high))
+    return KdNode(point, left, right, low, high)
+
+
+def boxDistance2(node, vector):
+    total = 0.0
+    for a in range(3):
+        if vector[a] < node.low[a]:
+            total += (node.low[a] - vector[a]) ** 2
+        elif vector[a] > node.high[a]:
+            total += (vector[a] - node.high[a]) ** 2
+    return total
+
+
+def pointDistance2(a, b):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+class FacilityIndex:
+    """
+    A k-d tree over the operating facilities.
+
+    Attributes:
+        etag (str): The map points ETag the tree was built from.
+        ids (list): Facility IDs by point index.
+        lat (list): Latitudes by point index.
+        lon (list): Longitudes by point index.
+        text (list): Facility names by point index.
+    """
+
+    def __init__(self, points):
+        operating = [
+            i for i, isOperating in enumerate(points["operating"]) if isOperating
+        ]
+        self.etag = points["etag"]
+        self.ids = [points["id"][i] for i in operating]
+        self.lat = [points["lat"][i] for i in operating]
+        self.lon = [points["lon"][i] for i in operating]
+        self.text = [points["text"][i] for i in operating]
+        self.positions = {facilityId: i for i, facilityId in enumerate(self.ids)}
+        self.vectors = [toUnitVector(lat, lon) for lat, lon in zip(self.lat, self.lon)]
+        self.root = buildTree(self.vectors, list(range(len(self.ids))))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nearest(self, lat, lon):
+        """Yield point indexes in increasing distance from (lat, lon)."""
+        if self.root is None:
+            return
+        vector = toUnitVector(lat, lon)
+        tiebreak = counter()
+        heap = [(0.0, next(tiebreak), self.root)]
+        while heap:
+            distance, _, item = heapq.heappop(heap)
+            if not isinstance(item, KdNode):
+                yield item
+                continue
+            heapq.heappush(
+                heap,
+                (
+                    pointDistance2(self.vectors[item.point], vector),
+                    next(tiebreak),
+                    item.point,
+                ),
+            )
+            for child in (item.left, item.right):
+                if child is not None:
+                    heapq.heappush(
+                        heap, (boxDistance2(child, vector), next(tiebreak), child)
+                    )
+
+
+indexLock = Lock()
+facilityIndex = None
+
+
+def getFacilityIndex():
+    """Return the facility index, rebuilding it if the facilities changed."""
+    global facilityIndex
+    etag = getMapEtag()
+    index = facilityIndex
+    if index is not None and index.etag == etag:
+        return index
+    with indexLock:
+        if facilityIndex is None or facilityIndex.etag != etag:
+            facilityIndex = FacilityIndex(getMapPoints())
+        return facilityIndex
+
+
+def stockFilter(model, itemKey, itemId, quantity):
+    return (getattr(model, itemKey) == itemId, model.count >= quantity)
+
+
+def countStocked(model, itemKey, itemId, quantity, limit):
+    """Count the facilities holding at least quantity, stopping at limit."""
+    # Only reads the (item, count) index
+    stocked = db.select(model.count).where(
+        *stockFilter(model, itemKey, itemId, quantity)
+    )
+    return db.session.scalar(
+        db.select(db.func.count()).select_from(stocked.limit(limit).subquery())
+    )
+
+
+def stockedAt(model, itemKey, itemId, quantity, facilityIds=None):
+    """Return {facilityId: count} of the inventory rows holding at least quantity."""
+    if facilityIds is None:
+        query = db.select(model.productionFacilityId, model.count).where(
+            *stockFilter(model, itemKey, itemId, quantity)
+        )
+        return dict(db.session.execute(query).all())
+    # Without a count condition the planner looks each candidate up in the
+    # (facility, item) unique index instead of scanning the item's stock
+    query = db.select(model.productionFacilityId, model.count).where(
+        getattr(model, itemKey) == itemId,
+        model.productionFacilityId.in_(facilityIds),
+    )
+    return {
+        facilityId: count
+        for facilityId, count in db.session.execute(query)
+        if count >= quantity
+    }
+
+
+def nearestWithStock(lat, lon, itemType, itemId, quantity=1, k=5):
+    """
+    Return the k nearest operating facilities holding at least quantity of an item.
+
+    Args:
+        lat (float): Latitude of the destination.
+        lon (float): Longitude of the destination.
+        itemType (str): "product" or "component".
+        itemId (int): The product or component ID.
+        quantity (int): The minimum count a facility must hold.
+        k (int): The maximum number of facilities to return.
+
+    Returns:
+        list: Dictionaries with the facility "id", "name", "latitude", "longitude",
+            "count" and "distanceKm", nearest first.
+    """
+    model, itemKey = stockModels[itemType]
+    index = getFacilityIndex()
+    matches = []
+    # Walking the tree checks about k * len(index) / stocked candidates, ranking
+    # directly reads every stocked row
+    directLimit = max(rareItemLimit, int(math.sqrt(treeWalkCost * k * len(index))))
+    if countStocked(model, itemKey, itemId, quantity, directLimit + 1) <= directLimit:
+        stocked = stockedAt(model, itemKey, itemId, quantity)
+        positions = [index.positions[f] for f in stocked if f in index.positions]
+        for i in positions:
+            matches.append((haversineKm(lat, lon, index.lat[i], index.lon[i]), i))
+        matches = heapq.nsmallest(k, matches)
+        counts = stocked
+    else:
+        counts = {}
+        candidates = index.nearest(lat, lon)
+        batchSize = firstBatchSize
+        while len(matches) < k:
+            batch = [index.ids[i] for _, i in zip(range(batchSize), candidates)]
+            if not batch:
+                break
+            counts.update(
+                stockedAt(model, itemKey, itemId, quantity, facilityIds=batch)
+            )
+            for facilityId in batch:
+                if facilityId in counts and len(matches) < k:
+                    i = index.positions[facilityId]
+                    matches.append(
+                        (haversineKm(lat, lon, index.lat[i], index.lon[i]), i)
+                    )
+            batchSize = min(batchSize * 2, maxBatchSize)
+    return [
+        {
+            "id": index.ids[i],
+            "name": index.text[i],
+            "latitude": index.lat[i],
+            "longitude": index.lon[i],
+            "count": counts[index.ids[i]],
+            "distanceKm": round(distance, 3),
+        }
+        for distance, i in matches
+    ]
@@ -0,0 +1,222 @@
+"""
+Reorder points and low-stock alerts.
+
+models/stockAlert.py raises, reopens and resolves alerts as inventory counts and
+reorder points change, evaluating only the items each transaction touched. This
+module sets the reorder points, lists and acknowledges the alerts, and reconciles
+them:
+reconcileAlerts() re-evaluates every reorder point, STOCK_ALERT_BATCH_SIZE at a
+time, to catch the changes that bypassed the unit of work. It runs from
+`flask ims reconcile-alerts`, once or every --interval seconds.
+"""
+
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, exists, not_
+from extensions import db
+from models.stockAlert import (
+    StockAlert,
+    StockThreshold,
+    activeStatuses,
+    evaluateKeys,
+    resolveAlerts,
+)
+from services.inventoryLocks import writeSerialized
+
+alertStatuses = ("open", "acknowledged", "resolved")
+
+
+class StockAlertError(Exception):
+    """
+    An alert action that cannot be carried out.
+
+    Attributes:
+        reason (str): notFound or resolved.
+    """
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+def thresholdDict(threshold):
+    return {
+        "type": threshold.itemType,
+        "itemId": threshold.itemId,
+        "reorderPoint": threshold.reorderPoint,
+        "updatedAt": threshold.updatedAt.isoformat(),
+        "updatedByUserId": threshold.updatedByUserId,
+    }
+
+
+def alertDict(alert):
+    return {
+        "alertId": alert.id,
+        "facilityId": alert.productionFacilityId,
+        "type": alert.itemType,
+        "itemId": alert.itemId,
+        "count": alert.count,
+        "reorderPoint": alert.reorderPoint,
+        "status": alert.status,
+        "triggerCount": alert.triggerCount,
+        "triggeredAt": alert.triggeredAt.isoformat(),
+        "lastTriggeredAt": alert.lastTriggeredAt.isoformat(),
+        "resolvedAt": alert.resolvedAt and alert.resolvedAt.isoformat(),
+        "acknowledgedByUserId": alert.acknowledgedByUserId,
+    }
+
+
+def listThresholds(facilityId):
+    """Return a facility's reorder points, ordered by type and item ID."""
+    return [
+        thresholdDict(threshold)
+        for threshold in db.session.scalars(
+            db.select(StockThreshold)
+            .where(StockThreshold.productionFacilityId == facilityId)
+            .order_by(StockThreshold.itemType, StockThreshold.itemId)
+        )
+    ]
+
+
+def setThresholds(facilityId, thresholds, userId=None):
+    """
+    Set or remove some of a facility's reorder points in one transaction.
+
+    The commit evaluates the changed items, so an item already at or below its new
+    reorder point raises its alert straight away, and removing a reorder point
+    resolves its alert.
+
+    Args:
+        facilityId (int): The facility.
+        thresholds: (item type, item ID, reorder point) tuples; a reorder point of
+            None removes the item's threshold.
+        userId (int): Recorded as updatedByUserId.
+
+    Returns:
+        list: The facility's reorder points after the change.
+    """
+    for itemType, itemId, reorderPoint in thresholds:
+        threshold = db.session.get(StockThreshold, (facilityId, itemType, itemId))
+        if reorderPoint is None:
+            if threshold is not None:
+                db.session.delete(threshold)
+            continue
+        if threshold is None:
+            threshold = StockThreshold(
+                productionFacilityId=facilityId, itemType=itemType, itemId=itemId
+            )
+            db.session.add(threshold)
+        threshold.reorderPoint = reorderPoint
+        threshold.updatedByUserId = userId
+    db.session.commit()
+    return listThresholds(facilityId)
+
+
+def listAlerts(status=None, facilityId=None, beforeId=None, limit=100):
+    """
+    Return low-stock alerts, newest first.
+
+    Args:
+        status (str): Only alerts with this status; the open and acknowledged
+            ones by default.
+        facilityId (int): Only the alerts of this facility.
+        beforeId (int): Only alerts older than this one, to page backwards.
+        limit (int): The maximum number of alerts.
+
+    Returns:
+        list: One dictionary per alert.
+    """
+    query = db.select(StockAlert).where(
+        StockAlert.status.in_(activeStatuses if status is None else (status,))
+    )
+    if facilityId is not None:
+        query = query.where(StockAlert.productionFacilityId == facilityId)
+    if beforeId is not None:
+        query = query.where(StockAlert.id < beforeId)
+    return [
+        alertDict(alert)
+        for alert in db.session.scalars(
+            query.order_by(StockAlert.id.desc()).limit(limit)
+        )
+    ]
+
+
+def acknowledgeAlert(alertId, userId=None):
+    """
+    Mark an open alert as seen; it stays active until the stock recovers.
+
+    Raises:
+        StockAlertError: If the alert does not exist or is already resolved.
+    """
+    alert = db.session.get(StockAlert, alertId)
+    if alert is None:
+        raise StockAlertError(f"Alert {alertId} not found.", "notFound")
+    if alert.status == "resolved":
+        raise StockAlertError(f"Alert {alertId} is already resolved.", "resolved")
+    alert.status = "acknowledged"
+    alert.acknowledgedAt = datetime.now()
+    alert.acknowledgedByUserId = userId
+    db.session.commit()
+    return alertDict(alert)
+
+
+def reconcileAlerts(batchSize=None):
+    """
+    Re-evaluate every reorder point, catching the changes alerting missed.
+
+    Alerts whose reorder point no longer exists are resolved first. Each batch of
+    reorder points is evaluated in its own transaction.
+
+    Returns:
+        dict: The number of reorder points "evaluated" and of alerts "fired",
+            "suppressed", "updated" and "resolved".
+    """
+    batchSize = batchSize or current_app.config["STOCK_ALERT_BATCH_SIZE"]
+    totals = dict.fromkeys(
+        ("evaluated", "fired", "suppressed", "updated", "resolved"), 0
+    )
+    with writeSerialized(db.session):
+        try:
+            totals["resolved"] += resolveAlerts(
+                db.session.connection(),
+                not_(
+                    exists().where(
+                        and_(
+                            StockThreshold.productionFacilityId
+                            == StockAlert.productionFacilityId,
+                            StockThreshold.itemType == StockAlert.itemType,
+                            StockThreshold.itemId == StockAlert.itemId,
+                        )
+                    )
+                ),
+                "reconcile",
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    keys = db.session.execute(
+        db.select(
+            StockThreshold.productionFacilityId,
+            StockThreshold.itemType,
+            StockThreshold.itemId,
+        ).order_by(
+            StockThreshold.productionFacilityId,
+            StockThreshold.itemType,
+            StockThreshold.itemId,
+        )
+    ).all()
+    db.session.commit()
+    for start in range(0, len(keys), batchSize):
+        batch = [tuple(key) for key in keys[start : start + batchSize]]
+        with writeSerialized(db.session):
+            try:
+                outcomes = evaluateKeys(db.session.connection(), batch, "reconcile")
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        totals["evaluated"] += len(batch)
+        for outcome, count in outcomes.items():
+            totals[outcome] += count
+    return totals
@@ -0,0 +1,289 @@
+"""
+Deterministic synthetic dataset generator for load testing.
+
+generateDataset() fills an empty schema with users, production facilities,
+products, components and inventory, using Core bulk INSERTs in chunks. The same
+seed and sizes always produce the same rows, so performance changes can be
+measured against identical data.
+
+Distributions:
+- Facilities are scattered around a fixed list of US metro areas.
+- Product and component prices are log-normal per category.
+- Every facility stocks a distinct sample of items, so (facility, item) pairs are
+  unique. Counts are log-normal, scaled by a per-item popularity, and a few
+  entries are out of stock.
+- Optionally, each product has a number of production processes, each requiring
+  a distinct sample of components, mostly one or two units of each.
+"""
+
+import random
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from werkzeug.security import generate_password_hash
+from models.component import Component
+from models.inventory import ComponentInventory, ProductInventory
+from models.product import Product
+from models.productionFacility import ProductionFacility
+from models.productionProcess import ComponentsRequired, ProductionProcess
+from models.stockRollup import rebuildStockRollups
+from models.user import User
+
+metroAreas = [
+    ("New York", "NY", 40.71, -74.01),
+    ("Los Angeles", "CA", 34.05, -118.24),
+    ("Chicago", "IL", 41.88, -87.63),
+    ("Houston", "TX", 29.76, -95.37),
+    ("Phoenix", "AZ", 33.45, -112.07),
+    ("Seattle", "WA", 47.61, -122.33),
+    ("Denver", "CO", 39.74, -104.99),
+    ("Atlanta", "GA", 33.75, -84.39),
+    ("Miami", "FL", 25.76, -80.19),
+    ("Boston", "MA", 42.36, -71.06),
+]
+productCategories = [
+    ("Notebook", 900),
+    ("Ultrabook", 1400),
+    ("Gaming", 1800),
+    ("2 in 1 Convertible", 1100),
+    ("Workstation", 2400),
+    ("Netbook", 400),
+]
+componentCategories = [
+    ("CPU", 300),
+    ("Memory", 90),
+    ("Storage", 120),
+    ("GPU", 600),
+    ("Display", 250),
+    ("Battery", 80),
+    ("Cooling", 40),
+]
+brands = ["Acer", "Apple", "Asus", "Dell", "HP", "Lenovo", "MSI", "Razer", "Samsung"]
+stockoutRate = 0.05
+# Units of a component consumed by one process run
+requiredCounts = (1, 1, 1, 2, 2, 4)
+
+
+def chunked(rows, chunkSize):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunkSize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def userRows(rng, count):
+    # Hashing is slow on purpose, so every user shares one password hash
+    passwordHash = generate_password_hash("password")
+    for i in range(1, count + 1):
+        yield {
+            "username": f"loadtest{i}",
+            "passwordHash": passwordHash,
+            "firstName": f"First{i}",
+            "lastName": f"Last{i}",
+            "email": f"loadtest{i}@example.com",
+            "title": rng.choice(["Inventory Manager", "Employee"]),
+        }
+
+
+def facilityRows(rng, count):
+    for i in range(1, count + 1):
+        city, state, latitude, longitude = rng.choice(metroAreas)
+        yield {
+            "name": f"{city} Facility {i}",
+            "contactInfo": f"555-{i % 10000:04d}",
+            "streetAddress": f"{rng.randint(1, 9999)} Main St",
+            "city": city,
+            "stateProvinceRegion": state,
+            "postalCode": f"{rng.randint(10000, 99999)}",
+            "country": "USA",
+            "latitude": round(latitude + rng.gauss(0, 1.5), 6),
+            "longitude": round(longitude + rng.gauss(0, 1.5), 6),
+            "isOperating": rng.random() > 0.02,
+        }
+
+
+def productRows(rng, count):
+    for i in range(1, count + 1):
+        category, medianPrice = rng.choice(productCategories)
+        yield {
+            "brand": rng.choice(brands),
+            "model": f"Model {i}",
+            "category": category,
+            "price": round(medianPrice * rng.lognormvariate(0, 0.35), 2),
+            "available": True,
+        }
+
+
+def componentRows(rng, count):
+    for i in range(1, count + 1):
+        category, medianPrice = rng.choice(componentCategories)
+        yield {
+            "name": f"{category} {i}",
+            "brand": rng.choice(brands),
+            "category": category,
+            "price": round(medianPrice * rng.lognormvariate(0, 0.5), 2),
+        }
+
+
+def inventoryRows(rng, itemKey, facilities, items, perFacility, users, lastUpdated):
+    popularity = [rng.lognormvariate(0, 0.75) for _ in range(items)]
+    perFacility = min(perFacility, items)
+    for facilityId in range(1, facilities + 1):
+        for index in rng.sample(range(items), perFacility):
+            if rng.random() < stockoutRate:
+                count = 0
+            else:
+                count = max(1, int(rng.lognormvariate(3.5, 0.8) * popularity[index]))
+            yield {
+                "productionFacilityId": facilityId,
+                itemKey: index + 1,
+                "count": count,
+                "lastUpdated": lastUpdated,
+                "lastUpdatedByUserId": rng.randint(1, users),
+            }
+
+
+def processRows(rng, products, perProduct, lastUpdated):
+    for productId in range(1, products + 1):
+        for _ in range(perProduct):
+            yield {
+                "product": productId,
+                "minutes": rng.randint(10, 240),
+                "lastUpdated": lastUpdated,
+            }
+
+
+def requirementRows(rng, processes, components, perProcess):
+    perProcess = min(perProcess, components)
+    for processId in range(1, processes + 1):
+        for index in rng.sample(range(components), perProcess):
+            yield {
+                "processId": processId,
+                "componentId": index + 1,
+                "count": rng.choice(requiredCounts),
+            }
+
+
+def generateDataset(
+    engine,
+    facilities=100,
+    products=1000,
+    components=1000,
+    productsPerFacility=50,
+    componentsPerFacility=50,
+    processesPerProduct=0,
+    componentsPerProcess=4,
+    users=20,
+    seed=0,
+    chunkSize=20000,
+    onProgress=None,
+):
+    """
+    Fill an empty database with a deterministic synthetic dataset.
+
+    The tables must exist and be empty, so the generated IDs start at 1.
+
+    Args:
+        engine: The SQLAlchemy engine to write to.
+        facilities (int): Number of production facilities.
+        products (int): Number of products.
+        components (int): Number of components.
+        productsPerFacility (int): Distinct products stocked by each facility.
+        componentsPerFacility (int): Distinct components stocked by each facility.
+        processesPerProduct (int): Production processes of each product.
+        componentsPerProcess (int): Distinct components required by each process.
+        users (int): Number of users.
+        seed (int): Seed of the random generators.
+        chunkSize (int): Rows per INSERT transaction.
+        onProgress (callable): Called with (tableName, rowsWritten) after each chunk.
+
+    Returns:
+        dict: Rows written per table and the elapsed "seconds".
+    """
+    # One generator per table, so changing one size does not shift the others
+    lastUpdated = datetime(2024, 1, 1)
+    tables = [
+        (User, userRows(random.Random(f"{seed}:users"), users)),
+        (
+            ProductionFacility,
+            facilityRows(random.Random(f"{seed}:facilities"), facilities),
+        ),
+        (Product, productRows(random.Random(f"{seed}:products"), products)),
+        (Component, componentRows(random.Random(f"{seed}:components"), components)),
+        (
+            ProductInventory,
+            inventoryRows(
+                random.Random(f"{seed}:productInventory"),
+                "productId",
+                facilities,
+                products,
+                productsPerFacility,
+                users,
+                lastUpdated,
+            ),
+        ),
+        (
+            ComponentInventory,
+            inventoryRows(
+                random.Random(f"{seed}:componentInventory"),
+                "componentId",
+                facilities,
+                components,
+                componentsPerFacility,
+                users,
+                lastUpdated,
+            ),
+        ),
+        (
+            ProductionProcess,
+            processRows(
+                random.Random(f"{seed}:processes"),
+                products,
+                processesPerProduct,
+                lastUpdated,
+            ),
+        ),
+        (
+            ComponentsRequired,
+            requirementRows(
+                random.Random(f"{seed}:requirements"),
+                products * processesPerProduct,
+                components,
+                componentsPerProcess,
+            ),
+        ),
+    ]
+    start = time.perf_counter()
+    written = {}
+    with engine.connect() as connection:
+        if connection.dialect.name == "sqlite":
+            # The dataset can be regenerated, so trade durability for speed
+            connection.exec_driver_sql("PRAGMA synchronous = OFF")
+        for model, rows in tables:
+            tableName = model.__tablename__
+            written[tableName] = 0
+            for chunk in chunked(rows, chunkSize):
+                connection.execute(insert(model), chunk)
+                connection.commit()
+                written[tableName] += len(chunk)
+                if onProgress is not None:
+                    onProgress(tableName, written[tableName])
+    with Session(engine) as session:
+        written.update(rebuildStockRollups(session))
+        session.commit()
+    written["seconds"] = time.perf_counter() - start
+    return written
+
+
+def estimateRows(
+    facilities, products, components, productsPerFacility, componentsPerFacility
+):
+    """Return the number of inventory rows generateDataset() will write."""
+    return facilities * (
+        min(productsPerFacility, products) + min(componentsPerFacility, components)
+    )
@@ -1,40 +1,77 @@
-fetch('/map-data')
-  .then(response => response.json())
-  .then(mapData => {
-    // Calculate the average latitude and longitude
-    var sumLat = mapData.lat.reduce((a, b) => a + b, 0);
-    var sumLon = mapData.lon.reduce((a, b) => a + b, 0);
-    var avgLat = sumLat / mapData.lat.length;
-    var avgLon = sumLon / mapData.lon.length;
+// Facilities are clustered on the server for the visible area, and the clusters
+// are fetched again whenever the map is panned or zoomed.
+var mapDiv = document.getElementById('map');
+var initialZoom = 3.5;
 
-    // Convert data into Plotly-compatible format
-    var data = [{
-        type: 'scattermapbox',
-        lat: mapData.lat,
-        lon: mapData.lon,
-        mode: 'markers',
-        marker: {
-            size: 14,
-            color: 'rgb(255, 0, 0)',
-            opacity: 0.7
-        },
-        text: mapData.text
-    }];
+function mapBoundingBox(center, zoom) {
+  // Web mercator: a 256px tile spans 360 degrees of longitude at zoom 0
+  var degreesPerPixel = 360 / (256 * Math.pow(2, zoom));
+  var halfWidth = mapDiv.clientWidth / 2 * degreesPerPixel;
+  var halfHeight = mapDiv.clientHeight / 2 * degreesPerPixel;
+  var clamp = (value, limit) => Math.max(-limit, Math.min(limit, value));
+  var wrap = value => ((value + 540) % 360) - 180;
+  if (halfWidth >= 180) {
+    return [-180, clamp(center.lat - halfHeight, 90), 180, clamp(center.lat + halfHeight, 90)];
+  }
+  return [
+    wrap(center.lon - halfWidth),
+    clamp(center.lat - halfHeight, 90),
+    wrap(center.lon + halfWidth),
+    clamp(center.lat + halfHeight, 90)
+  ];
+}
 
+function fetchClusters(center, zoom) {
+  var bbox = mapBoundingBox(center, zoom).map(value => value.toFixed(4)).join(',');
+  return fetch('/map-data?bbox=' + bbox + '&zoom=' + zoom.toFixed(1))
+    .then(response => response.json());
+}
+
+function clusterTrace(clusters) {
+  return {
+    type: 'scattermapbox',
+    lat: clusters.lat,
+    lon: clusters.lon,
+    mode: 'markers',
+    marker: {
+      size: clusters.count.map(count => 14 + 4 * Math.log2(count)),
+      color: 'rgb(255, 0, 0)',
+      opacity: 0.7
+    },
+    text: clusters.text
+  };
+}
+
+fetchClusters({ lat: 0, lon: 0 }, 0)
+  .then(worldClusters => {
+    // Center on the average facility position
+    var total = worldClusters.count.reduce((a, b) => a + b, 0) || 1;
+    var center = {
+      lat: worldClusters.lat.reduce((sum, lat, i) => sum + lat * worldClusters.count[i], 0) / total,
+      lon: worldClusters.lon.reduce((sum, lon, i) => sum + lon * worldClusters.count[i], 0) / total
+    };
+    return fetchClusters(center, initialZoom).then(clusters => ({ center, clusters }));
+  })
+  .then(({ center, clusters }) => {
     // Define layout for the map
     var layout = {
-        mapbox: {
-            style: 'open-street-map',
-            center: { lat: avgLat, lon: avgLon }, // Set the center dynamically
-            zoom: 3.5
-        },
-        margin: { l: 0, r: 0, b: 0, t: 0 },
-        // width: 800,
-        // height: 600
+      mapbox: {
+        style: 'open-street-map',
+        center: center,
+        zoom: initialZoom
+      },
+      margin: { l: 0, r: 0, b: 0, t: 0 },
     };
 
     // Plot the map
-    Plotly.newPlot('map', data, layout);
+    Plotly.newPlot('map', [clusterTrace(clusters)], layout).then(() => {
+      mapDiv.on('plotly_relayout', () => {
+        var view = mapDiv.layout.mapbox;
+        fetchClusters(view.center, view.zoom).then(clusters => {
+          Plotly.react('map', [clusterTrace(clusters)], mapDiv.layout);
+        });
+      });
+    });
   })
   .catch(error => {
     console.error('Error fetching map data:', error);
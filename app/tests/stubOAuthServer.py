@@ -0,0 +1,67 @@
+"""
+Local stand-in for the Google userinfo endpoint, used by the authentication tests.
+
+The server answers GET requests with the userinfo registered for the bearer token,
+keeps connections alive (HTTP/1.1) and records the client ports it has seen, so a
+test can check that the pooled HTTP client reuses its connection.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class UserInfoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.clientPorts.add(self.client_address[1])
+        server.requestCount += 1
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        userInfo = server.users.get(token)
+        body = json.dumps(userInfo or {"error": "invalid_token"}).encode()
+        self.send_response(200 if userInfo else 401)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubUserInfoServer:
+    """
+    A userinfo server on a free local port.
+
+    Attributes:
+        url (str): The userinfo URL to configure as GOOGLE_USERINFO_URL.
+        users (dict): Access token -> userinfo dictionary.
+    """
+
+    def __init__(self, users):
+        self.httpServer = ThreadingHTTPServer(("127.0.0.1", 0), UserInfoHandler)
+        self.httpServer.users = users
+        self.httpServer.clientPorts = set()
+        self.httpServer.requestCount = 0
+        self.url = f"http://127.0.0.1:{self.httpServer.server_port}/oauth2/v1/userinfo"
+        self.thread = threading.Thread(
+            target=self.httpServer.serve_forever, daemon=True
+        )
+
+    @property
+    def connectionCount(self):
+        return len(self.httpServer.clientPorts)
+
+    @property
+    def requestCount(self):
+        return self.httpServer.requestCount
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpServer.shutdown()
+        self.httpServer.server_close()
@@ -35,6 +35,8 @@ class TestAdmin(unittest.TestCase):
             "/admin/component",
             "/admin/productionfacility",
             "/admin/databasetransaction",
+            "/admin/stockalert",
+            "/admin/stockthreshold",
         ]
 
         actualAdminViews = [v.url for v in admin._views]
@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import app as appModule
+from app import create_app, db
+from config import Config
+from models.productionFacility import ProductionFacility
+
+
+class FactoryConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+
+
+class TestAppFactory(unittest.TestCase):
+    def testDefaultAppIsCreatedOnce(self):
+        self.assertIs(appModule.app, appModule.app)
+        with self.assertRaises(AttributeError):
+            appModule.missingAttribute
+
+    def testCreateAppBuildsIndependentInstance(self):
+        factoryApp = create_app(FactoryConfig)
+        self.assertIsNot(factoryApp, appModule.app)
+        self.assertTrue(factoryApp.config["TESTING"])
+        self.assertIn("main.facilityInventory", factoryApp.view_functions)
+        self.assertNotIn("performance.index", factoryApp.view_functions)
+        with factoryApp.app_context():
+            db.create_all()
+            db.session.add(ProductionFacility(name="Plant", latitude=1, longitude=2))
+            db.session.commit()
+        client = factoryApp.test_client()
+        self.assertEqual(client.get("/").status_code, 200)
+        # Flask-Admin is registered before the first request
+        self.assertIn("performance.index", factoryApp.view_functions)
+        self.assertEqual(client.get("/map-data").get_json()["text"], ["Plant"])
+
+    def testAdminAndOAuthAreLoadedLazily(self):
+        script = (
+            "import sys\n"
+            "from app import create_app\n"
+            "app = create_app()\n"
+            "lazy = ('flask_admin', 'flask_oauthlib', 'requests')\n"
+            "print(sorted(m for m in lazy if m in sys.modules))\n"
+            "app.test_client().get('/')\n"
+            "print(sorted(m for m in lazy if m in sys.modules))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            check=True,
+        )
+        self.assertEqual(
+            result.stdout.splitlines(), ["[]", "['flask_admin']"], result.stderr
+        )
+
+    def testEnginesCanBeDisposedAfterFork(self):
+        # What gunicorn's post_fork hook does in each worker
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        class FileConfig(FactoryConfig):
+            SQLALCHEMY_DATABASE_URI = (
+                f"sqlite:///{os.path.join(directory.name, 'factory.db')}"
+            )
+
+        factoryApp = create_app(FileConfig)
+        with factoryApp.app_context():
+            db.create_all()
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+            self.assertEqual(
+                db.session.scalar(db.select(db.func.count(ProductionFacility.id))), 0
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from sqlalchemy import event
+from sqlalchemy.orm import defer
+from app import app, db
+from models.auditDiff import registerAudit
+from models.product import Product
+from models.transaction import DatabaseTransaction
+from models.user import User
+
+
+class TestAuditDiff(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add(
+                Product(
+                    brand="Brand",
+                    category="Laptop",
+                    price=100,
+                    specs="16GB RAM",
+                    notes="Refurbished",
+                )
+            )
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def auditRows(self, operation):
+        return DatabaseTransaction.query.filter_by(operation=operation).all()
+
+    def recordSelects(self, engine, statements):
+        def beforeCursorExecute(conn, cursor, statement, *args):
+            if statement.startswith("SELECT"):
+                statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", beforeCursorExecute)
+        return beforeCursorExecute
+
+    def testUpdateRecordsOnlyModifiedColumns(self):
+        with app.app_context():
+            product = db.session.get(Product, 1)
+            product.price = 120
+            product.brand = "Other"
+            db.session.commit()
+            rows = self.auditRows("update")
+            self.assertEqual(len(rows), 1)
+            self.assertEqual(
+                rows[0].changes,
+                "brand changed from Brand to Other; price changed from 100.0 to 120",
+            )
+
+    def testUnchangedUpdateIsNotAudited(self):
+        with app.app_context():
+            product = db.session.get(Product, 1)
+            product.price = 100.0
+            db.session.commit()
+            self.assertEqual(self.auditRows("update"), [])
+
+    def testDeleteDoesNotLoadDeferredColumns(self):
+        with app.app_context():
+            product = db.session.scalars(
+                db.select(Product).options(defer(Product.specs), defer(Product.notes))
+            ).one()
+            statements = []
+            listener = self.recordSelects(db.engine, statements)
+            try:
+                db.session.delete(product)
+                db.session.commit()
+            finally:
+                event.remove(db.engine, "before_cursor_execute", listener)
+            self.assertEqual(statements, [])
+            changes = self.auditRows("delete")[0].changes
+            self.assertIn("brand was 'Brand'", changes)
+            self.assertNotIn("specs", changes)
+
+    def testUserUpdateAndDelete(self):
+        with app.app_context():
+            user = User(username="user", passwordHash="x")
+            db.session.add(user)
+            db.session.commit()
+            user.email = "user@example.com"
+            db.session.commit()
+            db.session.delete(user)
+            db.session.commit()
+            updates = DatabaseTransaction.query.filter_by(tableName="user").all()
+            self.assertEqual(
+                [row.changes for row in updates],
+                [
+                    "email changed from None to user@example.com",
+                    "User ID 1 was deleted",
+                ],
+            )
+
+    def testRegisterTwiceFails(self):
+        with self.assertRaises(ValueError):
+            registerAudit(Product, tableName="product")
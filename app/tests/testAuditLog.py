@@ -0,0 +1,174 @@
+import unittest
+import glob, os, subprocess, sys, tempfile
+from datetime import datetime
+from sqlalchemy import create_engine
+from app import app, db
+from models.product import Product
+from models.transaction import DatabaseTransaction, auditSink
+from services.auditLog import AuditSink, serializeRecord
+
+
+class TestAuditLog(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.tempDir = tempfile.TemporaryDirectory()
+        # The background writer gets its own file database
+        self.engine = create_engine(
+            "sqlite:///" + os.path.join(self.tempDir.name, "audit.db")
+        )
+        DatabaseTransaction.__table__.create(self.engine)
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+        self.engine.dispose()
+        self.tempDir.cleanup()
+
+    def makeSink(self):
+        sink = AuditSink(DatabaseTransaction)
+        sink.asyncMode = True
+        sink.engine = self.engine
+        sink.batchSize = 500
+        sink.flushInterval = 0.05
+        sink.spoolDir = os.path.join(self.tempDir.name, "spool")
+        return sink
+
+    def auditRowCount(self):
+        with self.engine.connect() as connection:
+            return connection.scalar(
+                db.select(db.func.count()).select_from(DatabaseTransaction)
+            )
+
+    def makeRecord(self, i):
+        return {
+            "objectId": i,
+            "tableName": "product",
+            "operation": "update",
+            "changes": f"change {i}",
+            "timestamp": datetime.now(),
+        }
+
+    def testSynchronousModeWritesInSameTransaction(self):
+        with app.app_context():
+            db.session.add(Product(category="Laptop", price=1))
+            db.session.commit()
+            rows = DatabaseTransaction.query.all()
+            self.assertEqual(len(rows), 1)
+            self.assertEqual(rows[0].operation, "insert")
+
+    def testBatchedWrites(self):
+        sink = self.makeSink()
+        sink.enqueue([self.makeRecord(i) for i in range(1200)])
+        sink.drain()
+        stats = sink.stats()
+        sink.close()
+        self.assertEqual(self.auditRowCount(), 1200)
+        self.assertEqual(stats["queueDepth"], 0)
+        self.assertEqual(stats["recordsWritten"], 1200)
+        self.assertGreaterEqual(stats["flushes"], 3)
+        spoolPath = os.path.join(sink.spoolDir, f"audit-{os.getpid()}.jsonl")
+        self.assertEqual(os.path.getsize(spoolPath), 0)
+
+    def testReplaysSpoolOfDeadProcess(self):
+        sink = self.makeSink()
+        os.makedirs(sink.spoolDir)
+        deadPid = subprocess.Popen([sys.executable, "-c", "pass"]).pid
+        os.waitpid(deadPid, 0)
+        spoolPath = os.path.join(sink.spoolDir, f"audit-{deadPid}.jsonl")
+        with open(spoolPath, "w") as spool:
+            for i in range(3):
+                spool.write(serializeRecord(self.makeRecord(i)) + "\n")
+            spool.write('{"objectId": 3, "tabl')
+        sink.enqueue([self.makeRecord(4)])
+        sink.drain()
+        sink.close()
+        self.assertFalse(os.path.exists(spoolPath))
+        self.assertEqual(sink.stats()["replayed"], 3)
+        self.assertEqual(self.auditRowCount(), 4)
+
+    def testUnwritableBatchIsDeadLettered(self):
+        sink = self.makeSink()
+        sink.maxRetries = 1
+        poison = dict(self.makeRecord(0), tableName=None)
+        sink.enqueue([poison])
+        sink.drain()
+        sink.enqueue([self.makeRecord(1)])
+        sink.drain()
+        stats = sink.stats()
+        sink.close()
+        self.assertEqual((stats["failures"], stats["deadLettered"]), (2, 1))
+        self.assertEqual(self.auditRowCount(), 1)
+        deadPath = os.path.join(sink.spoolDir, f"dead-{os.getpid()}.jsonl")
+        with open(deadPath) as spool:
+            self.assertEqual(spool.read(), serializeRecord(poison) + "\n")
+        spoolPath = os.path.join(sink.spoolDir, f"audit-{os.getpid()}.jsonl")
+        self.assertEqual(os.path.getsize(spoolPath), 0)
+
+    def testFailedReplayIsKeptApartFromLiveSpool(self):
+        # A dead process whose pid this one reuses left an unwritable spool
+        sink = self.makeSink()
+        os.makedirs(sink.spoolDir)
+        spoolPath = os.path.join(sink.spoolDir, f"audit-{os.getpid()}.jsonl")
+        poison = dict(self.makeRecord(0), tableName=None)
+        with open(spoolPath, "w") as spool:
+            spool.write(serializeRecord(poison) + "\n")
+        sink.enqueue([self.makeRecord(1)])
+        sink.drain()
+        sink.close()
+        self.assertEqual(self.auditRowCount(), 1)
+        self.assertEqual(os.path.getsize(spoolPath), 0)
+        (replayPath,) = glob.glob(os.path.join(sink.spoolDir, "replay-*.jsonl"))
+        with open(replayPath) as spool:
+            self.assertEqual(spool.read(), serializeRecord(poison) + "\n")
+
+    def testFailedReplayKeepsOnlyUnwrittenRecords(self):
+        sink = self.makeSink()
+        sink.batchSize = 1
+        sink.maxRetries = 2
+        sink.pid = os.getpid()
+        os.makedirs(sink.spoolDir)
+        deadPid = subprocess.Popen([sys.executable, "-c", "pass"]).pid
+        os.waitpid(deadPid, 0)
+        poison = dict(self.makeRecord(1), tableName=None)
+        records = [self.makeRecord(0), poison, self.makeRecord(2)]
+        with open(os.path.join(sink.spoolDir, f"audit-{deadPid}.jsonl"), "w") as spool:
+            spool.write("".join(serializeRecord(r) + "\n" for r in records))
+        sink.replaySpools()
+        self.assertEqual(self.auditRowCount(), 1)
+        (replayPath,) = glob.glob(os.path.join(sink.spoolDir, "replay-*.jsonl"))
+        with open(replayPath) as spool:
+            self.assertEqual(
+                spool.read(), "".join(serializeRecord(r) + "\n" for r in records[1:])
+            )
+        # The second failed replay reaches maxRetries and dead-letters the rest
+        sink.replaySpools()
+        self.assertEqual(self.auditRowCount(), 1)
+        self.assertEqual(glob.glob(os.path.join(sink.spoolDir, "replay-*")), [])
+        deadPath = os.path.join(sink.spoolDir, f"dead-{os.getpid()}.jsonl")
+        with open(deadPath) as spool:
+            self.assertEqual(len(spool.readlines()), 2)
+        self.assertEqual(
+            (sink.stats()["replayed"], sink.stats()["deadLettered"]), (1, 2)
+        )
+
+    def testAsyncModeQueuesOnCommitOnly(self):
+        auditSink.asyncMode, auditSink.engine = True, self.engine
+        auditSink.spoolDir = os.path.join(self.tempDir.name, "spool")
+        try:
+            with app.app_context():
+                db.session.add(Product(category="Laptop", price=1))
+                db.session.flush()
+                db.session.rollback()
+                db.session.add(Product(category="Laptop", price=2))
+                db.session.commit()
+                self.assertEqual(DatabaseTransaction.query.count(), 0)
+            auditSink.drain()
+            self.assertEqual(self.auditRowCount(), 1)
+        finally:
+            auditSink.close()
+            auditSink.asyncMode, auditSink.engine = False, None
@@ -0,0 +1,182 @@
+import unittest
+from threading import BoundedSemaphore
+from unittest import mock
+from sqlalchemy import event
+from app import app, db, google
+from models.inventory import ProductInventory
+from models.user import User
+from services import authentication
+from services.authentication import LoginThrottle, authenticator, createHttpSession
+from tests.stubOAuthServer import StubUserInfoServer
+
+
+class TestAuthentication(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.client = app.test_client()
+        authenticator.init_app(app)
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            user = User(username="alice", email="alice@example.com", role=1)
+            user.setPassword("secret")
+            db.session.add(user)
+            db.session.add(
+                ProductInventory(
+                    productId=1, count=1, productionFacilityId=1, lastUpdatedByUserId=0
+                )
+            )
+            db.session.commit()
+
+    def tearDown(self):
+        # Leave a fresh authenticator for the other test modules
+        authenticator.close()
+        authenticator.init_app(app)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self, password, ip="10.0.0.1"):
+        return self.client.post(
+            "/login",
+            data={"username": "alice", "password": password},
+            environ_base={"REMOTE_ADDR": ip},
+        )
+
+    def userQueries(self, action):
+        statements = []
+
+        def beforeCursorExecute(conn, cursor, statement, *args):
+            if "FROM users" in statement:
+                statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", beforeCursorExecute)
+        try:
+            action()
+        finally:
+            event.remove(engine, "before_cursor_execute", beforeCursorExecute)
+        return statements
+
+    def testLoginStoresPrincipal(self):
+        response = self.login("secret")
+        self.assertEqual(response.headers["Location"], "/dashboard")
+        with self.client.session_transaction() as session:
+            self.assertEqual(
+                session["principal"],
+                {"id": 1, "username": "alice", "role": 1, "email": "alice@example.com"},
+            )
+            self.assertEqual(session["username"], "alice")
+
+    def testPrincipalSkipsUserQuery(self):
+        self.login("secret")
+        save = lambda: self.client.post(
+            "/save-changes",
+            json={"changesList": [{"type": "product", "entryId": 1, "quantity": 5}]},
+        )
+        # The first request caches the principal, later ones only read the cache
+        save()
+        self.assertEqual(self.userQueries(save), [])
+        with app.app_context():
+            self.assertEqual(db.session.get(ProductInventory, 1).lastUpdatedByUserId, 1)
+
+    def testPrincipalFollowsUserChanges(self):
+        self.login("secret")
+        with app.app_context():
+            with app.test_request_context():
+                authentication.session["principal"] = {
+                    "id": 1,
+                    "username": "alice",
+                    "role": 1,
+                    "email": "alice@example.com",
+                }
+                self.assertEqual(authentication.currentPrincipal()["role"], 1)
+                db.session.get(User, 1).role = 2
+                db.session.commit()
+                self.assertEqual(authentication.currentPrincipal()["role"], 2)
+                db.session.delete(db.session.get(User, 1))
+                db.session.commit()
+                self.assertIsNone(authentication.currentPrincipal())
+                self.assertNotIn("username", authentication.session)
+
+    def testRepeatFailuresAreThrottledBeforeHashing(self):
+        with mock.patch.object(
+            authentication,
+            "check_password_hash",
+            wraps=authentication.check_password_hash,
+        ) as checkPassword:
+            for _ in range(5):
+                self.assertEqual(self.login("wrong").headers["Location"], "/login")
+            throttled = self.login("secret")
+            self.assertEqual(throttled.status_code, 429)
+            self.assertIn("Retry-After", throttled.headers)
+            self.assertEqual(checkPassword.call_count, 5)
+        self.assertEqual(authenticator.stats["throttled"], 1)
+
+    def testUnknownUsernameIsHashedToo(self):
+        with mock.patch.object(
+            authentication,
+            "check_password_hash",
+            wraps=authentication.check_password_hash,
+        ) as checkPassword:
+            response = self.client.post(
+                "/login", data={"username": "mallory", "password": "unused"}
+            )
+            self.assertEqual(response.headers["Location"], "/login")
+            self.assertEqual(checkPassword.call_count, 1)
+        self.assertEqual(authenticator.stats["rejected"], 1)
+
+    def testIpThrottleSpansUsernames(self):
+        authenticator.ipThrottle = LoginThrottle(3, 300)
+        for i in range(3):
+            self.client.post(
+                "/login",
+                data={"username": f"guess{i}", "password": "x"},
+                environ_base={"REMOTE_ADDR": "10.9.9.9"},
+            )
+        self.assertEqual(self.login("secret", ip="10.9.9.9").status_code, 429)
+        self.assertEqual(self.login("secret", ip="10.0.0.2").status_code, 302)
+
+    def testThrottleWindowExpires(self):
+        throttle = LoginThrottle(2, 10)
+        throttle.recordFailure("key", now=0)
+        throttle.recordFailure("key", now=1)
+        self.assertAlmostEqual(throttle.retryAfter("key", now=2), 9)
+        self.assertEqual(throttle.retryAfter("key", now=11), 0)
+
+    def testSaturatedHashingPoolRefuses(self):
+        authenticator.slots = BoundedSemaphore(1)
+        authenticator.slots.acquire()
+        response = self.login("secret")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+    def testGoogleCallbackUsesPooledClient(self):
+        users = {"token-a": {"email": "alice@example.com"}}
+        with StubUserInfoServer(users) as stub:
+            authenticator.userInfoUrl = stub.url
+            authenticator.httpSession = createHttpSession(2)
+            with mock.patch.object(
+                google, "authorized_response", return_value={"access_token": "token-a"}
+            ):
+                for _ in range(3):
+                    response = self.client.get("/googleLogin/callback")
+                    self.assertEqual(response.headers["Location"], "/dashboard")
+            self.assertEqual(stub.requestCount, 3)
+            self.assertEqual(stub.connectionCount, 1)
+        with self.client.session_transaction() as session:
+            self.assertEqual(session["principal"]["username"], "alice")
+
+    def testGoogleCallbackRejectedTokenRedirectsToLogin(self):
+        with StubUserInfoServer({}) as stub:
+            authenticator.userInfoUrl = stub.url
+            with mock.patch.object(
+                google, "authorized_response", return_value={"access_token": "expired"}
+            ):
+                response = self.client.get("/googleLogin/callback")
+        self.assertEqual(response.headers["Location"], "/login")
+        self.assertIn(b"Google sign-in failed", self.client.get("/login").data)
+        with self.client.session_transaction() as session:
+            self.assertNotIn("principal", session)
@@ -0,0 +1,85 @@
+import unittest
+import io, os, tempfile
+from app import app, db
+from commands import ims
+from models.component import Component
+from models.product import Product
+from models.transaction import DatabaseTransaction
+from services.bulkImport import importCsv
+
+productHeader = "Manufacturer,Model Name,Category,Screen Size,Screen,CPU,RAM, Storage,GPU,Operating System,Operating System Version,Weight,Price (Euros)\n"
+
+
+def productCsv(rows, invalid=0):
+    lines = [productHeader]
+    for i in range(rows):
+        lines.append(
+            f'Brand,Model {i},Notebook,15,IPS,i5,8GB,256GB,GPU,Windows,10,2kg,"1,{i:03d}"\n'
+        )
+    for i in range(invalid):
+        lines.append(
+            "Brand,Broken,Notebook,15,IPS,i5,8GB,256GB,GPU,Windows,10,2kg,n/a\n"
+        )
+    return io.StringIO("".join(lines))
+
+
+class TestBulkImport(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def testChunkedImportWithSummaryAudit(self):
+        progress = []
+        with app.app_context():
+            totals = importCsv(
+                "products",
+                productCsv(25, invalid=3),
+                chunkSize=10,
+                onProgress=progress.append,
+            )
+            self.assertEqual(totals["inserted"], 25)
+            self.assertEqual(totals["rejected"], 3)
+            self.assertEqual(len(progress), 3)
+            self.assertEqual(Product.query.count(), 25)
+            product = Product.query.filter_by(model="Model 7").one()
+            self.assertAlmostEqual(product.price, 1007 * 1.07)
+            audits = DatabaseTransaction.query.all()
+            self.assertEqual(len(audits), 3)
+            self.assertEqual(audits[0].operation, "import")
+
+    def testRowAuditAndNoAudit(self):
+        with app.app_context():
+            importCsv("products", productCsv(5), audit="row")
+            self.assertEqual(
+                DatabaseTransaction.query.filter_by(operation="insert").count(), 5
+            )
+            importCsv("products", productCsv(5), audit="none")
+            self.assertEqual(Product.query.count(), 10)
+            self.assertEqual(DatabaseTransaction.query.count(), 5)
+
+    def testProcessPoolKeepsOrder(self):
+        with app.app_context():
+            importCsv("products", productCsv(40), chunkSize=5, workers=2, audit="none")
+            models = [p.model for p in Product.query.order_by(Product.id)]
+            self.assertEqual(models, [f"Model {i}" for i in range(40)])
+
+    def testImportCommand(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            path = os.path.join(tempDir, "components.csv")
+            with open(path, "w") as csvFile:
+                csvFile.write(",brand_name,decription,ratings,prices,category\n")
+                csvFile.write('0,Brand,Fan,4.5,"1,299",Cooling\n')
+                csvFile.write("1,Brand,Broken,4.5,n/a,Cooling\n")
+            result = app.test_cli_runner().invoke(ims, ["import", "components", path])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertIn("imported 1 components", result.output)
+            with app.app_context():
+                self.assertEqual(Component.query.one().price, 1299)
@@ -0,0 +1,158 @@
+import os
+import tempfile
+import time
+import unittest
+from cachelib import SimpleCache
+from flask import Flask, jsonify
+from app import app as mainApp
+from extensions import db
+from models.productionFacility import ProductionFacility
+from services.dbRouting import DatabaseRouter, RoutingSession, usePrimary
+from services.readCache import ReadCache
+
+
+def facilityNames():
+    return sorted(db.session.scalars(db.select(ProductionFacility.name)))
+
+
+class TestDbRouting(unittest.TestCase):
+    def setUp(self):
+        # Two SQLite files act as the primary and its replica; they are never
+        # synchronized, so every read shows which database served it
+        self.directory = tempfile.TemporaryDirectory()
+        primary = os.path.join(self.directory.name, "primary.db")
+        replica = os.path.join(self.directory.name, "replica.db")
+        self.app = Flask(__name__)
+        self.app.config.update(
+            TESTING=True,
+            SECRET_KEY="test",
+            SQLALCHEMY_DATABASE_URI=f"sqlite:///{primary}",
+            SQLALCHEMY_BINDS={"replica0": f"sqlite:///{replica}"},
+            DB_REPLICA_BINDS=["replica0"],
+            DB_STICKY_SECONDS=10,
+        )
+        db.init_app(self.app)
+        self.router = DatabaseRouter(self.app)
+        self.registerRoutes()
+        with self.app.app_context():
+            db.create_all()
+            db.metadata.create_all(db.engines["replica0"])
+            db.session.add(
+                ProductionFacility(name="On primary", latitude=0, longitude=0)
+            )
+            db.session.commit()
+            with db.engines["replica0"].begin() as connection:
+                connection.execute(
+                    db.insert(ProductionFacility).values(
+                        name="On replica", latitude=0, longitude=0
+                    )
+                )
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+        # init_app registered an empty metadata for the bind on the shared db,
+        # which the main app's create_all and drop_all would look up
+        db.metadatas.pop("replica0", None)
+        self.directory.cleanup()
+
+    def registerRoutes(self):
+        self.readCache = ReadCache()
+        self.readCache.backend = SimpleCache()
+
+        @self.app.route("/facilities/cached")
+        def cachedFacilities():
+            names = facilityNames()
+            cached = self.readCache.get("productionFacility", "all", facilityNames)
+            return jsonify([names, cached, facilityNames()])
+
+        @self.app.route("/facilities", methods=["GET", "POST"])
+        def facilities():
+            return jsonify(facilityNames())
+
+        @self.app.route("/facilities/add", methods=["GET", "POST"])
+        def addFacility():
+            db.session.add(ProductionFacility(name="Added", latitude=0, longitude=0))
+            db.session.flush()
+            # Reads after the flush must see the new row
+            names = facilityNames()
+            db.session.commit()
+            return jsonify(names)
+
+        @self.app.route("/facilities/locked")
+        def lockedFacilities():
+            names = db.session.scalars(
+                db.select(ProductionFacility.name).with_for_update()
+            ).all()
+            return jsonify(sorted(names))
+
+        @self.app.route("/facilities/primary")
+        def primaryFacilities():
+            usePrimary()
+            return jsonify(facilityNames())
+
+    def testSessionClass(self):
+        with self.app.app_context():
+            self.assertIsInstance(db.session(), RoutingSession)
+
+    def testReadOnlyRequestUsesReplica(self):
+        self.assertEqual(self.client.get("/facilities").get_json(), ["On replica"])
+
+    def testWriteRequestUsesPrimary(self):
+        self.assertEqual(self.client.post("/facilities").get_json(), ["On primary"])
+        self.assertEqual(
+            self.client.post("/facilities/add").get_json(), ["Added", "On primary"]
+        )
+        with self.app.app_context():
+            self.assertEqual(facilityNames(), ["Added", "On primary"])
+
+    def testReadsAfterFlushInGetUsePrimary(self):
+        self.assertEqual(
+            self.client.get("/facilities/add").get_json(), ["Added", "On primary"]
+        )
+
+    def testForUpdateAndUsePrimary(self):
+        self.assertEqual(
+            self.client.get("/facilities/locked").get_json(), ["On primary"]
+        )
+        self.assertEqual(
+            self.client.get("/facilities/primary").get_json(), ["On primary"]
+        )
+
+    def testReadCacheLoadsFromPrimary(self):
+        # A miss must not cache rows from a replica that may be behind
+        self.assertEqual(
+            self.client.get("/facilities/cached").get_json(),
+            [["On replica"], ["On primary"], ["On replica"]],
+        )
+
+    def testReadYourWritesStickiness(self):
+        self.client.post("/facilities/add")
+        # The writer keeps reading from the primary within the window
+        self.assertEqual(
+            self.client.get("/facilities").get_json(), ["Added", "On primary"]
+        )
+        # Other users still read from the replica
+        other = self.app.test_client()
+        self.assertEqual(other.get("/facilities").get_json(), ["On replica"])
+        with self.client.session_transaction() as session:
+            session["dbPrimaryUntil"] = time.time() - 1
+        self.assertEqual(self.client.get("/facilities").get_json(), ["On replica"])
+
+    def testNoReplicasConfigured(self):
+        self.assertEqual(mainApp.config["DB_REPLICA_BINDS"], [])
+        client = mainApp.test_client()
+        client.get("/")
+        with client.session_transaction() as session:
+            self.assertNotIn("dbPrimaryUntil", session)
+
+    def testOutsideRequestUsesPrimary(self):
+        with self.app.app_context():
+            self.assertEqual(facilityNames(), ["On primary"])
+
+
+if __name__ == "__main__":
+    unittest.main()
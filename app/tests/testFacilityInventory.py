@@ -0,0 +1,165 @@
+import unittest, json
+from sqlalchemy import event
+from app import app, db
+from models.component import Component
+from models.inventory import ProductInventory, ComponentInventory
+from models.product import Product
+from models.productionFacility import ProductionFacility
+
+
+class TestFacilityInventory(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+        self.app = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def seedFacility(self, skuCount):
+        with app.app_context():
+            facility = ProductionFacility(name="Facility", latitude=1, longitude=2)
+            db.session.add(facility)
+            db.session.flush()
+            for i in range(skuCount):
+                product = Product(
+                    brand="Brand", model=f"Model {i}", category="Laptop", price=i
+                )
+                component = Component(name=f"Component {i}", brand="Brand", price=i)
+                db.session.add_all([product, component])
+                db.session.flush()
+                db.session.add(
+                    ProductInventory(
+                        productId=product.id,
+                        count=i,
+                        productionFacilityId=facility.id,
+                        lastUpdatedByUserId=1,
+                    )
+                )
+                db.session.add(
+                    ComponentInventory(
+                        componentId=component.id,
+                        count=i,
+                        productionFacilityId=facility.id,
+                        lastUpdatedByUserId=1,
+                    )
+                )
+            db.session.commit()
+            return facility.id
+
+    def countQueries(self, url):
+        statements = []
+
+        def beforeCursorExecute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", beforeCursorExecute)
+        try:
+            response = self.app.get(url)
+        finally:
+            event.remove(engine, "before_cursor_execute", beforeCursorExecute)
+        self.assertEqual(response.status_code, 200)
+        return len(statements)
+
+    def testInventoryApi(self):
+        facilityId = self.seedFacility(3)
+        response = self.app.get(f"/api/facilities/{facilityId}/inventory")
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data["facility"]["id"], facilityId)
+        self.assertEqual(len(data["productEntries"]), 3)
+        self.assertEqual(len(data["componentEntries"]), 3)
+        self.assertEqual(data["productEntries"][1]["product"]["model"], "Model 1")
+        self.assertEqual(
+            data["componentEntries"][2]["component"]["name"], "Component 2"
+        )
+
+    def testInventoryApiMissingFacility(self):
+        response = self.app.get("/api/facilities/999/inventory")
+        self.assertEqual(response.status_code, 404)
+
+    def testQueryCountIsConstant(self):
+        smallFacilityId = self.seedFacility(5)
+        largeFacilityId = self.seedFacility(50)
+        for url in ("/inventory/{}", "/api/facilities/{}/inventory"):
+            smallCount = self.countQueries(url.format(smallFacilityId))
+            largeCount = self.countQueries(url.format(largeFacilityId))
+            self.assertEqual(smallCount, largeCount)
+
+    def fetchAllPages(self, url):
+        entries, after = [], None
+        while True:
+            pageUrl = url + (f"&after={after}" if after else "")
+            page = json.loads(self.app.get(pageUrl).data)
+            entries.extend(page["entries"])
+            after = page["nextCursor"]
+            if after is None:
+                return entries
+
+    def testKeysetPagination(self):
+        facilityId = self.seedFacility(23)
+        base = f"/api/facilities/{facilityId}/inventory/product?limit=5"
+        entries = self.fetchAllPages(base)
+        self.assertEqual(
+            [e["product"]["model"] for e in entries], [f"Model {i}" for i in range(23)]
+        )
+        byCount = self.fetchAllPages(base + "&sort=count&direction=desc")
+        self.assertEqual([e["count"] for e in byCount], list(range(22, -1, -1)))
+        filtered = self.fetchAllPages(base + "&q=model%201&minCount=5")
+        self.assertEqual(
+            [e["product"]["model"] for e in filtered],
+            [
+                "Model 10",
+                "Model 11",
+                "Model 12",
+                "Model 13",
+                "Model 14",
+                "Model 15",
+                "Model 16",
+                "Model 17",
+                "Model 18",
+                "Model 19",
+            ],
+        )
+
+    def testDeepPageQueryCountIsConstant(self):
+        facilityId = self.seedFacility(30)
+        firstPage = f"/api/facilities/{facilityId}/inventory/component?limit=5"
+        deepPage = firstPage
+        for _ in range(4):
+            cursor = json.loads(self.app.get(deepPage).data)["nextCursor"]
+            deepPage = f"{firstPage}&after={cursor}"
+        self.assertEqual(self.countQueries(deepPage), self.countQueries(firstPage))
+
+    def testInvalidGridArguments(self):
+        facilityId = self.seedFacility(2)
+        base = f"/api/facilities/{facilityId}/inventory"
+        self.assertEqual(self.app.get(base + "/product?sort=brand").status_code, 400)
+        self.assertEqual(self.app.get(base + "/product?after=xyz").status_code, 400)
+        self.assertEqual(self.app.get(base + "/widget").status_code, 400)
+
+    def testStreamedExport(self):
+        facilityId = self.seedFacility(1200)
+        response = self.app.get(
+            f"/inventory/{facilityId}/export/product.csv?sort=count&direction=desc"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0], "entryId,productId,brand,model,category,price,count")
+        self.assertEqual(len(lines), 1201)
+        self.assertTrue(lines[1].endswith(",1199"))
+        self.assertEqual(
+            self.app.get(
+                f"/inventory/{facilityId}/export/product.csv?direction=up"
+            ).status_code,
+            400,
+        )
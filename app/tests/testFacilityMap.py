@@ -42,3 +42,71 @@ class TestFacility(unittest.TestCase):
             "text": ["Facility 0", "Facility 1", "Facility 2"],
         }
         self.assertEqual(actualMapData, expectedMapData)
+
+
+class TestFacilityMap(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.client = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            # Two facilities near Chicago, one in Seattle
+            for name, lat, lon in [
+                ("Chicago A", 41.88, -87.63),
+                ("Chicago B", 41.90, -87.70),
+                ("Seattle", 47.61, -122.33),
+            ]:
+                db.session.add(
+                    ProductionFacility(name=name, latitude=lat, longitude=lon)
+                )
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def testDefaultFormatAndConditionalGet(self):
+        response = self.client.get("/map-data")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.get_json(),
+            {
+                "lat": [41.88, 41.90, 47.61],
+                "lon": [-87.63, -87.70, -122.33],
+                "text": ["Chicago A", "Chicago B", "Seattle"],
+            },
+        )
+        etag = response.headers["ETag"]
+        cached = self.client.get("/map-data", headers={"If-None-Match": etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.data, b"")
+
+    def testEtagChangesWithFacilities(self):
+        etag = self.client.get("/map-data").headers["ETag"]
+        with app.app_context():
+            facility = db.session.get(ProductionFacility, 3)
+            facility.latitude = 47.0
+            db.session.commit()
+        response = self.client.get("/map-data", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["lat"][2], 47.0)
+
+    def testClustersInBoundingBox(self):
+        response = self.client.get("/map-data?bbox=-130,20,-60,50&zoom=3")
+        clusters = response.get_json()
+        self.assertEqual(sorted(clusters["count"]), [1, 2])
+        chicago = clusters["count"].index(2)
+        self.assertEqual(clusters["text"][chicago], "2 facilities")
+        self.assertAlmostEqual(clusters["lat"][chicago], 41.89)
+        zoomed = self.client.get("/map-data?bbox=-90,40,-80,45&zoom=12").get_json()
+        self.assertEqual(zoomed["count"], [1, 1])
+        self.assertNotEqual(
+            response.headers["ETag"], self.client.get("/map-data").headers["ETag"]
+        )
+
+    def testInvalidBoundingBox(self):
+        response = self.client.get("/map-data?bbox=1,2,3&zoom=2")
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,248 @@
+import unittest
+from datetime import datetime, timedelta
+from app import app, db
+from models.component import Component
+from models.inventory import ComponentInventory, ProductInventory
+from models.inventoryMovement import (
+    InventoryMovement,
+    InventorySnapshot,
+    InventorySnapshotEntry,
+)
+from models.product import Product
+from models.productionFacility import ProductionFacility
+from models.productionProcess import ComponentsRequired, ProductionProcess
+from models.user import User
+from services.inventoryLedger import reconcileLedger, stockAt, takeSnapshots
+from services.productionBuild import buildProduct
+
+start = datetime(2024, 1, 1)
+
+
+class TestInventoryLedger(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.client = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            user = User(username="alice", email="alice@example.com", role=1)
+            user.setPassword("secret")
+            db.session.add_all(
+                [
+                    user,
+                    ProductionFacility(name="Plant 1", latitude=0, longitude=0),
+                    ProductionFacility(name="Plant 2", latitude=0, longitude=0),
+                    Product(category="Laptop", price=1, brand="Acer", model="M1"),
+                    Product(category="Laptop", price=1, brand="Acer", model="M2"),
+                    Component(name="Part 1", brand="Intel"),
+                ]
+            )
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def movements(self):
+        return [
+            (m.productionFacilityId, m.itemType, m.itemId, m.delta, m.reason, m.userId)
+            for m in db.session.scalars(
+                db.select(InventoryMovement).order_by(InventoryMovement.id)
+            )
+        ]
+
+    def setCount(self, facilityId, productId, count, day):
+        """Set a product count through the ORM and date its movement."""
+        entry = db.session.scalars(
+            db.select(ProductInventory).filter_by(
+                productionFacilityId=facilityId, productId=productId
+            )
+        ).first()
+        if entry is None:
+            entry = ProductInventory(
+                productionFacilityId=facilityId,
+                productId=productId,
+                count=count,
+                lastUpdatedByUserId=1,
+            )
+            db.session.add(entry)
+        entry.count = count
+        db.session.commit()
+        db.session.execute(
+            db.update(InventoryMovement)
+            .where(InventoryMovement.id == db.select(db.func.max(InventoryMovement.id)))
+            .values(createdAt=start + timedelta(days=day))
+        )
+        db.session.commit()
+
+    def testChangesAppendMovements(self):
+        with app.app_context():
+            entry = ProductInventory(
+                productionFacilityId=1, productId=1, count=10, lastUpdatedByUserId=1
+            )
+            db.session.add_all(
+                [
+                    entry,
+                    ComponentInventory(productionFacilityId=1, componentId=1, count=0),
+                ]
+            )
+            db.session.commit()
+            entry.count = 4
+            db.session.flush()
+            db.session.rollback()
+            entry.count = 7
+            db.session.commit()
+            entry.productionFacilityId = 2
+            db.session.commit()
+            db.session.delete(entry)
+            db.session.commit()
+            self.assertEqual(
+                self.movements(),
+                [
+                    (1, "product", 1, 10, "edit", 1),
+                    (1, "product", 1, -3, "edit", 1),
+                    (1, "product", 1, -7, "edit", 1),
+                    (2, "product", 1, 7, "edit", 1),
+                    (2, "product", 1, -7, "edit", 1),
+                ],
+            )
+
+    def testBuildsRecordTheirReason(self):
+        with app.app_context():
+            db.session.add_all(
+                [
+                    ComponentInventory(productionFacilityId=1, componentId=1, count=5),
+                    ProductionProcess(product=1, minutes=5),
+                ]
+            )
+            db.session.flush()
+            db.session.add(ComponentsRequired(processId=1, componentId=1, count=2))
+            db.session.commit()
+            buildProduct(1, 1, 2, userId=1)
+            self.assertEqual(
+                self.movements()[1:],
+                [
+                    (1, "component", 1, -4, "build", 1),
+                    (1, "product", 1, 2, "build", 1),
+                ],
+            )
+            db.session.get(ComponentInventory, 1).count = 0
+            db.session.commit()
+            self.assertEqual(self.movements()[-1][4], "edit")
+
+    def testStockAtReplaysFromTheLatestSnapshot(self):
+        with app.app_context():
+            for day, count in enumerate((5, 8, 2, 9, 6)):
+                self.setCount(1, 1, count, day)
+            self.setCount(1, 2, 3, 1)
+            self.setCount(2, 1, 4, 1)
+            self.assertEqual(takeSnapshots(start + timedelta(days=2, hours=1), 5), 0)
+            self.assertEqual(takeSnapshots(start + timedelta(days=2, hours=1), 3), 1)
+            # Facility 1 has no movements since its snapshot, facility 2 too few
+            self.assertEqual(takeSnapshots(start + timedelta(days=2, hours=12), 2), 0)
+            snapshot = db.session.scalars(db.select(InventorySnapshot)).one()
+            self.assertEqual(
+                (snapshot.productionFacilityId, snapshot.movementCount), (1, 4)
+            )
+            self.assertEqual(db.session.query(InventorySnapshotEntry).count(), 2)
+
+            stock = stockAt(1, start + timedelta(days=3, hours=1))
+            self.assertEqual(stock["snapshotAt"], snapshot.takenAt)
+            self.assertEqual(stock["replayed"], 1)
+            self.assertEqual(
+                stock["items"],
+                [
+                    {"type": "product", "itemId": 1, "count": 9},
+                    {"type": "product", "itemId": 2, "count": 3},
+                ],
+            )
+            before = stockAt(1, start + timedelta(days=1), "product", [1])
+            self.assertIsNone(before["snapshotAt"])
+            self.assertEqual(
+                before["items"], [{"type": "product", "itemId": 1, "count": 8}]
+            )
+            self.assertEqual(stockAt(1, start - timedelta(days=1))["items"], [])
+            # Every point in time agrees with a full replay of the ledger
+            for hours in range(0, 5 * 24, 7):
+                at = start + timedelta(hours=hours)
+                full = db.session.scalar(
+                    db.select(db.func.sum(InventoryMovement.delta)).where(
+                        InventoryMovement.productionFacilityId == 1,
+                        InventoryMovement.itemId == 1,
+                        InventoryMovement.createdAt <= at,
+                    )
+                )
+                items = stockAt(1, at, "product", [1])["items"]
+                self.assertEqual(items[0]["count"] if items else 0, full or 0)
+
+    def testReconcileOpensTheLedger(self):
+        with app.app_context():
+            db.session.execute(
+                db.insert(ProductInventory),
+                [
+                    {
+                        "productionFacilityId": facilityId,
+                        "productId": 1,
+                        "count": 6,
+                        "lastUpdatedByUserId": 1,
+                    }
+                    for facilityId in (1, 2)
+                ],
+            )
+            db.session.execute(
+                db.insert(InventoryMovement).values(
+                    productionFacilityId=2,
+                    itemType="component",
+                    itemId=1,
+                    delta=3,
+                    reason="edit",
+                    createdAt=start,
+                )
+            )
+            db.session.commit()
+            self.assertEqual(reconcileLedger(), {"product": 2, "component": 1})
+            self.assertEqual(reconcileLedger(), {"product": 0, "component": 0})
+            self.assertEqual(
+                stockAt(2, datetime.now())["items"],
+                [{"type": "product", "itemId": 1, "count": 6}],
+            )
+
+    def testEndpointsAndCommands(self):
+        with app.app_context():
+            for day, count in enumerate((5, 8)):
+                self.setCount(1, 1, count, day)
+        runner = app.test_cli_runner()
+        result = runner.invoke(
+            args=["ims", "snapshot-inventory", "--min-movements", "1"]
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("took 1 snapshots", result.output)
+        result = runner.invoke(args=["ims", "reconcile-ledger"])
+        self.assertIn("appended 0 product and 0 component", result.output)
+
+        response = self.client.get(
+            "/api/facilities/1/stock-at?at=2024-01-01T12:00:00&type=product&ids=1"
+        )
+        self.assertEqual(
+            response.json["items"], [{"type": "product", "itemId": 1, "count": 5}]
+        )
+        for query in ("", "?at=yesterday", "?at=2024-01-01&type=pallet"):
+            self.assertEqual(
+                self.client.get(f"/api/facilities/1/stock-at{query}").status_code, 400
+            )
+        movements = self.client.get("/api/facilities/1/movements?limit=1").json
+        self.assertEqual([m["delta"] for m in movements["movements"]], [3])
+        older = self.client.get(
+            f"/api/facilities/1/movements?type=product&itemId=1"
+            f"&before={movements['movements'][0]['movementId']}"
+        ).json
+        self.assertEqual([m["delta"] for m in older["movements"]], [5])
+        self.assertEqual(
+            self.client.get("/api/facilities/1/movements?itemId=1").status_code, 400
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,240 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from flask import Flask
+from sqlalchemy import create_engine
+from app import app, db
+from models.inventory import ProductInventory
+from models.product import Product
+from models.productionFacility import ProductionFacility
+from services.inventoryWriter import saveErrors, savedRows
+from services.metrics import MetricsRegistry, TimedQueuePool, metrics
+
+
+def sampleValue(text, line):
+    """Return the value of the exposition line starting with line."""
+    for candidate in text.splitlines():
+        if candidate.startswith(line + " "):
+            return float(candidate.rsplit(" ", 1)[1])
+    return None
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def testHistogramExposition(self):
+        registry = MetricsRegistry()
+        latency = registry.histogram(
+            "test_seconds", "Test latency.", ("route",), buckets=(0.1, 1)
+        )
+        for value in (0.05, 0.5, 0.7, 3):
+            latency.observe(value, ("a",))
+        text = registry.render()
+        self.assertIn("# TYPE test_seconds histogram", text)
+        self.assertIn('test_seconds_bucket{route="a",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{route="a",le="1"} 3', text)
+        self.assertIn('test_seconds_bucket{route="a",le="+Inf"} 4', text)
+        self.assertIn('test_seconds_count{route="a"} 4', text)
+        self.assertEqual(sampleValue(text, 'test_seconds_sum{route="a"}'), 4.25)
+
+    def testLabelEscapingAndDuplicates(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("test_total", "Test counter.", ("name",))
+        counter.inc(2, ('say "hi"\n',))
+        self.assertIn('test_total{name="say \\"hi\\"\\n"} 2', registry.render())
+        with self.assertRaises(ValueError):
+            registry.counter("test_total", "Again.")
+
+    def testMultiprocessAggregation(self):
+        with tempfile.TemporaryDirectory() as directory:
+            testApp = Flask(__name__)
+            testApp.config["METRICS_MULTIPROC_DIR"] = directory
+            registry = MetricsRegistry()
+            counter = registry.counter("test_total", "Test counter.")
+            gauge = registry.gauge("test_gauge", "Test gauge.")
+            registry.init_app(testApp)
+            counter.inc(3)
+            gauge.set(5)
+            # A snapshot left by a worker that has exited
+            deadPid = 2**22 + 1
+            with open(os.path.join(directory, f"metrics-{deadPid}.json"), "w") as f:
+                json.dump(
+                    {
+                        "test_total": {
+                            "kind": "counter",
+                            "help": "Test counter.",
+                            "labelNames": [],
+                            "buckets": [],
+                            "values": [[[], 4]],
+                        },
+                        "test_gauge": {
+                            "kind": "gauge",
+                            "help": "Test gauge.",
+                            "labelNames": [],
+                            "buckets": [],
+                            "values": [[[], 7]],
+                        },
+                    },
+                    f,
+                )
+            text = registry.render()
+            self.assertEqual(sampleValue(text, "test_total"), 7)
+            self.assertEqual(sampleValue(text, "test_gauge"), 5)
+            self.assertTrue(
+                os.path.exists(os.path.join(directory, f"metrics-{os.getpid()}.json"))
+            )
+
+    def testExitedWorkerSnapshotsAreCompacted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            testApp = Flask(__name__)
+            testApp.config["METRICS_MULTIPROC_DIR"] = directory
+            registry = MetricsRegistry()
+            counter = registry.counter("test_total", "Test counter.")
+            gauge = registry.gauge("test_gauge", "Test gauge.")
+            registry.init_app(testApp)
+            counter.inc(3)
+            gauge.set(5)
+            for deadPid, count in ((2**22 + 1, 4), (2**22 + 2, 5)):
+                path = os.path.join(directory, f"metrics-{deadPid}.json")
+                with open(path, "w") as f:
+                    json.dump(
+                        {
+                            "test_total": {
+                                "kind": "counter",
+                                "help": "Test counter.",
+                                "labelNames": [],
+                                "buckets": [],
+                                "values": [[[], count]],
+                            },
+                            "test_gauge": {
+                                "kind": "gauge",
+                                "help": "Test gauge.",
+                                "labelNames": [],
+                                "buckets": [],
+                                "values": [[[], 7]],
+                            },
+                        },
+                        f,
+                    )
+                registry.compactSnapshot(deadPid)
+                self.assertFalse(os.path.exists(path))
+            # Exited workers keep adding to the totals, but not to the gauges
+            text = registry.render()
+            self.assertEqual(sampleValue(text, "test_total"), 12)
+            self.assertEqual(sampleValue(text, "test_gauge"), 5)
+            self.assertEqual(
+                sorted(os.listdir(directory)),
+                ["exited-metrics.json", f"metrics-{os.getpid()}.json"],
+            )
+
+    def testPoolCheckoutWait(self):
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_engine(
+                f"sqlite:///{directory}/pool.db",
+                poolclass=TimedQueuePool,
+                pool_size=1,
+                max_overflow=0,
+            )
+            registry = MetricsRegistry()
+            registry.instrumentEngine("primary", engine)
+            # The pool that dispose() creates, as after a fork, is still timed
+            engine.dispose()
+            held = engine.connect()
+            threading.Timer(0.2, held.close).start()
+            with engine.connect():
+                pass
+            engine.dispose()
+        text = registry.render()
+        self.assertEqual(
+            sampleValue(
+                text, 'ims_db_pool_checkout_wait_seconds_count{engine="primary"}'
+            ),
+            2,
+        )
+        self.assertGreaterEqual(
+            sampleValue(
+                text, 'ims_db_pool_checkout_wait_seconds_sum{engine="primary"}'
+            ),
+            0.15,
+        )
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.client = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            facility = ProductionFacility(name="Facility", latitude=1, longitude=2)
+            product = Product(category="Laptop", price=1)
+            db.session.add_all([facility, product])
+            db.session.flush()
+            db.session.add(
+                ProductInventory(
+                    productId=product.id,
+                    count=1,
+                    productionFacilityId=facility.id,
+                    lastUpdatedByUserId=1,
+                )
+            )
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def testRouteMetrics(self):
+        self.client.get("/")
+        self.client.get("/")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        text = response.get_data(as_text=True)
+        self.assertGreaterEqual(
+            sampleValue(
+                text,
+                'ims_http_requests_total{method="GET",endpoint="main.home",status="200"}',
+            ),
+            2,
+        )
+        self.assertIn(
+            'ims_http_request_duration_seconds_bucket{method="GET",endpoint="main.home",le="+Inf"}',
+            text,
+        )
+        # The scrape itself is in flight while it renders
+        self.assertEqual(
+            sampleValue(
+                text, 'ims_http_requests_in_flight{endpoint="main.prometheusMetrics"}'
+            ),
+            1,
+        )
+        self.assertGreaterEqual(
+            sampleValue(text, 'ims_db_pool_checkouts_total{engine="primary"}'), 1
+        )
+        self.assertIn('ims_db_pool_connect_seconds_count{engine="primary"}', text)
+
+    def testSaveChangesCounters(self):
+        saved = savedRows.values.get(("product",), 0)
+        invalid = saveErrors.values.get(("invalid",), 0)
+        missing = saveErrors.values.get(("missing",), 0)
+        self.client.post(
+            "/save-changes",
+            json={
+                "changesList": [
+                    {"type": "product", "entryId": 1, "quantity": 5},
+                    {"type": "product", "entryId": 99, "quantity": 5},
+                    {"type": "other", "entryId": 1, "quantity": 5},
+                ]
+            },
+        )
+        self.assertEqual(savedRows.values[("product",)], saved + 1)
+        self.assertEqual(saveErrors.values[("invalid",)], invalid + 1)
+        self.assertEqual(saveErrors.values[("missing",)], missing + 1)
+        self.assertIn("ims_inventory_save_rows_total", metrics.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+import unittest
+from app import app, db
+from models.component import Component
+from models.inventory import ComponentInventory
+from models.product import Product
+from models.productionFacility import ProductionFacility
+from models.productionProcess import ComponentsRequired, ProductionProcess
+from services.mrpEngine import computeBuildable, summarizeBuildable
+
+
+class TestMrpEngine(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.client = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add_all(
+                [
+                    ProductionFacility(name=f"Plant {i}", latitude=0, longitude=0)
+                    for i in (1, 2, 3)
+                ]
+                + [
+                    Product(category="Laptop", price=1, brand="Acer", model=f"M{i}")
+                    for i in (1, 2, 3)
+                ]
+                + [Component(name=f"Part {i}", brand="Intel") for i in (1, 2, 3, 4)]
+            )
+            db.session.flush()
+            # Product 1: process 1 needs 2 x part 1 and 1 x part 2, process 2
+            # needs 3 x part 3. Product 2: process 3 needs 1 x part 2, listed
+            # twice. Product 3: process 4 needs nothing.
+            db.session.add_all(
+                [
+                    ProductionProcess(product=1, minutes=10),
+                    ProductionProcess(product=1, minutes=20),
+                    ProductionProcess(product=2, minutes=5),
+                    ProductionProcess(product=3, minutes=5),
+                ]
+            )
+            db.session.flush()
+            db.session.add_all(
+                [
+                    ComponentsRequired(processId=1, componentId=1, count=2),
+                    ComponentsRequired(processId=1, componentId=2, count=1),
+                    ComponentsRequired(processId=2, componentId=3, count=3),
+                    ComponentsRequired(processId=3, componentId=2, count=1),
+                    ComponentsRequired(processId=3, componentId=2, count=1),
+                ]
+            )
+            stock = {1: {1: 9, 2: 3, 3: 7}, 2: {1: 1, 2: 10, 3: 30, 4: 5}}
+            db.session.add_all(
+                ComponentInventory(
+                    productionFacilityId=facilityId,
+                    componentId=componentId,
+                    count=count,
+                )
+                for facilityId, counts in stock.items()
+                for componentId, count in counts.items()
+            )
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def quantities(self, plan, facilityId):
+        return {
+            entry["productId"]: (
+                entry["quantity"],
+                entry["processId"],
+                entry["limitingComponentId"],
+            )
+            for entry in plan.forFacility(facilityId, minQuantity=0)
+        }
+
+    def testBestProcessAndLimitingComponent(self):
+        with app.app_context():
+            plan = computeBuildable()
+        self.assertEqual(plan.productIds.tolist(), [1, 2])
+        self.assertEqual(plan.facilityIds.tolist(), [1, 2])
+        # Process 1 is limited to 3 by part 2, process 2 to 2 by part 3
+        self.assertEqual(self.quantities(plan, 1), {1: (3, 1, 2), 2: (1, 3, 2)})
+        # Process 1 is limited to 0 by part 1, process 2 builds 10
+        self.assertEqual(self.quantities(plan, 2), {1: (10, 2, 3), 2: (5, 3, 2)})
+        self.assertEqual(plan.forFacility(3), [])
+
+    def testChunksMatchOnePass(self):
+        with app.app_context():
+            onePass = computeBuildable()
+            chunked = computeBuildable(cells=1)
+        self.assertEqual(onePass.quantities.tolist(), chunked.quantities.tolist())
+        self.assertEqual(
+            onePass.limitingComponentIds.tolist(), chunked.limitingComponentIds.tolist()
+        )
+
+    def testFilteredComputation(self):
+        with app.app_context():
+            plan = computeBuildable(facilityIds=[3, 2], productIds=[2])
+        self.assertEqual(plan.facilityIds.tolist(), [2, 3])
+        self.assertEqual(plan.quantities.tolist(), [[5], [0]])
+        self.assertEqual([entry["facilityId"] for entry in plan.forProduct(2)], [2])
+
+    def testRequirementChangesInvalidateTheCache(self):
+        with app.app_context():
+            computeBuildable()
+            db.session.add(ComponentsRequired(processId=2, componentId=4, count=1))
+            db.session.commit()
+            plan = computeBuildable()
+        self.assertEqual(self.quantities(plan, 2)[1], (5, 2, 4))
+
+    def testSummary(self):
+        with app.app_context():
+            summary = summarizeBuildable()
+        first, second = summary["products"]
+        self.assertEqual(summary["facilities"], 2)
+        self.assertEqual(first["productId"], 1)
+        self.assertEqual(first["totalQuantity"], 13)
+        self.assertEqual(first["facilities"], 2)
+        self.assertEqual((first["bestFacilityId"], first["bestQuantity"]), (2, 10))
+        self.assertEqual(first["product"], "Acer M1")
+        self.assertEqual(second["bottleneckComponentId"], 2)
+        self.assertEqual(second["bottleneckComponent"], "Intel Part 2")
+
+    def testFacilityEndpoint(self):
+        response = self.client.get("/api/facilities/2/buildable")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json["products"],
+            [
+                {
+                    "productId": 1,
+                    "quantity": 10,
+                    "processId": 2,
+                    "limitingComponentId": 3,
+                },
+                {
+                    "productId": 2,
+                    "quantity": 5,
+                    "processId": 3,
+                    "limitingComponentId": 2,
+                },
+            ],
+        )
+        limited = self.client.get("/api/facilities/2/buildable?minQuantity=6")
+        self.assertEqual([p["productId"] for p in limited.json["products"]], [1])
+        self.assertEqual(
+            self.client.get("/api/facilities/9/buildable").status_code, 404
+        )
+        self.assertEqual(
+            self.client.get("/api/facilities/2/buildable?limit=0").status_code, 400
+        )
+
+    def testProductEndpoint(self):
+        response = self.client.get("/api/products/1/buildable?limit=1")
+        self.assertEqual(response.json["totalQuantity"], 13)
+        self.assertEqual(
+            response.json["facilities"],
+            [
+                {
+                    "facilityId": 2,
+                    "quantity": 10,
+                    "processId": 2,
+                    "limitingComponentId": 3,
+                }
+            ],
+        )
+        none = self.client.get("/api/products/3/buildable")
+        self.assertEqual(
+            none.json, {"productId": 3, "totalQuantity": 0, "facilities": []}
+        )
+        self.assertEqual(self.client.get("/api/products/9/buildable").status_code, 404)
+
+    def testAdminReport(self):
+        self.assertEqual(self.client.get("/admin/buildable/").status_code, 302)
+        with self.client.session_transaction() as session:
+            session["username"] = "user1"
+        response = self.client.get("/admin/buildable/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Acer M1", response.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+import unittest
+from sqlalchemy import event
+from app import app, db
+from models.component import Component
+from models.inventory import ComponentInventory, ProductInventory
+from models.product import Product
+from models.productionFacility import ProductionFacility
+from models.productionProcess import ComponentsRequired, ProductionProcess
+from models.stockRollup import ComponentStockRollup, ProductStockRollup
+from models.user import User
+from services.productionBuild import BuildError, buildProduct
+
+
+class TestProductionBuild(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.client = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            user = User(username="alice", email="alice@example.com", role=1)
+            user.setPassword("secret")
+            db.session.add_all(
+                [
+                    user,
+                    ProductionFacility(name="Plant", latitude=0, longitude=0),
+                    Product(category="Laptop", price=1, brand="Acer", model="M1"),
+                    Product(category="Laptop", price=1, brand="Acer", model="M2"),
+                ]
+                + [Component(name=f"Part {i}", brand="Intel") for i in (1, 2, 3)]
+            )
+            db.session.flush()
+            # Product 1: process 2 (10 min) needs 2 x part 1 and 1 x part 2,
+            # process 1 (20 min) needs 1 x part 3, listed twice
+            db.session.add_all(
+                [
+                    ProductionProcess(product=1, minutes=20),
+                    ProductionProcess(product=1, minutes=10),
+                ]
+            )
+            db.session.flush()
+            db.session.add_all(
+                [
+                    ComponentsRequired(processId=2, componentId=1, count=2),
+                    ComponentsRequired(processId=2, componentId=2, count=1),
+                    ComponentsRequired(processId=1, componentId=3, count=1),
+                    ComponentsRequired(processId=1, componentId=3, count=1),
+                ]
+                + [
+                    ComponentInventory(
+                        productionFacilityId=1, componentId=i, count=count
+                    )
+                    for i, count in ((1, 10), (2, 3), (3, 8))
+                ]
+            )
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def counts(self):
+        with app.app_context():
+            components = dict(
+                db.session.execute(
+                    db.select(ComponentInventory.componentId, ComponentInventory.count)
+                ).all()
+            )
+            products = dict(
+                db.session.execute(
+                    db.select(ProductInventory.productId, ProductInventory.count)
+                ).all()
+            )
+        return components, products
+
+    def signIn(self):
+        with self.client.session_transaction() as session:
+            session["principal"] = {
+                "id": 1,
+                "username": "alice",
+                "role": 1,
+                "email": "alice@example.com",
+            }
+
+    def testBuildUsesTheFastestProcessWithStock(self):
+        with app.app_context():
+            first = buildProduct(1, 1, 3, userId=1)
+            second = buildProduct(1, 1, 2, userId=1)
+        self.assertEqual(first["processId"], 2)
+        self.assertEqual(
+            first["components"],
+            [{"componentId": 1, "count": 4}, {"componentId": 2, "count": 0}],
+        )
+        # Part 2 is used up, so process 1 (2 x part 3 a unit) takes over
+        self.assertEqual(second["processId"], 1)
+        self.assertEqual(second["productCount"], 5)
+        self.assertEqual(self.counts(), ({1: 4, 2: 0, 3: 4}, {1: 5}))
+        with app.app_context():
+            self.assertEqual(db.session.get(ProductStockRollup, 1).totalCount, 5)
+            self.assertEqual(db.session.get(ComponentStockRollup, 3).totalCount, 4)
+
+    def testShortageChangesNothing(self):
+        with app.app_context():
+            with self.assertRaises(BuildError) as raised:
+                buildProduct(1, 1, 5, userId=1)
+        self.assertEqual(raised.exception.reason, "noStock")
+        self.assertEqual(
+            raised.exception.shortages,
+            [{"componentId": 2, "required": 5, "available": 3}],
+        )
+        self.assertEqual(self.counts(), ({1: 10, 2: 3, 3: 8}, {}))
+        with app.app_context():
+            with self.assertRaises(BuildError) as raised:
+                buildProduct(1, 1, 1, userId=1, processId=9)
+            self.assertEqual(raised.exception.reason, "unknownProcess")
+            with self.assertRaises(BuildError) as raised:
+                buildProduct(1, 2, 1, userId=1)
+            self.assertEqual(raised.exception.reason, "noProcess")
+
+    def testRowsAreLockedInOrder(self):
+        statements = []
+
+        def beforeCursorExecute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+            event.listen(engine, "before_cursor_execute", beforeCursorExecute)
+            try:
+                buildProduct(1, 1, 1, userId=1)
+            finally:
+                event.remove(engine, "before_cursor_execute", beforeCursorExecute)
+        selects = [s for s in statements if "Inventory" in s and "SELECT" in s]
+        self.assertIn('FROM "componentInventory"', selects[0])
+        self.assertIn('ORDER BY "componentInventory".id', selects[0])
+        self.assertIn('FROM "productInventory"', selects[1])
+        updates = [s for s in statements if s.startswith('UPDATE "componentInventory"')]
+        # The SQLite write lock, then one executemany for both component rows
+        self.assertEqual(len(updates), 2)
+
+    def testRecipeChangesApplyToTheNextBuild(self):
+        with app.app_context():
+            buildProduct(1, 1, 1, userId=1)
+            db.session.add(ComponentsRequired(processId=2, componentId=3, count=1))
+            db.session.commit()
+            self.assertEqual(
+                buildProduct(1, 1, 1, userId=1)["components"][-1],
+                {"componentId": 3, "count": 7},
+            )
+
+    def testEndpoint(self):
+        url = "/api/facilities/1/builds"
+        self.assertEqual(
+            self.client.post(url, json={"productId": 1, "quantity": 1}).status_code,
+            401,
+        )
+        self.signIn()
+        response = self.client.post(url, json={"productId": 1, "quantity": 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json["productCount"], 2)
+        shortage = self.client.post(url, json={"productId": 1, "quantity": 9})
+        self.assertEqual(shortage.status_code, 409)
+        self.assertEqual(shortage.json["shortages"][0]["componentId"], 1)
+        self.assertEqual(
+            self.client.post(
+                url, json={"productId": 1, "quantity": 1, "processId": 9}
+            ).status_code,
+            404,
+        )
+        self.assertEqual(
+            self.client.post(url, json={"productId": 1, "quantity": 0}).status_code,
+            400,
+        )
+        self.assertEqual(
+            self.client.post(
+                "/api/facilities/9/builds", json={"productId": 1, "quantity": 1}
+            ).status_code,
+            404,
+        )
+        with app.app_context():
+            self.assertEqual(db.session.get(ProductInventory, 1).lastUpdatedByUserId, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,240 @@
+import unittest
+import numpy as np
+from app import app, db
+from models.component import Component
+from models.inventory import ComponentInventory
+from models.product import Product
+from models.productionFacility import ProductionFacility
+from models.productionProcess import ComponentsRequired, ProductionProcess
+from models.productionSchedule import ProductionSchedule, ScheduleStock
+from services import productionScheduler
+from services.productionScheduler import (
+    PlannedOrder,
+    Scheduler,
+    createSchedule,
+    getSchedule,
+    removeScheduledOrder,
+    setScheduledOrder,
+)
+
+
+def plainScheduler(facilities=2, lines=1, stock=None):
+    """A scheduler over facilities 1.., where product 1 takes 10 minutes a unit."""
+    return Scheduler(
+        facilityIds=list(range(1, facilities + 1)),
+        lineCounts=[lines] * facilities,
+        processes={1: [(10, 1, ((1, 1),))]},
+        stock=stock or {f: {1: 1000} for f in range(1, facilities + 1)},
+        candidates={1: np.arange(facilities)},
+    )
+
+
+class TestScheduler(unittest.TestCase):
+    def testLongestOrdersFirstOnTheEarliestFreeLine(self):
+        scheduler = plainScheduler()
+        orders = [PlannedOrder(i, 1, quantity) for i, quantity in enumerate([2, 3, 7])]
+        scheduler.schedule(orders)
+        placed = {o.orderId: (o.facilityId, o.start, o.end) for o in orders}
+        self.assertEqual(placed, {2: (1, 0, 70), 1: (2, 0, 30), 0: (2, 30, 50)})
+        self.assertEqual(scheduler.makespan(), 70)
+
+    def testPriorityComesBeforeLength(self):
+        scheduler = plainScheduler(facilities=1)
+        orders = [PlannedOrder(1, 1, 5), PlannedOrder(2, 1, 1, priority=-1)]
+        scheduler.schedule(orders)
+        self.assertEqual([o.start for o in orders], [10, 0])
+
+    def testStockLimitsAndReasons(self):
+        scheduler = plainScheduler(stock={1: {1: 4}, 2: {1: 2}})
+        orders = [
+            PlannedOrder(1, 1, 3),
+            PlannedOrder(2, 1, 2),
+            PlannedOrder(3, 1, 2),
+            PlannedOrder(4, 2, 1),
+        ]
+        scheduler.schedule(orders)
+        self.assertEqual([o.facilityId for o in orders], [1, 2, None, None])
+        self.assertEqual(orders[2].reason, "noStock")
+        self.assertEqual(orders[3].reason, "noProcess")
+        self.assertEqual(scheduler.stock[0][1], 1)
+
+    def testPinnedFacility(self):
+        scheduler = plainScheduler()
+        orders = [PlannedOrder(1, 1, 5, pinnedFacilityId=2), PlannedOrder(2, 1, 1)]
+        orders.append(PlannedOrder(3, 1, 1, pinnedFacilityId=9))
+        scheduler.schedule(orders)
+        self.assertEqual([o.facilityId for o in orders], [2, 1, None])
+        self.assertEqual(orders[2].reason, "facilityUnavailable")
+
+    def testRemoveMovesLaterOrdersUpAndRetriesShortOrders(self):
+        scheduler = plainScheduler(facilities=1, stock={1: {1: 7}})
+        orders = [PlannedOrder(i, 1, quantity, i) for i, quantity in [(1, 3), (2, 2)]]
+        orders.append(PlannedOrder(3, 1, 4, priority=3))
+        scheduler.schedule(orders)
+        self.assertEqual(orders[2].reason, "noStock")
+        changes = scheduler.removeOrder(1)
+        self.assertEqual(changes["deleted"], [1])
+        self.assertEqual([o.orderId for o in changes["updated"]], [2, 3])
+        self.assertEqual((orders[1].start, orders[1].end), (0, 20))
+        self.assertEqual((orders[2].start, orders[2].end), (20, 60))
+        self.assertIsNone(scheduler.removeOrder(1))
+
+    def testSetOrderReplacesTheOrder(self):
+        scheduler = plainScheduler(facilities=1)
+        orders = [PlannedOrder(1, 1, 3), PlannedOrder(2, 1, 2)]
+        scheduler.schedule(orders)
+        changes = scheduler.setOrder(PlannedOrder(1, 1, 1))
+        self.assertEqual([o.orderId for o in changes["updated"]], [1, 2])
+        self.assertEqual((orders[1].start, orders[1].end), (0, 20))
+        self.assertEqual((scheduler.orders[1].start, scheduler.orders[1].end), (20, 30))
+        self.assertEqual(scheduler.stock[0][1], 997)
+        added = scheduler.setOrder(PlannedOrder(3, 1, 1))
+        self.assertEqual([o.orderId for o in added["inserted"]], [3])
+        self.assertEqual(added["updated"], [])
+
+
+class TestProductionScheduler(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.client = app.test_client()
+        productionScheduler.cachedSchedulers.clear()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add_all(
+                [
+                    ProductionFacility(name=f"Plant {i}", latitude=0, longitude=0)
+                    for i in (1, 2)
+                ]
+                + [
+                    Product(category="Laptop", price=1, brand="Acer", model=f"M{i}")
+                    for i in (1, 2)
+                ]
+                + [Component(name="Part 1", brand="Intel")]
+            )
+            db.session.flush()
+            # Product 1 takes 10 minutes and 1 x part 1 a unit, product 2 takes 5
+            # minutes and nothing
+            db.session.add_all(
+                [
+                    ProductionProcess(product=1, minutes=10),
+                    ProductionProcess(product=2, minutes=5),
+                ]
+            )
+            db.session.flush()
+            db.session.add_all(
+                [
+                    ComponentsRequired(processId=1, componentId=1, count=1),
+                    ComponentInventory(productionFacilityId=1, componentId=1, count=4),
+                ]
+            )
+            db.session.commit()
+
+    def tearDown(self):
+        productionScheduler.cachedSchedulers.clear()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def orders(self):
+        return [
+            PlannedOrder(1, 1, 3),
+            PlannedOrder(2, 1, 2),
+            PlannedOrder(3, 2, 4),
+            PlannedOrder(4, 2, 2),
+        ]
+
+    def testCreateAndReloadFromRows(self):
+        with app.app_context():
+            summary = createSchedule(self.orders(), {2: 2})
+            self.assertEqual(summary["makespanMinutes"], 30)
+            self.assertEqual(summary["unscheduled"], 1)
+            # Another process changes the schedule: this one reloads it
+            productionScheduler.cachedSchedulers.clear()
+            changes = removeScheduledOrder(summary["scheduleId"], 1)
+            self.assertEqual(changes["version"], 2)
+            self.assertEqual([o["orderId"] for o in changes["changed"]], [2])
+            self.assertEqual(changes["changed"][0]["facilityId"], 1)
+            self.assertEqual(
+                getSchedule(summary["scheduleId"])["unscheduledOrders"], []
+            )
+            stale = db.session.get(ProductionSchedule, summary["scheduleId"])
+            stale.version = 9
+            db.session.commit()
+            changes = setScheduledOrder(summary["scheduleId"], PlannedOrder(5, 1, 2))
+            self.assertEqual(changes["changed"][0]["start"], 20)
+            self.assertIsNone(removeScheduledOrder(summary["scheduleId"], 1))
+            self.assertIsNone(removeScheduledOrder(99, 1))
+
+    def testReloadPlansWithTheStockOfCreation(self):
+        with app.app_context():
+            summary = createSchedule(self.orders(), {2: 2})
+            self.assertEqual(db.session.query(ScheduleStock).count(), 1)
+            # The stock changes after the schedule was built
+            db.session.get(ComponentInventory, 1).count = 0
+            db.session.commit()
+            productionScheduler.cachedSchedulers.clear()
+            # The reloaded schedule still has 1 of the 4 parts order 1 left
+            changes = setScheduledOrder(summary["scheduleId"], PlannedOrder(5, 1, 1))
+            self.assertEqual(changes["changed"][0]["facilityId"], 1)
+
+    def testEndpoints(self):
+        response = self.client.post(
+            "/api/schedules",
+            json={
+                "orders": [
+                    {"orderId": 1, "productId": 1, "quantity": 3},
+                    {"orderId": 2, "productId": 2, "quantity": 4, "facilityId": 2},
+                ],
+                "lines": {"1": 1},
+            },
+        )
+        self.assertEqual(response.status_code, 201)
+        scheduleId = response.json["scheduleId"]
+        self.assertEqual(response.json["makespanMinutes"], 30)
+        timeline = self.client.get(f"/api/schedules/{scheduleId}/facilities/2")
+        self.assertEqual(
+            [(o["orderId"], o["start"], o["end"]) for o in timeline.json["orders"]],
+            [(2, 0, 20)],
+        )
+        changed = self.client.put(
+            f"/api/schedules/{scheduleId}/orders/1",
+            json={"productId": 1, "quantity": 5},
+        )
+        self.assertEqual(changed.json["changed"][0]["reason"], "noStock")
+        self.assertEqual(
+            self.client.get(f"/api/schedules/{scheduleId}").json["unscheduledOrders"],
+            [{"orderId": 1, "productId": 1, "reason": "noStock"}],
+        )
+        removed = self.client.delete(f"/api/schedules/{scheduleId}/orders/1")
+        self.assertEqual(removed.json["removed"], [1])
+        self.assertEqual(removed.json["version"], 3)
+        self.assertEqual(
+            self.client.delete(f"/api/schedules/{scheduleId}/orders/1").status_code,
+            404,
+        )
+        self.assertEqual(self.client.get("/api/schedules/99").status_code, 404)
+
+    def testInvalidRequests(self):
+        for body in (
+            {},
+            {"orders": [{"orderId": 1, "productId": 1}]},
+            {"orders": [{"orderId": 1, "productId": 1, "quantity": 0}]},
+            {
+                "orders": [
+                    {"orderId": 1, "productId": 1, "quantity": 1},
+                    {"orderId": 1, "productId": 2, "quantity": 1},
+                ]
+            },
+            {
+                "orders": [{"orderId": 1, "productId": 1, "quantity": 1}],
+                "lines": {"1": -1},
+            },
+        ):
+            response = self.client.post("/api/schedules", json=body)
+            self.assertEqual(response.status_code, 400, body)
+
+
+if __name__ == "__main__":
+    unittest.main()
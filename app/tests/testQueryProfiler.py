@@ -0,0 +1,128 @@
+import unittest
+from flask import Flask
+from sqlalchemy import create_engine, text
+from app import app as mainApp, db
+from models.productionFacility import ProductionFacility
+from services.queryProfiler import QueryProfiler, fingerprint, queryProfiler
+
+
+class TestFingerprint(unittest.TestCase):
+    def testLiteralsAndInListsCollapse(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 42 AND name = 'it''s'"),
+            "SELECT * FROM t WHERE id = ? AND name = ?",
+        )
+        self.assertEqual(
+            fingerprint("SELECT  *\n FROM t2 WHERE id IN (?, ?, ?)"),
+            fingerprint("SELECT * FROM t2 WHERE id IN (?, ?)"),
+        )
+
+
+class TestQueryProfiler(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(
+            TESTING=True, PROFILER_QUERY_BUDGET=10, PROFILER_REPEAT_THRESHOLD=5
+        )
+        self.profiler = QueryProfiler(self.app)
+        self.engine = create_engine("sqlite://")
+        engine = self.engine
+
+        @self.app.route("/single")
+        def single():
+            with engine.connect() as connection:
+                return str(connection.execute(text("SELECT 1")).scalar())
+
+        @self.app.route("/loop/<int:n>")
+        def loop(n):
+            # One statement per item, like a lazy load in a loop
+            with engine.connect() as connection:
+                for i in range(n):
+                    connection.execute(text("SELECT :i"), {"i": i})
+            return "ok"
+
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def testCountsQueriesPerEndpoint(self):
+        response = self.client.get("/single")
+        self.client.get("/single")
+        self.assertIn('desc="1 queries"', response.headers["Server-Timing"])
+        stats = self.profiler.stats()
+        (endpoint,) = stats["endpoints"]
+        self.assertEqual(endpoint["endpoint"], "single")
+        self.assertEqual(endpoint["requests"], 2)
+        self.assertEqual(endpoint["queries"], 2)
+        self.assertEqual(endpoint["flagged"], 0)
+        self.assertEqual(stats["recentFlagged"], [])
+
+    def testRepeatedStatementIsFlagged(self):
+        with self.assertLogs(self.app.logger, "WARNING"):
+            self.client.get("/loop/6")
+        self.client.get("/loop/2")
+        endpoint = self.profiler.stats()["endpoints"][0]
+        self.assertEqual(endpoint["requests"], 2)
+        self.assertEqual(endpoint["maxQueries"], 6)
+        self.assertEqual(endpoint["flagged"], 1)
+        self.assertEqual(
+            endpoint["repeated"],
+            [{"statement": "SELECT ?", "requests": 1, "maxRepeats": 6}],
+        )
+        (flagged,) = self.profiler.stats()["recentFlagged"]
+        self.assertEqual(flagged["path"], "/loop/6")
+        self.assertEqual(flagged["queries"], 6)
+
+    def testQueryBudget(self):
+        self.profiler.repeatThreshold = 100
+        self.client.get("/loop/11")
+        self.assertEqual(self.profiler.stats()["endpoints"][0]["flagged"], 1)
+
+    def testQueriesOutsideRequestsAreIgnored(self):
+        with self.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        self.assertEqual(self.profiler.stats()["endpoints"], [])
+
+    def testReset(self):
+        self.client.get("/loop/6")
+        self.profiler.reset()
+        self.assertEqual(self.profiler.stats()["endpoints"], [])
+        self.assertEqual(self.profiler.stats()["recentFlagged"], [])
+
+
+class TestPerformanceView(unittest.TestCase):
+    def setUp(self):
+        mainApp.config["TESTING"] = True
+        mainApp.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.client = mainApp.test_client()
+        with mainApp.app_context():
+            db.create_all()
+            db.session.add(ProductionFacility(name="Plant", latitude=0, longitude=0))
+            db.session.commit()
+        queryProfiler.reset()
+
+    def tearDown(self):
+        queryProfiler.reset()
+        with mainApp.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def testLoginRequired(self):
+        response = self.client.get("/admin/performance/")
+        self.assertEqual(response.status_code, 302)
+
+    def testShowsEndpointAggregates(self):
+        with self.client.session_transaction() as session:
+            session["username"] = "user1"
+        self.client.get("/inventory")
+        response = self.client.get("/admin/performance/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"main.inventoryHome", response.data)
+        self.client.post("/admin/performance/reset")
+        endpoints = [e["endpoint"] for e in queryProfiler.stats()["endpoints"]]
+        self.assertNotIn("main.inventoryHome", endpoints)
+
+
+if __name__ == "__main__":
+    unittest.main()
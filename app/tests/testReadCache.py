@@ -0,0 +1,92 @@
+import unittest, json
+from unittest import mock
+from cachelib import NullCache, SimpleCache
+from app import app, db
+from extensions import readCache
+from models.product import Product
+from models.productionFacility import ProductionFacility
+from services.catalog import getFacility, getProduct, listFacilities
+from services.readCache import ReadCache, createBackend
+
+
+class TestReadCache(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add(
+                ProductionFacility(name="Facility 0", latitude=1, longitude=2)
+            )
+            db.session.add(Product(category="Laptop", price=100))
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def testHitsAndMisses(self):
+        with app.app_context():
+            before = readCache.stats().get("product", {"hits": 0, "misses": 0})
+            self.assertEqual(getProduct(1)["price"], 100)
+            self.assertEqual(getProduct(1)["price"], 100)
+            after = readCache.stats()["product"]
+        self.assertEqual(after["misses"] - before["misses"], 1)
+        self.assertEqual(after["hits"] - before["hits"], 1)
+
+    def testUpdateInvalidates(self):
+        with app.app_context():
+            self.assertEqual(getFacility(1)["name"], "Facility 0")
+            self.assertEqual(len(listFacilities()), 1)
+            facility = db.session.get(ProductionFacility, 1)
+            facility.name = "Renamed"
+            db.session.commit()
+            self.assertEqual(getFacility(1)["name"], "Renamed")
+            self.assertEqual(listFacilities()[0]["name"], "Renamed")
+
+    def testInsertAndDeleteInvalidateList(self):
+        self.assertEqual(len(json.loads(self.app.get("/map-data").data)["lat"]), 1)
+        with app.app_context():
+            db.session.add(
+                ProductionFacility(name="Facility 1", latitude=3, longitude=4)
+            )
+            db.session.commit()
+        self.assertEqual(len(json.loads(self.app.get("/map-data").data)["lat"]), 2)
+        with app.app_context():
+            db.session.delete(db.session.get(ProductionFacility, 1))
+            db.session.commit()
+            self.assertIsNone(getFacility(1))
+        mapData = json.loads(self.app.get("/map-data").data)
+        self.assertEqual(mapData["text"], ["Facility 1"])
+
+    def testSharedBackend(self):
+        # Two caches over one backend behave like two workers sharing a cache server
+        sharedBackend = SimpleCache()
+        workerA, workerB = ReadCache(), ReadCache()
+        workerA.backend = workerB.backend = sharedBackend
+        self.assertEqual(workerA.get("product", 1, lambda: {"price": 1}), {"price": 1})
+        self.assertEqual(workerB.get("product", 1, lambda: {"price": 2}), {"price": 1})
+        workerB.invalidate("product", 1)
+        self.assertEqual(workerA.get("product", 1, lambda: {"price": 3}), {"price": 3})
+        self.assertEqual(workerB.stats()["product"], {"hits": 1, "misses": 0})
+
+    def testPerProcessBackendIsOffWithSeveralWorkers(self):
+        cache = ReadCache()
+        cache.backend = SimpleCache()
+        self.assertFalse(cache.ensureShared(1))
+        self.assertTrue(cache.ensureShared(4))
+        self.assertIsInstance(cache.backend, NullCache)
+        self.assertEqual(cache.get("principal", 1, lambda: {"role": 2}), {"role": 2})
+        self.assertEqual(cache.get("principal", 1, lambda: {"role": 0}), {"role": 0})
+        # A shared backend is kept
+        shared = ReadCache()
+        shared.backend = mock.Mock()
+        self.assertFalse(shared.ensureShared(4))
+
+    def testMissingClientLibrary(self):
+        with mock.patch.dict("sys.modules", {"redis": None}):
+            with self.assertRaisesRegex(RuntimeError, "READ_CACHE_TYPE=redis"):
+                createBackend({"READ_CACHE_TYPE": "redis"})
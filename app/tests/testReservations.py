@@ -0,0 +1,284 @@
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy.dialects import mysql, postgresql
+from app import app, db
+from models.component import Component
+from models.inventory import ComponentInventory, ProductInventory
+from models.product import Product
+from models.productionFacility import ProductionFacility
+from models.productionProcess import ComponentsRequired, ProductionProcess
+from models.reservation import InventoryReservation
+from models.stockRollup import ProductStockRollup
+from models.user import User
+from services.productionBuild import BuildError, buildProduct
+from services.reservations import (
+    ReservationError,
+    availableToPromise,
+    confirmReservation,
+    confirmedBatchQuery,
+    convertConfirmed,
+    releaseReservation,
+    reserve,
+    sweepExpired,
+)
+
+
+class TestReservations(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.client = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            user = User(username="alice", email="alice@example.com", role=1)
+            user.setPassword("secret")
+            db.session.add_all(
+                [
+                    user,
+                    ProductionFacility(name="Plant 1", latitude=0, longitude=0),
+                    ProductionFacility(name="Plant 2", latitude=0, longitude=0),
+                    Product(category="Laptop", price=1, brand="Acer", model="M1"),
+                    Product(category="Laptop", price=1, brand="Acer", model="M2"),
+                    Component(name="Part 1", brand="Intel"),
+                ]
+            )
+            db.session.flush()
+            db.session.add_all(
+                [
+                    ProductInventory(
+                        productionFacilityId=facilityId,
+                        productId=productId,
+                        count=10,
+                        lastUpdatedByUserId=1,
+                    )
+                    for facilityId, productId in ((1, 1), (1, 2), (2, 1))
+                ]
+                + [ComponentInventory(productionFacilityId=1, componentId=1, count=5)]
+            )
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def count(self, model, entryId):
+        with app.app_context():
+            return db.session.get(model, entryId).count
+
+    def signIn(self):
+        with self.client.session_transaction() as session:
+            session["principal"] = {
+                "id": 1,
+                "username": "alice",
+                "role": 1,
+                "email": "alice@example.com",
+            }
+
+    def testHoldsReduceAvailableToPromise(self):
+        with app.app_context():
+            first = reserve(1, "product", 1, 4)
+            self.assertEqual(first["available"], 6)
+            reserve(1, "product", 1, 6)
+            with self.assertRaises(ReservationError) as raised:
+                reserve(1, "product", 1, 1)
+            self.assertEqual(
+                (raised.exception.reason, raised.exception.available),
+                ("insufficient", 0),
+            )
+            with self.assertRaises(ReservationError) as raised:
+                reserve(2, "product", 2, 1)
+            self.assertEqual(raised.exception.reason, "unknownItem")
+            self.assertEqual(
+                availableToPromise(1, "product", [1, 2, 3]),
+                [
+                    {"itemId": 1, "count": 10, "held": 10, "available": 0},
+                    {"itemId": 2, "count": 10, "held": 0, "available": 10},
+                ],
+            )
+        # A hold changes no inventory row
+        self.assertEqual(self.count(ProductInventory, 1), 10)
+
+    def testExpiredHoldsStopCountingAndAreSwept(self):
+        with app.app_context():
+            expired = reserve(1, "product", 1, 8, ttlSeconds=1)
+            reservation = db.session.get(InventoryReservation, expired["reservationId"])
+            reservation.expiresAt = datetime.now() - timedelta(seconds=1)
+            db.session.commit()
+            self.assertEqual(reserve(1, "product", 1, 9)["available"], 1)
+            with self.assertRaises(ReservationError) as raised:
+                confirmReservation(expired["reservationId"])
+            self.assertEqual(raised.exception.reason, "expired")
+            self.assertEqual(sweepExpired(batchSize=1), 1)
+            self.assertEqual(sweepExpired(), 0)
+            self.assertEqual(db.session.query(InventoryReservation).count(), 1)
+            with self.assertRaises(ReservationError) as raised:
+                confirmReservation(expired["reservationId"])
+            self.assertEqual(raised.exception.reason, "notFound")
+
+    def testConfirmedHoldsAreConvertedInBatches(self):
+        with app.app_context():
+            for facilityId, itemType, quantity in (
+                (1, "product", 2),
+                (1, "product", 3),
+                (2, "product", 4),
+                (1, "component", 5),
+            ):
+                held = reserve(facilityId, itemType, 1, quantity)
+                confirmReservation(held["reservationId"])
+            unconfirmed = reserve(1, "product", 1, 1)
+            # Confirmed holds do not expire
+            db.session.execute(
+                db.update(InventoryReservation).values(
+                    expiresAt=datetime.now() - timedelta(seconds=1)
+                )
+            )
+            db.session.commit()
+            self.assertEqual(sweepExpired(), 1)
+            result = convertConfirmed(batchSize=3)
+            self.assertEqual(
+                result,
+                {
+                    "reservations": 4,
+                    "units": {"component": 5, "product": 9},
+                    "shortfall": 0,
+                },
+            )
+            self.assertFalse(releaseReservation(unconfirmed["reservationId"]))
+            self.assertEqual(db.session.get(ProductStockRollup, 1).totalCount, 11)
+        self.assertEqual(self.count(ProductInventory, 1), 5)
+        self.assertEqual(self.count(ProductInventory, 3), 6)
+        self.assertEqual(self.count(ComponentInventory, 1), 0)
+
+    def testConversionQueryCompilesForMySql57(self):
+        def compiled(dialect, version):
+            dialect.server_version_info = version
+            return str(confirmedBatchQuery(10, dialect).compile(dialect=dialect))
+
+        # The production image runs MySQL 5.7, which has no SKIP LOCKED
+        legacy = compiled(mysql.dialect(), (5, 7, 44))
+        self.assertTrue(legacy.endswith("FOR UPDATE"), legacy)
+        self.assertIn("ORDER BY", legacy)
+        self.assertTrue(
+            compiled(mysql.dialect(), (8, 0, 36)).endswith("FOR UPDATE SKIP LOCKED")
+        )
+        self.assertIn("SKIP LOCKED", compiled(postgresql.dialect(), (16, 2)))
+
+    def testConversionNeverDrivesCountsNegative(self):
+        with app.app_context():
+            held = reserve(1, "product", 1, 6)
+            confirmReservation(held["reservationId"])
+            db.session.get(ProductInventory, 1).count = 4
+            db.session.commit()
+            self.assertEqual(convertConfirmed()["shortfall"], 2)
+        self.assertEqual(self.count(ProductInventory, 1), 0)
+
+    def testBuildsLeaveReservedComponents(self):
+        with app.app_context():
+            db.session.add(ProductionProcess(product=2, minutes=5))
+            db.session.flush()
+            db.session.add(ComponentsRequired(processId=1, componentId=1, count=1))
+            db.session.commit()
+            reserve(1, "component", 1, 3)
+            buildProduct(1, 2, 2, userId=1)
+            with self.assertRaises(BuildError) as raised:
+                buildProduct(1, 2, 1, userId=1)
+            self.assertEqual(raised.exception.shortages[0]["available"], 0)
+
+    def testEndpoints(self):
+        url = "/api/facilities/1/reservations"
+        body = {"type": "product", "itemId": 1, "quantity": 7}
+        self.assertEqual(self.client.post(url, json=body).status_code, 401)
+        self.signIn()
+        created = self.client.post(url, json=body)
+        self.assertEqual(created.status_code, 201)
+        reservationId = created.json["reservationId"]
+        self.assertEqual(created.json["status"], "held")
+        conflict = self.client.post(url, json=dict(body, quantity=4))
+        self.assertEqual(conflict.status_code, 409)
+        self.assertEqual(conflict.json["available"], 3)
+        for invalid in (
+            dict(body, quantity=0),
+            dict(body, type="pallet"),
+            dict(body, ttlSeconds=10**9),
+        ):
+            self.assertEqual(self.client.post(url, json=invalid).status_code, 400)
+        self.assertEqual(
+            self.client.post(
+                url, json=dict(body, type="component", itemId=9)
+            ).status_code,
+            404,
+        )
+        available = self.client.get("/api/facilities/1/available/product?ids=1,2")
+        self.assertEqual(
+            [item["available"] for item in available.json["items"]], [3, 10]
+        )
+        self.assertEqual(
+            self.client.get("/api/facilities/1/available/product?ids=x").status_code,
+            400,
+        )
+        confirmed = self.client.post(f"/api/reservations/{reservationId}/confirm")
+        self.assertEqual(confirmed.json["status"], "confirmed")
+        self.assertEqual(
+            self.client.delete(f"/api/reservations/{reservationId}").json,
+            {"released": reservationId},
+        )
+        self.assertEqual(
+            self.client.post(f"/api/reservations/{reservationId}/confirm").status_code,
+            404,
+        )
+        self.assertEqual(
+            self.client.delete(f"/api/reservations/{reservationId}").status_code, 404
+        )
+
+    def testReservationChangesNeedOwnerOrAdmin(self):
+        with app.app_context():
+            for username, role in (("bob", 2), ("carol", 0)):
+                user = User(username=username, email=f"{username}@example.com")
+                user.role = role
+                user.setPassword("secret")
+                db.session.add(user)
+            db.session.commit()
+            held = reserve(1, "product", 1, 2, userId=1)["reservationId"]
+        confirmUrl = f"/api/reservations/{held}/confirm"
+        self.assertEqual(self.client.post(confirmUrl).status_code, 401)
+        self.assertEqual(
+            self.client.delete(f"/api/reservations/{held}").status_code, 401
+        )
+
+        def signInAs(userId, username, role):
+            with self.client.session_transaction() as session:
+                session["principal"] = {
+                    "id": userId,
+                    "username": username,
+                    "role": role,
+                    "email": f"{username}@example.com",
+                }
+
+        signInAs(2, "bob", 2)
+        self.assertEqual(self.client.post(confirmUrl).status_code, 403)
+        self.assertEqual(
+            self.client.delete(f"/api/reservations/{held}").status_code, 403
+        )
+        self.assertEqual(
+            self.client.post("/api/reservations/99/confirm").status_code, 404
+        )
+        signInAs(3, "carol", 0)
+        self.assertEqual(self.client.post(confirmUrl).json["status"], "confirmed")
+        self.assertEqual(
+            self.client.delete(f"/api/reservations/{held}").json, {"released": held}
+        )
+
+    def testSweepCommand(self):
+        with app.app_context():
+            held = reserve(1, "product", 2, 3)
+            confirmReservation(held["reservationId"])
+        result = app.test_cli_runner().invoke(args=["ims", "sweep-reservations"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("converted 1 reservations (3 product", result.output)
+        self.assertEqual(self.count(ProductInventory, 2), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
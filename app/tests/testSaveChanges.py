@@ -0,0 +1,150 @@
+import unittest, json
+from sqlalchemy import event
+from app import app, db
+from models.inventory import ProductInventory, ComponentInventory
+from models.product import Product
+from models.component import Component
+from models.productionFacility import ProductionFacility
+
+
+class TestBulkSaveChanges(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+        self.app = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            facility = ProductionFacility(name="Facility", latitude=1, longitude=2)
+            db.session.add(facility)
+            db.session.flush()
+            for i in range(10):
+                product = Product(category="Laptop", price=i)
+                component = Component(name=f"Component {i}", price=i)
+                db.session.add_all([product, component])
+                db.session.flush()
+                db.session.add(
+                    ProductInventory(
+                        productId=product.id,
+                        count=100,
+                        productionFacilityId=facility.id,
+                        lastUpdatedByUserId=1,
+                    )
+                )
+                db.session.add(
+                    ComponentInventory(
+                        componentId=component.id,
+                        count=100,
+                        productionFacilityId=facility.id,
+                        lastUpdatedByUserId=1,
+                    )
+                )
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def postChanges(self, changesList, status=200, **options):
+        data = dict(changesList=changesList, **options)
+        response = self.app.post(
+            "/save-changes", data=json.dumps(data), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status)
+        return json.loads(response.data)
+
+    def counts(self, model):
+        with app.app_context():
+            return {entry.id: entry.count for entry in model.query.all()}
+
+    def testBulkUpdateUsesExecutemany(self):
+        changesList = [
+            {"type": "product", "entryId": str(i), "quantity": i} for i in range(1, 11)
+        ] + [
+            {"type": "component", "entryId": i, "quantity": i * 2} for i in range(1, 11)
+        ]
+        statements = []
+
+        def beforeCursorExecute(
+            conn, cursor, statement, parameters, context, executemany
+        ):
+            statements.append((statement.split()[0], executemany))
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", beforeCursorExecute)
+        try:
+            responseData = self.postChanges(changesList)
+        finally:
+            event.remove(engine, "before_cursor_execute", beforeCursorExecute)
+
+        self.assertEqual(responseData["msg"], "Inventory updated successfully.")
+        # One query per type and the reorder point lookup of the alert evaluator
+        self.assertEqual(statements.count(("SELECT", False)), 3)
+        self.assertEqual(statements.count(("UPDATE", True)), 2)
+        self.assertEqual(self.counts(ProductInventory), {i: i for i in range(1, 11)})
+        self.assertEqual(
+            self.counts(ComponentInventory), {i: i * 2 for i in range(1, 11)}
+        )
+
+    def testPartialFailureKeepsValidChanges(self):
+        changesList = [
+            {"type": "product", "entryId": 1, "quantity": 15},
+            {"type": "product", "entryId": 999, "quantity": 15},
+            {"type": "invalid_type", "entryId": 2, "quantity": 15},
+            {"type": "component", "entryId": 3, "quantity": -1},
+        ]
+        responseData = self.postChanges(changesList)
+        self.assertEqual(responseData["msg"], "Errors occured on 3/4 updates.")
+        self.assertIn("Invalid inventory entry type.", responseData["errors"])
+        self.assertIn(
+            "Inventory product entry 999 does not exist.", responseData["errors"]
+        )
+        self.assertEqual(self.counts(ProductInventory)[1], 15)
+        self.assertEqual(self.counts(ComponentInventory)[3], 100)
+
+    def testAtomicFailureSavesNothing(self):
+        changesList = [
+            {"type": "product", "entryId": 1, "quantity": 15},
+            {"type": "component", "entryId": 999, "quantity": 15},
+        ]
+        responseData = self.postChanges(changesList, atomic=True)
+        self.assertEqual(
+            responseData["msg"], "Errors occured on 1/2 updates. No changes were saved."
+        )
+        self.assertEqual(self.counts(ProductInventory)[1], 100)
+
+    def testStaleExpectedCountIsAConflict(self):
+        with app.app_context():
+            # A build changed the count after the grid was loaded
+            db.session.get(ComponentInventory, 2).count = 90
+            db.session.commit()
+        changesList = [
+            {"type": "product", "entryId": 1, "quantity": 15, "expectedCount": 100},
+            {"type": "component", "entryId": 2, "quantity": 15, "expectedCount": 100},
+        ]
+        responseData = self.postChanges(changesList, status=409)
+        self.assertEqual(
+            responseData["errors"],
+            ["Inventory component entry 2 changed from 100 to 90."],
+        )
+        self.assertEqual(
+            responseData["conflicts"],
+            [
+                {
+                    "type": "component",
+                    "entryId": 2,
+                    "expectedCount": 100,
+                    "count": 90,
+                }
+            ],
+        )
+        self.assertEqual(self.counts(ProductInventory)[1], 15)
+        self.assertEqual(self.counts(ComponentInventory)[2], 90)
+        responseData = self.postChanges(
+            [dict(changesList[1], expectedCount=90)], atomic=True
+        )
+        self.assertEqual(responseData["msg"], "Inventory updated successfully.")
+        self.assertEqual(self.counts(ComponentInventory)[2], 15)
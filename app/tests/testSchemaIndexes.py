@@ -0,0 +1,155 @@
+import unittest
+from sqlalchemy import create_engine, inspect, insert, text
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from app import app, db
+from models.inventory import ProductInventory
+from models.inventoryMovement import InventoryMovement
+from models.productionFacility import ProductionFacility
+from models.shipment import ShipmentAllocation, shipment
+from models.stockRollup import ProductStockRollup
+from services.schemaIndexes import indexedModels, initDatabase, migrateIndexes
+
+
+class TestSchemaIndexes(unittest.TestCase):
+    def setUp(self):
+        # A standalone database created before the indexes were declared
+        self.engine = create_engine("sqlite://")
+        db.metadata.create_all(self.engine)
+        for model in indexedModels:
+            for index in model.__table__.indexes:
+                index.drop(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def indexNames(self, tableName):
+        return {index["name"] for index in inspect(self.engine).get_indexes(tableName)}
+
+    def testMigrationMergesDuplicatesAndCreatesIndexes(self):
+        rows = [
+            {"productionFacilityId": 1, "productId": 1, "count": 3},
+            {"productionFacilityId": 1, "productId": 1, "count": 4},
+            {"productionFacilityId": 2, "productId": 1, "count": 5},
+        ]
+        with self.engine.begin() as connection:
+            connection.execute(
+                insert(ProductInventory),
+                [dict(row, lastUpdatedByUserId=1) for row in rows],
+            )
+
+        result = migrateIndexes(self.engine)
+        self.assertEqual(result["merged"]["productInventory"], 1)
+        self.assertIn("ix_productInventory_facility_product", result["created"])
+        self.assertIn("ix_users_email", self.indexNames("users"))
+        self.assertIn(
+            "ix_databaseTransactions_table_object_time",
+            self.indexNames("databaseTransactions"),
+        )
+        with self.engine.connect() as connection:
+            counts = connection.execute(
+                db.select(
+                    ProductInventory.productionFacilityId, ProductInventory.count
+                ).order_by(ProductInventory.id)
+            ).all()
+        self.assertEqual([tuple(row) for row in counts], [(1, 7), (2, 5)])
+
+        # Running it again is a no-op
+        self.assertEqual(migrateIndexes(self.engine)["created"], [])
+
+    def testMigrationAddsShipmentColumns(self):
+        # The shipment table as released before shipment planning
+        ShipmentAllocation.__table__.drop(self.engine)
+        shipment.__table__.drop(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(
+                    "CREATE TABLE shipment (id INTEGER NOT NULL PRIMARY KEY,"
+                    ' name VARCHAR(256), "contactInfo" VARCHAR(256),'
+                    " longitude FLOAT, latitude FLOAT)"
+                )
+            )
+            connection.execute(
+                text(
+                    "INSERT INTO shipment (name, latitude, longitude) VALUES ('Old', 1, 2)"
+                )
+            )
+        db.metadata.create_all(self.engine)
+
+        result = migrateIndexes(self.engine)
+        self.assertEqual(
+            result["columns"],
+            [
+                "shipment.productId",
+                "shipment.quantity",
+                "shipment.status",
+                "shipment.createdAt",
+            ],
+        )
+        self.assertIn("ix_shipment_status", self.indexNames("shipment"))
+        with Session(self.engine) as session:
+            old = session.get(shipment, 1)
+            self.assertEqual(
+                (old.name, old.productId, old.quantity, old.status),
+                ("Old", None, 1, "pending"),
+            )
+            self.assertIsNotNone(old.createdAt)
+            session.add(shipment(name="New", productId=1, latitude=0, longitude=0))
+            session.commit()
+            self.assertEqual(session.get(shipment, 2).quantity, 1)
+        self.assertEqual(migrateIndexes(self.engine)["columns"], [])
+
+    def testInitDatabaseCreatesAndFillsMissingTables(self):
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            # Stock held before the rollups and the ledger were added
+            ProductStockRollup.__table__.drop(db.engine)
+            InventoryMovement.__table__.drop(db.engine)
+            db.session.add(ProductionFacility(name="Plant", latitude=0, longitude=0))
+            db.session.execute(
+                insert(ProductInventory),
+                [
+                    {
+                        "productionFacilityId": 1,
+                        "productId": 1,
+                        "count": 3,
+                        "lastUpdatedByUserId": 1,
+                    }
+                ],
+            )
+            db.session.commit()
+            result = initDatabase()
+            self.assertEqual(
+                sorted(result["tables"]),
+                ["inventoryMovements", "productStockRollup"],
+            )
+            self.assertTrue(result["rebuilt"])
+            self.assertEqual(db.session.get(ProductStockRollup, 1).totalCount, 3)
+            self.assertEqual(result["reconciled"], {"product": 1, "component": 0})
+
+            result = initDatabase()
+            self.assertEqual((result["tables"], result["created"]), ([], []))
+            self.assertFalse(result["rebuilt"])
+            db.session.remove()
+            db.drop_all()
+
+    def testDuplicateInventoryRejected(self):
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            for _ in range(2):
+                db.session.add(
+                    ProductInventory(
+                        productId=1,
+                        count=1,
+                        productionFacilityId=1,
+                        lastUpdatedByUserId=1,
+                    )
+                )
+            with self.assertRaises(IntegrityError):
+                db.session.commit()
+            db.session.rollback()
+            db.drop_all()
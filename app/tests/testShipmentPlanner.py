@@ -0,0 +1,244 @@
+import unittest
+from sqlalchemy import event
+from sqlalchemy.dialects import mysql
+from app import app, db
+from models.inventory import ProductInventory
+from models.product import Product
+from models.productionFacility import ProductionFacility
+from models.reservation import InventoryReservation
+from models.shipment import ShipmentAllocation, shipment
+from models.user import User
+from services.reservations import availableToPromise, reserve
+from services.shipmentPlanner import (
+    ShipmentPlanError,
+    applyPlan,
+    haversineMatrix,
+    planShipments,
+    shipmentLockQuery,
+)
+from services.spatialIndex import haversineKm
+
+
+class TestShipmentPlanner(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.client = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            user = User(username="alice", email="alice@example.com", role=1)
+            user.setPassword("secret")
+            db.session.add_all(
+                [
+                    user,
+                    # Facility 1 at longitude 0, facility 2 at longitude 2
+                    ProductionFacility(name="Plant 1", latitude=0, longitude=0),
+                    ProductionFacility(name="Plant 2", latitude=0, longitude=2),
+                    ProductionFacility(
+                        name="Closed", latitude=0, longitude=1, isOperating=False
+                    ),
+                    Product(category="Laptop", price=1, brand="Acer", model="M1"),
+                ]
+            )
+            db.session.flush()
+            db.session.add_all(
+                [
+                    ProductInventory(
+                        productionFacilityId=facilityId,
+                        productId=1,
+                        count=1,
+                        lastUpdatedByUserId=1,
+                    )
+                    for facilityId in (1, 2, 3)
+                ]
+                + [
+                    # The first shipment is a little nearer facility 1, the
+                    # second much nearer it
+                    shipment(name="First", productId=1, latitude=0, longitude=0.9),
+                    shipment(name="Second", productId=1, latitude=0, longitude=-1),
+                    shipment(name="No product", latitude=0, longitude=0),
+                ]
+            )
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def signIn(self):
+        with self.client.session_transaction() as session:
+            session["principal"] = {
+                "id": 1,
+                "username": "alice",
+                "role": 1,
+                "email": "alice@example.com",
+            }
+
+    def sources(self, plan):
+        return [
+            (allocation["shipmentId"], allocation["facilityId"], allocation["quantity"])
+            for allocation in plan["allocations"]
+        ]
+
+    def testHaversineMatrixMatchesHaversineKm(self):
+        points = [(0, 0), (51.5, -0.1), (-33.9, 151.2), (90, 0)]
+        lat, lon = zip(*points)
+        matrix = haversineMatrix(lat, lon, lat[::-1], lon[::-1])
+        self.assertEqual(matrix.shape, (4, 4))
+        for i, (lat1, lon1) in enumerate(points):
+            for j, (lat2, lon2) in enumerate(points[::-1]):
+                self.assertAlmostEqual(
+                    matrix[i, j], haversineKm(lat1, lon1, lat2, lon2), places=6
+                )
+
+    def testOptimalModeMovesEarlierShipments(self):
+        with app.app_context():
+            greedy = planShipments("greedy")
+            optimal = planShipments("optimal")
+        self.assertEqual(self.sources(greedy), [(1, 1, 1), (2, 2, 1)])
+        self.assertEqual(self.sources(optimal), [(1, 2, 1), (2, 1, 1)])
+        self.assertLess(optimal["unitKm"], greedy["unitKm"])
+        self.assertEqual((optimal["shipments"], optimal["unserved"]), (2, []))
+        # Planned one at a time, the first shipment keeps facility 1
+        with app.app_context():
+            chunked = planShipments("optimal", chunkSize=1)
+        self.assertEqual(self.sources(chunked), self.sources(greedy))
+
+    def testShortStockSplitsAndServesTheOldestFirst(self):
+        with app.app_context():
+            db.session.get(shipment, 1).quantity = 3
+            db.session.commit()
+            for mode in ("greedy", "optimal"):
+                plan = planShipments(mode)
+                self.assertEqual(
+                    sorted(self.sources(plan)), [(1, 1, 1), (1, 2, 1)], mode
+                )
+                self.assertEqual(
+                    (plan["units"], plan["allocatedUnits"], plan["unserved"]),
+                    (4, 2, [1, 2]),
+                )
+            reserve(2, "product", 1, 1)
+            self.assertEqual(self.sources(planShipments("optimal")), [(1, 1, 1)])
+            with self.assertRaises(ValueError):
+                planShipments("cheapest")
+
+    def testApplyHoldsTheStock(self):
+        with app.app_context():
+            plan = planShipments("optimal")
+            self.assertEqual(applyPlan(plan["allocations"], userId=1), 2)
+            self.assertEqual(
+                [entry.status for entry in db.session.scalars(db.select(shipment))],
+                ["planned", "planned", "pending"],
+            )
+            self.assertEqual(db.session.query(ShipmentAllocation).count(), 2)
+            self.assertEqual(
+                [item["available"] for item in availableToPromise(1, "product", [1])],
+                [0],
+            )
+            self.assertEqual(planShipments()["shipments"], 0)
+            with self.assertRaises(ShipmentPlanError) as raised:
+                applyPlan(plan["allocations"])
+            self.assertEqual(raised.exception.reason, "shipmentChanged")
+
+            db.session.add(shipment(productId=1, latitude=0, longitude=1))
+            db.session.get(ProductInventory, 2).count = 2
+            db.session.commit()
+            stale = planShipments()
+            db.session.get(ProductInventory, 2).count = 1
+            db.session.commit()
+            with self.assertRaises(ShipmentPlanError) as raised:
+                applyPlan(stale["allocations"])
+            self.assertEqual(raised.exception.reason, "stockChanged")
+            # Only the first plan's two holds
+            self.assertEqual(db.session.query(InventoryReservation).count(), 2)
+
+    def testOverlappingPlansDoNotOverAllocate(self):
+        with app.app_context():
+            for entry in db.session.scalars(db.select(ProductInventory)):
+                entry.count = 5
+            db.session.get(shipment, 2).quantity = 3
+            db.session.commit()
+            # Both plans are computed before either is applied
+            first = planShipments(shipmentIds=[1, 2])
+            second = planShipments(shipmentIds=[2])
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            event.listen(db.engine, "before_cursor_execute", record)
+            try:
+                self.assertEqual(applyPlan(first["allocations"]), 2)
+            finally:
+                event.remove(db.engine, "before_cursor_execute", record)
+            with self.assertRaises(ShipmentPlanError) as raised:
+                applyPlan(second["allocations"])
+            self.assertEqual(raised.exception.reason, "shipmentChanged")
+            self.assertEqual(
+                db.session.scalar(
+                    db.select(db.func.sum(ShipmentAllocation.quantity)).where(
+                        ShipmentAllocation.shipmentId == 2
+                    )
+                ),
+                3,
+            )
+        # The shipments are locked first, then the inventory rows
+        selects = [sql for sql in statements if sql.lstrip().startswith("SELECT")]
+        self.assertIn("FROM shipment", selects[0])
+        self.assertIn('FROM "productInventory"', selects[2])
+        compiled = str(
+            shipmentLockQuery({2, 1}).compile(
+                dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}
+            )
+        )
+        self.assertTrue(compiled.endswith("ORDER BY shipment.id FOR UPDATE"), compiled)
+
+    def testEndpoints(self):
+        url = "/api/shipments/plan"
+        self.assertEqual(self.client.post(url, json={"apply": True}).status_code, 401)
+        for invalid in ({"mode": "fastest"}, {"chunkSize": -1}, {"shipmentIds": ["x"]}):
+            self.assertEqual(self.client.post(url, json=invalid).status_code, 400)
+        preview = self.client.post(url, json={"mode": "optimal", "shipmentIds": [2]})
+        self.assertEqual(preview.status_code, 200)
+        self.assertEqual(
+            preview.json["allocations"],
+            [
+                {
+                    "shipmentId": 2,
+                    "facilityId": 1,
+                    "quantity": 1,
+                    "distanceKm": round(haversineKm(0, -1, 0, 0), 3),
+                }
+            ],
+        )
+        self.signIn()
+        applied = self.client.post(url, json={"mode": "optimal", "apply": True})
+        self.assertEqual(applied.status_code, 201)
+        self.assertEqual(applied.json["planned"], 2)
+        detail = self.client.get("/api/shipments/1").json
+        self.assertEqual(detail["status"], "planned")
+        self.assertEqual(
+            [allocation["facilityId"] for allocation in detail["allocations"]], [2]
+        )
+        self.assertEqual(self.client.get("/api/shipments/9").status_code, 404)
+
+    def testPlanCommand(self):
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["ims", "plan-shipments", "--mode", "optimal"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("optimal: 2 of 2 units of 2 shipments allocated", result.output)
+        result = runner.invoke(args=["ims", "plan-shipments", "--apply"])
+        self.assertIn("planned 2 shipments", result.output)
+        with app.app_context():
+            self.assertEqual(
+                db.session.scalar(
+                    db.select(db.func.sum(InventoryReservation.quantity))
+                ),
+                2,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
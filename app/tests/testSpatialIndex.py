@@ -0,0 +1,122 @@
+import unittest
+import random
+from sqlalchemy import insert
+from app import app, db
+from models.inventory import ProductInventory
+from models.product import Product
+from models.productionFacility import ProductionFacility
+from services import spatialIndex
+from services.spatialIndex import haversineKm, nearestWithStock
+
+
+class TestSpatialIndex(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.client = app.test_client()
+        rng = random.Random(1)
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add(Product(category="Laptop", price=1))
+            db.session.execute(
+                insert(ProductionFacility),
+                [
+                    {
+                        "name": f"Facility {i}",
+                        "latitude": rng.uniform(-60, 70),
+                        "longitude": rng.uniform(-180, 180),
+                        "isOperating": i % 10 != 0,
+                    }
+                    for i in range(1, 301)
+                ],
+            )
+            db.session.execute(
+                insert(ProductInventory),
+                [
+                    {
+                        "productionFacilityId": i,
+                        "productId": 1,
+                        "count": rng.randint(0, 20),
+                        "lastUpdatedByUserId": 1,
+                    }
+                    for i in range(1, 301)
+                ],
+            )
+            db.session.commit()
+            self.facilities = {f.id: f.toDict() for f in ProductionFacility.query.all()}
+            self.counts = {
+                row.productionFacilityId: row.count
+                for row in ProductInventory.query.all()
+            }
+
+    def tearDown(self):
+        spatialIndex.rareItemLimit = 512
+        spatialIndex.treeWalkCost = 8
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def bruteForce(self, lat, lon, quantity, k):
+        distances = sorted(
+            (haversineKm(lat, lon, f["latitude"], f["longitude"]), facilityId)
+            for facilityId, f in self.facilities.items()
+            if f["isOperating"] and self.counts[facilityId] >= quantity
+        )
+        return [facilityId for _, facilityId in distances[:k]]
+
+    def assertMatchesBruteForce(self):
+        rng = random.Random(2)
+        with app.app_context():
+            for _ in range(20):
+                lat, lon = rng.uniform(-80, 80), rng.uniform(-180, 180)
+                quantity = rng.randint(1, 20)
+                result = nearestWithStock(lat, lon, "product", 1, quantity, k=7)
+                self.assertEqual(
+                    [row["id"] for row in result],
+                    self.bruteForce(lat, lon, quantity, 7),
+                )
+                for row in result:
+                    self.assertGreaterEqual(row["count"], quantity)
+
+    def testRareItemPath(self):
+        self.assertMatchesBruteForce()
+
+    def testTreeWalkPath(self):
+        spatialIndex.rareItemLimit, spatialIndex.treeWalkCost = 5, 0
+        self.assertMatchesBruteForce()
+
+    def testIndexFollowsFacilityChanges(self):
+        with app.app_context():
+            nearestWithStock(0, 0, "product", 1)
+            facility = ProductionFacility(name="Null Island", latitude=0, longitude=0)
+            db.session.add(facility)
+            db.session.flush()
+            db.session.add(
+                ProductInventory(
+                    productionFacilityId=facility.id,
+                    productId=1,
+                    count=5,
+                    lastUpdatedByUserId=1,
+                )
+            )
+            db.session.commit()
+            nearest = nearestWithStock(0.1, 0.1, "product", 1, quantity=5, k=1)[0]
+            self.assertEqual(nearest["name"], "Null Island")
+            facility.isOperating = False
+            db.session.commit()
+            nearest = nearestWithStock(0.1, 0.1, "product", 1, quantity=5, k=1)[0]
+            self.assertNotEqual(nearest["name"], "Null Island")
+
+    def testNearestEndpoint(self):
+        response = self.client.get(
+            "/api/facilities/nearest?lat=40&lon=-100&productId=1&quantity=3&k=3"
+        )
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual(
+            [row["id"] for row in body["facilities"]], self.bruteForce(40, -100, 3, 3)
+        )
+        self.assertEqual(
+            self.client.get("/api/facilities/nearest?lat=40").status_code, 400
+        )
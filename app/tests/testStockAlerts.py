@@ -0,0 +1,236 @@
+import unittest
+from app import app, db
+from models.component import Component
+from models.inventory import ComponentInventory, ProductInventory
+from models.product import Product
+from models.productionFacility import ProductionFacility
+from models.stockAlert import StockAlert, StockThreshold, evaluatedKeys
+from models.user import User
+from services.stockAlerts import reconcileAlerts, setThresholds
+
+
+class TestStockAlerts(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        app.config["STOCK_ALERT_COOLDOWN_SECONDS"] = 3600
+        self.client = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            user = User(username="alice", email="alice@example.com", role=1)
+            user.setPassword("secret")
+            db.session.add_all(
+                [
+                    user,
+                    ProductionFacility(name="Plant 1", latitude=0, longitude=0),
+                    ProductionFacility(name="Plant 2", latitude=0, longitude=0),
+                    Product(category="Laptop", price=1, brand="Acer", model="M1"),
+                    Product(category="Laptop", price=1, brand="Acer", model="M2"),
+                    Component(name="Part 1", brand="Intel"),
+                ]
+            )
+            db.session.flush()
+            db.session.add_all(
+                [
+                    ProductInventory(
+                        productionFacilityId=1,
+                        productId=1,
+                        count=10,
+                        lastUpdatedByUserId=1,
+                    ),
+                    ProductInventory(
+                        productionFacilityId=1,
+                        productId=2,
+                        count=10,
+                        lastUpdatedByUserId=1,
+                    ),
+                    ComponentInventory(productionFacilityId=2, componentId=1, count=3),
+                ]
+            )
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def signIn(self):
+        with self.client.session_transaction() as session:
+            session["principal"] = {
+                "id": 1,
+                "username": "alice",
+                "role": 1,
+                "email": "alice@example.com",
+            }
+
+    def setCount(self, model, entryId, count):
+        db.session.get(model, entryId).count = count
+        db.session.commit()
+
+    def alerts(self):
+        return [
+            (a.id, a.productionFacilityId, a.itemType, a.itemId, a.count, a.status)
+            for a in db.session.scalars(db.select(StockAlert).order_by(StockAlert.id))
+        ]
+
+    def testCountChangesRaiseRefreshAndResolveOneAlert(self):
+        with app.app_context():
+            setThresholds(1, [("product", 1, 5)], userId=1)
+            self.assertEqual(self.alerts(), [])
+            self.setCount(ProductInventory, 1, 5)
+            self.assertEqual(self.alerts(), [(1, 1, "product", 1, 5, "open")])
+            # Further drops refresh the same alert
+            self.setCount(ProductInventory, 1, 2)
+            self.assertEqual(self.alerts(), [(1, 1, "product", 1, 2, "open")])
+            self.setCount(ProductInventory, 1, 6)
+            self.assertEqual(self.alerts(), [(1, 1, "product", 1, 6, "resolved")])
+            # Running low again within the cooldown reopens it
+            self.setCount(ProductInventory, 1, 4)
+            self.assertEqual(self.alerts(), [(1, 1, "product", 1, 4, "open")])
+            alert = db.session.get(StockAlert, 1)
+            self.assertEqual((alert.triggerCount, alert.resolvedAt), (2, None))
+
+            app.config["STOCK_ALERT_COOLDOWN_SECONDS"] = 0
+            self.setCount(ProductInventory, 1, 6)
+            self.setCount(ProductInventory, 1, 4)
+            self.assertEqual(
+                self.alerts(),
+                [
+                    (1, 1, "product", 1, 6, "resolved"),
+                    (2, 1, "product", 1, 4, "open"),
+                ],
+            )
+
+    def testOnlyChangedItemsAreEvaluated(self):
+        with app.app_context():
+            setThresholds(1, [("product", 1, 5)])
+            before = evaluatedKeys.values.get(("event",), 0)
+            db.session.get(ProductInventory, 2).count = 1
+            db.session.get(ComponentInventory, 1).count = 0
+            db.session.commit()
+            self.assertEqual(evaluatedKeys.values[("event",)], before + 2)
+            self.assertEqual(self.alerts(), [])
+            # Neither a threshold for another item nor a timestamp-only change
+            db.session.get(ProductInventory, 1).lastUpdatedByUserId = 2
+            db.session.commit()
+            self.assertEqual(evaluatedKeys.values[("event",)], before + 2)
+
+            # A new threshold at or above the count fires straight away, and
+            # removing it resolves the alert
+            setThresholds(2, [("component", 1, 0)])
+            self.assertEqual(self.alerts(), [(1, 2, "component", 1, 0, "open")])
+            setThresholds(2, [("component", 1, None)])
+            self.assertEqual(self.alerts()[0][-1], "resolved")
+            self.assertEqual(db.session.query(StockThreshold).count(), 1)
+
+    def testRolledBackChangesRaiseNothing(self):
+        with app.app_context():
+            setThresholds(1, [("product", 1, 5)])
+            db.session.get(ProductInventory, 1).count = 0
+            db.session.flush()
+            db.session.rollback()
+            db.session.commit()
+            self.assertEqual(self.alerts(), [])
+            # Deleting the stock row leaves nothing at the facility
+            db.session.delete(db.session.get(ProductInventory, 1))
+            db.session.commit()
+            self.assertEqual(
+                [a[1:] for a in self.alerts()], [(1, "product", 1, 0, "open")]
+            )
+
+    def testReconcileCatchesWritesBypassingTheSession(self):
+        with app.app_context():
+            setThresholds(1, [("product", 1, 5), ("product", 2, 5)])
+            db.session.execute(db.update(ProductInventory).values(count=1))
+            db.session.commit()
+            self.assertEqual(self.alerts(), [])
+            totals = reconcileAlerts(batchSize=1)
+            self.assertEqual(
+                totals,
+                {
+                    "evaluated": 2,
+                    "fired": 2,
+                    "suppressed": 0,
+                    "updated": 0,
+                    "resolved": 0,
+                },
+            )
+            self.assertEqual(reconcileAlerts()["fired"], 0)
+
+            db.session.execute(
+                db.delete(StockThreshold).where(StockThreshold.itemId == 2)
+            )
+            db.session.execute(
+                db.update(ProductInventory)
+                .where(ProductInventory.id == 1)
+                .values(count=0)
+            )
+            db.session.commit()
+            totals = reconcileAlerts()
+            self.assertEqual((totals["updated"], totals["resolved"]), (1, 1))
+            self.assertEqual(
+                self.alerts(),
+                [
+                    (1, 1, "product", 1, 0, "open"),
+                    (2, 1, "product", 2, 1, "resolved"),
+                ],
+            )
+
+    def testEndpoints(self):
+        url = "/api/facilities/1/thresholds"
+        body = {"thresholds": [{"type": "product", "itemId": 1, "reorderPoint": 10}]}
+        self.assertEqual(self.client.put(url, json=body).status_code, 401)
+        self.signIn()
+        for invalid in (
+            {},
+            {"thresholds": []},
+            {"thresholds": [{"type": "part", "itemId": 1, "reorderPoint": 1}]},
+            {"thresholds": [{"type": "product", "itemId": 1, "reorderPoint": -1}]},
+            {"thresholds": [{"type": "product", "itemId": 1}]},
+        ):
+            self.assertEqual(self.client.put(url, json=invalid).status_code, 400)
+        self.assertEqual(
+            self.client.put("/api/facilities/9/thresholds", json=body).status_code,
+            404,
+        )
+        response = self.client.put(url, json=body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [
+                (t["type"], t["itemId"], t["reorderPoint"], t["updatedByUserId"])
+                for t in self.client.get(url).json["thresholds"]
+            ],
+            [("product", 1, 10, 1)],
+        )
+
+        alerts = self.client.get("/api/alerts").json["alerts"]
+        self.assertEqual(
+            [(a["alertId"], a["itemId"], a["count"], a["status"]) for a in alerts],
+            [(1, 1, 10, "open")],
+        )
+        self.assertEqual(self.client.get("/api/alerts?facilityId=2").json["alerts"], [])
+        self.assertEqual(self.client.get("/api/alerts?status=late").status_code, 400)
+        self.assertEqual(self.client.post("/api/alerts/9/acknowledge").status_code, 404)
+        acknowledged = self.client.post("/api/alerts/1/acknowledge")
+        self.assertEqual(acknowledged.json["status"], "acknowledged")
+        self.assertEqual(len(self.client.get("/api/alerts").json["alerts"]), 1)
+
+        body["thresholds"][0]["reorderPoint"] = None
+        self.assertEqual(self.client.put(url, json=body).json["thresholds"], [])
+        self.assertEqual(self.client.get("/api/alerts").json["alerts"], [])
+        resolved = self.client.get("/api/alerts?status=resolved").json["alerts"]
+        self.assertEqual(resolved[0]["acknowledgedByUserId"], 1)
+        self.assertEqual(self.client.post("/api/alerts/1/acknowledge").status_code, 409)
+
+    def testReconcileCommand(self):
+        with app.app_context():
+            setThresholds(2, [("component", 1, 3)])
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["ims", "reconcile-alerts"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("evaluated 1 reorder points: fired 0", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
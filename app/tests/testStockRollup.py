@@ -0,0 +1,119 @@
+import unittest, json
+from app import app, db
+from models.inventory import ProductInventory, ComponentInventory
+from models.product import Product
+from models.component import Component
+from models.productionFacility import ProductionFacility
+from models.stockRollup import (
+    ProductStockRollup,
+    ComponentStockRollup,
+    rebuildStockRollups,
+)
+
+
+class TestStockRollup(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            for i in range(3):
+                db.session.add(
+                    ProductionFacility(name=f"Facility {i}", latitude=i, longitude=i)
+                )
+            db.session.add_all([Product(category="Laptop", price=1) for i in range(2)])
+            db.session.add(Component(name="CPU", price=1))
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def addProductEntry(self, productId, facilityId, count):
+        entry = ProductInventory(
+            productId=productId,
+            count=count,
+            productionFacilityId=facilityId,
+            lastUpdatedByUserId=1,
+        )
+        db.session.add(entry)
+        return entry
+
+    def rollup(self, model, itemId):
+        row = db.session.get(model, itemId)
+        return (row.totalCount, row.facilityCount) if row else None
+
+    def testInsertUpdateDelete(self):
+        with app.app_context():
+            self.addProductEntry(1, 1, 10)
+            self.addProductEntry(1, 2, 5)
+            self.addProductEntry(2, 3, 7)
+            db.session.commit()
+            self.assertEqual(self.rollup(ProductStockRollup, 1), (15, 2))
+            self.assertEqual(self.rollup(ProductStockRollup, 2), (7, 1))
+
+            entry = db.session.get(ProductInventory, 2)
+            entry.count = 0
+            db.session.commit()
+            self.assertEqual(self.rollup(ProductStockRollup, 1), (10, 1))
+
+            # Moving a row to another product shifts its stock between rollups
+            entry = db.session.get(ProductInventory, 1)
+            entry.productId = 2
+            db.session.commit()
+            self.assertEqual(self.rollup(ProductStockRollup, 1), (0, 0))
+            self.assertEqual(self.rollup(ProductStockRollup, 2), (17, 2))
+
+            db.session.delete(db.session.get(ProductInventory, 3))
+            db.session.commit()
+            self.assertEqual(self.rollup(ProductStockRollup, 2), (10, 1))
+
+    def testRollbackDiscardsDeltas(self):
+        with app.app_context():
+            self.addProductEntry(1, 1, 10)
+            db.session.commit()
+            db.session.get(ProductInventory, 1).count = 50
+            db.session.flush()
+            db.session.rollback()
+            self.assertEqual(self.rollup(ProductStockRollup, 1), (10, 1))
+
+    def testSaveChangesUpdatesRollup(self):
+        with app.app_context():
+            db.session.add(
+                ComponentInventory(
+                    componentId=1,
+                    count=4,
+                    productionFacilityId=1,
+                    lastUpdatedByUserId=1,
+                )
+            )
+            db.session.commit()
+        data = {"changesList": [{"type": "component", "entryId": 1, "quantity": 9}]}
+        self.app.post(
+            "/save-changes", data=json.dumps(data), content_type="application/json"
+        )
+        response = self.app.get("/api/stock/components/1")
+        self.assertEqual(
+            json.loads(response.data),
+            {"componentId": 1, "totalCount": 9, "facilityCount": 1},
+        )
+
+    def testRebuildFixesDrift(self):
+        with app.app_context():
+            self.addProductEntry(1, 1, 10)
+            self.addProductEntry(1, 2, 0)
+            db.session.commit()
+            db.session.execute(db.update(ProductStockRollup).values(totalCount=999))
+            db.session.commit()
+            written = rebuildStockRollups(db.session)
+            db.session.commit()
+            self.assertEqual(written["productStockRollup"], 1)
+            self.assertEqual(self.rollup(ProductStockRollup, 1), (10, 1))
+            self.assertIsNone(self.rollup(ComponentStockRollup, 1))
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["ims", "rebuild-rollups"])
+        self.assertIn("productStockRollup: 1 rows", result.output)
@@ -0,0 +1,72 @@
+import unittest
+import os, tempfile
+from sqlalchemy import create_engine
+from app import app, db
+from commands import ims
+from models.inventory import ComponentInventory, ProductInventory
+from models.stockRollup import ProductStockRollup
+from services.syntheticData import generateDataset
+
+
+class TestSyntheticData(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def makeEngine(self, name):
+        engine = create_engine("sqlite:///" + os.path.join(self.tempDir.name, name))
+        db.metadata.create_all(engine)
+        return engine
+
+    def inventoryRows(self, engine):
+        with engine.connect() as connection:
+            return connection.execute(
+                db.select(
+                    ProductInventory.productionFacilityId,
+                    ProductInventory.productId,
+                    ProductInventory.count,
+                ).order_by(ProductInventory.id)
+            ).all()
+
+    def testSameSeedSameData(self):
+        sizes = {"facilities": 20, "products": 100, "components": 50, "seed": 7}
+        first, second = self.makeEngine("a.db"), self.makeEngine("b.db")
+        written = generateDataset(first, chunkSize=333, **sizes)
+        generateDataset(second, **sizes)
+        self.assertEqual(written["productInventory"], 20 * 50)
+        self.assertEqual(written["componentInventory"], 20 * 50)
+        self.assertEqual(self.inventoryRows(first), self.inventoryRows(second))
+        other = self.makeEngine("c.db")
+        generateDataset(other, **dict(sizes, seed=8))
+        self.assertNotEqual(self.inventoryRows(first), self.inventoryRows(other))
+        for engine in (first, second, other):
+            engine.dispose()
+
+    def testPairsAreUniqueAndRollupsMatch(self):
+        engine = self.makeEngine("data.db")
+        generateDataset(engine, facilities=10, products=30, productsPerFacility=30)
+        rows = self.inventoryRows(engine)
+        pairs = {(facilityId, productId) for facilityId, productId, _ in rows}
+        self.assertEqual(len(pairs), len(rows))
+        with engine.connect() as connection:
+            total = connection.scalar(
+                db.select(db.func.sum(ProductStockRollup.totalCount))
+            )
+        self.assertEqual(total, sum(count for _, _, count in rows))
+        engine.dispose()
+
+    def testGenerateCommand(self):
+        url = "sqlite:///" + os.path.join(self.tempDir.name, "cli.db")
+        result = app.test_cli_runner().invoke(
+            ims, ["generate", "--database-url", url, "--facilities", "3", "--reset"]
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        engine = create_engine(url)
+        with engine.connect() as connection:
+            count = connection.scalar(
+                db.select(db.func.count()).select_from(ComponentInventory)
+            )
+        engine.dispose()
+        self.assertEqual(count, 150)
@@ -0,0 +1,15 @@
+"""
+Production WSGI entry point.
+
+Run with gunicorn, which reads gunicorn.conf.py from the working directory:
+
+    gunicorn wsgi:app
+
+The lazily loaded parts of the app are set up here, in the preloaded master,
+instead of on each worker's first request.
+"""
+
+from app import create_app, finishSetup
+
+app = create_app()
+finishSetup(app)